@@ -0,0 +1,77 @@
+"""Benchmark: module import time for server startup.
+
+Runs `python -X importtime -c "import <module>"` in fresh interpreters and
+reports the total, plus the top-level packages that contribute the most.
+Compare agent.app (what each uvicorn worker imports to start) with
+agent.agent + the deferred LangChain stack (what the first chat pays).
+
+Run from the agent/ directory:
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --module agent.app --runs 10
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+
+DEFAULT_MODULES = (
+    "agent.app",
+    "agent.tools",
+    "langgraph.prebuilt",
+    "langchain_anthropic",
+)
+
+
+def import_profile(module: str) -> tuple[float, dict[str, float]]:
+    """(total seconds, self seconds per top-level package) for one import."""
+    env = {**os.environ, "PYTHONPATH": str(SRC)}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+    total = 0.0
+    by_package: dict[str, float] = defaultdict(float)
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, _, name = line.removeprefix("import time:").split("|")
+        seconds = int(self_us) / 1e6
+        total += seconds
+        by_package[name.strip().split(".")[0]] += seconds
+    return total, by_package
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", action="append", dest="modules")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8)
+    args = parser.parse_args()
+
+    for module in args.modules or DEFAULT_MODULES:
+        runs = [import_profile(module) for _ in range(args.runs)]
+        totals = [total for total, _ in runs]
+        print(
+            f"{module}: median {statistics.median(totals) * 1000:.0f} ms, "
+            f"min {min(totals) * 1000:.0f} ms over {args.runs} runs"
+        )
+        _, packages = min(runs, key=lambda run: run[0])
+        for name, seconds in sorted(packages.items(), key=lambda kv: -kv[1])[
+            : args.top
+        ]:
+            print(f"    {name:<28}{seconds * 1000:>8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Microbenchmark: decoding OpenEMR response bodies.
+
+Builds response envelopes shaped like real OpenEMR payloads at several
+sizes (one patient's allergies up to a full patient list / multi-year
+encounter history) and times each decoder on them:
+
+    httpx      response.json() — what the client used before (text + stdlib)
+    json       json.loads on the raw bytes
+    orjson     orjson.loads on the raw bytes (if installed)
+    lazy       LazyJSON with the fastest decoder, never read (e.g. a ping)
+
+Run from the agent/ directory:
+    python benchmarks/json_decode.py
+"""
+
+from __future__ import annotations
+
+import json
+import random
+import sys
+import timeit
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from agent.json_decode import DECODERS, LazyJSON, get_decoder  # noqa: E402
+
+
+def _patient(i: int, rng: random.Random) -> dict[str, Any]:
+    return {
+        "id": str(i),
+        "pid": str(i),
+        "uuid": f"9{i:07d}-0000-4000-8000-{i:012d}",
+        "title": "",
+        "fname": rng.choice(["Phil", "Maria", "John", "Aisha", "Wei"]),
+        "mname": "",
+        "lname": f"Patient{i}",
+        "street": f"{rng.randint(1, 999)} Main St",
+        "postal_code": "62701",
+        "city": "Springfield",
+        "state": "IL",
+        "country_code": "US",
+        "phone_home": "555-0100",
+        "phone_cell": "555-0101",
+        "email": f"patient{i}@example.com",
+        "DOB": f"19{rng.randint(30, 99)}-{rng.randint(1, 12):02d}-15",
+        "sex": rng.choice(["Male", "Female"]),
+        "race": "",
+        "ethnicity": "",
+        "status": "",
+    }
+
+
+def _encounter(i: int, rng: random.Random) -> dict[str, Any]:
+    return {
+        "id": str(i),
+        "uuid": f"8{i:07d}-0000-4000-8000-{i:012d}",
+        "date": f"20{rng.randint(10, 24)}-{rng.randint(1, 12):02d}-10 09:00:00",
+        "reason": rng.choice(["Follow-up", "Annual physical", "Cough", ""]),
+        "facility": "Your Clinic Name Here",
+        "facility_id": "3",
+        "pid": "1",
+        "onset_date": "",
+        "sensitivity": "normal",
+        "billing_facility": "3",
+        "pc_catid": "5",
+        "provider_id": "1",
+        "encounter": str(i),
+        "class_code": "AMB",
+    }
+
+
+def envelope(rows: list[dict[str, Any]]) -> bytes:
+    body = {"validationErrors": [], "internalErrors": [], "data": rows}
+    return json.dumps(body).encode()
+
+
+def main() -> None:
+    rng = random.Random(7)
+    payloads = {
+        "10 patients": envelope([_patient(i, rng) for i in range(10)]),
+        "200 encounters": envelope([_encounter(i, rng) for i in range(200)]),
+        "1000 patients": envelope([_patient(i, rng) for i in range(1000)]),
+        "5000 encounters": envelope([_encounter(i, rng) for i in range(5000)]),
+    }
+    fastest = get_decoder("auto")
+    candidates = {
+        "httpx": lambda body: httpx.Response(200, content=body).json(),
+        **{name: decoder for name, decoder in DECODERS.items()},
+        "lazy": lambda body: LazyJSON(body, fastest),
+    }
+    if "orjson" not in DECODERS:
+        print("(orjson not installed — pip install '.[fast]' to compare it)\n")
+
+    names = list(candidates)
+    print(f"{'payload':<18}{'size':>9}" + "".join(f"{n:>12}" for n in names))
+    for label, body in payloads.items():
+        number = max(5, 2_000_000 // len(body))
+        cells = []
+        for decode in candidates.values():
+            best = min(timeit.repeat(lambda: decode(body), number=number, repeat=5))
+            cells.append(f"{best / number * 1e6:>10.0f}us")
+        print(f"{label:<18}{len(body) / 1024:>7.0f}KB" + "".join(cells))
+
+
+if __name__ == "__main__":
+    main()
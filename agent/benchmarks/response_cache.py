@@ -0,0 +1,99 @@
+"""Benchmark: per-worker vs shared response cache hit rates.
+
+Simulates a multi-worker deployment: clinicians open chat sessions about
+patients (popular patients are asked about more often), each session
+asks a few questions, and the load balancer sends every question to a
+random worker. Each question fetches a few OpenEMR resources for that
+patient. Every worker is a real OS process, so the comparison includes
+SQLite's cross-process locking.
+
+    memory   each worker has its own MemoryCache (per-process)
+    sqlite   all workers share one SQLiteCache file (WAL)
+
+Run from the agent/ directory:
+    python benchmarks/response_cache.py
+    python benchmarks/response_cache.py --workers 8 --sessions 2000
+"""
+
+from __future__ import annotations
+
+import argparse
+import multiprocessing
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from agent.cache import MemoryCache, SQLiteCache  # noqa: E402
+
+RESOURCES = ("", "/allergy", "/medication", "/encounter", "/medical_problem")
+PAYLOAD = b"x" * 8192  # a typical single-patient response body
+TTL = 3600.0  # long enough that nothing expires during the run
+
+
+def make_workload(
+    workers: int, sessions: int, patients: int, seed: int
+) -> list[list[str]]:
+    """Per-worker lists of cache keys, in arrival order."""
+    rng = random.Random(seed)
+    # Zipf-like popularity: a few patients get most of the questions.
+    weights = [1 / (rank + 1) for rank in range(patients)]
+    queues: list[list[str]] = [[] for _ in range(workers)]
+    for _ in range(sessions):
+        patient = rng.choices(range(patients), weights)[0]
+        for _ in range(rng.randint(2, 5)):  # questions per session
+            worker = rng.randrange(workers)  # load balancer
+            for resource in rng.sample(RESOURCES, 2):  # tool calls per question
+                queues[worker].append(f"/patient/{patient}{resource}")
+    return queues
+
+
+def run_worker(args: tuple[str, str, list[str]]) -> tuple[int, int, float]:
+    """Replay one worker's requests; returns (hits, lookups, seconds in cache)."""
+    backend, path, keys = args
+    cache = MemoryCache() if backend == "memory" else SQLiteCache(path)
+    hits = 0
+    spent = 0.0
+    for key in keys:
+        started = time.perf_counter()
+        if cache.get(key) is not None:
+            hits += 1
+        else:
+            cache.set(key, PAYLOAD, TTL)
+        spent += time.perf_counter() - started
+    return hits, len(keys), spent
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--patients", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    queues = make_workload(args.workers, args.sessions, args.patients, args.seed)
+    print(
+        f"{args.workers} workers, {args.sessions} sessions, "
+        f"{sum(map(len, queues))} GETs over {args.patients} patients\n"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "cache.sqlite3")
+        SQLiteCache(path).close()  # create the schema before workers race
+        for backend in ("memory", "sqlite"):
+            with multiprocessing.Pool(args.workers) as pool:
+                results = pool.map(run_worker, [(backend, path, q) for q in queues])
+            hits = sum(r[0] for r in results)
+            lookups = sum(r[1] for r in results)
+            spent = sum(r[2] for r in results)
+            print(
+                f"{backend:<8} hit rate {hits / lookups:6.1%}   "
+                f"{spent / lookups * 1e6:6.1f} us per lookup"
+            )
+
+
+if __name__ == "__main__":
+    main()
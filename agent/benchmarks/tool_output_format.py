@@ -0,0 +1,254 @@
+"""Benchmark: tool output size and turn latency, text vs. table format.
+
+Generates synthetic patients (with realistic list sizes: dozens of
+encounters, medications, problems, ...) served by an in-memory stand-in
+for the OpenEMR API, then renders every tool's output in both formats
+and reports estimated tokens per tool output.
+
+With --turns N (and ANTHROPIC_API_KEY set), also runs N real agent turns
+per format against the synthetic patients and reports end-to-end turn
+latency. OpenEMR itself is never contacted.
+
+Run from the agent/ directory:
+    python benchmarks/tool_output_format.py
+    python benchmarks/tool_output_format.py --patients 50 --turns 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from agent import openemr_client  # noqa: E402
+from agent.config import ANTHROPIC_API_KEY  # noqa: E402
+from agent.tokens import estimate_tokens  # noqa: E402
+from agent.tools.billing import get_insurance  # noqa: E402
+from agent.tools.clinical import (  # noqa: E402
+    get_allergies,
+    get_medical_problems,
+    get_medications,
+    get_vitals,
+)
+from agent.tools.encounters import get_encounters  # noqa: E402
+from agent.tools.formatting import OUTPUT_FORMATS, set_output_format  # noqa: E402
+from agent.tools.patient import get_patient_details, patient_search  # noqa: E402
+from agent.tools.scheduling import get_appointments  # noqa: E402
+
+FIRST = ["Phil", "Maria", "John", "Aisha", "Wei", "Olga", "Sam", "Priya", "Luis"]
+LAST = ["Dixon", "Garcia", "Smith", "Khan", "Chen", "Ivanova", "Lee", "Patel"]
+MEDS = ["Lisinopril", "Metformin", "Atorvastatin", "Zestril", "Lipitor", "Norvasc"]
+ALLERGENS = ["Penicillin", "Sulfa", "Latex", "Peanuts", "Codeine"]
+PROBLEMS = ["Hypertension", "Type 2 diabetes", "Hyperlipidemia", "Asthma", "GERD"]
+
+
+def _date(rng: random.Random) -> str:
+    return f"20{rng.randint(10, 24)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+
+
+def make_patient(pid: int, rng: random.Random) -> dict[str, Any]:
+    """One synthetic patient with all of its list resources."""
+    uuid = f"9{pid:07d}-0000-4000-8000-{pid:012d}"
+    return {
+        "demographics": {
+            "pid": str(pid),
+            "uuid": uuid,
+            "fname": rng.choice(FIRST),
+            "lname": f"{rng.choice(LAST)}{pid}",
+            "DOB": _date(rng).replace("20", "19", 1),
+            "sex": rng.choice(["Male", "Female"]),
+            "street": f"{rng.randint(1, 999)} Main St",
+            "city": "Springfield",
+            "state": "IL",
+            "postal_code": "62701",
+            "phone_home": "555-0100",
+        },
+        "allergy": [
+            {
+                "title": a,
+                "reaction": rng.choice(["Hives", "Rash", ""]),
+                "severity_al": "mild",
+            }
+            for a in rng.sample(ALLERGENS, rng.randint(0, 3))
+        ],
+        "medication": [
+            {
+                "title": f"{rng.choice(MEDS)} {rng.choice([5, 10, 20])}mg tab",
+                "dose": f"{rng.choice([5, 10, 20])}mg",
+                "route": "oral",
+                "frequency": rng.choice(["once daily", "twice daily", ""]),
+                "begdate": _date(rng),
+            }
+            for _ in range(rng.randint(2, 15))
+        ],
+        "medical_problem": [
+            {
+                "title": p,
+                "diagnosis": f"ICD10:I{rng.randint(10, 99)}",
+                "begdate": _date(rng),
+                "status": rng.choice(["active", ""]),
+            }
+            for p in rng.sample(PROBLEMS, rng.randint(1, 4))
+        ],
+        "encounter": [
+            {
+                "eid": str(pid * 1000 + i),
+                "pid": str(pid),
+                "date": _date(rng),
+                "reason": rng.choice(["Follow-up", "Annual physical", "", "Cough"]),
+            }
+            for i in range(rng.randint(5, 120))
+        ],
+        "appointment": [
+            {
+                "pc_title": rng.choice(["Office Visit", "Follow-up", "Lab"]),
+                "pc_eventDate": _date(rng),
+                "pc_startTime": f"{rng.randint(8, 16):02d}:00:00",
+                "pc_apptstatus": rng.choice(["-", "@", ""]),
+            }
+            for _ in range(rng.randint(1, 30))
+        ],
+        "insurance": [
+            {"type": "primary", "provider": "Blue Cross", "policy_number": f"BC{pid}"}
+        ],
+        "vital": [
+            {
+                "bps": "120",
+                "bpd": "80",
+                "pulse": "72",
+                "temperature": "98.6",
+                "weight": "180",
+                "height": "70",
+                "BMI": "25.8",
+                "date": _date(rng),
+            }
+        ],
+    }
+
+
+class SyntheticOpenEMR:
+    """Answers OpenEMRClient.get() calls from synthetic patients in memory."""
+
+    def __init__(self, patients: list[dict[str, Any]]) -> None:
+        self.by_id: dict[str, dict[str, Any]] = {}
+        for p in patients:
+            self.by_id[p["demographics"]["pid"]] = p
+            self.by_id[p["demographics"]["uuid"]] = p
+        self.patients = patients
+
+    async def get(self, endpoint: str, params: dict[str, Any] | None = None) -> Any:
+        if endpoint == "/patient":
+            lname = (params or {}).get("lname", "").lower()
+            fname = (params or {}).get("fname", "").lower()
+            rows = [
+                p["demographics"]
+                for p in self.patients
+                if (not lname or p["demographics"]["lname"].lower() == lname)
+                and (not fname or p["demographics"]["fname"].lower() == fname)
+            ]
+            return {"data": rows}
+        match = re.fullmatch(
+            r"/patient/([^/]+)(?:/(\w+))?(?:/[^/]+/(vital))?", endpoint
+        )
+        if not match or match.group(1) not in self.by_id:
+            return {"data": []}
+        patient = self.by_id[match.group(1)]
+        resource = match.group(3) or match.group(2)
+        if resource is None:
+            return {"data": patient["demographics"]}
+        return {"data": patient.get(resource, [])}
+
+
+async def measure_tokens(
+    patients: list[dict[str, Any]],
+) -> dict[str, dict[str, list[int]]]:
+    """Estimated tokens of every tool's output, per format."""
+    results: dict[str, dict[str, list[int]]] = {fmt: {} for fmt in OUTPUT_FORMATS}
+    for fmt in OUTPUT_FORMATS:
+        set_output_format(fmt)
+        for p in patients:
+            demo = p["demographics"]
+            first_eid = p["encounter"][0]["eid"]
+            outputs = {
+                "patient_search": await patient_search(demo["lname"]),
+                "get_patient_details": await get_patient_details(demo["uuid"]),
+                "get_allergies": await get_allergies(demo["uuid"]),
+                "get_medications": await get_medications(demo["pid"]),
+                "get_medical_problems": await get_medical_problems(demo["uuid"]),
+                "get_encounters": await get_encounters(demo["uuid"]),
+                "get_appointments": await get_appointments(demo["pid"]),
+                "get_insurance": await get_insurance(demo["uuid"]),
+                "get_vitals": await get_vitals(demo["pid"], first_eid),
+            }
+            for tool, result in outputs.items():
+                results[fmt].setdefault(tool, []).append(estimate_tokens(result.text))
+    return results
+
+
+async def measure_turns(
+    patients: list[dict[str, Any]], turns: int
+) -> dict[str, list[float]]:
+    """End-to-end run_agent latency per format (needs ANTHROPIC_API_KEY)."""
+    from agent.agent import run_agent
+
+    latencies: dict[str, list[float]] = {fmt: [] for fmt in OUTPUT_FORMATS}
+    for fmt in OUTPUT_FORMATS:
+        set_output_format(fmt)
+        for p in patients[:turns]:
+            demo = p["demographics"]
+            question = (
+                f"Summarize the recent encounters and current medications "
+                f"for {demo['fname']} {demo['lname']}."
+            )
+            started = time.perf_counter()
+            await run_agent(question)
+            latencies[fmt].append(time.perf_counter() - started)
+    return latencies
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--patients", type=int, default=100)
+    parser.add_argument("--turns", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    patients = [make_patient(pid, rng) for pid in range(1, args.patients + 1)]
+    openemr_client._client = SyntheticOpenEMR(patients)  # type: ignore[assignment]
+
+    tokens = await measure_tokens(patients)
+    print(f"Estimated tokens per tool output ({args.patients} synthetic patients)\n")
+    print(f"{'tool':<22}{'text mean':>10}{'table mean':>11}{'saved':>8}")
+    for tool in tokens["text"]:
+        text_mean = statistics.mean(tokens["text"][tool])
+        table_mean = statistics.mean(tokens["table"][tool])
+        saved = 1 - table_mean / text_mean
+        print(f"{tool:<22}{text_mean:>10.0f}{table_mean:>11.0f}{saved:>8.0%}")
+    total_text = sum(sum(v) for v in tokens["text"].values())
+    total_table = sum(sum(v) for v in tokens["table"].values())
+    saved = 1 - total_table / total_text
+    print(f"\nTotal: text={total_text} table={total_table} ({saved:.0%} saved)")
+
+    if args.turns:
+        if not ANTHROPIC_API_KEY:
+            print("\n--turns needs ANTHROPIC_API_KEY; skipping turn latency.")
+            return
+        latencies = await measure_turns(patients, args.turns)
+        print(f"\nEnd-to-end turn latency ({args.turns} turns per format)")
+        for fmt, values in latencies.items():
+            print(
+                f"  {fmt:<6} mean={statistics.mean(values):.2f}s max={max(values):.2f}s"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
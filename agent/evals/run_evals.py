@@ -0,0 +1,130 @@
+"""Run the eval cases with and without the fast path.
+
+Each case in test_cases.json is run twice in a fresh session: once with
+the fast-path router enabled and once through the full ReAct agent. For
+each mode it reports the pass rate and turn latency, so a change to the
+router can be checked for both speed and correctness.
+
+A case passes when the expected tools were called (in order) and the
+answer contains the expected text (case-insensitive): every item for
+happy_path cases, any one of the listed alternatives for edge cases.
+
+Needs ANTHROPIC_API_KEY and a reachable OpenEMR (see .env.example).
+Run from the agent/ directory:
+    python evals/run_evals.py
+    python evals/run_evals.py --case eval-002 --repeat 3
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from agent import agent as agent_module  # noqa: E402
+from agent.config import ANTHROPIC_API_KEY  # noqa: E402
+
+CASES_PATH = Path(__file__).resolve().parent / "test_cases.json"
+
+
+@dataclass
+class Outcome:
+    case_id: str
+    mode: str
+    passed: bool
+    latency_ms: float
+    tools: list[str]
+
+
+def _tools_called(session_id: str) -> list[str]:
+    return [
+        call["name"]
+        for message in agent_module._sessions.load(session_id)
+        for call in getattr(message, "tool_calls", []) or []
+    ]
+
+
+def _passed(case: dict[str, Any], answer: str, tools: list[str]) -> bool:
+    expected_tools = case.get("expected_tools", [])
+    called = iter(tools)
+    if not all(tool in called for tool in expected_tools):  # ordered subsequence
+        return False
+    text = answer.lower()
+    found = [item.lower() in text for item in case.get("expected_in_response", [])]
+    if not found:
+        return True
+    return all(found) if case.get("category") == "happy_path" else any(found)
+
+
+async def run_case(case: dict[str, Any], fast_path: bool) -> Outcome:
+    with patch.object(agent_module, "AGENT_FAST_PATH", fast_path):
+        started = time.perf_counter()
+        answer, session_id = await agent_module.run_agent(case["input"])
+        latency_ms = (time.perf_counter() - started) * 1000
+    tools = _tools_called(session_id)
+    agent_module._sessions.delete(session_id)
+    return Outcome(
+        case["id"],
+        "fast" if fast_path else "agent",
+        _passed(case, answer, tools),
+        latency_ms,
+        tools,
+    )
+
+
+def report(outcomes: list[Outcome]) -> None:
+    print(f"{'case':<10} {'mode':<6} {'pass':<5} {'ms':>8}  tools")
+    for o in outcomes:
+        print(
+            f"{o.case_id:<10} {o.mode:<6} {'yes' if o.passed else 'NO':<5} "
+            f"{o.latency_ms:>8.0f}  {', '.join(o.tools)}"
+        )
+    print()
+    for mode in ("fast", "agent"):
+        runs = [o for o in outcomes if o.mode == mode]
+        if not runs:
+            continue
+        passed = sum(o.passed for o in runs)
+        latencies = [o.latency_ms for o in runs]
+        print(
+            f"{mode:<6} pass {passed}/{len(runs)}  "
+            f"median {statistics.median(latencies):.0f} ms  "
+            f"max {max(latencies):.0f} ms"
+        )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--case", action="append", help="Only run these case IDs")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per case/mode")
+    parser.add_argument("--mode", choices=("both", "fast", "agent"), default="both")
+    args = parser.parse_args()
+
+    if not ANTHROPIC_API_KEY:
+        sys.exit("ANTHROPIC_API_KEY is not set; evals need a real model.")
+
+    cases = json.loads(CASES_PATH.read_text())
+    if args.case:
+        cases = [c for c in cases if c["id"] in args.case]
+    modes = {"both": (True, False), "fast": (True,), "agent": (False,)}[args.mode]
+
+    outcomes = [
+        await run_case(case, fast_path)
+        for case in cases
+        for fast_path in modes
+        for _ in range(args.repeat)
+    ]
+    report(outcomes)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -17,18 +17,35 @@ We just provide the model, tools, and system prompt.
 
 from __future__ import annotations
 
+import asyncio
+import functools
 import logging
+import time
 import uuid
 from collections.abc import Callable, Coroutine
-from typing import Any
-
-from langchain_anthropic import ChatAnthropic
-from langchain_core.messages import BaseMessage, HumanMessage
-from langchain_core.tools import StructuredTool
-from langgraph.prebuilt import create_react_agent
-from pydantic import SecretStr
-
-from agent.config import ANTHROPIC_API_KEY, ANTHROPIC_MODEL
+from typing import TYPE_CHECKING, Any, TypeVar
+
+from agent.config import (
+    AGENT_ENFORCE_RULES,
+    AGENT_FAST_PATH,
+    AGENT_MAX_ITERATIONS,
+    AGENT_SESSION_BACKEND,
+    AGENT_TURN_DEADLINE_SECONDS,
+    AGENT_VERIFY_CLAIMS,
+    AGENT_WARMUP_TIMEOUT,
+    ANTHROPIC_API_KEY,
+    ANTHROPIC_FAST_MODEL,
+    ANTHROPIC_MODEL,
+    OPENEMR_WARM_CONNECTIONS,
+)
+from agent.deadline import remaining, set_deadline
+from agent.metrics import metrics
+from agent.model_routing import build_model_router
+from agent.openemr_client import OpenEMRAPIError, OpenEMRAuthError, get_client
+from agent.prefetch import current_session, prefetcher
+from agent.router import try_fast_path
+from agent.sessions import SessionStore, open_session_store
+from agent.tokens import estimate_tokens
 
 # Import the raw tool functions from each module.
 # We import the functions (not the modules) so we can wrap each one
@@ -42,10 +59,26 @@ from agent.tools.clinical import (
 )
 from agent.tools.encounters import get_encounters
 from agent.tools.patient import get_patient_details, patient_search
+from agent.tools.records import PatientRecord, ToolResult
 from agent.tools.scheduling import get_appointments, search_practitioners
+from agent.verification import DISCLAIMER, check_rules, verify_turn
+
+# Concept — lazy imports:
+#     LangChain, LangGraph and the Anthropic SDK take a couple of seconds to
+#     import, which every uvicorn worker would pay at startup before it can
+#     answer even /agent/health. They're only needed once the agent is built
+#     or a chat turn runs, so they're imported inside those functions (Python
+#     caches modules, so only the first call pays). Names used in type hints
+#     are imported for the type checker only. tests/test_import_time.py keeps
+#     them from creeping back into module-level imports.
+if TYPE_CHECKING:
+    from langchain_core.messages import BaseMessage
+    from langchain_core.tools import StructuredTool
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
 # ---------------------------------------------------------------------------
 # System prompt — instructions for Claude
 # ---------------------------------------------------------------------------
@@ -53,7 +86,7 @@ logger = logging.getLogger(__name__)
 # Claude *how* to behave: what role to play, which tools to use when,
 # and what rules to follow. Think of it as the agent's "job description."
 
-SYSTEM_PROMPT = """\
+SYSTEM_PROMPT = f"""\
 You are a clinical assistant for OpenEMR, an electronic medical records system.
 You help healthcare providers look up patient information by querying the \
 OpenEMR API through the tools available to you.
@@ -74,8 +107,7 @@ clinical data.
 clarify which one they mean.
 - Never fabricate clinical data — only report what the API returns.
 - Be concise but thorough.
-- End every clinical response with: "This information is for reference only \
-and does not replace clinical judgment."
+- End every clinical response with: "{DISCLAIMER}"
 """
 
 # ---------------------------------------------------------------------------
@@ -89,11 +121,44 @@ and does not replace clinical judgment."
 # We use StructuredTool.from_function() instead of adding @tool decorators
 # to the original functions. This way the original functions stay unchanged
 # and our existing unit tests (which call them directly) keep working.
+#
+# Each tool returns a ToolResult (typed records + lazily rendered text).
+# With response_format="content_and_artifact", LangGraph puts the text in
+# the ToolMessage content (what Claude reads) and keeps the records on
+# ToolMessage.artifact, where verifiers can use them without re-parsing.
+
+
+def _as_content_and_artifact(
+    fn: Callable[..., Coroutine[Any, Any, ToolResult]],
+) -> Callable[..., Coroutine[Any, Any, tuple[str, tuple[Any, ...]]]]:
+    """Adapt a tool function to return (text, records) for LangChain.
+
+    Also records the estimated tokens each call adds to the prompt, and
+    after a patient_search with exactly one match starts prefetching that
+    patient's likely-next data (see prefetch.py).
+    """
+
+    tokens = metrics.histogram("tool_output_tokens", tool=fn.__name__)
+
+    @functools.wraps(fn)  # keeps the signature so the args schema is inferred
+    async def wrapper(*args: Any, **kwargs: Any) -> tuple[str, tuple[Any, ...]]:
+        result = await fn(*args, **kwargs)
+        if fn is patient_search:
+            matches = [r for r in result.records if isinstance(r, PatientRecord)]
+            if len(matches) == 1:
+                await prefetcher.on_patient_match(matches[0])
+        text = result.text
+        tokens.observe(estimate_tokens(text))
+        return text, result.records
+
+    return wrapper
 
 
 def _build_tools() -> list[StructuredTool]:
     """Wrap all raw tool functions as LangChain StructuredTools."""
-    tool_functions: list[Callable[..., Coroutine[Any, Any, str]]] = [
+    from langchain_core.tools import StructuredTool
+
+    tool_functions: list[Callable[..., Coroutine[Any, Any, ToolResult]]] = [
         patient_search,
         get_patient_details,
         get_allergies,
@@ -109,9 +174,10 @@ def _build_tools() -> list[StructuredTool]:
     tools: list[StructuredTool] = []
     for fn in tool_functions:
         tool = StructuredTool.from_function(
-            coroutine=fn,
+            coroutine=_as_content_and_artifact(fn),
             name=fn.__name__,
             description=fn.__doc__ or fn.__name__,
+            response_format="content_and_artifact",
         )
         tools.append(tool)
 
@@ -125,43 +191,108 @@ def _build_tools() -> list[StructuredTool]:
 # doesn't fail when ANTHROPIC_API_KEY is not set (e.g., in CI).
 
 _agent = None  # Will hold the compiled LangGraph agent
+# The build in progress, awaited by everyone who needs the agent meanwhile
+_agent_build: asyncio.Future[Any] | None = None
 
 # ---------------------------------------------------------------------------
-# Session store (in-memory)
+# Session store
 # ---------------------------------------------------------------------------
 # Maps session IDs to their message histories. This lets a clinician have
 # a multi-turn conversation (e.g., "Tell me about Phil Dixon" → "What are
 # his allergies?" where "his" refers to Phil from the previous turn).
 #
-# For MVP this is a plain dict — sessions are lost on server restart.
-# TODO: Swap for LangGraph's RedisSaver or SqliteSaver checkpointer so
-# sessions persist across restarts.
+# The backend is chosen with AGENT_SESSION_BACKEND: "memory" keeps them in
+# this process; "sqlite" shares them between all uvicorn workers on the
+# host and keeps them across restarts (see sessions.py).
+
+_sessions: SessionStore = open_session_store(AGENT_SESSION_BACKEND)
+
+
+def close_sessions() -> None:
+    """Write out and close the session store (called on server shutdown)."""
+    _sessions.close()
+
+
+async def _in_session_store(call: Callable[..., T], *args: Any) -> T:
+    """Call a session store method, off the event loop if it does disk I/O.
+
+    The SQLite store can wait up to 10 seconds for another worker's write
+    lock; on the event loop that would stall every other request.
+    """
+    if _sessions.blocking:
+        return await asyncio.to_thread(call, *args)
+    return call(*args)
 
-_sessions: dict[str, list[BaseMessage]] = {}
 
+async def _get_agent() -> Any:
+    """The LangGraph ReAct agent, built on first call.
 
-def _get_agent():  # type: ignore[no-untyped-def]
-    """Create the LangGraph ReAct agent (lazily, on first call)."""
-    global _agent  # noqa: PLW0603
+    Building imports LangChain (seconds of CPU), so it runs in a worker
+    thread while the event loop keeps serving other requests. Callers that
+    arrive during the build (warm-up, early chat turns) all await the same
+    build. If it fails, the next call tries again.
+    """
+    global _agent, _agent_build  # noqa: PLW0603
     if _agent is not None:
         return _agent
+    if _agent_build is None or _agent_build.get_loop() is not (
+        asyncio.get_running_loop()
+    ):
+        _agent_build = asyncio.ensure_future(asyncio.to_thread(_create_agent))
+    build = _agent_build
+    try:
+        # shield: a caller that gives up doesn't cancel the others' build
+        _agent = await asyncio.shield(build)
+    except Exception:
+        if _agent_build is build and build.done():
+            _agent_build = None
+        raise
+    return _agent
 
-    # mypy can't see Pydantic model fields as constructor kwargs, so we
-    # suppress the type error here. This works correctly at runtime.
-    model = ChatAnthropic(
-        model_name=ANTHROPIC_MODEL,  # type: ignore[call-arg]
-        anthropic_api_key=SecretStr(ANTHROPIC_API_KEY),  # type: ignore[call-arg]
-    )
+
+def _create_agent():  # type: ignore[no-untyped-def]
+    """Build the models, tools and compiled ReAct graph.
+
+    The model is a ModelRouter: LangGraph asks it for a model before each
+    step, and it picks ANTHROPIC_FAST_MODEL or ANTHROPIC_MODEL (see
+    model_routing.py).
+    """
+    from langgraph.prebuilt import create_react_agent
 
     tools = _build_tools()
+    model = build_model_router(tools, ANTHROPIC_MODEL, ANTHROPIC_FAST_MODEL)
 
-    _agent = create_react_agent(
+    # The router is a callable model, typed for any state mapping; mypy
+    # takes that Mapping for the graph's StateSchema, which it isn't.
+    return create_react_agent(  # type: ignore[type-var]
         model=model,
         tools=tools,
         prompt=SYSTEM_PROMPT,
     )
 
-    return _agent
+
+async def warm_up(timeout: float = AGENT_WARMUP_TIMEOUT) -> None:
+    """Do the one-time work the first request would otherwise pay for.
+
+    Builds the agent (model client, tools, compiled graph), creates the
+    OpenEMR client and authenticates, and opens keep-alive connections.
+    Started in the background at server startup. OpenEMR being slow or
+    down is not fatal: the error is logged and the first request retries as usual.
+    """
+    started = time.perf_counter()
+    if ANTHROPIC_API_KEY:
+        await _get_agent()
+
+    try:
+        async with asyncio.timeout(timeout):
+            client = await get_client()
+            await client.warm(OPENEMR_WARM_CONNECTIONS)
+    except (OpenEMRAuthError, OpenEMRAPIError, TimeoutError) as exc:
+        logger.warning("OpenEMR warm-up failed, continuing without it: %s", exc)
+
+    elapsed = time.perf_counter() - started
+    metrics.gauge("startup_warmup_seconds").set(elapsed)
+    logger.info("Warm-up finished in %.2f s", elapsed)
 
 
 # ---------------------------------------------------------------------------
@@ -178,6 +309,15 @@ async def run_agent(message: str, session_id: str | None = None) -> tuple[str, s
     conversation (remembering previous messages). When omitted, a new
     session is created automatically.
 
+    Formulaic lookups ("allergies for Phil Dixon") are answered by the
+    fast path in router.py without the planning loop; everything else
+    runs through the ReAct agent. Both produce the same message trace.
+
+    A turn gets AGENT_TURN_DEADLINE_SECONDS and AGENT_MAX_ITERATIONS model
+    steps. If it runs out of either, outstanding work is cancelled and the
+    answer is the data gathered so far, marked incomplete (see
+    deadline.py).
+
     When ANTHROPIC_API_KEY is not set (e.g., in CI), returns a placeholder
     response so that tests can pass without real API credentials.
 
@@ -199,18 +339,152 @@ async def run_agent(message: str, session_id: str | None = None) -> tuple[str, s
             session_id,
         )
 
-    agent = _get_agent()
+    from langchain_core.messages import AIMessage, HumanMessage
+
+    started = time.perf_counter()
+    current_session.set(session_id)  # lets tool hooks see the conversation
+    set_deadline(AGENT_TURN_DEADLINE_SECONDS)  # seen by tools and HTTP calls
+    history = await _in_session_store(_sessions.load, session_id)
+
+    routed = await try_fast_path(message) if AGENT_FAST_PATH else None
+    new_messages: list[BaseMessage]
+    outcome = "complete"
+    if routed is not None:
+        new_messages = [*history, *routed.messages]
+    else:
+        agent = await _get_agent()
+        # Build the message list: previous history + the new message
+        messages = [*history, HumanMessage(content=message)]
+        new_messages, outcome = await _run_graph(agent, messages)
+    metrics.histogram(
+        "turn_latency_ms", path="agent" if routed is None else "fast"
+    ).observe((time.perf_counter() - started) * 1000)
+    metrics.counter("turn_outcome", result=outcome).inc()
+
+    if outcome != "complete":
+        # Keep the question and the partial answer (which includes the data
+        # gathered) but not the unfinished tool calls: the next turn's
+        # model request must not contain a tool call without its result.
+        logger.warning("Turn cut short (%s) in session %s", outcome, session_id)
+        turn = new_messages[len(history) :]
+        response_text = _partial_answer(turn, outcome)
+        await _in_session_store(
+            _sessions.append,
+            session_id,
+            [HumanMessage(content=message), AIMessage(content=response_text)],
+        )
+        return response_text, session_id
+
+    # The last message is the agent's final answer (an AIMessage).
+    last_message = new_messages[-1]
+    response_text = str(last_message.content)
+
+    # Enforce the domain rules from SYSTEM_PROMPT. Cheap violations are
+    # repaired in the text, and the repaired answer replaces the original
+    # in history so later turns see what the clinician saw.
+    if AGENT_ENFORCE_RULES:
+        rule_report = check_rules(new_messages)
+        if not rule_report.ok:
+            logger.warning(
+                "Domain rule violations: %s",
+                [v.rule for v in rule_report.violations],
+            )
+            response_text = rule_report.text
+            new_messages = [
+                *new_messages[:-1],
+                AIMessage(content=response_text, id=last_message.id),
+            ]
+
+    # Save this turn's messages (including tool calls and responses) to the
+    # session so the next turn has full context. The history before them
+    # is already stored, so only the new ones are appended.
+    await _in_session_store(_sessions.append, session_id, new_messages[len(history) :])
+
+    if AGENT_VERIFY_CLAIMS:
+        response_text = _flag_unsupported_claims(new_messages, response_text)
+
+    return response_text, session_id
+
+
+async def _run_graph(
+    agent: Any, messages: list[BaseMessage]
+) -> tuple[list[BaseMessage], str]:
+    """Run the ReAct loop within the turn's deadline and step budget.
 
-    # Build the message list: previous history + the new message
-    history = _sessions.get(session_id, [])
-    messages = [*history, HumanMessage(content=message)]
+    Returns:
+        The messages so far, and how the turn ended: "complete",
+        "deadline" or "iterations".
+    """
+    from langgraph.errors import GraphRecursionError
+
+    # Each model step and each round of tool calls is one graph step.
+    config = {"recursion_limit": 2 * AGENT_MAX_ITERATIONS}
+    latest = messages
+    left = remaining()
+    try:
+        async with asyncio.timeout(None if left is None else max(left, 0)):
+            async for state in agent.astream(
+                {"messages": messages}, config, stream_mode="values"
+            ):
+                latest = state["messages"]
+    except TimeoutError:
+        return latest, "deadline"
+    except GraphRecursionError:
+        return latest, "iterations"
+    # With a recursion limit, create_react_agent ends a turn that is about
+    # to run out of steps with a fixed apology instead of raising.
+    last = latest[-1]
+    if last.type == "ai" and str(last.content).startswith(_OUT_OF_STEPS):
+        return latest[:-1], "iterations"
+    return latest, "complete"
+
+
+_OUT_OF_STEPS = "Sorry, need more steps to process this request."
+
+
+def _partial_answer(turn: list[BaseMessage], outcome: str) -> str:
+    """An incomplete answer made of the tool results gathered this turn."""
+    limit = "time limit" if outcome == "deadline" else "step limit"
+    results = [
+        str(m.content)
+        for m in turn
+        if m.type == "tool" and getattr(m, "status", "success") == "success"
+    ]
+    if not results:
+        return (
+            f"I couldn't answer this within the {limit}, and no patient data "
+            "was retrieved yet. Please try again or ask a narrower question."
+        )
+    gathered = "\n\n".join(results)
+    return (
+        f"I couldn't finish this answer within the {limit}. Here is the data "
+        "I retrieved so far; it may be incomplete, so please review it "
+        f"directly:\n\n{gathered}\n\n{DISCLAIMER}"
+    )
 
-    result = await agent.ainvoke({"messages": messages})
 
-    # Save the full message history (including tool calls and responses)
-    # back to the session so the next turn has full context.
-    _sessions[session_id] = result["messages"]
+def _flag_unsupported_claims(messages: list[BaseMessage], response_text: str) -> str:
+    """Run the claim verifier and append a warning for unsupported values.
 
-    # The last message is the agent's final answer (an AIMessage).
-    last_message = result["messages"][-1]
-    return str(last_message.content), session_id
+    The stored session history keeps the model's original answer; the
+    warning is only added to what the clinician sees.
+    """
+    started = time.perf_counter()
+    report = verify_turn(messages)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    logger.debug(
+        "Claim verification: %d checked, %d unsupported in %.2f ms",
+        report.checked,
+        len(report.unsupported),
+        elapsed_ms,
+    )
+    if report.ok:
+        return response_text
+
+    logger.warning("Unsupported claims in agent answer: %s", report.unsupported)
+    return (
+        f"{response_text}\n\n"
+        "Verification note: these values could not be matched to the OpenEMR "
+        f"data retrieved in this conversation: {', '.join(report.unsupported)}. "
+        "Please confirm them in the chart."
+    )
@@ -1,28 +1,118 @@
 """FastAPI server — the HTTP entry point for the agent.
 
 This file defines the web API that clients (like our Streamlit frontend)
-use to talk to the agent. It exposes two endpoints:
+use to talk to the agent. It exposes these endpoints:
 
 - GET  /agent/health  — Simple check that the server is running
 - POST /agent/chat    — Send a message, get back the agent's response
+                        (with an idempotency_key, repeats run only once;
+                        see idempotency.py)
+- GET  /agent/metrics — In-process metrics (tool output tokens, etc.)
+- POST /agent/jobs    — Queue many questions (or pre-visit summaries for
+                        many patients) to run in the background
+- GET  /agent/jobs/{id} — A job's progress and the answers so far
 
 FastAPI is a modern Python web framework that automatically generates
 API documentation (visit /docs when running) and validates request/response
 data using Pydantic models.
 
+On startup the server warms up in the background: it builds the agent,
+authenticates with OpenEMR and opens keep-alive connections (see warm_up()
+in agent.py). /agent/health answers immediately meanwhile. With
+AGENT_PREWARM, a background job also keeps the charts of the day's
+upcoming patients in the response cache (see prewarm.py), and batch jobs
+left unfinished by a previous run are resumed (see jobs.py). On shutdown
+the server drains: new chats get 503 while running turns get
+AGENT_DRAIN_SECONDS to finish (see drain.py); then background work is
+cancelled, sessions are flushed and the OpenEMR client is closed.
+
 Run locally with:
     cd agent && uvicorn agent.app:app --reload
 """
 
-from fastapi import FastAPI
-from pydantic import BaseModel
+import asyncio
+import logging
+from collections.abc import AsyncIterator, Awaitable
+from contextlib import asynccontextmanager, suppress
+from typing import Any, TypeVar
+
+from fastapi import FastAPI, HTTPException, Request
+from pydantic import BaseModel, Field, model_validator
+
+from agent.agent import close_sessions, run_agent, warm_up
+from agent.config import (
+    AGENT_DRAIN_SECONDS,
+    AGENT_JOB_MAX_ITEMS,
+    AGENT_PREWARM,
+    AGENT_WARMUP,
+)
+from agent.drain import Draining, turns
+from agent.idempotency import (
+    IdempotencyConflict,
+    IdempotencyStore,
+    request_fingerprint,
+)
+from agent.jobs import get_job_runner
+from agent.metrics import metrics
+from agent.openemr_client import close_client
+from agent.prewarm import PrewarmJob
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# How often a running chat turn checks whether its client is still there.
+DISCONNECT_POLL_SECONDS = 1.0
+
+# Chat turns by idempotency key (see idempotency.py)
+chat_requests = IdempotencyStore()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Start warming up in the background; release clients on exit.
+
+    Concept — lifespan:
+        FastAPI runs the code before `yield` once at startup (the server
+        doesn't accept connections until it finishes) and the code after
+        `yield` once at shutdown. Warm-up runs as a task rather than being
+        awaited here, so health checks pass while it's still going.
+
+    Concept — draining on shutdown:
+        The drain begins as soon as the stop signal arrives (see drain.py),
+        so by the time the code after `yield` runs, uvicorn has already
+        waited out the open requests. Here we wait for the drain to end
+        (turns that outlived their request, like job items, included),
+        then stop the rest.
+    """
+    turns.reset()
+    turns.drain_on_signals(AGENT_DRAIN_SECONDS)
+    background = []
+    if AGENT_WARMUP:
+        background.append(asyncio.create_task(warm_up()))
+    if AGENT_PREWARM:
+        background.append(asyncio.create_task(PrewarmJob().run_forever()))
+    await get_job_runner().resume()
+    yield
+    report = await turns.drain(AGENT_DRAIN_SECONDS)
+    logger.info(
+        "Shutdown: %d turns drained, %d aborted", report.drained, report.aborted
+    )
+    await get_job_runner().stop()
+    for task in background:
+        if not task.done():
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+    close_sessions()
+    await close_client()
 
-from agent.agent import run_agent
 
 app = FastAPI(
     title="OpenEMR Healthcare AI Agent",
     description="Ask natural language questions about patients in OpenEMR",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 
@@ -31,6 +121,8 @@ class ChatRequest(BaseModel):
 
     message: str  # The clinician's question in plain English
     session_id: str | None = None  # Optional: continue an existing conversation
+    # Optional: unique per question; repeats with the same key run only once
+    idempotency_key: str | None = Field(default=None, min_length=1, max_length=255)
 
 
 class ChatResponse(BaseModel):
@@ -46,8 +138,14 @@ async def health() -> dict[str, str]:
     return {"status": "ok"}
 
 
+@app.get("/agent/metrics")
+async def get_metrics() -> dict[str, Any]:
+    """Snapshot of this worker's counters, gauges and histograms."""
+    return metrics.snapshot()
+
+
 @app.post("/agent/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest) -> ChatResponse:
+async def chat(request: ChatRequest, http_request: Request) -> ChatResponse:
     """Process a chat message through the AI agent.
 
     The client sends a natural language question, and the agent
@@ -56,8 +154,113 @@ async def chat(request: ChatRequest) -> ChatResponse:
 
     Include a session_id to continue a previous conversation. If omitted,
     a new session is created and its ID is returned in the response.
+
+    Include an idempotency_key to make retries safe: a repeat of the same
+    key waits for the first request's turn (or returns its answer, if it
+    already finished) instead of running the question again. Reusing a
+    key for a different message or session is rejected with 422.
+
+    If the client disconnects (gave up waiting), the turn is cancelled —
+    unless it has an idempotency key, in which case it finishes so that
+    the client's retry gets its answer.
+
+    While the server is shutting down, new questions get 503 (retry
+    against another instance); a turn cut off by the end of the drain
+    also gets 503.
     """
-    response_text, session_id = await run_agent(
-        request.message, session_id=request.session_id
-    )
+
+    def start() -> asyncio.Task[tuple[str, str]]:
+        return turns.start(run_agent(request.message, session_id=request.session_id))
+
+    try:
+        if request.idempotency_key is None:
+            turn: Awaitable[tuple[str, str]] = start()
+        else:
+            turn = chat_requests.run(
+                request.idempotency_key,
+                request_fingerprint(request.message, request.session_id),
+                start,
+            )
+        response_text, session_id = await _unless_disconnected(http_request, turn)
+    except IdempotencyConflict as exc:
+        raise HTTPException(status_code=422, detail=str(exc)) from exc
+    except Draining as exc:
+        raise HTTPException(
+            status_code=503, detail=str(exc), headers={"Retry-After": "5"}
+        ) from exc
     return ChatResponse(response=response_text, session_id=session_id)
+
+
+async def _unless_disconnected(request: Request, work: Awaitable[T]) -> T:
+    """Run `work`, cancelling it if the HTTP client goes away first.
+
+    Concept — noticing a disconnect:
+        Uvicorn doesn't cancel a handler whose client has hung up; the
+        handler has to ask (request.is_disconnected()). So the turn runs
+        as a task while this coroutine checks on the client every
+        DISCONNECT_POLL_SECONDS.
+    """
+    task = asyncio.ensure_future(work)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+            if done:
+                if task.cancelled() and not turns.accepting:
+                    raise Draining("The server shut down before the answer was ready")
+                return task.result()
+            if await request.is_disconnected():
+                metrics.counter("turn_outcome", result="disconnected").inc()
+                raise HTTPException(status_code=499, detail="Client disconnected")
+    finally:
+        if not task.done():
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+
+
+class JobRequest(BaseModel):
+    """What the client sends to POST /agent/jobs: questions or patients."""
+
+    # Questions to answer, one agent turn each
+    prompts: list[str] = Field(default_factory=list, max_length=AGENT_JOB_MAX_ITEMS)
+    # Patient UUIDs to prepare a pre-visit summary for
+    patient_uuids: list[str] = Field(
+        default_factory=list, max_length=AGENT_JOB_MAX_ITEMS
+    )
+
+    @model_validator(mode="after")
+    def _one_kind(self) -> "JobRequest":
+        if bool(self.prompts) == bool(self.patient_uuids):
+            raise ValueError("Send either prompts or patient_uuids (not both)")
+        return self
+
+
+class JobCreated(BaseModel):
+    """What POST /agent/jobs sends back."""
+
+    job_id: str  # Poll GET /agent/jobs/{job_id} for progress
+    total: int  # Number of items queued
+
+
+@app.post("/agent/jobs", response_model=JobCreated, status_code=202)
+async def create_job(request: JobRequest) -> JobCreated:
+    """Queue a batch of agent turns to run in the background.
+
+    Returns immediately with a job ID. Items run a few at a time (see
+    AGENT_JOB_CONCURRENCY); each answer is saved as soon as it's ready.
+    """
+    if request.prompts:
+        kind, inputs = "prompts", request.prompts
+    else:
+        kind, inputs = "patients", request.patient_uuids
+    job_id = await get_job_runner().submit(kind, inputs)
+    return JobCreated(job_id=job_id, total=len(inputs))
+
+
+@app.get("/agent/jobs/{job_id}")
+async def get_job(job_id: str) -> dict[str, Any]:
+    """A job's progress: per-item status and answers, throughput and ETA."""
+    status = await get_job_runner().get(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return status.to_dict()
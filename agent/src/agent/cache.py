@@ -0,0 +1,267 @@
+"""Response cache for OpenEMR GET requests.
+
+Clinicians ask several questions about the same patient in a row, and
+each one re-fetches the same demographics, allergies and encounter lists.
+Caching GET responses for a short TTL turns those repeats into local
+lookups.
+
+Two backends:
+- MemoryCache: a dict inside one process. Fastest, but with N uvicorn
+  workers there are N separate caches, and a request only hits if it
+  lands on the worker that fetched the data — hit rates drop ~N-fold.
+- SQLiteCache: one file on the host shared by every worker. A response
+  fetched by any worker is a hit for all of them.
+
+Concept — SQLite WAL mode:
+    In the default rollback-journal mode, a writer blocks all readers.
+    In write-ahead-log (WAL) mode, readers keep reading the last committed
+    state while one writer appends to the log, so many worker processes
+    can read the cache concurrently while another one stores a response.
+
+Concept — TTL + size-bounded eviction:
+    Every entry expires `ttl` seconds after it was stored (so edits made
+    in OpenEMR show up within that window). Independently, the cache is
+    capped at `max_bytes`: when it grows past that, expired entries are
+    dropped first, then the least recently stored ones.
+
+Values are the raw response bodies (bytes), so a hit is decoded exactly
+like a fresh response. The cache holds patient data: the SQLite file is
+created owner-only (0600), and entries are keyed by server + user, so
+different identities never share entries.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Protocol
+
+from agent.config import (
+    OPENEMR_CACHE_MAX_MB,
+    OPENEMR_CACHE_PATH,
+)
+
+logger = logging.getLogger(__name__)
+
+# Backend names accepted by open_cache() / OPENEMR_CACHE_BACKEND.
+CACHE_BACKENDS = ("none", "memory", "sqlite")
+
+DEFAULT_CACHE_PATH = Path(tempfile.gettempdir()) / "openemr-agent-cache.sqlite3"
+
+
+class ResponseCache(Protocol):
+    """What OpenEMRClient needs from a cache backend."""
+
+    name: str
+
+    def get(self, key: str) -> bytes | None:
+        """The cached body for `key`, or None if missing or expired."""
+        ...
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        """Store `value` under `key` for `ttl` seconds."""
+        ...
+
+    def delete(self, key: str) -> None:
+        """Drop `key` if present."""
+        ...
+
+    def clear(self) -> None:
+        """Drop every entry."""
+        ...
+
+
+class MemoryCache:
+    """Per-process LRU cache with TTL, bounded by total value size."""
+
+    name = "memory"
+
+    def __init__(self, max_bytes: int = OPENEMR_CACHE_MAX_MB * 1024 * 1024) -> None:
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._size = 0
+
+    def get(self, key: str) -> bytes | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if time.time() >= expires_at:
+            self.delete(key)
+            return None
+        self._entries.move_to_end(key)  # most recently used
+        return value
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        self.delete(key)
+        self._entries[key] = (time.time() + ttl, value)
+        self._size += len(value)
+        while self._size > self.max_bytes and self._entries:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+
+    def delete(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry[1])
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._size = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCache:
+    """Cache shared by every process on the host, stored in one SQLite file.
+
+    Operations are synchronous: even with several workers writing, a
+    lookup takes well under a millisecond (see benchmarks/response_cache.py),
+    far less than the OpenEMR round trip it saves. They run on the event
+    loop, so they never wait long for another worker's write lock: after
+    BUSY_TIMEOUT seconds the operation gives up, a read counts as a miss
+    and a write is skipped. A cache is only worth it while it is fast.
+    """
+
+    name = "sqlite"
+
+    # Seconds to wait for another worker's write lock before giving up.
+    BUSY_TIMEOUT = 0.05
+
+    # Check the size cap every N writes rather than on every write.
+    EVICT_EVERY = 32
+
+    def __init__(
+        self,
+        path: str | Path = "",
+        max_bytes: int = OPENEMR_CACHE_MAX_MB * 1024 * 1024,
+    ) -> None:
+        self.path = Path(path or DEFAULT_CACHE_PATH).expanduser()
+        self.max_bytes = max_bytes
+        self._writes = 0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Create the file owner-only before SQLite opens it.
+        os.close(os.open(self.path, os.O_CREAT | os.O_RDWR, 0o600))
+        # isolation_level=None: autocommit, each statement is its own
+        # transaction. timeout: wait (briefly) for another worker's write lock.
+        self._db = sqlite3.connect(
+            self.path,
+            timeout=self.BUSY_TIMEOUT,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # NORMAL is durable enough for a cache and avoids an fsync per write.
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " value BLOB NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " stored_at REAL NOT NULL,"
+            " expires_at REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS responses_stored_at ON responses (stored_at)"
+        )
+
+    def get(self, key: str) -> bytes | None:
+        try:
+            row = self._db.execute(
+                "SELECT value FROM responses WHERE key = ? AND expires_at > ?",
+                (key, time.time()),
+            ).fetchone()
+        except sqlite3.Error as exc:  # e.g. locked for longer than the timeout
+            logger.warning("Response cache read failed: %s", exc)
+            return None
+        return row[0] if row else None
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        now = time.time()
+        try:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value), now, now + ttl),
+            )
+        except sqlite3.Error as exc:
+            logger.warning("Response cache write failed: %s", exc)
+            return
+        self._writes += 1
+        if self._writes % self.EVICT_EVERY == 0:
+            try:
+                self.evict()
+            except sqlite3.Error as exc:
+                logger.warning("Response cache eviction failed: %s", exc)
+
+    def delete(self, key: str) -> None:
+        try:
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+        except sqlite3.Error as exc:
+            logger.warning("Response cache delete failed: %s", exc)
+
+    def clear(self) -> None:
+        try:
+            self._db.execute("DELETE FROM responses")
+        except sqlite3.Error as exc:
+            logger.warning("Response cache clear failed: %s", exc)
+
+    def evict(self) -> None:
+        """Drop expired entries, then the oldest ones until under max_bytes."""
+        self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+        (total,) = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        if total <= self.max_bytes:
+            return
+        # Walk entries oldest-first and delete until we're back under the cap.
+        excess = total - self.max_bytes
+        cutoff = None
+        for stored_at, size in self._db.execute(
+            "SELECT stored_at, size FROM responses ORDER BY stored_at"
+        ):
+            excess -= size
+            cutoff = stored_at
+            if excess <= 0:
+                break
+        if cutoff is not None:
+            self._db.execute("DELETE FROM responses WHERE stored_at <= ?", (cutoff,))
+
+    def close(self) -> None:
+        with contextlib.suppress(sqlite3.Error):
+            self._db.close()
+
+    def __len__(self) -> int:
+        (count,) = self._db.execute(
+            "SELECT COUNT(*) FROM responses WHERE expires_at > ?", (time.time(),)
+        ).fetchone()
+        return int(count)
+
+
+def open_cache(backend: str, path: str = OPENEMR_CACHE_PATH) -> ResponseCache | None:
+    """Create the cache for a backend name ("none", "memory", or "sqlite").
+
+    A SQLite cache that can't be opened (read-only disk, bad path) is
+    logged and replaced by no cache, so requests keep working.
+
+    Raises:
+        ValueError: If the backend name is unknown.
+    """
+    if backend == "none":
+        return None
+    if backend == "memory":
+        return MemoryCache()
+    if backend == "sqlite":
+        try:
+            return SQLiteCache(path)
+        except (OSError, sqlite3.Error) as exc:
+            logger.warning("Could not open response cache at %r: %s", path, exc)
+            return None
+    raise ValueError(f"Unknown cache backend {backend!r}; use one of {CACHE_BACKENDS}")
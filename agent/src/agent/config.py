@@ -45,6 +45,33 @@ ANTHROPIC_API_KEY: str = os.getenv("ANTHROPIC_API_KEY", "")
 # for tool-use tasks. You can switch to "claude-opus-4-20250514" for harder reasoning.
 ANTHROPIC_MODEL: str = os.getenv("ANTHROPIC_MODEL", "claude-sonnet-4-20250514")
 
+# Optional faster model (e.g., "claude-3-5-haiku-latest") for tool-planning
+# steps and simple lookups. ANTHROPIC_MODEL still writes answers that need
+# reasoning and redoes any fast step that fails validation (see
+# model_routing.py). Empty = use ANTHROPIC_MODEL for every step.
+ANTHROPIC_FAST_MODEL: str = os.getenv("ANTHROPIC_FAST_MODEL", "")
+# Once a turn has gathered more tool results than this, the answer is
+# written by ANTHROPIC_MODEL (combining several sources is synthesis)
+AGENT_FAST_MODEL_MAX_TOOL_RESULTS: int = int(
+    os.getenv("AGENT_FAST_MODEL_MAX_TOOL_RESULTS", "2")
+)
+
+# Your Anthropic rate limits (see the console's Limits page). Every LLM call
+# in this process waits its turn to stay under them, instead of running
+# into 429 errors (see ratelimit.py). 0 = no limit of that kind. The
+# budget is per process: with several uvicorn workers, divide by their number.
+ANTHROPIC_REQUESTS_PER_MINUTE: float = float(
+    os.getenv("ANTHROPIC_REQUESTS_PER_MINUTE", "0")
+)
+ANTHROPIC_INPUT_TOKENS_PER_MINUTE: float = float(
+    os.getenv("ANTHROPIC_INPUT_TOKENS_PER_MINUTE", "0")
+)
+ANTHROPIC_OUTPUT_TOKENS_PER_MINUTE: float = float(
+    os.getenv("ANTHROPIC_OUTPUT_TOKENS_PER_MINUTE", "0")
+)
+# Output tokens reserved per call before the real count is known
+AGENT_LLM_OUTPUT_ESTIMATE: int = int(os.getenv("AGENT_LLM_OUTPUT_ESTIMATE", "512"))
+
 # --- Observability ---
 # LangSmith is a platform that records every step the agent takes,
 # so you can debug and evaluate its behavior. These two env vars
@@ -56,3 +83,196 @@ LANGCHAIN_TRACING_V2: str = os.getenv("LANGCHAIN_TRACING_V2", "false")
 # OpenEMR supports multiple "sites" (separate databases). The default
 # installation uses "default" as the site name.
 OPENEMR_SITE: str = os.getenv("OPENEMR_SITE", "default")
+
+# --- Medication lexicon ---
+# Optional JSON file that extends the built-in medication lexicon used to
+# normalize free-text medication titles to RxNorm ingredients. Leave empty
+# to use only the built-in lexicon (see medication_lexicon.py for the format).
+MEDICATION_LEXICON_PATH: str = os.getenv("MEDICATION_LEXICON_PATH", "")
+
+# --- Verification ---
+# When enabled, every final answer is checked against the values the tools
+# actually returned, and unsupported values are flagged in the response.
+AGENT_VERIFY_CLAIMS: bool = os.getenv("AGENT_VERIFY_CLAIMS", "true").lower() == "true"
+
+# When enabled, the system prompt's rules (confirm name + DOB, list every
+# ambiguous match, end with the disclaimer) are checked against each turn
+# and cheap violations are repaired in the answer without re-prompting.
+AGENT_ENFORCE_RULES: bool = os.getenv("AGENT_ENFORCE_RULES", "true").lower() == "true"
+
+# --- Tool output size ---
+# List tools (encounters, appointments, medications) return one page at a
+# time. TOOL_PAGE_SIZE caps the rows per page; TOOL_OUTPUT_TOKEN_BUDGET caps
+# the estimated LLM tokens per tool result. Whichever limit is hit first ends
+# the page, and the model gets a cursor to fetch the next one.
+TOOL_PAGE_SIZE: int = int(os.getenv("TOOL_PAGE_SIZE", "25"))
+TOOL_OUTPUT_TOKEN_BUDGET: int = int(os.getenv("TOOL_OUTPUT_TOKEN_BUDGET", "1500"))
+
+# Tool output format: "text" repeats field labels on every row (easiest to
+# read); "table" lists column names once followed by delimited rows, which
+# uses noticeably fewer tokens for long lists.
+TOOL_OUTPUT_FORMAT: str = os.getenv("TOOL_OUTPUT_FORMAT", "text").lower()
+
+# --- OpenEMR response decoding ---
+# JSON decoder for API responses: "auto" uses orjson when installed (the
+# "fast" extra) and the stdlib decoder otherwise; "orjson" / "json" force one.
+OPENEMR_JSON_DECODER: str = os.getenv("OPENEMR_JSON_DECODER", "auto").lower()
+
+# When enabled, response bodies are parsed on first access instead of as
+# soon as they arrive, so responses that are never read are never decoded.
+OPENEMR_JSON_LAZY: bool = os.getenv("OPENEMR_JSON_LAZY", "false").lower() == "true"
+
+# --- Startup warm-up ---
+# When enabled, the server builds the agent, authenticates with OpenEMR and
+# opens keep-alive connections in the background right after startup, so the
+# first chat request is as fast as every later one. Failures are logged and
+# the server starts anyway (the first request then does the work instead).
+AGENT_WARMUP: bool = os.getenv("AGENT_WARMUP", "true").lower() == "true"
+AGENT_WARMUP_TIMEOUT: float = float(os.getenv("AGENT_WARMUP_TIMEOUT", "15"))
+
+# How many connections to OpenEMR to open during warm-up. Tools that run in
+# parallel each need their own connection.
+OPENEMR_WARM_CONNECTIONS: int = int(os.getenv("OPENEMR_WARM_CONNECTIONS", "4"))
+
+# --- OAuth token cache ---
+# Optional file where the OAuth2 client registration and tokens are kept
+# between restarts, so new processes and workers skip the password grant
+# (and auto-registration). Leave empty to disable. The file is created with
+# owner-only permissions; set OPENEMR_TOKEN_CACHE_KEY (a Fernet key, needs
+# the "crypto" extra) to also encrypt it.
+OPENEMR_TOKEN_CACHE_PATH: str = os.getenv("OPENEMR_TOKEN_CACHE_PATH", "")
+OPENEMR_TOKEN_CACHE_KEY: str = os.getenv("OPENEMR_TOKEN_CACHE_KEY", "")
+
+# --- OpenEMR response cache ---
+# Cache GET responses for a few seconds so follow-up questions about the
+# same patient don't re-fetch the same data. Backends: "none" (off),
+# "memory" (per process), or "sqlite" (one file shared by all uvicorn
+# workers on the host — use this when running several workers).
+OPENEMR_CACHE_BACKEND: str = os.getenv("OPENEMR_CACHE_BACKEND", "none").lower()
+# Seconds a cached response stays valid (edits in OpenEMR show up after this)
+OPENEMR_CACHE_TTL: float = float(os.getenv("OPENEMR_CACHE_TTL", "30"))
+# SQLite file for the "sqlite" backend (empty = a file in the temp directory)
+OPENEMR_CACHE_PATH: str = os.getenv("OPENEMR_CACHE_PATH", "")
+# Size cap for cached response bodies; oldest entries are evicted past this
+OPENEMR_CACHE_MAX_MB: int = int(os.getenv("OPENEMR_CACHE_MAX_MB", "64"))
+
+# Request timeout in seconds. With adaptive timeouts this is the ceiling
+# (and the timeout for endpoints without enough history yet).
+OPENEMR_TIMEOUT: float = float(os.getenv("OPENEMR_TIMEOUT", "30"))
+# Learn a timeout per endpoint from its recent latency: a multiple of its
+# p99, kept between OPENEMR_TIMEOUT_MIN and OPENEMR_TIMEOUT (see latency.py).
+# A hung cheap lookup then fails in seconds instead of holding the turn.
+OPENEMR_ADAPTIVE_TIMEOUTS: bool = (
+    os.getenv("OPENEMR_ADAPTIVE_TIMEOUTS", "true").lower() == "true"
+)
+OPENEMR_TIMEOUT_MIN: float = float(os.getenv("OPENEMR_TIMEOUT_MIN", "5"))
+OPENEMR_TIMEOUT_MULTIPLIER: float = float(os.getenv("OPENEMR_TIMEOUT_MULTIPLIER", "4"))
+
+# Hedged GETs: if a response is slower than the endpoint's usual
+# (OPENEMR_HEDGE_PERCENTILE) latency, send a second copy of the request and
+# use whichever answers first (see latency.py). Cuts the long tail of slow
+# endpoints at the cost of a few duplicate requests.
+OPENEMR_HEDGE: bool = os.getenv("OPENEMR_HEDGE", "false").lower() == "true"
+OPENEMR_HEDGE_PERCENTILE: float = float(os.getenv("OPENEMR_HEDGE_PERCENTILE", "95"))
+# Max duplicate requests, as a fraction of all GETs (0.05 = at most 5% extra)
+OPENEMR_HEDGE_MAX_EXTRA: float = float(os.getenv("OPENEMR_HEDGE_MAX_EXTRA", "0.05"))
+
+# --- Turn limits ---
+# Seconds a chat turn may take before it's cut short with a partial answer
+# (the tool results gathered so far). Keep it under the client's timeout
+# (the Streamlit app waits 120 s). 0 = no deadline.
+AGENT_TURN_DEADLINE_SECONDS: float = float(
+    os.getenv("AGENT_TURN_DEADLINE_SECONDS", "90")
+)
+# Max model steps (LLM calls) per turn before answering with what it has
+AGENT_MAX_ITERATIONS: int = int(os.getenv("AGENT_MAX_ITERATIONS", "10"))
+
+# --- Graceful shutdown ---
+# Seconds running turns get to finish when the server is stopped (new chats
+# get 503 meanwhile); turns still running after that are cancelled (see
+# drain.py). Keep it below the container's stop timeout (ECS: 30 s).
+AGENT_DRAIN_SECONDS: float = float(os.getenv("AGENT_DRAIN_SECONDS", "25"))
+
+# --- Idempotent chat requests ---
+# A chat request with an idempotency_key runs once: repeats while it runs
+# wait for it, and repeats within AGENT_IDEMPOTENCY_TTL seconds after it
+# finishes get the same answer (see idempotency.py). Per process.
+AGENT_IDEMPOTENCY_TTL: float = float(os.getenv("AGENT_IDEMPOTENCY_TTL", "600"))
+# Most keys remembered at once; the oldest finished ones are dropped first
+AGENT_IDEMPOTENCY_MAX_ENTRIES: int = int(
+    os.getenv("AGENT_IDEMPOTENCY_MAX_ENTRIES", "1000")
+)
+
+# --- Session storage ---
+# Where conversation histories live: "memory" (this process only — fine for
+# a single worker) or "sqlite" (one file shared by every uvicorn worker on
+# the host, so follow-up questions can land on any worker).
+AGENT_SESSION_BACKEND: str = os.getenv("AGENT_SESSION_BACKEND", "memory").lower()
+# SQLite file for the "sqlite" backend (empty = a file in the temp directory)
+AGENT_SESSION_PATH: str = os.getenv("AGENT_SESSION_PATH", "")
+
+# In-memory sessions with no activity for this many minutes are packed into
+# a compressed form (repeated tool outputs stored once) and unpacked on their
+# next message. 0 disables packing.
+AGENT_SESSION_PACK_AFTER_MINUTES: float = float(
+    os.getenv("AGENT_SESSION_PACK_AFTER_MINUTES", "10")
+)
+
+# --- Fast path ---
+# Answer formulaic lookups ("allergies for Phil Dixon", "meds for pid 12")
+# by calling the tools directly instead of running the LLM planning loop.
+AGENT_FAST_PATH: bool = os.getenv("AGENT_FAST_PATH", "true").lower() == "true"
+# How routed answers are worded: "template" (no LLM call) or "llm" (one
+# call that phrases the fetched data)
+AGENT_FAST_PATH_PHRASING: str = os.getenv(
+    "AGENT_FAST_PATH_PHRASING", "template"
+).lower()
+
+# --- Tool selection ---
+# Offer each agent step only the tools relevant to the question (plus
+# patient_search), instead of all of them. Falls back to the full catalog
+# when the question names no topic or asks for everything.
+AGENT_TOOL_SELECTION: bool = os.getenv("AGENT_TOOL_SELECTION", "true").lower() == "true"
+
+# --- Speculative prefetch ---
+# When patient_search finds exactly one patient, fetch these resources in
+# the background before the model asks for them (comma-separated; empty
+# disables). Choices: allergies, medications, problems, encounters,
+# appointments, insurance, details. Tune with the openemr_prefetch metrics.
+AGENT_PREFETCH_RESOURCES: list[str] = [
+    name.strip()
+    for name in os.getenv(
+        "AGENT_PREFETCH_RESOURCES", "allergies,medications,problems"
+    ).split(",")
+    if name.strip()
+]
+
+# --- Schedule pre-warming ---
+# Keep the charts of patients with an upcoming appointment today in the
+# response cache, so the first question about each is a cache hit. Needs
+# OPENEMR_CACHE_BACKEND (sqlite to share the warmed data with all workers).
+AGENT_PREWARM: bool = os.getenv("AGENT_PREWARM", "false").lower() == "true"
+# Warm a patient this many minutes before their appointment starts
+AGENT_PREWARM_LEAD_MINUTES: float = float(os.getenv("AGENT_PREWARM_LEAD_MINUTES", "30"))
+# Max OpenEMR requests per second the job may send
+AGENT_PREWARM_RATE: float = float(os.getenv("AGENT_PREWARM_RATE", "2"))
+# Seconds a warmed response stays cached (must cover the lead time gap)
+AGENT_PREWARM_TTL: float = float(os.getenv("AGENT_PREWARM_TTL", "1800"))
+# Seconds between passes over the schedule
+AGENT_PREWARM_INTERVAL: float = float(os.getenv("AGENT_PREWARM_INTERVAL", "60"))
+
+# --- Batch jobs ---
+# POST /agent/jobs runs many questions (or pre-visit summaries for many
+# patients) in the background. Progress is checkpointed to a SQLite file,
+# so a restart resumes unfinished jobs instead of starting over.
+# SQLite file for job progress (empty = a file in the temp directory)
+AGENT_JOB_PATH: str = os.getenv("AGENT_JOB_PATH", "")
+# How many job items run at the same time in this process
+AGENT_JOB_CONCURRENCY: int = int(os.getenv("AGENT_JOB_CONCURRENCY", "4"))
+# Max agent turns per minute for job items, leaving LLM quota for chat
+# (0 = no job-specific limit; the shared LLM limiter still applies)
+AGENT_JOB_TURNS_PER_MINUTE: float = float(os.getenv("AGENT_JOB_TURNS_PER_MINUTE", "20"))
+# Attempts per item when the LLM provider rate-limits or is overloaded
+AGENT_JOB_MAX_ATTEMPTS: int = int(os.getenv("AGENT_JOB_MAX_ATTEMPTS", "3"))
+# Max prompts / patients in one job
+AGENT_JOB_MAX_ITEMS: int = int(os.getenv("AGENT_JOB_MAX_ITEMS", "500"))
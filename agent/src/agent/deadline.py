@@ -0,0 +1,54 @@
+"""Per-turn deadlines — stop working on answers nobody will wait for.
+
+The Streamlit client gives up on a chat request after 120 seconds. Without
+a limit of its own, a turn can run far longer than that — a slow OpenEMR
+endpoint, a ReAct loop that keeps calling tools — and hold a worker and
+LLM quota for an answer nobody will read.
+
+Concept — a deadline in a context variable:
+    run_agent sets `turn_deadline` to the time (time.monotonic()) by which
+    the turn must be done. asyncio copies the context into the tasks
+    LangGraph starts for tool calls, so tools, OpenEMR requests and LLM
+    calls can all see how much time is left without passing it through
+    every signature. OpenEMRClient shortens each request's timeout to the
+    time remaining, and doesn't start a request once it has run out.
+
+Concept — cooperative cancellation:
+    run_agent runs the graph inside asyncio.timeout(). When the deadline
+    passes, whatever the turn is awaiting — an HTTP request, an LLM call,
+    a wait for rate-limit budget — raises CancelledError, which unwinds
+    the tool and the graph and closes the connection. app.py does the
+    same when the HTTP client disconnects.
+
+Concept — partial answers:
+    Work already done isn't thrown away. run_agent keeps the latest graph
+    state as it goes, so when a turn is cut short (by the deadline, or by
+    AGENT_MAX_ITERATIONS model steps) it answers with the tool results
+    gathered so far, marked as incomplete.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import time
+
+# When the current turn must finish (time.monotonic()); None = no deadline.
+turn_deadline: contextvars.ContextVar[float | None] = contextvars.ContextVar(
+    "turn_deadline", default=None
+)
+
+
+def remaining() -> float | None:
+    """Seconds left before the current turn's deadline (None if no deadline).
+
+    Can be zero or negative once the deadline has passed.
+    """
+    deadline = turn_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def set_deadline(seconds: float) -> None:
+    """Give the current turn `seconds` to finish (0 or less: no deadline)."""
+    turn_deadline.set(time.monotonic() + seconds if seconds > 0 else None)
@@ -0,0 +1,167 @@
+"""Graceful drain — let running turns finish when the server shuts down.
+
+A deploy stops the old container while clinicians are waiting on it.
+Without a drain, every turn still in its ReAct loop dies with the
+process: the LLM calls already made are wasted and the clinician gets an
+error instead of an answer.
+
+Concept — tracked turns:
+    Every agent turn (a chat request, or a batch job item) runs as a task
+    registered with the process-wide TurnTracker (`turns`). So at
+    shutdown we know exactly what is still running.
+
+Concept — draining:
+    When the server is told to stop (SIGTERM from Docker/ECS, or Ctrl-C),
+    the tracker stops accepting turns: new chats get 503 and job workers
+    leave their remaining items for the next process (see jobs.py).
+    Turns already running get AGENT_DRAIN_SECONDS to finish; whatever is
+    still running after that is cancelled. The shutdown then logs and
+    counts how many turns finished ("drained") and how many were cut off
+    ("aborted"). Metrics: drain_turns{result=drained|aborted},
+    drain_rejected, turns_in_flight.
+
+    Uvicorn itself, on the same signal, closes its listening socket and
+    waits for open requests before running the app's shutdown (see
+    app.py's lifespan), so the drain starts at the signal rather than at
+    the shutdown hook — otherwise the grace period would only begin once
+    every request had already finished on its own. The container's stop
+    timeout must be longer than AGENT_DRAIN_SECONDS, and the signal must
+    reach uvicorn (see start.sh).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import signal
+import time
+from collections.abc import Coroutine
+from dataclasses import dataclass
+from typing import Any, TypeVar
+
+from agent.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class Draining(RuntimeError):
+    """The server is shutting down and takes no new turns."""
+
+
+@dataclass(frozen=True, slots=True)
+class DrainReport:
+    """How the turns running at shutdown ended.
+
+    Attributes:
+        drained: Turns that finished within the grace period.
+        aborted: Turns cancelled when it ran out.
+    """
+
+    drained: int
+    aborted: int
+
+
+class TurnTracker:
+    """Knows which agent turns are running, and drains them on shutdown."""
+
+    def __init__(self) -> None:
+        self._running: set[asyncio.Task[Any]] = set()
+        self._drain: asyncio.Task[DrainReport] | None = None
+        self._drained = 0
+
+    @property
+    def accepting(self) -> bool:
+        """False once draining has begun."""
+        return self._drain is None
+
+    @property
+    def running(self) -> int:
+        return len(self._running)
+
+    def start(self, turn: Coroutine[Any, Any, T]) -> asyncio.Task[T]:
+        """Run `turn` as a tracked task.
+
+        Raises:
+            Draining: If the server is shutting down (`turn` is discarded).
+        """
+        if not self.accepting:
+            turn.close()
+            metrics.counter("drain_rejected").inc()
+            raise Draining("The server is shutting down; try again shortly")
+        task = asyncio.ensure_future(turn)
+        self._running.add(task)
+        task.add_done_callback(self._finished)
+        metrics.gauge("turns_in_flight").set(len(self._running))
+        return task
+
+    def _finished(self, task: asyncio.Task[Any]) -> None:
+        self._running.discard(task)
+        metrics.gauge("turns_in_flight").set(len(self._running))
+        if not self.accepting and not task.cancelled():
+            self._drained += 1
+
+    def begin_drain(self, grace: float) -> asyncio.Task[DrainReport]:
+        """Stop accepting turns and give running ones `grace` seconds.
+
+        Calling it again returns the drain already under way.
+        """
+        if self._drain is None:
+            logger.info(
+                "Draining: %d turns running, %.0fs to finish", len(self._running), grace
+            )
+            self._drain = asyncio.ensure_future(self._run_drain(grace))
+        return self._drain
+
+    def reset(self) -> None:
+        """Accept turns again (the server is starting)."""
+        self._drain = None
+        self._drained = 0
+
+    async def drain(self, grace: float) -> DrainReport:
+        """Drain (or wait for the drain already started) and report."""
+        return await self.begin_drain(grace)
+
+    async def _run_drain(self, grace: float) -> DrainReport:
+        deadline = time.monotonic() + grace
+        while self._running and (left := deadline - time.monotonic()) > 0:
+            await asyncio.wait(set(self._running), timeout=left)
+        aborted = list(self._running)
+        for task in aborted:
+            task.cancel()
+        await asyncio.gather(*aborted, return_exceptions=True)
+
+        report = DrainReport(drained=self._drained, aborted=len(aborted))
+        metrics.counter("drain_turns", result="drained").inc(report.drained)
+        metrics.counter("drain_turns", result="aborted").inc(report.aborted)
+        return report
+
+    def drain_on_signals(self, grace: float) -> None:
+        """Begin draining on SIGTERM/SIGINT, before uvicorn's own handler runs.
+
+        Chains onto the handler already installed (uvicorn's, which starts
+        its shutdown), so both still happen. Signals without a Python
+        handler are left alone: nothing in-process would shut down the
+        server after the drain. Call from the event loop in the main
+        thread, e.g. in the app's startup; elsewhere it does nothing and
+        the drain starts at shutdown instead.
+        """
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            previous = signal.getsignal(signum)
+            if not callable(previous):
+                continue
+
+            def handler(signum: int, frame: Any, previous: Any = previous) -> None:
+                loop.call_soon_threadsafe(self.begin_drain, grace)
+                previous(signum, frame)
+
+            try:
+                signal.signal(signum, handler)
+            except ValueError:  # not the main thread (e.g. a test client)
+                return
+
+
+# The process-wide tracker: chat turns and job items register here.
+turns = TurnTracker()
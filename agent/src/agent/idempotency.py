@@ -0,0 +1,149 @@
+"""Idempotency keys for chat requests.
+
+A chat turn is expensive (several LLM calls) and not safe to repeat: each
+run appends its question and answer to the session history. Yet clients
+do repeat them. The Streamlit app gives up after 120 seconds and the user
+asks again, or a double-click submits the same question twice. Without
+protection, the agent answers twice, costs twice, and the session ends up
+with the turn recorded twice.
+
+Concept — idempotency key:
+    The client sends a key that is unique per question it means to ask
+    (a fresh UUID per submission). Every request with the same key means
+    "this same question", so the agent runs it at most once:
+
+    - No run for the key yet: start one, and remember it under the key.
+    - A run is still in progress: wait for it and return its answer
+      (nothing new is started).
+    - A run finished within the last AGENT_IDEMPOTENCY_TTL seconds:
+      return its stored answer right away.
+
+    Reusing a key for a different message or session is a client bug;
+    it's rejected (IdempotencyConflict) rather than answered with the
+    other question's response. A run that fails is forgotten, so a retry
+    with the same key tries again.
+
+Concept — the run outlives the request:
+    A request that is abandoned (the client timed out or disconnected)
+    doesn't cancel a keyed run: the point of the key is that the client's
+    retry picks it up. The run still stops at the turn deadline (see
+    deadline.py).
+
+The store is in process memory and bounded (AGENT_IDEMPOTENCY_MAX_ENTRIES,
+oldest finished entries evicted first). With several uvicorn workers, a
+retry that lands on another worker is not deduplicated. Metrics:
+chat_idempotency{result=new|attached|replayed|conflict}.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from itertools import islice
+from typing import Any
+
+from agent.config import AGENT_IDEMPOTENCY_MAX_ENTRIES, AGENT_IDEMPOTENCY_TTL
+from agent.metrics import metrics
+
+
+class IdempotencyConflict(ValueError):
+    """An idempotency key was reused for a different request."""
+
+
+@dataclass(slots=True)
+class _Entry:
+    fingerprint: str
+    task: asyncio.Future[Any]
+    finished_at: float | None = None  # monotonic; None while running
+
+
+def request_fingerprint(*parts: str | None) -> str:
+    """A digest identifying a request's content (e.g. message and session)."""
+    return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+
+class IdempotencyStore:
+    """Runs each keyed request once and remembers its result for a while.
+
+    Args:
+        ttl: Seconds a finished result is returned for repeats.
+        max_entries: Most keys remembered; the oldest finished ones go first.
+    """
+
+    def __init__(
+        self,
+        ttl: float = AGENT_IDEMPOTENCY_TTL,
+        max_entries: int = AGENT_IDEMPOTENCY_MAX_ENTRIES,
+    ) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def run(
+        self, key: str, fingerprint: str, work: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """Return the result of `work()` for `key`, running it at most once.
+
+        Args:
+            key: The client's idempotency key.
+            fingerprint: Identifies the request's content; a repeat of the
+                key with a different fingerprint is a conflict.
+            work: Starts the run; only called if there's none for `key`.
+
+        Raises:
+            IdempotencyConflict: If `key` was used for a different request.
+        """
+        self._expire()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry.fingerprint != fingerprint:
+                metrics.counter("chat_idempotency", result="conflict").inc()
+                raise IdempotencyConflict(
+                    "Idempotency key was already used for a different request"
+                )
+            result = "attached" if entry.finished_at is None else "replayed"
+            metrics.counter("chat_idempotency", result=result).inc()
+        else:
+            entry = _Entry(fingerprint, asyncio.ensure_future(work()))
+            entry.task.add_done_callback(lambda _: self._finished(key, entry))
+            self._entries[key] = entry
+            self._evict()
+            metrics.counter("chat_idempotency", result="new").inc()
+        # shield: a waiter that gives up (e.g. its client left) doesn't
+        # cancel the run for the others
+        return await asyncio.shield(entry.task)
+
+    def _finished(self, key: str, entry: _Entry) -> None:
+        failed = entry.task.cancelled() or entry.task.exception() is not None
+        if self._entries.get(key) is not entry:
+            return  # evicted meanwhile
+        if failed:
+            del self._entries[key]  # let a retry run it again
+        else:
+            entry.finished_at = time.monotonic()
+
+    def _expire(self) -> None:
+        cutoff = time.monotonic() - self.ttl
+        for key in [
+            key
+            for key, entry in self._entries.items()
+            if entry.finished_at is not None and entry.finished_at < cutoff
+        ]:
+            del self._entries[key]
+
+    def _evict(self) -> None:
+        excess = len(self._entries) - self.max_entries
+        if excess <= 0:
+            return
+        finished = (
+            key for key, entry in self._entries.items() if entry.finished_at is not None
+        )
+        for key in list(islice(finished, excess)):
+            del self._entries[key]
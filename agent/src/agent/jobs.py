@@ -0,0 +1,587 @@
+"""Batch jobs — many agent turns run in the background, with saved progress.
+
+/agent/chat answers one question and blocks until it's done. Preparing
+pre-visit summaries for a whole clinic day (50-200 patients) overnight
+needs something else: submit the whole list once, let it run, and check
+on it later. POST /agent/jobs takes a list of questions (or of patient
+UUIDs, each turned into a summary request) and returns a job ID;
+GET /agent/jobs/{id} reports progress and the answers so far.
+
+Concept — a worker pool:
+    Items go on an asyncio queue and AGENT_JOB_CONCURRENCY worker tasks
+    take them off one at a time, each running a normal agent turn
+    (run_agent) in its own session. So at most that many turns are in
+    flight, however big the job, and chat requests keep being served by
+    the same event loop in between.
+
+Concept — rate-limit awareness:
+    Each item takes a token from a TokenBucket (see ratelimit.py) that
+    refills at AGENT_JOB_TURNS_PER_MINUTE, leaving the rest of the LLM
+    quota to clinicians. If the provider still answers 429 (rate limited)
+    or 529 (overloaded), the item goes back on the queue and the whole
+    pool pauses — for the server's Retry-After if it sent one, otherwise
+    with exponential backoff — instead of every worker hammering a
+    provider that just said no. After AGENT_JOB_MAX_ATTEMPTS the item is
+    marked failed.
+
+Concept — checkpoints:
+    Every item's state (pending / running / done / failed) and answer is
+    written to a SQLite file as soon as it changes. If the server
+    restarts mid-job, the next one to start picks up the unfinished items
+    and carries on; finished answers are never recomputed. Each job
+    records which process owns it and when that process last made
+    progress (and, while it runs, a heartbeat every HEARTBEAT_INTERVAL
+    seconds, so a long turn or a rate-limit pause doesn't look like a dead
+    process), so a job is only taken over once its owner has stopped or
+    gone quiet for STALE_AFTER seconds. An item is only started by its
+    job's current owner. Store calls run in a worker
+    thread, so waiting for another process's write lock doesn't stall the
+    chat turns on the event loop.
+
+Concept — shutdown:
+    Item turns are tracked like chat turns (see drain.py): when the
+    server drains, running items get the grace period to finish, and
+    items not yet started are left pending for the next process.
+
+Metrics: job_items{result=done|failed}, job_item_seconds,
+job_retries, job_queue_depth, and job_items_per_minute (completions over
+the last few minutes — the throughput a clinic day's job will get).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from collections.abc import Callable, Sequence
+from contextlib import suppress
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, TypeVar
+
+from agent.agent import run_agent
+from agent.config import (
+    AGENT_JOB_CONCURRENCY,
+    AGENT_JOB_MAX_ATTEMPTS,
+    AGENT_JOB_PATH,
+    AGENT_JOB_TURNS_PER_MINUTE,
+)
+from agent.drain import Draining, turns
+from agent.metrics import metrics
+from agent.openemr_client import get_client
+from agent.ratelimit import TokenBucket, retry_delay
+from agent.tools.records import PatientRecord
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+JOB_KINDS = ("prompts", "patients")
+
+DEFAULT_JOB_PATH = Path(tempfile.gettempdir()) / "openemr-agent-jobs.sqlite3"
+
+# What a "patients" job asks the agent for each patient. Giving the IDs up
+# front lets the agent skip patient_search.
+SUMMARY_PROMPT = (
+    "Prepare a pre-visit summary for {name} (DOB {dob}, patient ID {pid}, "
+    "patient UUID {uuid}): active problems, current medications, allergies, "
+    "the most recent vitals and the last encounter."
+)
+
+# Item states.
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+
+# A job whose owner hasn't made progress for this long is taken over.
+STALE_AFTER = 300.0
+
+# How often a running JobRunner marks its jobs alive.
+HEARTBEAT_INTERVAL = STALE_AFTER / 5
+
+# First backoff after a rate-limited item with no Retry-After (doubles).
+BACKOFF_SECONDS = 5.0
+
+# Completions counted by the job_items_per_minute gauge.
+THROUGHPUT_WINDOW = 300.0
+
+
+@dataclass(frozen=True, slots=True)
+class JobItem:
+    """One question in a job and what became of it."""
+
+    index: int
+    input: str
+    status: str
+    response: str | None = None
+    error: str | None = None
+    session_id: str | None = None
+    attempts: int = 0
+    seconds: float | None = None  # run time of the last attempt
+
+
+@dataclass(frozen=True, slots=True)
+class JobStatus:
+    """A job's progress, as reported by GET /agent/jobs/{id}."""
+
+    job_id: str
+    kind: str
+    created_at: float
+    items: list[JobItem]
+    items_per_minute: float | None = None
+
+    @property
+    def counts(self) -> dict[str, int]:
+        counts = dict.fromkeys((PENDING, RUNNING, DONE, FAILED), 0)
+        for item in self.items:
+            counts[item.status] += 1
+        return counts
+
+    @property
+    def status(self) -> str:
+        counts = self.counts
+        if counts[PENDING] + counts[RUNNING] == 0:
+            return "done"
+        return "queued" if counts[PENDING] == len(self.items) else "running"
+
+    @property
+    def eta_seconds(self) -> float | None:
+        counts = self.counts
+        if not self.items_per_minute:
+            return None
+        return (counts[PENDING] + counts[RUNNING]) * 60 / self.items_per_minute
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "status": self.status,
+            "created_at": self.created_at,
+            "total": len(self.items),
+            "counts": self.counts,
+            "items_per_minute": self.items_per_minute,
+            "eta_seconds": self.eta_seconds,
+            "items": [asdict(item) for item in self.items],
+        }
+
+
+class JobStore:
+    """Job progress in a WAL-mode SQLite file shared by every worker."""
+
+    def __init__(self, path: str | Path = "") -> None:
+        self.path = Path(path or DEFAULT_JOB_PATH).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Answers contain patient data: create the file owner-only.
+        os.close(os.open(self.path, os.O_CREAT | os.O_RDWR, 0o600))
+        self._db = sqlite3.connect(
+            self.path, timeout=10.0, isolation_level=None, check_same_thread=False
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                owner TEXT NOT NULL,
+                heartbeat REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS items (
+                job_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                input TEXT NOT NULL,
+                status TEXT NOT NULL,
+                response TEXT,
+                error TEXT,
+                session_id TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                started_at REAL,
+                finished_at REAL,
+                PRIMARY KEY (job_id, idx)
+            ) WITHOUT ROWID;
+            """
+        )
+        # JobRunner calls the store from worker threads (see JobRunner._store),
+        # to keep lock waits off the event loop; one transaction at a time.
+        self._lock = threading.Lock()
+
+    def create(self, kind: str, inputs: Sequence[str], owner: str) -> str:
+        """Store a new job with all items pending. Returns its ID."""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    "INSERT INTO jobs VALUES (?, ?, ?, ?, ?)",
+                    (job_id, kind, now, owner, now),
+                )
+                self._db.executemany(
+                    "INSERT INTO items (job_id, idx, input, status) "
+                    "VALUES (?, ?, ?, ?)",
+                    [(job_id, i, text, PENDING) for i, text in enumerate(inputs)],
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return job_id
+
+    def start_item(self, job_id: str, index: int, owner: str) -> int | None:
+        """Mark an item running, if `owner` still owns its job.
+
+        Returns:
+            Which attempt this is (1-based), or None if another process
+            has taken the job over (the item is left to it).
+        """
+        now = time.time()
+        with self._lock:
+            started = self._db.execute(
+                "UPDATE items SET status = ?, attempts = attempts + 1, "
+                "started_at = ? WHERE job_id = ? AND idx = ? AND EXISTS "
+                "(SELECT 1 FROM jobs WHERE job_id = ? AND owner = ?)",
+                (RUNNING, now, job_id, index, job_id, owner),
+            ).rowcount
+            if not started:
+                return None
+            self._touch(job_id, now)
+            row = self._db.execute(
+                "SELECT attempts FROM items WHERE job_id = ? AND idx = ?",
+                (job_id, index),
+            ).fetchone()
+        return int(row[0])
+
+    def finish_item(
+        self, job_id: str, index: int, response: str, session_id: str
+    ) -> None:
+        self._end_item(job_id, index, DONE, response=response, session_id=session_id)
+
+    def fail_item(self, job_id: str, index: int, error: str) -> None:
+        self._end_item(job_id, index, FAILED, error=error)
+
+    def retry_item(self, job_id: str, index: int) -> None:
+        """Put a running item back to pending (it will be queued again)."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE items SET status = ? WHERE job_id = ? AND idx = ?",
+                (PENDING, job_id, index),
+            )
+
+    def _end_item(
+        self,
+        job_id: str,
+        index: int,
+        status: str,
+        response: str | None = None,
+        error: str | None = None,
+        session_id: str | None = None,
+    ) -> None:
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE items SET status = ?, response = ?, error = ?, "
+                "session_id = ?, finished_at = ? WHERE job_id = ? AND idx = ?",
+                (status, response, error, session_id, now, job_id, index),
+            )
+            self._touch(job_id, now)
+
+    def _touch(self, job_id: str, now: float) -> None:
+        # Progress on any item shows the owner is alive: refresh all its jobs,
+        # including ones still waiting behind this one in the queue.
+        self._db.execute(
+            "UPDATE jobs SET heartbeat = ? "
+            "WHERE owner = (SELECT owner FROM jobs WHERE job_id = ?)",
+            (now, job_id),
+        )
+
+    def get(self, job_id: str) -> JobStatus | None:
+        """A job's progress, or None if there's no such job."""
+        with self._lock:
+            job = self._db.execute(
+                "SELECT kind, created_at FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+            if job is None:
+                return None
+            rows = self._db.execute(
+                "SELECT idx, input, status, response, error, session_id, attempts, "
+                "started_at, finished_at FROM items WHERE job_id = ? ORDER BY idx",
+                (job_id,),
+            ).fetchall()
+        items = []
+        first_start, last_finish, finished = None, None, 0
+        for idx, text, status, response, error, session, attempts, start, end in rows:
+            seconds = end - start if start is not None and end is not None else None
+            items.append(
+                JobItem(idx, text, status, response, error, session, attempts, seconds)
+            )
+            if start is not None:
+                first_start = start if first_start is None else min(first_start, start)
+            if end is not None:
+                finished += 1
+                last_finish = end if last_finish is None else max(last_finish, end)
+        rate = None
+        if finished and first_start is not None and last_finish > first_start:
+            rate = round(finished * 60 / (last_finish - first_start), 2)
+        return JobStatus(job_id, job[0], job[1], items, rate)
+
+    def claim_unfinished(
+        self, owner: str, stale_after: float = STALE_AFTER
+    ) -> list[tuple[str, str, int, str]]:
+        """Take over unfinished jobs whose owner stopped or went quiet.
+
+        Items that were running are reset to pending.
+
+        Returns:
+            (job_id, kind, index, input) for each item left to run.
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                jobs = self._db.execute(
+                    "SELECT DISTINCT jobs.job_id, kind FROM jobs "
+                    "JOIN items USING (job_id) "
+                    "WHERE items.status IN (?, ?) AND jobs.heartbeat < ?",
+                    (PENDING, RUNNING, now - stale_after),
+                ).fetchall()
+                claimed: list[tuple[str, str, int, str]] = []
+                for job_id, kind in jobs:
+                    self._db.execute(
+                        "UPDATE jobs SET owner = ?, heartbeat = ? WHERE job_id = ?",
+                        (owner, now, job_id),
+                    )
+                    self._db.execute(
+                        "UPDATE items SET status = ? WHERE job_id = ? AND status = ?",
+                        (PENDING, job_id, RUNNING),
+                    )
+                    rows = self._db.execute(
+                        "SELECT idx, input FROM items WHERE job_id = ? AND status = ? "
+                        "ORDER BY idx",
+                        (job_id, PENDING),
+                    ).fetchall()
+                    claimed.extend((job_id, kind, idx, text) for idx, text in rows)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return claimed
+
+    def heartbeat(self, owner: str) -> None:
+        """Show that `owner` is alive, even while no item finishes."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET heartbeat = ? WHERE owner = ?", (time.time(), owner)
+            )
+
+    def release(self, owner: str) -> None:
+        """Let another process take over this owner's jobs right away."""
+        with self._lock:
+            self._db.execute("UPDATE jobs SET heartbeat = 0 WHERE owner = ?", (owner,))
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+class JobRunner:
+    """Runs job items on a pool of worker tasks in this process.
+
+    Args:
+        store: Where progress is checkpointed.
+        concurrency: How many items run at once.
+        turns_per_minute: Max agent turns started per minute (0 = no limit).
+        max_attempts: Tries per item when the LLM provider pushes back.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        *,
+        concurrency: int = AGENT_JOB_CONCURRENCY,
+        turns_per_minute: float = AGENT_JOB_TURNS_PER_MINUTE,
+        max_attempts: int = AGENT_JOB_MAX_ATTEMPTS,
+    ) -> None:
+        self.store = store
+        self.owner = uuid.uuid4().hex
+        self.concurrency = max(concurrency, 1)
+        self.max_attempts = max_attempts
+        self.bucket = (
+            TokenBucket(turns_per_minute / 60, burst=self.concurrency)
+            if turns_per_minute > 0
+            else None  # no job-specific rate limit
+        )
+        self._queue: asyncio.Queue[tuple[str, str, int, str]] = asyncio.Queue()
+        self._workers: list[asyncio.Task[None]] = []
+        self._heartbeat: asyncio.Task[None] | None = None
+        self._paused_until = 0.0  # monotonic; set when the provider says 429
+        self._started = time.monotonic()
+        self._completed: deque[float] = deque()
+
+    async def submit(self, kind: str, inputs: Sequence[str]) -> str:
+        """Create a job and queue its items. Returns the job ID.
+
+        Raises:
+            ValueError: If the kind is unknown or there are no inputs.
+        """
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind {kind!r}; use one of {JOB_KINDS}")
+        if not inputs:
+            raise ValueError("A job needs at least one item")
+        job_id = await self._store(self.store.create, kind, inputs, self.owner)
+        for index, text in enumerate(inputs):
+            self._queue.put_nowait((job_id, kind, index, text))
+        self._start_workers()
+        logger.info("Job %s queued: %d %s", job_id, len(inputs), kind)
+        return job_id
+
+    async def resume(self) -> int:
+        """Queue unfinished items of abandoned jobs. Returns how many."""
+        items = await self._store(self.store.claim_unfinished, self.owner)
+        for item in items:
+            self._queue.put_nowait(item)
+        if items:
+            self._start_workers()
+            logger.info("Resuming %d unfinished job items", len(items))
+        return len(items)
+
+    async def get(self, job_id: str) -> JobStatus | None:
+        return await self._store(self.store.get, job_id)
+
+    async def _store(self, call: Callable[..., T], *args: Any) -> T:
+        """Call a JobStore method in a worker thread.
+
+        Each call may wait up to 10 seconds for another worker's SQLite
+        write lock; on the event loop that would stall every chat turn.
+        """
+        return await asyncio.to_thread(call, *args)
+
+    async def join(self) -> None:
+        """Wait until every queued item has finished."""
+        await self._queue.join()
+
+    async def stop(self) -> None:
+        """Cancel the workers; unfinished items are resumed by the next
+        process to start."""
+        tasks = [*self._workers, *filter(None, [self._heartbeat])]
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            with suppress(asyncio.CancelledError):
+                await task
+        self._workers.clear()
+        self._heartbeat = None
+        await self._store(self.store.release, self.owner)
+
+    def _start_workers(self) -> None:
+        metrics.gauge("job_queue_depth").set(self._queue.qsize())
+        self._workers = [task for task in self._workers if not task.done()]
+        while len(self._workers) < self.concurrency:
+            self._workers.append(asyncio.create_task(self._worker()))
+        if self._heartbeat is None or self._heartbeat.done():
+            self._heartbeat = asyncio.create_task(self._beat())
+
+    async def _beat(self) -> None:
+        """Refresh this process's jobs' heartbeat until stopped."""
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            try:
+                await self._store(self.store.heartbeat, self.owner)
+            except sqlite3.Error as exc:
+                logger.warning("Job heartbeat failed: %s", exc)
+
+    async def _worker(self) -> None:
+        while True:
+            item = await self._queue.get()
+            try:
+                await self._run_item(*item)
+            except Exception:  # never let one item kill the worker
+                logger.exception("Job item %s/%d crashed", item[0], item[2])
+            finally:
+                self._queue.task_done()
+                metrics.gauge("job_queue_depth").set(self._queue.qsize())
+
+    async def _run_item(self, job_id: str, kind: str, index: int, text: str) -> None:
+        pause = self._paused_until - time.monotonic()
+        if pause > 0:
+            await asyncio.sleep(pause)
+        if self.bucket is not None:
+            await self.bucket.acquire()
+        if not turns.accepting:
+            return  # shutting down: left pending for the next process
+
+        attempt = await self._store(self.store.start_item, job_id, index, self.owner)
+        if attempt is None:
+            logger.info("Job %s was taken over; skipping item %d", job_id, index)
+            return
+        started = time.perf_counter()
+        try:
+            prompt = await self._prompt(kind, text)
+            response, session_id = await turns.start(
+                run_agent(prompt, session_id=f"job-{job_id}-{index}")
+            )
+        except Draining:
+            await self._store(self.store.retry_item, job_id, index)
+            return
+        except Exception as exc:
+            delay = retry_delay(exc)
+            if delay is not None and attempt < self.max_attempts:
+                delay = delay or BACKOFF_SECONDS * 2 ** (attempt - 1)
+                logger.warning(
+                    "Job item %s/%d rate limited; pausing jobs %.0fs",
+                    job_id,
+                    index,
+                    delay,
+                )
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                await self._store(self.store.retry_item, job_id, index)
+                self._queue.put_nowait((job_id, kind, index, text))
+                metrics.counter("job_retries").inc()
+                return
+            logger.warning("Job item %s/%d failed: %s", job_id, index, exc)
+            await self._store(
+                self.store.fail_item, job_id, index, f"{type(exc).__name__}: {exc}"
+            )
+            metrics.counter("job_items", result="failed").inc()
+            return
+
+        await self._store(self.store.finish_item, job_id, index, response, session_id)
+        metrics.counter("job_items", result="done").inc()
+        metrics.histogram("job_item_seconds").observe(time.perf_counter() - started)
+        self._record_completion()
+
+    async def _prompt(self, kind: str, text: str) -> str:
+        if kind == "prompts":
+            return text
+        client = await get_client()
+        data = await client.get(f"/patient/{text}")
+        if not data.get("data"):
+            raise LookupError(f"No patient found with UUID '{text}'")
+        patient = PatientRecord.from_api(data["data"])
+        return SUMMARY_PROMPT.format(
+            name=patient.name, dob=patient.dob, pid=patient.pid, uuid=patient.uuid
+        )
+
+    def _record_completion(self) -> None:
+        now = time.monotonic()
+        self._completed.append(now)
+        while self._completed[0] < now - THROUGHPUT_WINDOW:
+            self._completed.popleft()
+        span = min(now - self._started, THROUGHPUT_WINDOW)
+        if span > 0:
+            metrics.gauge("job_items_per_minute").set(len(self._completed) * 60 / span)
+
+
+_runner: JobRunner | None = None
+
+
+def get_job_runner() -> JobRunner:
+    """The process-wide job runner (opens the job store on first use)."""
+    global _runner  # noqa: PLW0603
+    if _runner is None:
+        _runner = JobRunner(JobStore(AGENT_JOB_PATH))
+    return _runner
@@ -0,0 +1,132 @@
+"""Pluggable JSON decoding for OpenEMR API responses.
+
+Every tool call decodes one OpenEMR response body, and the largest ones
+(patient lists, encounter histories, appointment books) are hundreds of
+kilobytes. Decoding runs on the single event loop thread, so time spent
+in the JSON parser is time no other request can make progress.
+
+Concept — pluggable decoder:
+    A decoder is any function `bytes -> Any`. The stdlib `json.loads` is
+    always available; `orjson.loads` (install the "fast" extra) parses
+    the same input several times faster. OPENEMR_JSON_DECODER picks one:
+    "auto" (orjson if installed, else stdlib), "orjson", or "json".
+
+Concept — lazy decoding:
+    OpenEMR wraps every result in an envelope:
+        {"validationErrors": [], "internalErrors": [], "data": [...]}
+    With OPENEMR_JSON_LAZY enabled, the client returns a LazyJSON mapping
+    that keeps the raw bytes and only parses them the first time a key is
+    read. Responses nobody looks at (warm-up pings, fire-and-forget POSTs)
+    are never decoded, and the parse happens where the data is used.
+
+Run benchmarks/json_decode.py to compare decoders on realistic payloads.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import time
+from collections.abc import Callable, Iterator, Mapping
+from typing import Any
+
+from agent.metrics import metrics
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the "fast" extra
+    orjson = None  # type: ignore[assignment]
+
+logger = logging.getLogger(__name__)
+
+Decoder = Callable[[bytes], Any]
+
+DECODERS: dict[str, Decoder] = {"json": json.loads}
+if orjson is not None:
+    DECODERS["orjson"] = orjson.loads
+
+
+def get_decoder(name: str = "auto") -> Decoder:
+    """Look up a decoder by name ("auto", "orjson", or "json").
+
+    Asking for "orjson" when it isn't installed falls back to the stdlib
+    decoder with a warning, so a missing optional extra never breaks
+    requests.
+
+    Raises:
+        ValueError: If the name isn't a known decoder.
+    """
+    if name == "auto":
+        return DECODERS.get("orjson", json.loads)
+    if name == "orjson" and orjson is None:
+        logger.warning("orjson is not installed — using the stdlib JSON decoder")
+        return json.loads
+    try:
+        return DECODERS[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown JSON decoder {name!r}; use 'auto', 'orjson', or 'json'"
+        ) from None
+
+
+def _timed_decode(body: bytes, decoder: Decoder) -> Any:
+    started = time.perf_counter()
+    value = decoder(body)
+    metrics.histogram("openemr_json_decode_ms").observe(
+        (time.perf_counter() - started) * 1000
+    )
+    return value
+
+
+class LazyJSON(Mapping[str, Any]):
+    """A JSON object that is parsed on first access.
+
+    Behaves like the decoded dict for reads (`data.get("data", [])`,
+    `data["data"]`, iteration, `==` against a dict). The raw body is
+    dropped once it has been decoded.
+    """
+
+    __slots__ = ("_body", "_decoder", "_value")
+
+    def __init__(self, body: bytes, decoder: Decoder) -> None:
+        self._body: bytes | None = body
+        self._decoder = decoder
+        self._value: dict[str, Any] | None = None
+
+    @property
+    def decoded(self) -> bool:
+        """Whether the body has been parsed yet."""
+        return self._value is not None
+
+    def value(self) -> dict[str, Any]:
+        """The decoded object (parses the body on first call)."""
+        if self._value is None:
+            assert self._body is not None
+            self._value = _timed_decode(self._body, self._decoder)
+            self._body = None
+        return self._value
+
+    def __getitem__(self, key: str) -> Any:
+        return self.value()[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.value())
+
+    def __len__(self) -> int:
+        return len(self.value())
+
+    def __repr__(self) -> str:
+        if self._value is None:
+            return f"LazyJSON(<{len(self._body or b'')} bytes, not decoded>)"
+        return f"LazyJSON({self._value!r})"
+
+
+def decode_body(body: bytes, decoder: Decoder, *, lazy: bool = False) -> Any:
+    """Decode a response body, optionally deferring the parse.
+
+    Only JSON objects are deferred; arrays and scalars (which don't fit
+    the mapping interface) are always decoded right away.
+    """
+    if lazy and body.lstrip()[:1] == b"{":
+        return LazyJSON(body, decoder)
+    return _timed_decode(body, decoder)
@@ -0,0 +1,224 @@
+"""Per-endpoint latency tracking, adaptive timeouts and hedged requests.
+
+Some OpenEMR endpoints (encounters, medical problems) are usually quick
+but now and then take several times longer, and because tools await
+their requests one after another, those rare slow responses decide how
+long a turn takes. The slowness usually belongs to that one request (a
+busy PHP worker, a cold query cache), not to the endpoint, so asking
+again is often faster than waiting.
+
+Concept — latency per endpoint template:
+    Requests are grouped by path with the IDs taken out
+    (/patient/{id}/allergy), so every patient's allergy lookup counts
+    toward the same distribution. LatencyTracker keeps a rolling window of
+    recent latencies per template and reports percentiles from it
+    (metrics: openemr_request_ms{endpoint}).
+
+Concept — adaptive timeouts:
+    One fixed timeout has to suit the slowest endpoint, so a hung patient
+    lookup that normally answers in 100 ms holds the turn for the full 30
+    seconds. AdaptiveTimeouts gives each endpoint OPENEMR_TIMEOUT_MULTIPLIER
+    times its own p99 instead, kept between OPENEMR_TIMEOUT_MIN and
+    OPENEMR_TIMEOUT (which is also used until an endpoint has enough
+    history). A request that times out is recorded at its timeout, so an
+    endpoint that has really slowed down pushes its p99 and its timeout up
+    rather than timing out forever. A request cut short by the turn's
+    deadline (see deadline.py) says nothing about the endpoint, so it is
+    neither recorded nor counted as a timeout. Metrics:
+    openemr_timeout_seconds{endpoint} (the learned value),
+    openemr_timeouts{endpoint}, openemr_deadline_cutoffs{endpoint}.
+
+Concept — hedging:
+    A GET is idempotent, so sending it twice is safe. HedgePolicy waits
+    until the endpoint's p95 (OPENEMR_HEDGE_PERCENTILE) has passed; if
+    there's still no response, it sends a second copy and uses whichever
+    response arrives first, cancelling the other. By construction only
+    about 1 in 20 requests gets that far, and those are exactly the ones
+    stuck in the tail.
+
+Concept — capping the extra load:
+    If OpenEMR as a whole slows down, every request would pass its p95 and
+    get hedged, doubling the load on a server that's already struggling.
+    So hedges are paid from a budget that grows by OPENEMR_HEDGE_MAX_EXTRA
+    per request (0.05: one hedge per 20 requests) and is spent one per
+    hedge. Once it's empty, requests just wait. Metrics:
+    openemr_hedges{endpoint,result=issued|won|skipped} — "won" means the
+    duplicate answered first.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import re
+from collections.abc import Awaitable, Callable
+from typing import TypeVar
+
+from agent.metrics import Histogram, metrics
+
+T = TypeVar("T")
+
+# Recent requests per endpoint used for percentiles.
+LATENCY_WINDOW = 256
+
+# Below this many samples an endpoint's percentiles aren't trusted.
+MIN_SAMPLES = 20
+
+# Percentile that adaptive timeouts are a multiple of.
+TIMEOUT_PERCENTILE = 99
+
+# Never hedge sooner than this (seconds), however fast the endpoint is.
+MIN_HEDGE_DELAY = 0.05
+
+# Most hedges that can be saved up while traffic is quiet.
+MAX_HEDGE_BUDGET = 5.0
+
+# A path segment is an ID if it contains a digit (pids, uuids, encounter
+# IDs); resource names never do.
+_ID_SEGMENT = re.compile(r"[^/]*\d[^/]*")
+
+
+def endpoint_template(endpoint: str) -> str:
+    """The endpoint with its IDs replaced by {id}, e.g. /patient/{id}/allergy."""
+    path = endpoint.split("?", 1)[0]
+    return "/".join(
+        "{id}" if _ID_SEGMENT.fullmatch(segment) else segment
+        for segment in path.split("/")
+    )
+
+
+class LatencyTracker:
+    """Rolling latency percentiles per endpoint template.
+
+    Args:
+        window: How many recent requests per template to keep.
+        min_samples: Fewer samples than this and percentile() returns None.
+    """
+
+    def __init__(
+        self, window: int = LATENCY_WINDOW, min_samples: int = MIN_SAMPLES
+    ) -> None:
+        self.window = window
+        self.min_samples = min_samples
+        self._latencies: dict[str, Histogram] = {}
+
+    def observe(self, template: str, seconds: float) -> None:
+        if template not in self._latencies:
+            self._latencies[template] = Histogram(self.window)
+        self._latencies[template].observe(seconds)
+        metrics.histogram("openemr_request_ms", endpoint=template).observe(
+            seconds * 1000
+        )
+
+    def percentile(self, template: str, q: float) -> float | None:
+        """The q-th percentile latency in seconds, or None if too few samples."""
+        latencies = self._latencies.get(template)
+        if latencies is None or len(latencies) < self.min_samples:
+            return None
+        return latencies.percentile(q)
+
+
+class AdaptiveTimeouts:
+    """Per-endpoint timeouts learned from latency (see "adaptive timeouts").
+
+    Args:
+        tracker: Where endpoint latencies come from.
+        default: Timeout for endpoints without enough history, and the
+            upper bound for learned ones.
+        minimum: Lower bound for learned timeouts.
+        multiplier: Timeout as a multiple of the endpoint's p99.
+    """
+
+    def __init__(
+        self,
+        tracker: LatencyTracker,
+        default: float,
+        minimum: float,
+        multiplier: float,
+    ) -> None:
+        self.tracker = tracker
+        self.default = default
+        self.minimum = min(minimum, default)
+        self.multiplier = multiplier
+
+    def timeout(self, template: str) -> float:
+        """Seconds to allow a request to this endpoint."""
+        latency = self.tracker.percentile(template, TIMEOUT_PERCENTILE)
+        if latency is None:
+            return self.default
+        timeout = min(max(latency * self.multiplier, self.minimum), self.default)
+        metrics.gauge("openemr_timeout_seconds", endpoint=template).set(timeout)
+        return timeout
+
+
+class HedgePolicy:
+    """Sends a second copy of slow GETs (see "hedging" above).
+
+    Args:
+        tracker: Where endpoint latencies come from.
+        percentile: Hedge once a request is slower than this percentile.
+        max_extra: Max hedges as a fraction of requests.
+    """
+
+    def __init__(
+        self, tracker: LatencyTracker, percentile: float = 95, max_extra: float = 0.05
+    ) -> None:
+        self.tracker = tracker
+        self.percentile = percentile
+        self.max_extra = max_extra
+        self._budget = 1.0
+
+    def delay(self, template: str) -> float | None:
+        """How long to wait before hedging, or None to never hedge."""
+        latency = self.tracker.percentile(template, self.percentile)
+        if latency is None:
+            return None
+        return max(latency, MIN_HEDGE_DELAY)
+
+    async def run(self, template: str, send: Callable[[], Awaitable[T]]) -> T:
+        """Call `send()`, and again if the first call is slow; first answer wins.
+
+        If one copy fails, the other is still awaited; the error is raised
+        only if both fail.
+        """
+        self._budget = min(self._budget + self.max_extra, MAX_HEDGE_BUDGET)
+        delay = self.delay(template)
+        if delay is None:
+            return await send()
+
+        primary = asyncio.ensure_future(send())
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                return primary.result()
+            if self._budget < 1:
+                metrics.counter(
+                    "openemr_hedges", endpoint=template, result="skipped"
+                ).inc()
+                return await primary
+            self._budget -= 1
+            hedge = asyncio.ensure_future(send())
+            tasks.append(hedge)
+            metrics.counter("openemr_hedges", endpoint=template, result="issued").inc()
+
+            pending = set(tasks)
+            error: BaseException | None = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    exc = task.exception()
+                    if exc is None:
+                        if task is hedge:
+                            metrics.counter(
+                                "openemr_hedges", endpoint=template, result="won"
+                            ).inc()
+                        return task.result()
+                    error = error or exc
+            assert error is not None
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
@@ -0,0 +1,366 @@
+"""Medication name normalization — map free-text titles to ingredients.
+
+OpenEMR stores medication titles as free text, so the same drug shows up
+as "Lisinopril 10mg tab", "ZESTRIL" or "lisinopril-hctz". That defeats
+caching, deduplication and interaction checks, which all need a stable
+identifier. This module maps every title to the RxNorm ingredient IDs
+(RxCUIs) it mentions, using a local lexicon of generic names, brand names
+and common synonyms.
+
+Concept — Aho-Corasick automaton:
+    Checking every lexicon term against every title one at a time costs
+    O(terms x title length). Aho-Corasick builds a prefix trie of all the
+    terms once, then adds "failure links" so a single left-to-right pass
+    over the title finds every term it contains. Lookup time is linear in
+    the length of the title (plus the number of matches), no matter how
+    large the lexicon grows.
+
+The built-in lexicon covers common outpatient medications. Deployments can
+extend it with a JSON file (see MEDICATION_LEXICON_PATH in config.py):
+
+    {
+        "ingredients": {"29046": "lisinopril"},
+        "synonyms": {"zestril": ["29046"], "zestoretic": ["29046", "5487"]}
+    }
+
+Usage:
+    lexicon = get_lexicon()
+    lexicon.normalize("ZESTRIL 10 MG tab")  # -> [Ingredient("29046", "lisinopril")]
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import re
+from collections import deque
+from collections.abc import Iterable, Mapping, Sequence
+from dataclasses import dataclass
+from pathlib import Path
+
+from agent.config import MEDICATION_LEXICON_PATH
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------------
+# Built-in lexicon
+# ---------------------------------------------------------------------------
+# Ingredient-level RxNorm concept IDs (RxCUIs) and their generic names.
+
+_BUILTIN_INGREDIENTS: dict[str, str] = {
+    "161": "acetaminophen",
+    "435": "albuterol",
+    "519": "allopurinol",
+    "596": "alprazolam",
+    "723": "amoxicillin",
+    "1191": "aspirin",
+    "1202": "atenolol",
+    "2231": "cephalexin",
+    "2551": "ciprofloxacin",
+    "2556": "citalopram",
+    "2670": "codeine",
+    "3407": "digoxin",
+    "3443": "diltiazem",
+    "3640": "doxycycline",
+    "4493": "fluoxetine",
+    "4603": "furosemide",
+    "4821": "glipizide",
+    "5487": "hydrochlorothiazide",
+    "5489": "hydrocodone",
+    "5640": "ibuprofen",
+    "6470": "lorazepam",
+    "6809": "metformin",
+    "6918": "metoprolol",
+    "7052": "morphine",
+    "7258": "naproxen",
+    "7646": "omeprazole",
+    "7804": "oxycodone",
+    "8591": "potassium chloride",
+    "8640": "prednisone",
+    "8787": "propranolol",
+    "9997": "spironolactone",
+    "10180": "sulfamethoxazole",
+    "10582": "levothyroxine",
+    "10689": "tramadol",
+    "10737": "trazodone",
+    "10829": "trimethoprim",
+    "11289": "warfarin",
+    "17767": "amlodipine",
+    "18631": "azithromycin",
+    "19831": "budesonide",
+    "20352": "carvedilol",
+    "25480": "gabapentin",
+    "29046": "lisinopril",
+    "32968": "clopidogrel",
+    "36117": "salmeterol",
+    "36437": "sertraline",
+    "36567": "simvastatin",
+    "40790": "pantoprazole",
+    "41126": "fluticasone",
+    "41493": "meloxicam",
+    "42463": "pravastatin",
+    "48203": "clavulanate",
+    "52175": "losartan",
+    "69749": "valsartan",
+    "77492": "tamsulosin",
+    "83367": "atorvastatin",
+    "88249": "montelukast",
+    "274783": "insulin glargine",
+    "301542": "rosuvastatin",
+    "321988": "escitalopram",
+    "593411": "sitagliptin",
+    "1364430": "apixaban",
+}
+
+# Brand names, abbreviations and alternate spellings. Combination products
+# map to every ingredient they contain. Generic names are added
+# automatically from _BUILTIN_INGREDIENTS, so they are not repeated here.
+_BUILTIN_SYNONYMS: dict[str, tuple[str, ...]] = {
+    "tylenol": ("161",),
+    "paracetamol": ("161",),
+    "apap": ("161",),
+    "ventolin": ("435",),
+    "proair": ("435",),
+    "salbutamol": ("435",),
+    "zyloprim": ("519",),
+    "xanax": ("596",),
+    "amoxil": ("723",),
+    "augmentin": ("723", "48203"),
+    "asa": ("1191",),
+    "bayer": ("1191",),
+    "tenormin": ("1202",),
+    "keflex": ("2231",),
+    "cipro": ("2551",),
+    "celexa": ("2556",),
+    "lanoxin": ("3407",),
+    "cardizem": ("3443",),
+    "vibramycin": ("3640",),
+    "prozac": ("4493",),
+    "lasix": ("4603",),
+    "glucotrol": ("4821",),
+    "hctz": ("5487",),
+    "microzide": ("5487",),
+    "vicodin": ("5489", "161"),
+    "norco": ("5489", "161"),
+    "advil": ("5640",),
+    "motrin": ("5640",),
+    "ativan": ("6470",),
+    "glucophage": ("6809",),
+    "lopressor": ("6918",),
+    "toprol": ("6918",),
+    "aleve": ("7258",),
+    "naprosyn": ("7258",),
+    "prilosec": ("7646",),
+    "oxycontin": ("7804",),
+    "roxicodone": ("7804",),
+    "percocet": ("7804", "161"),
+    "klor con": ("8591",),
+    "kcl": ("8591",),
+    "deltasone": ("8640",),
+    "inderal": ("8787",),
+    "aldactone": ("9997",),
+    "bactrim": ("10180", "10829"),
+    "septra": ("10180", "10829"),
+    "synthroid": ("10582",),
+    "levoxyl": ("10582",),
+    "ultram": ("10689",),
+    "desyrel": ("10737",),
+    "coumadin": ("11289",),
+    "jantoven": ("11289",),
+    "norvasc": ("17767",),
+    "zithromax": ("18631",),
+    "z pak": ("18631",),
+    "pulmicort": ("19831",),
+    "coreg": ("20352",),
+    "neurontin": ("25480",),
+    "zestril": ("29046",),
+    "prinivil": ("29046",),
+    "zestoretic": ("29046", "5487"),
+    "plavix": ("32968",),
+    "advair": ("41126", "36117"),
+    "zoloft": ("36437",),
+    "zocor": ("36567",),
+    "protonix": ("40790",),
+    "flonase": ("41126",),
+    "mobic": ("41493",),
+    "pravachol": ("42463",),
+    "cozaar": ("52175",),
+    "hyzaar": ("52175", "5487"),
+    "diovan": ("69749",),
+    "flomax": ("77492",),
+    "lipitor": ("83367",),
+    "singulair": ("88249",),
+    "lantus": ("274783",),
+    "basaglar": ("274783",),
+    "toujeo": ("274783",),
+    "crestor": ("301542",),
+    "lexapro": ("321988",),
+    "januvia": ("593411",),
+    "janumet": ("593411", "6809"),
+    "eliquis": ("1364430",),
+}
+
+# Anything that is not a letter or digit becomes a word separator, so
+# "Lisinopril-HCTZ 10/12.5mg" normalizes to "lisinopril hctz 10 12 5mg".
+_SEPARATORS = re.compile(r"[^a-z0-9]+")
+
+
+def _normalize_text(text: str) -> str:
+    """Lowercase and collapse punctuation/whitespace to single spaces."""
+    return _SEPARATORS.sub(" ", text.lower()).strip()
+
+
+@dataclass(frozen=True, slots=True)
+class Ingredient:
+    """A normalized medication ingredient.
+
+    Attributes:
+        rxcui: The RxNorm ingredient concept ID (e.g., "29046").
+        name: The generic ingredient name (e.g., "lisinopril").
+    """
+
+    rxcui: str
+    name: str
+
+
+class MedicationLexicon:
+    """Aho-Corasick matcher from medication terms to ingredients.
+
+    The automaton is stored as parallel lists indexed by state number
+    (state 0 is the root), which keeps it compact and fast to walk:
+    - _goto[s]:   outgoing character transitions from state s
+    - _fail[s]:   failure link (longest proper suffix that is also a prefix)
+    - _output[s]: (term length, ingredient IDs) for every term ending at s
+    """
+
+    def __init__(
+        self,
+        ingredients: Mapping[str, str],
+        synonyms: Mapping[str, Sequence[str]],
+    ) -> None:
+        self._ingredients = {
+            rxcui: Ingredient(rxcui=rxcui, name=name)
+            for rxcui, name in ingredients.items()
+        }
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._output: list[list[tuple[int, tuple[str, ...]]]] = [[]]
+
+        terms: dict[str, tuple[str, ...]] = {
+            _normalize_text(name): (rxcui,) for rxcui, name in ingredients.items()
+        }
+        for term, rxcuis in synonyms.items():
+            terms[_normalize_text(term)] = tuple(rxcuis)
+
+        for term, rxcuis in terms.items():
+            unknown = [r for r in rxcuis if r not in self._ingredients]
+            if not term or unknown:
+                logger.warning(
+                    "Skipping lexicon term %r (unknown IDs %s)", term, unknown
+                )
+                continue
+            self._add_term(term, rxcuis)
+        self._build_failure_links()
+
+    def __len__(self) -> int:
+        """Number of distinct ingredients in the lexicon."""
+        return len(self._ingredients)
+
+    def _add_term(self, term: str, rxcuis: tuple[str, ...]) -> None:
+        """Insert a normalized term into the trie."""
+        state = 0
+        for char in term:
+            nxt = self._goto[state].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = nxt
+        self._output[state].append((len(term), rxcuis))
+
+    def _build_failure_links(self) -> None:
+        """Compute failure links breadth-first, merging suffix outputs."""
+        queue: deque[int] = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                link = self._goto[fallback].get(char, 0)
+                self._fail[nxt] = link if link != nxt else 0
+                self._output[nxt].extend(self._output[self._fail[nxt]])
+
+    def find(self, text: str) -> list[Ingredient]:
+        """Return every ingredient mentioned in text, in order of appearance.
+
+        Only whole-word matches count, so "asa" does not match inside
+        "Flomax-asap". Duplicates are removed.
+        """
+        normalized = _normalize_text(text)
+        found: dict[str, Ingredient] = {}
+        state = 0
+        last = len(normalized) - 1
+        for pos, char in enumerate(normalized):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            if not self._output[state] or (pos < last and normalized[pos + 1] != " "):
+                continue
+            for length, rxcuis in self._output[state]:
+                start = pos - length + 1
+                if start > 0 and normalized[start - 1] != " ":
+                    continue
+                for rxcui in rxcuis:
+                    found.setdefault(rxcui, self._ingredients[rxcui])
+        return list(found.values())
+
+    def normalize(self, title: str) -> list[Ingredient]:
+        """Normalize a free-text medication title to its ingredients.
+
+        Alias for find(), named for the common use case.
+        """
+        return self.find(title)
+
+    @classmethod
+    def from_sources(cls, extra_paths: Iterable[str | Path] = ()) -> MedicationLexicon:
+        """Build a lexicon from the built-in table plus optional JSON files.
+
+        Args:
+            extra_paths: JSON files with "ingredients" and "synonyms" keys
+                (see the module docstring). Later files win on conflicts.
+                A file that is missing or malformed is logged and skipped,
+                so medication lookups keep working with the rest.
+        """
+        ingredients = dict(_BUILTIN_INGREDIENTS)
+        synonyms: dict[str, Sequence[str]] = dict(_BUILTIN_SYNONYMS)
+        for path in extra_paths:
+            try:
+                data = json.loads(Path(path).read_text(encoding="utf-8"))
+                if not isinstance(data, dict):
+                    raise ValueError("expected a JSON object")
+            except (OSError, ValueError) as exc:
+                logger.warning("Ignoring medication lexicon file %s: %s", path, exc)
+                continue
+            ingredients.update(data.get("ingredients", {}))
+            synonyms.update(data.get("synonyms", {}))
+        return cls(ingredients, synonyms)
+
+
+# --- Module-level singleton ---
+# Building the automaton takes a few milliseconds, so we do it once on
+# first use and share it across all tool calls.
+
+_lexicon: MedicationLexicon | None = None
+
+
+def get_lexicon() -> MedicationLexicon:
+    """Get or build the shared MedicationLexicon."""
+    global _lexicon  # noqa: PLW0603
+    if _lexicon is None:
+        paths = [MEDICATION_LEXICON_PATH] if MEDICATION_LEXICON_PATH else []
+        _lexicon = MedicationLexicon.from_sources(paths)
+    return _lexicon
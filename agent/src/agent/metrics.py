@@ -0,0 +1,164 @@
+"""In-process metrics — counters, gauges and latency histograms.
+
+A tiny metrics registry so each part of the agent can record what it's
+doing (tokens per tool call, cache hits, model latency, ...) without
+pulling in a metrics library. Everything is exposed as JSON at
+GET /agent/metrics.
+
+Concept — labels:
+    A metric name plus a set of labels identifies one series, e.g.
+    `tool_output_tokens{tool=get_encounters}`. Labels let one metric
+    name cover many tools/endpoints/models while still being reported
+    separately.
+
+Histograms keep a bounded window of recent observations and report
+count, sum, and p50/p95/p99/max over that window. This is plenty for
+tuning and dashboards, and memory stays constant no matter how long the
+process runs.
+
+Usage:
+    from agent.metrics import metrics
+
+    metrics.counter("cache_hits", backend="sqlite").inc()
+    metrics.histogram("tool_output_tokens", tool="get_encounters").observe(812)
+"""
+
+from __future__ import annotations
+
+import math
+from collections import deque
+from typing import Any
+
+# How many recent observations each histogram keeps for percentiles.
+HISTOGRAM_WINDOW = 1024
+
+
+def _series_key(name: str, labels: dict[str, str]) -> str:
+    """Render a series name like `name{a=1,b=2}` (labels sorted)."""
+    if not labels:
+        return name
+    inner = ",".join(f"{k}={v}" for k, v in sorted(labels.items()))
+    return f"{name}{{{inner}}}"
+
+
+def _pick(ordered: list[float], q: float) -> float:
+    """Nearest-rank q-th percentile of an already sorted list."""
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+class Counter:
+    """A monotonically increasing count."""
+
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class Gauge:
+    """A value that can go up and down (e.g., current queue depth)."""
+
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+
+class Histogram:
+    """Distribution of observed values over a rolling window."""
+
+    __slots__ = ("count", "total", "_window")
+
+    def __init__(self, window: int = HISTOGRAM_WINDOW) -> None:
+        self.count = 0
+        self.total = 0.0
+        self._window: deque[float] = deque(maxlen=window)
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self._window.append(value)
+
+    def percentile(self, q: float) -> float:
+        """The q-th percentile (0-100) of the window, or 0.0 when empty."""
+        if not self._window:
+            return 0.0
+        return _pick(sorted(self._window), q)
+
+    def __len__(self) -> int:
+        """Number of observations currently in the window."""
+        return len(self._window)
+
+    def snapshot(self) -> dict[str, float]:
+        ordered = sorted(self._window)
+        if not ordered:
+            return {"count": self.count, "sum": self.total}
+        return {
+            "count": self.count,
+            "sum": round(self.total, 3),
+            "p50": _pick(ordered, 50),
+            "p95": _pick(ordered, 95),
+            "p99": _pick(ordered, 99),
+            "max": ordered[-1],
+        }
+
+
+class MetricsRegistry:
+    """Holds every metric series, created on first use."""
+
+    def __init__(self) -> None:
+        self._counters: dict[str, Counter] = {}
+        self._gauges: dict[str, Gauge] = {}
+        self._histograms: dict[str, Histogram] = {}
+
+    def counter(self, name: str, **labels: str) -> Counter:
+        key = _series_key(name, labels)
+        if key not in self._counters:
+            self._counters[key] = Counter()
+        return self._counters[key]
+
+    def gauge(self, name: str, **labels: str) -> Gauge:
+        key = _series_key(name, labels)
+        if key not in self._gauges:
+            self._gauges[key] = Gauge()
+        return self._gauges[key]
+
+    def histogram(self, name: str, **labels: str) -> Histogram:
+        key = _series_key(name, labels)
+        if key not in self._histograms:
+            self._histograms[key] = Histogram()
+        return self._histograms[key]
+
+    def snapshot(self) -> dict[str, Any]:
+        """All series as plain JSON-serializable data."""
+        return {
+            "counters": {k: c.value for k, c in sorted(self._counters.items())},
+            "gauges": {k: g.value for k, g in sorted(self._gauges.items())},
+            "histograms": {
+                k: h.snapshot() for k, h in sorted(self._histograms.items())
+            },
+        }
+
+    def reset(self) -> None:
+        """Drop every series (used by tests)."""
+        self._counters.clear()
+        self._gauges.clear()
+        self._histograms.clear()
+
+
+# --- Module-level singleton ---
+# One registry for the whole process, like the shared OpenEMR client.
+
+metrics = MetricsRegistry()
@@ -0,0 +1,298 @@
+"""Per-step model routing: a fast model for planning, a strong one for synthesis.
+
+A ReAct turn is a series of LLM steps. Most of them are small decisions —
+"call patient_search", "now call get_allergies with this uuid" — that a
+fast model makes as well as a large one, in a fraction of the time. Only
+the final answer to a question that needs reasoning ("summarize", "is
+this trending up?", an answer drawn from many tool results) benefits from
+the stronger model.
+
+Concept — dynamic model:
+    create_react_agent accepts a callable instead of a model. LangGraph
+    calls it before every LLM step with the graph state, and uses whatever
+    model it returns for that step. ModelRouter is that callable: it looks
+    at the current turn and picks "fast" or "strong".
+
+Concept — validate, then escalate:
+    A fast step is checked before LangGraph sees it. The step is redone
+    with the strong model if the fast model raised, returned nothing, or
+    called a tool wrongly: an unknown tool, arguments that don't match the
+    tool's schema, a pid where a uuid belongs (or the reverse), or a
+    patient ID that appears nowhere in the conversation (an invented ID).
+    A slip therefore costs one extra call instead of a wrong answer.
+
+Routing is off unless ANTHROPIC_FAST_MODEL is set; every step then uses
+ANTHROPIC_MODEL. Either way each step records per-model latency and token
+metrics (llm_step_ms, llm_tokens), which is what the split is tuned with.
+
+The router also decides which tools each step is offered (see
+tool_selection.py): a dynamic model gets no automatic tool binding from
+LangGraph, so the router binds the selected subset itself, caching one
+bound model per (model, subset).
+
+Every call waits its turn in the process-wide LLMLimiter first (see
+ratelimit.py), so bursts queue up fairly instead of hitting the
+provider's rate limits.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+import time
+from collections.abc import Callable, Mapping, Sequence
+from typing import TYPE_CHECKING, Any, cast
+
+from pydantic import BaseModel
+
+from agent.config import (
+    AGENT_FAST_MODEL_MAX_TOOL_RESULTS,
+    AGENT_TOOL_SELECTION,
+    ANTHROPIC_API_KEY,
+)
+from agent.metrics import metrics
+from agent.prefetch import current_session
+from agent.ratelimit import LLMLimiter, llm_limiter, retry_delay
+from agent.tokens import estimate_tokens
+from agent.tool_selection import record_selection, select_tools
+from agent.verification.claims import message_text
+
+if TYPE_CHECKING:
+    from langchain_core.language_models import BaseChatModel
+    from langchain_core.messages import AIMessage, BaseMessage
+    from langchain_core.runnables import Runnable
+    from langchain_core.tools import BaseTool
+
+logger = logging.getLogger(__name__)
+
+# Questions that need reasoning over the data rather than reporting it.
+SYNTHESIS = re.compile(
+    r"\b(?:summar\w*|overview|compare|comparison|trend\w*|why|explain|"
+    r"interpret\w*|assess\w*|recommend\w*|should|risks?|interact\w*|"
+    r"changed?|differen\w*)\b",
+    re.IGNORECASE,
+)
+
+# (messages, all tool names) -> the names to offer, or None for all.
+ToolSelector = Callable[[Sequence[Any], Sequence[str]], tuple[str, ...] | None]
+
+# A numeric pid (what patient_id takes); uuids are never all digits.
+_PID = re.compile(r"\d+")
+
+
+class ModelRouter:
+    """Chooses the model for each agent step (pass to create_react_agent).
+
+    Args:
+        strong: The default chat model (tools are bound per step).
+        fast: The fast chat model, or None to disable routing.
+        tools: The agent's full tool catalog.
+        strong_name: Model name used in metrics.
+        fast_name: Model name used in metrics.
+        max_fast_tool_results: Once a turn has more tool results than
+            this, the answer is written by the strong model.
+        select: Picks the tool names for a step (None = all tools), e.g.
+            tool_selection.select_tools. None offers every tool every step.
+        limiter: Request/token budget every call waits for (defaults to
+            the process-wide one).
+    """
+
+    def __init__(
+        self,
+        strong: BaseChatModel,
+        fast: BaseChatModel | None = None,
+        *,
+        tools: Sequence[BaseTool] = (),
+        strong_name: str = "strong",
+        fast_name: str = "fast",
+        max_fast_tool_results: int = AGENT_FAST_MODEL_MAX_TOOL_RESULTS,
+        select: ToolSelector | None = None,
+        limiter: LLMLimiter | None = None,
+    ) -> None:
+        self.strong = strong
+        self.fast = fast
+        self.strong_name = strong_name
+        self.fast_name = fast_name
+        self.max_fast_tool_results = max_fast_tool_results
+        self.select = select
+        self.limiter = limiter or llm_limiter
+        self._tools = {tool.name: tool for tool in tools}
+        self._bound: dict[tuple[str, tuple[str, ...] | None], Runnable[Any, Any]] = {}
+
+    def choose(self, messages: Sequence[BaseMessage]) -> str:
+        """Pick "fast" or "strong" for the next step of the conversation."""
+        if self.fast is None:
+            return "strong"
+        question, turn = _current_turn(messages)
+        tool_results = sum(1 for m in turn if m.type == "tool")
+        if tool_results == 0:
+            return "fast"  # first step of a turn: pick the tools to call
+        if tool_results > self.max_fast_tool_results or SYNTHESIS.search(question):
+            return "strong"
+        return "fast"
+
+    def __call__(self, state: Mapping[str, Any], runtime: Any) -> Runnable[Any, Any]:
+        """LangGraph's dynamic-model hook: the model for this step."""
+        from langchain_core.runnables import RunnableLambda
+
+        messages = state["messages"]
+        role = self.choose(messages)
+        names = self.select(messages, tuple(self._tools)) if self.select else None
+        tool_tokens = record_selection(tuple(self._tools.values()), names)
+
+        async def step(prompt: Any, config: Any = None) -> AIMessage:
+            call = (names, tool_tokens, prompt, config)
+            if role == "strong":
+                return await self._invoke("strong", *call)
+            return await self._fast_step(messages, *call)
+
+        return RunnableLambda(step, name=f"model_{role}")
+
+    def _model(self, role: str, names: tuple[str, ...] | None) -> Runnable[Any, Any]:
+        """The role's model with the selected tools bound (cached)."""
+        key = (role, names)
+        if key not in self._bound:
+            model = self.fast if role == "fast" else self.strong
+            assert model is not None
+            tools = [
+                t for t in self._tools.values() if names is None or t.name in names
+            ]
+            self._bound[key] = model.bind_tools(tools)
+        return self._bound[key]
+
+    async def _fast_step(
+        self,
+        messages: Sequence[BaseMessage],
+        names: tuple[str, ...] | None,
+        tool_tokens: int,
+        prompt: Any,
+        config: Any,
+    ) -> AIMessage:
+        reason: str | None
+        response: AIMessage | None
+        try:
+            response = await self._invoke("fast", names, tool_tokens, prompt, config)
+        except Exception as exc:  # API error, overload, timeout, ...
+            reason, response = "error", None
+            logger.warning("Fast model failed, escalating: %s", exc)
+        else:
+            reason = self.validate(response, messages)
+            if reason is None:
+                return response
+        logger.info("Escalating step to %s: %s", self.strong_name, reason)
+        metrics.counter("model_escalations", reason=reason).inc()
+        return await self._invoke("strong", names, tool_tokens, prompt, config)
+
+    def validate(
+        self, response: AIMessage, messages: Sequence[BaseMessage]
+    ) -> str | None:
+        """Why a fast-model step must be redone, or None if it's usable."""
+        calls = getattr(response, "tool_calls", None) or []
+        if not calls:
+            return None if message_text(response).strip() else "empty"
+        seen = "\n".join(message_text(m) for m in messages)
+        for call in calls:
+            tool = self._tools.get(call["name"])
+            if tool is None:
+                return "unknown_tool"
+            schema = tool.args_schema
+            if isinstance(schema, type) and issubclass(schema, BaseModel):
+                try:
+                    schema.model_validate(call["args"])
+                except Exception:  # pydantic.ValidationError
+                    return "bad_args"
+            for arg, value in call["args"].items():
+                if arg not in ("patient_id", "patient_uuid"):
+                    continue
+                value = str(value)
+                if (arg == "patient_id") != bool(_PID.fullmatch(value)):
+                    return "wrong_id"
+                if value not in seen:
+                    return "unseen_id"
+        return None
+
+    async def _invoke(
+        self,
+        role: str,
+        names: tuple[str, ...] | None,
+        tool_tokens: int,
+        prompt: Any,
+        config: Any,
+    ) -> AIMessage:
+        name = self.fast_name if role == "fast" else self.strong_name
+        cost = await self.limiter.acquire(
+            current_session.get(), _prompt_tokens(prompt) + tool_tokens
+        )
+        started = time.perf_counter()
+        try:
+            response = cast(
+                "AIMessage", await self._model(role, names).ainvoke(prompt, config)
+            )
+        except Exception as exc:
+            self.limiter.refund(cost)
+            delay = retry_delay(exc)
+            if delay is not None:  # rate limited despite the budget: back off
+                self.limiter.pause(delay or 1.0)
+            raise
+        # Split by tool set so the prefill saved by selection shows up.
+        metrics.histogram(
+            "llm_step_ms", model=name, tools="all" if names is None else "subset"
+        ).observe((time.perf_counter() - started) * 1000)
+        metrics.counter("llm_steps", model=name).inc()
+        usage = getattr(response, "usage_metadata", None) or {}
+        for kind in ("input_tokens", "output_tokens"):
+            if usage.get(kind):
+                metrics.counter("llm_tokens", model=name, kind=kind).inc(usage[kind])
+        self.limiter.settle(cost, usage)
+        return response
+
+
+def _prompt_tokens(prompt: Any) -> int:
+    """Estimated input tokens of a step's prompt (messages or a PromptValue)."""
+    messages = prompt.to_messages() if hasattr(prompt, "to_messages") else prompt
+    if isinstance(messages, str):
+        return estimate_tokens(messages)
+    return sum(estimate_tokens(message_text(m)) for m in messages)
+
+
+def _current_turn(messages: Sequence[BaseMessage]) -> tuple[str, Sequence[Any]]:
+    """The latest human question and the messages after it."""
+    for i in range(len(messages) - 1, -1, -1):
+        if messages[i].type == "human":
+            return message_text(messages[i]), messages[i + 1 :]
+    return "", messages
+
+
+def build_model_router(
+    tools: Sequence[BaseTool],
+    strong_name: str,
+    fast_name: str = "",
+    make_model: Callable[[str], BaseChatModel] | None = None,
+) -> ModelRouter:
+    """Create the chat models and wrap them in a ModelRouter.
+
+    `make_model(name)` builds a chat model (defaults to ChatAnthropic with
+    ANTHROPIC_API_KEY). Tool selection follows AGENT_TOOL_SELECTION.
+    """
+    make = make_model or chat_model
+    return ModelRouter(
+        make(strong_name),
+        make(fast_name) if fast_name and fast_name != strong_name else None,
+        tools=tools,
+        strong_name=strong_name,
+        fast_name=fast_name or strong_name,
+        select=select_tools if AGENT_TOOL_SELECTION else None,
+    )
+
+
+def chat_model(name: str) -> BaseChatModel:
+    """A ChatAnthropic client for model `name` (imports the SDK on first use)."""
+    from langchain_anthropic import ChatAnthropic
+    from pydantic import SecretStr
+
+    # mypy can't see Pydantic model fields as constructor kwargs, so we
+    # suppress the type error here. This works correctly at runtime.
+    return ChatAnthropic(
+        model_name=name,  # type: ignore[call-arg]
+        anthropic_api_key=SecretStr(ANTHROPIC_API_KEY),  # type: ignore[call-arg]
+    )
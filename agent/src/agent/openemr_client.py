@@ -5,6 +5,12 @@ This module provides the OpenEMRClient class, which handles:
 2. Token acquisition via the "password grant" flow
 3. Automatic token refresh when the access token expires
 4. Authenticated GET/POST requests to any OpenEMR REST API endpoint
+5. (Optional) Caching the registration and tokens on disk, so restarts
+   and new workers skip the password grant (see token_cache.py)
+6. (Optional) Caching GET responses, per process or shared by all workers
+   (see cache.py)
+7. Speculative prefetches: GETs started before anyone asks for them, handed
+   to the first get() for the same endpoint (see prefetch.py)
 
 Concept — OAuth2 Password Grant:
     Unlike the Authorization Code flow (which requires a browser redirect),
@@ -24,21 +30,48 @@ Usage:
 
 from __future__ import annotations
 
+import asyncio
 import logging
 import time
+from collections.abc import Awaitable
 from typing import Any
+from urllib.parse import urlencode
 
 import httpx
 
+from agent.cache import ResponseCache, open_cache
 from agent.config import (
+    OPENEMR_ADAPTIVE_TIMEOUTS,
     OPENEMR_BASE_URL,
+    OPENEMR_CACHE_BACKEND,
+    OPENEMR_CACHE_TTL,
     OPENEMR_CLIENT_ID,
     OPENEMR_CLIENT_SECRET,
+    OPENEMR_HEDGE,
+    OPENEMR_HEDGE_MAX_EXTRA,
+    OPENEMR_HEDGE_PERCENTILE,
+    OPENEMR_JSON_DECODER,
+    OPENEMR_JSON_LAZY,
     OPENEMR_PASSWORD,
     OPENEMR_SITE,
     OPENEMR_SSL_VERIFY,
+    OPENEMR_TIMEOUT,
+    OPENEMR_TIMEOUT_MIN,
+    OPENEMR_TIMEOUT_MULTIPLIER,
+    OPENEMR_TOKEN_CACHE_KEY,
+    OPENEMR_TOKEN_CACHE_PATH,
     OPENEMR_USERNAME,
 )
+from agent.deadline import remaining
+from agent.json_decode import decode_body, get_decoder
+from agent.latency import (
+    AdaptiveTimeouts,
+    HedgePolicy,
+    LatencyTracker,
+    endpoint_template,
+)
+from agent.metrics import metrics
+from agent.token_cache import CachedCredentials, TokenCache
 
 logger = logging.getLogger(__name__)
 
@@ -63,6 +96,11 @@ DEFAULT_SCOPES = (
     "user/insurance.read"
 )
 
+# Seconds an idle connection to OpenEMR stays open for reuse. httpx's
+# default (5s) would drop the connections opened by warm() before the
+# first real request arrives.
+KEEPALIVE_EXPIRY = 60.0
+
 
 class OpenEMRAuthError(Exception):
     """Raised when OAuth2 authentication or token refresh fails."""
@@ -102,6 +140,15 @@ class OpenEMRClient:
         password: str = OPENEMR_PASSWORD,
         verify_ssl: bool = OPENEMR_SSL_VERIFY,
         scopes: str = DEFAULT_SCOPES,
+        json_decoder: str = OPENEMR_JSON_DECODER,
+        lazy_json: bool = OPENEMR_JSON_LAZY,
+        token_cache_path: str = OPENEMR_TOKEN_CACHE_PATH,
+        token_cache_key: str = OPENEMR_TOKEN_CACHE_KEY,
+        cache_backend: str = OPENEMR_CACHE_BACKEND,
+        cache_ttl: float = OPENEMR_CACHE_TTL,
+        hedge: bool = OPENEMR_HEDGE,
+        timeout: float = OPENEMR_TIMEOUT,
+        adaptive_timeouts: bool = OPENEMR_ADAPTIVE_TIMEOUTS,
     ) -> None:
         self.base_url = base_url.rstrip("/")
         self.site = site
@@ -121,32 +168,164 @@ class OpenEMRClient:
         self._refresh_token: str = ""
         self._token_expires_at: float = 0.0  # Unix timestamp
 
+        # How API response bodies are parsed (see json_decode.py).
+        self._decode = get_decoder(json_decoder)
+        self._lazy_json = lazy_json
+
+        # Optional on-disk copy of the registration + tokens (see token_cache.py)
+        self._token_cache = (
+            TokenCache(token_cache_path, token_cache_key) if token_cache_path else None
+        )
+        # The configured registration, to fall back to if cached credentials
+        # turn out to be stale; and whether the ones in use came from the cache
+        self._configured_client = (client_id, client_secret)
+        self._from_token_cache = False
+
+        # Optional GET response cache (see cache.py)
+        self._cache: ResponseCache | None = open_cache(cache_backend)
+        self._cache_ttl = cache_ttl
+
+        # Latency per endpoint, timeouts learned from it, and optional
+        # hedging of slow GETs (see latency.py)
+        self._latency = LatencyTracker()
+        self._timeouts = AdaptiveTimeouts(
+            self._latency,
+            default=timeout,
+            minimum=OPENEMR_TIMEOUT_MIN if adaptive_timeouts else timeout,
+            multiplier=OPENEMR_TIMEOUT_MULTIPLIER,
+        )
+        self._hedge = (
+            HedgePolicy(
+                self._latency, OPENEMR_HEDGE_PERCENTILE, OPENEMR_HEDGE_MAX_EXTRA
+            )
+            if hedge
+            else None
+        )
+
+        # Speculative GETs not yet claimed by get(): cache key ->
+        # (started_at, resource label, task). See prefetch().
+        self._prefetches: dict[str, tuple[float, str, asyncio.Task[Any]]] = {}
+
         # httpx.AsyncClient is the HTTP library that actually sends requests.
         # verify=False disables SSL cert checking (needed for self-signed certs).
+        # Idle connections are kept open for KEEPALIVE_EXPIRY seconds so the
+        # next request can skip the TCP + TLS handshake.
         self._http = httpx.AsyncClient(
             verify=verify_ssl,
-            timeout=httpx.Timeout(30.0),
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(keepalive_expiry=KEEPALIVE_EXPIRY),
         )
 
     async def initialize(self) -> None:
         """Initialize the client: register (if needed) and get a token.
 
         Call this once after creating the client. It:
-        1. Registers a new OAuth2 client if no client_id is configured
-        2. Obtains an initial access token via the password grant
+        1. Restores the registration and tokens from the token cache, if any
+        2. Registers a new OAuth2 client if there is still no client_id
+        3. Obtains an access token — reusing the cached one if still valid,
+           else via the refresh token, else via the password grant
 
         Raises:
             OpenEMRAuthError: If registration or token acquisition fails.
         """
+        self._restore_cached_credentials()
         if not self.client_id:
             logger.info("No client_id configured — attempting auto-registration")
             await self._register_client()
-        await self._get_token()
+        await self._ensure_token()
+
+    async def warm(self, connections: int = 1) -> None:
+        """Open keep-alive connections to the API ahead of the first request.
+
+        Sends `connections` concurrent GET /api/version requests. Each one
+        needs its own connection, so afterwards the pool holds that many
+        open (already TLS-negotiated) connections for real requests to
+        reuse.
+
+        Raises:
+            OpenEMRAuthError: If authentication fails.
+            OpenEMRAPIError: If the API can't be reached.
+        """
+        await self._ensure_token()
+        # Straight to _request: a cache hit wouldn't open a connection.
+        await asyncio.gather(
+            *(self._request("GET", "/version") for _ in range(connections))
+        )
 
     async def close(self) -> None:
-        """Close the underlying HTTP connection pool."""
+        """Cancel pending prefetches and close the HTTP connection pool."""
+        self.cancel_prefetches(list(self._prefetches))
         await self._http.aclose()
 
+    # --- Token cache ---
+
+    def _restore_cached_credentials(self) -> bool:
+        """Adopt credentials from the token cache if they belong to us.
+
+        Cached credentials are used only if they were issued for the same
+        server, site and user, and for the configured client_id (or any
+        auto-registered client when none is configured). A cached access
+        token is only adopted if it is newer than the one we hold.
+
+        Returns:
+            True if anything was restored.
+        """
+        if self._token_cache is None:
+            return False
+        cached = self._token_cache.load()
+        if cached is None:
+            return False
+        if (cached.base_url, cached.site, cached.username) != (
+            self.base_url,
+            self.site,
+            self.username,
+        ):
+            return False
+        if self.client_id and cached.client_id != self.client_id:
+            return False
+        if self._access_token and cached.expires_at <= self._token_expires_at:
+            return False  # ours is at least as fresh
+
+        self.client_id = cached.client_id
+        self.client_secret = cached.client_secret
+        self._access_token = cached.access_token
+        self._refresh_token = cached.refresh_token
+        self._token_expires_at = cached.expires_at
+        self._from_token_cache = True
+        logger.info("Restored OAuth2 credentials from token cache")
+        return True
+
+    def _forget_cached_credentials(self) -> None:
+        """Drop credentials restored from the token cache, and the cache file.
+
+        Back to the configured client_id (or none, to register again) and
+        no tokens.
+        """
+        if self._token_cache is not None:
+            self._token_cache.clear()
+        self.client_id, self.client_secret = self._configured_client
+        self._access_token = ""
+        self._refresh_token = ""
+        self._token_expires_at = 0.0
+        self._from_token_cache = False
+
+    def _save_cached_credentials(self) -> None:
+        """Write the current registration and tokens to the token cache."""
+        if self._token_cache is None:
+            return
+        self._token_cache.save(
+            CachedCredentials(
+                base_url=self.base_url,
+                site=self.site,
+                username=self.username,
+                client_id=self.client_id,
+                client_secret=self.client_secret,
+                access_token=self._access_token,
+                refresh_token=self._refresh_token,
+                expires_at=self._token_expires_at,
+            )
+        )
+
     # --- OAuth2 Methods ---
 
     async def _register_client(self) -> None:
@@ -187,6 +366,8 @@ class OpenEMRClient:
         data = response.json()
         self.client_id = data["client_id"]
         self.client_secret = data.get("client_secret", "")
+        self._from_token_cache = False
+        self._save_cached_credentials()
         logger.info(
             "Registered OAuth2 client: %s (NOTE: may need manual "
             "approval in OpenEMR admin UI at Admin > System > API Clients)",
@@ -278,20 +459,57 @@ class OpenEMRClient:
         # This prevents requests from failing due to clock drift or latency.
         self._token_expires_at = time.time() + expires_in - 60
         logger.debug("Token acquired, expires in %d seconds", expires_in)
+        self._save_cached_credentials()
 
     async def _ensure_token(self) -> None:
         """Ensure we have a valid (non-expired) access token.
 
         Called automatically before every API request. If the token
         has expired (or will expire within 60 seconds), refreshes it.
+
+        Before refreshing, re-reads the token cache: another worker may
+        already have refreshed (which revokes the refresh token we hold).
         """
         if not self._access_token or time.time() >= self._token_expires_at:
-            if self._refresh_token:
+            if (
+                self._restore_cached_credentials()
+                and time.time() < self._token_expires_at
+            ):
+                return
+            await self._authenticate()
+
+    async def _authenticate(self, refresh: bool = True) -> None:
+        """Get a new access token: refresh grant if we can, else password.
+
+        If OpenEMR rejects credentials restored from the token cache (the
+        server was reset, or the client was revoked), they'd be rejected
+        forever: the cache is cleared and authentication starts over once —
+        registering a new client if the cached one was auto-registered.
+
+        Args:
+            refresh: Try the refresh token first (if we have one).
+
+        Raises:
+            OpenEMRAuthError: If authentication fails.
+        """
+        try:
+            if refresh and self._refresh_token:
                 logger.info("Access token expired — refreshing")
                 await self._refresh_token_grant()
             else:
                 logger.info("No token — authenticating")
                 await self._get_token()
+        except OpenEMRAuthError:
+            if not self._from_token_cache:
+                raise
+            logger.warning(
+                "Cached OAuth2 credentials were rejected — clearing the token "
+                "cache and authenticating from scratch"
+            )
+            self._forget_cached_credentials()
+            if not self.client_id:
+                await self._register_client()
+            await self._get_token()
 
     # --- API Request Methods ---
 
@@ -307,6 +525,9 @@ class OpenEMRClient:
                 Appended to the api_base URL automatically.
             params: Optional query parameters (e.g., {"fname": "Phil"}).
 
+        Successful responses are served from the response cache (if one is
+        configured) for up to cache_ttl seconds.
+
         Returns:
             The JSON response body (usually a dict or list).
 
@@ -314,7 +535,140 @@ class OpenEMRClient:
             OpenEMRAuthError: If authentication/token refresh fails.
             OpenEMRAPIError: If the API returns an error status code.
         """
-        return await self._request("GET", endpoint, params=params)
+        key = self._cache_key(endpoint, params)
+        prefetched = self._claim_prefetch(key)
+        if prefetched is not None:
+            try:
+                return await prefetched
+            except (OpenEMRAuthError, OpenEMRAPIError) as exc:
+                logger.debug("Prefetch of %s failed, fetching again: %s", endpoint, exc)
+
+        if self._cache is None:
+            return await self._request("GET", endpoint, params=params)
+
+        body = self._cache.get(key)
+        result = "hit" if body is not None else "miss"
+        metrics.counter(
+            "openemr_cache_requests", backend=self._cache.name, result=result
+        ).inc()
+        if body is not None:
+            return decode_body(body, self._decode, lazy=self._lazy_json)
+        return await self._request("GET", endpoint, params=params, cache_key=key)
+
+    def _cache_key(self, endpoint: str, params: dict[str, Any] | None) -> str:
+        """Cache key: server + user + path + sorted query string.
+
+        Including the user keeps cached data from leaking between
+        identities that share the same cache file.
+        """
+        query = urlencode(sorted((params or {}).items()))
+        return f"{self.api_base}|{self.username}|{endpoint}?{query}"
+
+    @property
+    def caching(self) -> bool:
+        """Whether GET responses are cached (a cache backend is configured)."""
+        return self._cache is not None
+
+    def is_cached(self, endpoint: str, params: dict[str, Any] | None = None) -> bool:
+        """Whether a fresh response for this GET is in the response cache."""
+        if self._cache is None:
+            return False
+        return self._cache.get(self._cache_key(endpoint, params)) is not None
+
+    async def prefill(
+        self,
+        endpoint: str,
+        params: dict[str, Any] | None = None,
+        ttl: float | None = None,
+    ) -> Any:
+        """Fetch a GET response into the cache ahead of need (see prewarm.py).
+
+        Always sends the request (no cache lookup) and stores the body for
+        `ttl` seconds instead of the default cache_ttl.
+
+        Returns:
+            The decoded response body.
+
+        Raises:
+            OpenEMRAuthError: If authentication/token refresh fails.
+            OpenEMRAPIError: If the API returns an error status code.
+        """
+        return await self._request(
+            "GET",
+            endpoint,
+            params=params,
+            cache_key=self._cache_key(endpoint, params),
+            cache_ttl=ttl,
+        )
+
+    # --- Speculative prefetch ---
+
+    def prefetch(self, endpoint: str, resource: str = "") -> str | None:
+        """Start a GET in the background for a get() that will probably follow.
+
+        The next get() of the same endpoint takes over the request —
+        awaiting it if it's still in flight — instead of sending its own.
+        With a response cache the body is also stored there, so other
+        workers can hit it too. Unclaimed prefetches expire after
+        cache_ttl.
+
+        Args:
+            endpoint: API path, exactly as the tool will request it.
+            resource: Label for the openemr_prefetch metrics (e.g.,
+                "allergies").
+
+        Returns:
+            The prefetch's key (for cancel_prefetches()), or None if the
+            response is already cached or being prefetched.
+        """
+        self._expire_prefetches()
+        key = self._cache_key(endpoint, None)
+        if key in self._prefetches:
+            return None
+        if self._cache is not None and self._cache.get(key) is not None:
+            return None
+        task = asyncio.create_task(self._request("GET", endpoint, cache_key=key))
+        # A failed prefetch is simply refetched by get(); don't log it as
+        # "exception never retrieved" if nobody claims it.
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._prefetches[key] = (time.monotonic(), resource, task)
+        metrics.counter("openemr_prefetch", resource=resource, result="started").inc()
+        return key
+
+    def cancel_prefetches(self, keys: list[str]) -> None:
+        """Cancel prefetches that haven't been claimed by a get() yet."""
+        for key in keys:
+            entry = self._prefetches.pop(key, None)
+            if entry is None:
+                continue
+            _, resource, task = entry
+            task.cancel()
+            metrics.counter(
+                "openemr_prefetch", resource=resource, result="cancelled"
+            ).inc()
+
+    def _claim_prefetch(self, key: str) -> asyncio.Task[Any] | None:
+        """Take the prefetch for `key`, if one is pending and usable."""
+        self._expire_prefetches()
+        entry = self._prefetches.pop(key, None)
+        if entry is None:
+            return None
+        _, resource, task = entry
+        if task.cancelled():
+            return None
+        metrics.counter("openemr_prefetch", resource=resource, result="used").inc()
+        return task
+
+    def _expire_prefetches(self) -> None:
+        """Drop prefetches nobody claimed within cache_ttl."""
+        cutoff = time.monotonic() - self._cache_ttl
+        for key, (started_at, resource, task) in list(self._prefetches.items()):
+            if started_at < cutoff:
+                del self._prefetches[key]
+                task.cancel()  # no-op if it already finished
+                metrics.counter(
+                    "openemr_prefetch", resource=resource, result="expired"
+                ).inc()
 
     async def post(
         self,
@@ -342,6 +696,8 @@ class OpenEMRClient:
         endpoint: str,
         params: dict[str, Any] | None = None,
         json_data: dict[str, Any] | None = None,
+        cache_key: str | None = None,
+        cache_ttl: float | None = None,
     ) -> Any:
         """Send an authenticated request to the OpenEMR API.
 
@@ -351,15 +707,27 @@ class OpenEMRClient:
         2. Setting the Authorization: Bearer header
         3. Retrying once on 401 (in case the token was revoked server-side)
         4. Raising clear errors for non-2xx responses
+        5. A timeout learned from the endpoint's recent latency (see
+           latency.py)
+        6. Keeping within the current turn's deadline (see deadline.py):
+           the timeout is shortened to the time left, and no request is
+           sent once it has run out
+        7. Recording latency per endpoint and, if enabled, hedging slow
+           GETs (see latency.py)
 
         Args:
             method: HTTP method ("GET" or "POST").
             endpoint: API path relative to api_base.
             params: Query parameters for GET requests.
             json_data: JSON body for POST requests.
+            cache_key: If set, a successful response body is stored in the
+                response cache under this key.
+            cache_ttl: Seconds to keep it there (default: the client's
+                cache_ttl).
 
         Returns:
-            The parsed JSON response.
+            The parsed JSON response. With lazy_json enabled, JSON objects
+            come back as a LazyJSON mapping that parses on first access.
 
         Raises:
             OpenEMRAuthError: If token management fails.
@@ -372,34 +740,66 @@ class OpenEMRClient:
             "Authorization": f"Bearer {self._access_token}",
             "Accept": "application/json",
         }
-
-        try:
-            response = await self._http.request(
+        template = endpoint_template(endpoint)
+        timeout = self._timeouts.timeout(template)
+        left = remaining()
+        cut_by_deadline = False  # the deadline, not the learned timeout, binds
+        if left is not None:
+            if left <= 0:
+                raise OpenEMRAPIError(
+                    status_code=0, detail=f"Turn deadline passed before {endpoint}"
+                )
+            cut_by_deadline = left < timeout
+            timeout = min(timeout, left)
+
+        def send() -> Awaitable[httpx.Response]:
+            return self._http.request(
                 method,
                 url,
                 headers=headers,
                 params=params,
                 json=json_data,
+                timeout=timeout,
             )
+
+        started = time.perf_counter()
+        try:
+            if self._hedge is not None and method == "GET":
+                response = await self._hedge.run(template, send)
+            else:
+                response = await send()
+        except httpx.TimeoutException as exc:
+            if cut_by_deadline:
+                # Not the endpoint's latency: keep it out of the learned
+                # timeouts and hedge delays.
+                metrics.counter("openemr_deadline_cutoffs", endpoint=template).inc()
+                raise OpenEMRAPIError(
+                    status_code=0,
+                    detail=f"Request to {url} stopped at the turn deadline "
+                    f"after {timeout:.1f}s",
+                ) from exc
+            # Recorded at the timeout, so a slowed-down endpoint's timeout grows
+            self._latency.observe(template, time.perf_counter() - started)
+            metrics.counter("openemr_timeouts", endpoint=template).inc()
+            raise OpenEMRAPIError(
+                status_code=0,
+                detail=f"Request to {url} timed out after {timeout:.1f}s",
+            ) from exc
         except httpx.HTTPError as exc:
             raise OpenEMRAPIError(
                 status_code=0,
                 detail=f"Request to {url} failed: {exc}",
             ) from exc
 
+        self._latency.observe(template, time.perf_counter() - started)
+
         # If we get a 401, the token might have been revoked server-side.
         # Try re-authenticating once before giving up.
         if response.status_code == 401:
             logger.warning("Got 401 — retrying with fresh token")
-            await self._get_token()
+            await self._authenticate(refresh=False)
             headers["Authorization"] = f"Bearer {self._access_token}"
-            response = await self._http.request(
-                method,
-                url,
-                headers=headers,
-                params=params,
-                json=json_data,
-            )
+            response = await send()
 
         if response.status_code >= 400:
             raise OpenEMRAPIError(
@@ -407,7 +807,11 @@ class OpenEMRClient:
                 detail=response.text,
             )
 
-        return response.json()
+        if cache_key is not None and self._cache is not None:
+            ttl = self._cache_ttl if cache_ttl is None else cache_ttl
+            self._cache.set(cache_key, response.content, ttl)
+
+        return decode_body(response.content, self._decode, lazy=self._lazy_json)
 
 
 # --- Module-level singleton ---
@@ -417,18 +821,45 @@ class OpenEMRClient:
 
 _client: OpenEMRClient | None = None
 
+# Guards creation of the singleton. Without it, concurrent first requests
+# (e.g., several tools running in parallel) would each see _client is None
+# and each create and authenticate their own client.
+_client_lock = asyncio.Lock()
+
 
 async def get_client() -> OpenEMRClient:
     """Get or create the shared OpenEMRClient singleton.
 
     The first call creates and initializes the client (including
     OAuth2 authentication). Subsequent calls return the same instance.
+    Concurrent first calls wait for the one that is initializing. If
+    initialization fails, nothing is cached and the next call retries.
 
     Returns:
         The initialized OpenEMRClient instance.
     """
     global _client  # noqa: PLW0603
-    if _client is None:
-        _client = OpenEMRClient()
-        await _client.initialize()
+    if _client is not None:
+        return _client
+    async with _client_lock:
+        if _client is None:
+            client = OpenEMRClient()
+            try:
+                await client.initialize()
+            except BaseException:
+                await client.close()
+                raise
+            _client = client
     return _client
+
+
+async def close_client() -> None:
+    """Close the shared client (if any) and forget it.
+
+    Called on server shutdown; the next get_client() would start fresh.
+    """
+    global _client  # noqa: PLW0603
+    async with _client_lock:
+        if _client is not None:
+            await _client.close()
+            _client = None
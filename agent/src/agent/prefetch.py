@@ -0,0 +1,113 @@
+"""Speculative prefetch of the data a clinician usually asks for next.
+
+When patient_search finds exactly one patient, the next step is almost
+always "now get their allergies / medications / problems". The agent
+pays for that as one more LLM step followed by a sequential HTTP call.
+Instead, as soon as the match comes back, those resources are requested
+in the background. While the model is still deciding what to call, the
+data is already on its way, and the tool's get() picks up the pending
+request (see OpenEMRClient.prefetch).
+
+Concept — speculation has to be cheap to be wrong:
+    A prefetch nobody uses costs one OpenEMR request. So only the few
+    resources in AGENT_PREFETCH_RESOURCES are fetched, each at most once
+    per patient per session. When the session moves on to a different
+    patient, its unclaimed prefetches are cancelled. The
+    openemr_prefetch{resource,result} counters (started / used /
+    expired / cancelled) give the hit rate per resource, which is what
+    decides what belongs in the list.
+
+Concept — which session is this?:
+    Tools don't know which conversation they're serving. run_agent sets
+    the `current_session` context variable; asyncio copies context into
+    the tasks LangGraph starts for tool calls, so the hook below sees the
+    right session without threading an argument through every tool.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import logging
+from collections import OrderedDict
+from collections.abc import Sequence
+
+from agent.config import AGENT_PREFETCH_RESOURCES
+from agent.openemr_client import OpenEMRAPIError, OpenEMRAuthError, get_client
+from agent.tools.records import PatientRecord
+
+logger = logging.getLogger(__name__)
+
+# Resource name -> (ID it needs, endpoint the matching tool requests).
+# Endpoints must match the tools exactly, or get() won't find the prefetch.
+PREFETCHABLE: dict[str, tuple[str, str]] = {
+    "allergies": ("uuid", "/patient/{uuid}/allergy"),
+    "medications": ("pid", "/patient/{pid}/medication"),
+    "problems": ("uuid", "/patient/{uuid}/medical_problem"),
+    "encounters": ("uuid", "/patient/{uuid}/encounter"),
+    "appointments": ("pid", "/patient/{pid}/appointment"),
+    "insurance": ("uuid", "/patient/{uuid}/insurance"),
+    "details": ("uuid", "/patient/{uuid}"),
+}
+
+# The conversation the current turn belongs to (set by run_agent).
+current_session: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "current_session", default=""
+)
+
+
+class Prefetcher:
+    """Starts prefetches after a unique patient match, one patient per session.
+
+    Args:
+        resources: Names from PREFETCHABLE to fetch ahead.
+        max_sessions: How many sessions' prefetches to track; the least
+            recently active are forgotten (their prefetches just expire).
+    """
+
+    def __init__(self, resources: Sequence[str], max_sessions: int = 256) -> None:
+        unknown = [r for r in resources if r not in PREFETCHABLE]
+        if unknown:
+            raise ValueError(
+                f"Unknown prefetch resources {unknown}; use {sorted(PREFETCHABLE)}"
+            )
+        self.resources = tuple(resources)
+        self.max_sessions = max_sessions
+        # session -> (patient uuid, keys of its pending prefetches)
+        self._active: OrderedDict[str, tuple[str, list[str]]] = OrderedDict()
+
+    async def on_patient_match(self, patient: PatientRecord) -> None:
+        """Prefetch this patient's likely-next resources for the session."""
+        if not self.resources:
+            return
+        session = current_session.get()
+        previous = self._active.get(session)
+        if previous is not None and previous[0] == patient.uuid:
+            self._active.move_to_end(session)
+            return  # already prefetched for this patient
+
+        try:
+            client = await get_client()
+        except (OpenEMRAuthError, OpenEMRAPIError) as exc:
+            logger.debug("Skipping prefetch: %s", exc)
+            return
+        if previous is not None:
+            # The conversation moved on to another patient.
+            client.cancel_prefetches(previous[1])
+
+        ids = {"pid": patient.pid, "uuid": patient.uuid}
+        keys = []
+        for resource in self.resources:
+            id_field, endpoint = PREFETCHABLE[resource]
+            if ids[id_field] in ("", "?"):  # "?": missing from the API's row
+                continue
+            key = client.prefetch(endpoint.format(**ids), resource=resource)
+            if key is not None:
+                keys.append(key)
+
+        self._active[session] = (patient.uuid, keys)
+        self._active.move_to_end(session)
+        while len(self._active) > self.max_sessions:
+            self._active.popitem(last=False)
+
+
+prefetcher = Prefetcher(AGENT_PREFETCH_RESOURCES)
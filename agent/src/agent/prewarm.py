@@ -0,0 +1,237 @@
+"""Pre-warm the response cache for patients on today's schedule.
+
+Clinicians mostly ask about the patients they're about to see, in roughly
+schedule order. The first question about each of them pays for a cold
+OpenEMR fetch of every resource it touches. This background job reads
+today's appointments and, shortly before each slot, fetches the scheduled
+patient's chart into the response cache, so that first question is
+served locally.
+
+Concept — a moving window ahead of the schedule:
+    Every AGENT_PREWARM_INTERVAL seconds the job re-reads the schedule
+    (GET /appointment) and warms the patients whose appointment starts
+    within the next AGENT_PREWARM_LEAD_MINUTES, or started up to
+    GRACE_MINUTES ago (running late). Patients are warmed in start-time
+    order. Cancelled and no-show appointments are skipped.
+
+    For each patient it caches demographics, allergies, medications,
+    problems, encounters and the vitals of the latest encounter. Entries
+    are stored for AGENT_PREWARM_TTL seconds rather than the usual short
+    OPENEMR_CACHE_TTL: the data is fetched minutes before anyone asks,
+    so it must outlive the gap. Resources already in the cache (warmed by
+    another worker, or just queried) are not fetched again.
+
+Concept — staying out of the way:
+    Every fetch takes a token from a TokenBucket (see ratelimit.py), so
+    the job never sends more than AGENT_PREWARM_RATE requests per second
+    to OpenEMR, however many patients are on the schedule.
+
+The job needs a response cache (OPENEMR_CACHE_BACKEND=sqlite shares it
+with every worker); without one it has nowhere to put the data and does
+not start.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections.abc import Iterable
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any
+
+from agent.config import (
+    AGENT_PREWARM_INTERVAL,
+    AGENT_PREWARM_LEAD_MINUTES,
+    AGENT_PREWARM_RATE,
+    AGENT_PREWARM_TTL,
+)
+from agent.metrics import metrics
+from agent.openemr_client import (
+    OpenEMRAPIError,
+    OpenEMRAuthError,
+    OpenEMRClient,
+    get_client,
+)
+from agent.ratelimit import TokenBucket
+from agent.tools.paging import date_sort_key
+from agent.tools.records import EncounterRecord
+
+logger = logging.getLogger(__name__)
+
+# Still warm a patient whose appointment started up to this long ago.
+GRACE_MINUTES = 15
+
+# Appointment statuses (pc_apptstatus) that mean nobody is coming:
+# "x" canceled, "%" canceled < 24h, "?" no show.
+SKIP_STATUSES = frozenset({"x", "%", "?"})
+
+# Resources cached per patient: name -> endpoint. Endpoints must match the
+# tools exactly to be cache hits.
+CHART_RESOURCES: dict[str, str] = {
+    "details": "/patient/{uuid}",
+    "allergies": "/patient/{uuid}/allergy",
+    "medications": "/patient/{pid}/medication",
+    "problems": "/patient/{uuid}/medical_problem",
+    "encounters": "/patient/{uuid}/encounter",
+}
+VITALS_ENDPOINT = "/patient/{pid}/encounter/{eid}/vital"
+
+
+@dataclass(frozen=True, slots=True)
+class ScheduledVisit:
+    """One appointment on the schedule.
+
+    Attributes:
+        pid: Patient's numeric ID.
+        uuid: Patient's UUID.
+        start: When the appointment starts (server local time).
+    """
+
+    pid: str
+    uuid: str
+    start: datetime
+
+    @classmethod
+    def from_api(cls, appt: dict[str, Any]) -> ScheduledVisit | None:
+        """Parse a /appointment entry; None if unusable or not happening."""
+        if str(appt.get("pc_apptstatus", "")).strip() in SKIP_STATUSES:
+            return None
+        pid = str(appt.get("pid") or appt.get("pc_pid") or "")
+        uuid = str(appt.get("puuid") or "")
+        try:
+            start = datetime.fromisoformat(
+                f"{appt.get('pc_eventDate', '')}T{appt.get('pc_startTime') or '00:00'}"
+            )
+        except ValueError:
+            return None
+        if not pid or not uuid:
+            return None
+        return cls(pid=pid, uuid=uuid, start=start)
+
+
+def due_visits(
+    visits: Iterable[ScheduledVisit], now: datetime, lead_minutes: float
+) -> list[ScheduledVisit]:
+    """Visits starting within the lead window (or just started), in order."""
+    earliest = now - timedelta(minutes=GRACE_MINUTES)
+    latest = now + timedelta(minutes=lead_minutes)
+    due: dict[str, ScheduledVisit] = {}  # one entry per patient, earliest slot
+    for visit in sorted(visits, key=lambda v: v.start):
+        if earliest <= visit.start <= latest and visit.uuid not in due:
+            due[visit.uuid] = visit
+    return list(due.values())
+
+
+class PrewarmJob:
+    """Keeps upcoming patients' charts in the response cache.
+
+    Args:
+        client: The OpenEMR client (defaults to the shared one).
+        lead_minutes: How far ahead of a slot to warm the patient.
+        rate: Max OpenEMR requests per second.
+        ttl: Seconds warmed entries stay cached.
+        interval: Seconds between passes over the schedule.
+    """
+
+    def __init__(
+        self,
+        client: OpenEMRClient | None = None,
+        *,
+        lead_minutes: float = AGENT_PREWARM_LEAD_MINUTES,
+        rate: float = AGENT_PREWARM_RATE,
+        ttl: float = AGENT_PREWARM_TTL,
+        interval: float = AGENT_PREWARM_INTERVAL,
+    ) -> None:
+        self._client = client
+        self.lead_minutes = lead_minutes
+        self.ttl = ttl
+        self.interval = interval
+        self.bucket = TokenBucket(rate, burst=max(rate, 1.0))
+
+    async def run_forever(self) -> None:
+        """Run passes every `interval` seconds until cancelled.
+
+        A failed pass is logged and the next one runs on schedule: an
+        unexpected error (a dropped connection, an odd schedule row) must
+        not stop pre-warming for the rest of the process.
+        """
+        while True:
+            try:
+                await self.run_once()
+            except (OpenEMRAuthError, OpenEMRAPIError) as exc:
+                logger.warning("Schedule pre-warm pass failed: %s", exc)
+            except Exception:
+                logger.exception("Schedule pre-warm pass failed")
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self, now: datetime | None = None) -> int:
+        """Warm every patient due now. Returns how many requests were sent."""
+        client = self._client or await get_client()
+        if not client.caching:
+            logger.warning("Schedule pre-warm needs a response cache; skipping")
+            return 0
+        started = time.perf_counter()
+
+        await self.bucket.acquire()
+        schedule = await client.get("/appointment")
+        visits = [
+            visit
+            for appt in schedule.get("data", []) or []
+            if (visit := ScheduledVisit.from_api(appt)) is not None
+        ]
+        due = due_visits(visits, now or datetime.now(), self.lead_minutes)
+        metrics.gauge("prewarm_due_patients").set(len(due))
+
+        fetched = 0
+        for visit in due:
+            try:
+                fetched += await self.warm_patient(client, visit)
+            except OpenEMRAPIError as exc:  # one bad chart shouldn't stop the pass
+                logger.warning("Pre-warm of pid %s failed: %s", visit.pid, exc)
+
+        metrics.histogram("prewarm_pass_seconds").observe(time.perf_counter() - started)
+        if fetched:
+            logger.info("Pre-warmed %d resources for %d patients", fetched, len(due))
+        return fetched
+
+    async def warm_patient(self, client: OpenEMRClient, visit: ScheduledVisit) -> int:
+        """Cache one patient's chart. Returns how many requests were sent."""
+        ids = {"pid": visit.pid, "uuid": visit.uuid}
+        fetched = 0
+        encounters: Any = None
+        for resource, template in CHART_RESOURCES.items():
+            endpoint = template.format(**ids)
+            if client.is_cached(endpoint):
+                if resource == "encounters":
+                    encounters = await client.get(endpoint)  # a cache hit
+                continue
+            data = await self._fetch(client, endpoint, resource)
+            fetched += 1
+            if resource == "encounters":
+                encounters = data
+
+        latest = _latest_encounter(encounters)
+        if latest is not None and latest.eid != "?":
+            endpoint = VITALS_ENDPOINT.format(pid=visit.pid, eid=latest.eid)
+            if not client.is_cached(endpoint):
+                await self._fetch(client, endpoint, "vitals")
+                fetched += 1
+        return fetched
+
+    async def _fetch(self, client: OpenEMRClient, endpoint: str, resource: str) -> Any:
+        await self.bucket.acquire()
+        data = await client.prefill(endpoint, ttl=self.ttl)
+        metrics.counter("prewarm_fetches", resource=resource).inc()
+        return data
+
+
+def _latest_encounter(encounters: Any) -> EncounterRecord | None:
+    records = [
+        EncounterRecord.from_api(enc)
+        for enc in (encounters or {}).get("data", []) or []
+    ]
+    if not records:
+        return None
+    return max(records, key=lambda enc: date_sort_key(enc.date))
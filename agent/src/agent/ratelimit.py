@@ -0,0 +1,266 @@
+"""Rate limiting for work that shares a rate-limited backend.
+
+Background jobs (schedule pre-warming, batch summaries) can issue
+requests far faster than any clinician. Left unthrottled they would
+saturate OpenEMR — and the agent's own connection pool — exactly when
+interactive requests need it. The LLM provider, in turn, enforces
+requests-per-minute and tokens-per-minute limits on everything we send.
+
+Concept — token bucket:
+    The bucket holds up to `burst` tokens and refills at `rate` tokens per
+    second. Each request takes one token (or more, for bigger requests);
+    if the bucket is empty, the caller waits until enough has refilled.
+    Over any long window the caller averages `rate` requests per second,
+    while short bursts (up to `burst`) go through immediately.
+
+Waiters are served in arrival order, so one large request can't be
+starved by a stream of small ones.
+
+Concept — budgeting LLM calls (LLMLimiter):
+    The provider counts requests, input tokens and output tokens per
+    minute, and answers 429 once any of them runs out. Its SDK then
+    retries after a backoff, so under a burst every call slows down
+    unpredictably and the process swings between idle and throttled.
+    LLMLimiter keeps one bucket per limit and makes each call wait until
+    all three have room, so the process runs at the limit instead.
+
+    A call's input tokens are estimated from its prompt before it's sent
+    (see tokens.py); its output tokens aren't known yet, so a fixed
+    AGENT_LLM_OUTPUT_ESTIMATE is reserved. When the response arrives with
+    its real usage, the difference is given back (or charged); a call
+    that fails gets its token reservation back (refund()). If the
+    provider says 429 anyway (another process shares the key), every
+    queued call waits out its Retry-After.
+
+Concept — fair queuing:
+    Waiting calls are queued per session and served round-robin: one
+    call from each waiting session in turn. A batch job or a long chart
+    summary can't make a clinician's quick question wait behind all of
+    its steps.
+
+Metrics: llm_limiter_wait_ms (time calls spent queued),
+llm_limiter_throttled{budget} (calls that had to wait for that budget),
+llm_limiter_queued (calls waiting right now).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict, deque
+from collections.abc import Mapping
+
+from agent.config import (
+    AGENT_LLM_OUTPUT_ESTIMATE,
+    ANTHROPIC_INPUT_TOKENS_PER_MINUTE,
+    ANTHROPIC_OUTPUT_TOKENS_PER_MINUTE,
+    ANTHROPIC_REQUESTS_PER_MINUTE,
+)
+from agent.metrics import metrics
+
+# HTTP statuses meaning "slow down": rate limited, overloaded.
+RETRY_STATUSES = frozenset({429, 529})
+
+# LLM buckets hold this many seconds' worth of budget. Providers enforce
+# per-minute limits over shorter windows too, so a whole minute's budget
+# can't be spent in one burst.
+LLM_BURST_SECONDS = 10.0
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, at most `burst` saved up.
+
+    Args:
+        rate: Tokens added per second (must be > 0).
+        burst: Bucket capacity (defaults to max(rate, 1)). The bucket
+            starts full.
+    """
+
+    def __init__(self, rate: float, burst: float | None = None) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate, 1.0)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()  # FIFO: one waiter drains at a time
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    @property
+    def available(self) -> float:
+        """Tokens that could be taken right now (negative while in debt)."""
+        self._refill()
+        return self._tokens
+
+    async def acquire(self, tokens: float = 1.0) -> float:
+        """Wait until `tokens` are available and take them.
+
+        Requests larger than the bucket are capped at `burst`, so they
+        wait for a full bucket rather than forever.
+
+        Returns:
+            Seconds spent waiting (0.0 if the tokens were there).
+        """
+        tokens = min(tokens, self.burst)
+        started = time.monotonic()
+        waited = self._lock.locked()  # queued behind another waiter
+        async with self._lock:
+            self._refill()
+            while self._tokens < tokens:
+                waited = True
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= tokens
+        return time.monotonic() - started if waited else 0.0
+
+    def credit(self, tokens: float) -> None:
+        """Give back tokens taken in excess (negative: charge more).
+
+        Charging can push the bucket into debt, which later callers wait
+        out.
+        """
+        self._refill()
+        self._tokens = min(self.burst, self._tokens + tokens)
+
+
+def retry_delay(exc: BaseException) -> float | None:
+    """Seconds to wait before retrying after `exc`, or None if it's not
+    a rate-limit/overload error. 0 means "no Retry-After; back off"."""
+    if getattr(exc, "status_code", None) not in RETRY_STATUSES:
+        return None
+    response = getattr(exc, "response", None)
+    header = getattr(response, "headers", {}).get("retry-after")
+    if header is None:
+        return 0.0
+    try:
+        return max(float(header), 0.0)
+    except ValueError:
+        return 0.0
+
+
+class LLMLimiter:
+    """Process-wide budget for LLM requests and tokens, shared fairly.
+
+    Args:
+        requests_per_minute: Request limit (0 = unlimited).
+        input_tokens_per_minute: Input token limit (0 = unlimited).
+        output_tokens_per_minute: Output token limit (0 = unlimited).
+        output_estimate: Output tokens reserved per call until the real
+            count is known.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = 0,
+        input_tokens_per_minute: float = 0,
+        output_tokens_per_minute: float = 0,
+        output_estimate: int = AGENT_LLM_OUTPUT_ESTIMATE,
+    ) -> None:
+        limits = {
+            "requests": requests_per_minute,
+            "input_tokens": input_tokens_per_minute,
+            "output_tokens": output_tokens_per_minute,
+        }
+        self.buckets: dict[str, TokenBucket] = {
+            budget: TokenBucket(limit / 60, burst=limit / 60 * LLM_BURST_SECONDS)
+            for budget, limit in limits.items()
+            if limit > 0
+        }
+        self.output_estimate = output_estimate
+        # session -> its queued calls as (cost per budget, future), in order
+        self._waiting: OrderedDict[
+            str, deque[tuple[dict[str, float], asyncio.Future[None]]]
+        ] = OrderedDict()
+        self._dispatcher: asyncio.Task[None] | None = None
+        self._paused_until = 0.0  # monotonic; set when the provider says 429
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.buckets)
+
+    async def acquire(self, session: str, input_tokens: int) -> dict[str, float]:
+        """Wait for this session's turn and for budget for one call.
+
+        Returns:
+            The reserved cost, to pass to settle() once the call is done.
+        """
+        cost = {
+            "requests": 1.0,
+            "input_tokens": float(input_tokens),
+            "output_tokens": float(self.output_estimate),
+        }
+        if not self.enabled:
+            return cost
+        started = time.monotonic()
+        future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(session, deque()).append((cost, future))
+        self._update_queued()
+        if (
+            self._dispatcher is None
+            or self._dispatcher.done()
+            or self._dispatcher.get_loop() is not asyncio.get_running_loop()
+        ):
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        await future
+        metrics.histogram("llm_limiter_wait_ms").observe(
+            (time.monotonic() - started) * 1000
+        )
+        return cost
+
+    def settle(self, cost: Mapping[str, float], usage: Mapping[str, int]) -> None:
+        """Correct the reservation with the call's real token usage."""
+        for budget in ("input_tokens", "output_tokens"):
+            bucket = self.buckets.get(budget)
+            if bucket is not None and usage.get(budget):
+                bucket.credit(cost[budget] - usage[budget])
+
+    def refund(self, cost: Mapping[str, float]) -> None:
+        """Give back a failed call's token reservation.
+
+        The request itself stays spent: the provider counted it.
+        """
+        for budget in ("input_tokens", "output_tokens"):
+            bucket = self.buckets.get(budget)
+            if bucket is not None:
+                bucket.credit(cost[budget])
+
+    def pause(self, seconds: float) -> None:
+        """Hold every queued call for `seconds` (the provider said 429)."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        metrics.counter("llm_limiter_pauses").inc()
+
+    async def _dispatch(self) -> None:
+        """Hand out budget to queued calls, one session at a time."""
+        while self._waiting:
+            session, queue = next(iter(self._waiting.items()))
+            cost, future = queue.popleft()
+            if queue:
+                self._waiting.move_to_end(session)  # next session's turn
+            else:
+                del self._waiting[session]
+            if future.done():  # the caller gave up
+                continue
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            for budget, bucket in self.buckets.items():
+                if await bucket.acquire(cost[budget]) > 0:
+                    metrics.counter("llm_limiter_throttled", budget=budget).inc()
+            if not future.done():
+                future.set_result(None)
+            self._update_queued()
+
+    def _update_queued(self) -> None:
+        queued = sum(len(queue) for queue in self._waiting.values())
+        metrics.gauge("llm_limiter_queued").set(queued)
+
+
+llm_limiter = LLMLimiter(
+    ANTHROPIC_REQUESTS_PER_MINUTE,
+    ANTHROPIC_INPUT_TOKENS_PER_MINUTE,
+    ANTHROPIC_OUTPUT_TOKENS_PER_MINUTE,
+)
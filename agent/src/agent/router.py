@@ -0,0 +1,392 @@
+"""Fast path for formulaic questions — no LLM planning.
+
+Much of the traffic is one of a handful of shapes: "allergies for Phil
+Dixon", "meds for Smith", "when is Smith's next appointment?". For
+these the ReAct loop always makes the same plan (patient_search, then
+one fetch tool) yet still pays 2-3 LLM round trips to arrive at it.
+
+The router recognizes those shapes with a deterministic parser, calls
+the tool functions directly (search -> fetch), and answers from a
+template — or, with AGENT_FAST_PATH_PHRASING=llm, with a single LLM
+call that phrases the fetched data. Anything it isn't sure about (no
+patient named, pronouns like "his", several topics, a question that
+needs reasoning, a name that matches no one or several patients)
+returns None and goes to the full agent.
+
+Concept — same trace as the agent:
+    A routed turn is recorded as the messages the agent would have
+    produced (AI tool calls + ToolMessages + final answer). Session
+    history, the rule checks and the claim verifier then work exactly
+    as for an agent turn, and a follow-up question that does go to the
+    agent sees the patient IDs in history.
+
+Usage:
+    routed = await try_fast_path("What allergies does Phil Dixon have?")
+    if routed is not None:
+        routed.messages  # trace for the session history
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import re
+import uuid
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+from agent.config import (
+    AGENT_FAST_PATH_PHRASING,
+    ANTHROPIC_API_KEY,
+    ANTHROPIC_FAST_MODEL,
+    ANTHROPIC_MODEL,
+)
+from agent.deadline import remaining
+from agent.metrics import metrics
+from agent.model_routing import chat_model
+from agent.prefetch import current_session
+from agent.ratelimit import llm_limiter, retry_delay
+from agent.tokens import estimate_tokens
+from agent.tools.billing import get_insurance
+from agent.tools.clinical import get_allergies, get_medical_problems, get_medications
+from agent.tools.encounters import get_encounters
+from agent.tools.patient import get_patient_details, patient_search
+from agent.tools.records import PatientRecord, ToolResult
+from agent.tools.scheduling import get_appointments
+from agent.verification import DISCLAIMER
+
+if TYPE_CHECKING:
+    from langchain_core.messages import BaseMessage
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class Topic:
+    """One kind of lookup the router can answer directly.
+
+    Attributes:
+        name: Intent name used in metrics (e.g., "allergies").
+        pattern: Regex for the words that ask for it.
+        tool: Tool function that fetches it.
+        id_field: Which patient ID the tool takes ("uuid" or "pid").
+        kwargs: Extra tool arguments (e.g., sort order).
+    """
+
+    name: str
+    pattern: str
+    tool: Callable[..., Awaitable[ToolResult]]
+    id_field: str
+    kwargs: tuple[tuple[str, Any], ...] = ()
+
+
+TOPICS: tuple[Topic, ...] = (
+    Topic("allergies", r"allerg(?:y|ies)", get_allergies, "uuid"),
+    Topic(
+        "medications",
+        r"med(?:s|ication|ications)|prescriptions|drugs",
+        get_medications,
+        "pid",
+    ),
+    Topic(
+        "problems",
+        r"(?:medical |active )?problems|diagnos[ie]s|conditions|problem list",
+        get_medical_problems,
+        "uuid",
+    ),
+    Topic("encounters", r"encounters|visits|visit history", get_encounters, "uuid"),
+    Topic(
+        "next_appointment",
+        r"next appointment|upcoming appointments?",
+        get_appointments,
+        "pid",
+        (("upcoming", True), ("sort", "asc"), ("limit", 3)),
+    ),
+    Topic("appointments", r"appointments|appts", get_appointments, "pid"),
+    Topic("insurance", r"insurance(?: info(?:rmation)?)?", get_insurance, "uuid"),
+    Topic(
+        "details",
+        r"demographics|contact info(?:rmation)?|details|address|phone(?: number)?",
+        get_patient_details,
+        "uuid",
+    ),
+)
+
+_TOPIC = "|".join(f"(?:{t.pattern})" for t in TOPICS)
+# Lazy ({0,2}?) so "what meds is Phil Dixon currently taking" stops the
+# name before "currently".
+_WHO = r"pid\s*#?\s*\d+|[a-z][a-z'\-]*(?:\s+[a-z][a-z'\-]*){0,2}?"
+_LEAD = r"(?:what|which|show(?: me)?|list|get|give me|pull up|check)"
+
+# Each pattern must match the whole question (after trimming punctuation).
+_PATTERNS = tuple(
+    re.compile(p, re.IGNORECASE)
+    for p in (
+        # "allergies for Phil Dixon", "show me the current meds for pid 12"
+        rf"(?:{_LEAD}\s+)?(?:(?:are|is)\s+)?(?:the\s+)?(?:current\s+|active\s+|recent\s+)?"
+        rf"(?P<topic>{_TOPIC})\s+(?:for|of|on)\s+(?:patient\s+)?(?P<who>{_WHO})",
+        # "what allergies does Phil Dixon have", "what meds is Smith taking"
+        rf"(?:what|which)\s+(?P<topic>{_TOPIC})\s+(?:does|is|has)\s+(?:patient\s+)?"
+        rf"(?P<who>{_WHO})\s+(?:have|had|got|on|(?:currently\s+)?taking)",
+        # "when is Smith's next appointment"
+        rf"when\s+is\s+(?P<who>{_WHO})'s\s+(?P<topic>next appointment)",
+        # "Phil Dixon's allergies", "show Smith's next appointment"
+        rf"(?:{_LEAD}\s+)?(?:(?:are|is)\s+)?(?P<who>{_WHO})'s\s+(?:current\s+)?"
+        rf"(?P<topic>{_TOPIC})",
+        # "find patient Phil Dixon", "look up Dixon"
+        rf"(?:find|look\s*up|search\s+for|pull up)\s+(?:patient\s+)?(?P<who>{_WHO})",
+    )
+)
+
+# Words that mean the "name" isn't a name: pronouns and follow-ups, time
+# words ("appointments for today", "visits for last year"), conjunctions
+# and prepositions ("problems for Dixon and Smith").
+_NOT_NAMES = frozenset(
+    "he she him her his hers they them their this that the patient patients "
+    "me my our all every each same what when which who is are "
+    "today tonight tomorrow yesterday now day days week weeks month months "
+    "year years last next past previous recent recently upcoming soon ago "
+    "morning afternoon evening monday tuesday wednesday thursday friday "
+    "saturday sunday "
+    "and or nor but plus with without both either neither versus vs "
+    "for of on in at to from since before after by".split()
+)
+
+_PID = re.compile(r"pid\s*#?\s*(\d+)", re.IGNORECASE)
+
+
+@dataclass(frozen=True, slots=True)
+class Route:
+    """A parsed formulaic question.
+
+    Attributes:
+        topic: What to fetch (None = just find the patient).
+        name: Patient name to search for ("" when a pid was given).
+        pid: Numeric patient ID given directly ("" when a name was given).
+    """
+
+    topic: Topic | None
+    name: str = ""
+    pid: str = ""
+
+
+@dataclass(frozen=True, slots=True)
+class FastPathResult:
+    """A question answered without the agent.
+
+    Attributes:
+        route: What was recognized.
+        answer: The answer text.
+        messages: Agent-style trace of the turn, for session history.
+    """
+
+    route: Route
+    answer: str
+    messages: list[BaseMessage]
+
+
+def parse(message: str) -> Route | None:
+    """Recognize a formulaic lookup, or None if unsure."""
+    text = " ".join(message.strip().rstrip("?.!").split())
+    for pattern in _PATTERNS:
+        match = pattern.fullmatch(text)
+        if match is None:
+            continue
+        who = match.group("who")
+        topic_text = match.groupdict().get("topic")
+        topic = _topic_for(topic_text) if topic_text else None
+        if topic_text and topic is None:
+            return None
+        pid = _PID.fullmatch(who)
+        if pid:
+            return Route(topic, pid=pid.group(1))
+        if not _plausible_name(who):
+            return None
+        return Route(topic, name=who)
+    return None
+
+
+def _plausible_name(who: str) -> bool:
+    """Whether `who` reads as a patient name, not a topic or time phrase."""
+    words = who.lower().split()
+    if any(word in _NOT_NAMES for word in words):
+        return False
+    # "pull up allergies", "look up meds": a topic, not a patient
+    return not any(re.fullmatch(_TOPIC, text, re.IGNORECASE) for text in (who, *words))
+
+
+def _topic_for(text: str) -> Topic | None:
+    for topic in TOPICS:
+        if re.fullmatch(topic.pattern, text, re.IGNORECASE):
+            return topic
+    return None
+
+
+async def try_fast_path(message: str) -> FastPathResult | None:
+    """Answer `message` directly if it's a formulaic lookup.
+
+    Returns None (use the full agent) when the question isn't
+    recognized, when the name doesn't match exactly one patient, when a
+    pid is given instead of a name, or when a tool call fails.
+
+    A pid goes to the agent because the answer has to start with the
+    patient's name and DOB, and the API has no lookup by pid to get them.
+    Nor does a search that finds no one or several patients get answered
+    here: the name may have been misparsed, and the agent can tell.
+    """
+    route = parse(message)
+    if route is None:
+        _count(None, "fallback")
+        return None
+    if route.pid:
+        _count(route, "fallback")
+        return None
+
+    trace = _Trace(message)
+    search = await trace.call(patient_search, query=route.name)
+    patients = (
+        []
+        if search is None
+        else [r for r in search.records if isinstance(r, PatientRecord)]
+    )
+    if search is None or len(patients) != 1:
+        _count(route, "fallback")
+        return None
+    if route.topic is None:
+        _count(route, "routed")  # a plain lookup: the search is the answer
+        return trace.finish(route, search.text)
+    patient = patients[0]
+
+    patient_id = getattr(patient, route.topic.id_field)
+    id_arg = "patient_uuid" if route.topic.id_field == "uuid" else "patient_id"
+    fetched = await trace.call(
+        route.topic.tool, **{id_arg: patient_id}, **dict(route.topic.kwargs)
+    )
+    if fetched is None:
+        _count(route, "fallback")
+        return None
+
+    if AGENT_FAST_PATH_PHRASING == "llm" and ANTHROPIC_API_KEY:
+        try:
+            answer = await _phrase(message, trace.tool_texts())
+        except TimeoutError:
+            logger.info("Fast path phrasing ran out of time; using the template")
+            answer = _template(patient, fetched)
+        except Exception as exc:  # overload, rate limit, auth, ...
+            # The data is already fetched: answer with the template.
+            logger.warning("Fast path phrasing failed, using the template: %s", exc)
+            answer = _template(patient, fetched)
+    else:
+        answer = _template(patient, fetched)
+    _count(route, "routed")
+    return trace.finish(route, answer)
+
+
+def _template(patient: PatientRecord, fetched: ToolResult) -> str:
+    """The tool output, under a name + DOB header and above the disclaimer."""
+    body = f"{fetched.text}\n\n{DISCLAIMER}"
+    header = f"Patient: {patient.name} (DOB: {patient.dob}, pid: {patient.pid})"
+    return f"{header}\n\n{body}"
+
+
+def _count(route: Route | None, result: str) -> None:
+    intent = "none" if route is None or route.topic is None else route.topic.name
+    if route is not None and route.topic is None:
+        intent = "lookup"
+    metrics.counter("fast_path", intent=intent, result=result).inc()
+
+
+class _Trace:
+    """Builds the agent-style message trace while the tools run."""
+
+    def __init__(self, question: str) -> None:
+        from langchain_core.messages import HumanMessage
+
+        self.messages: list[BaseMessage] = [HumanMessage(content=question)]
+
+    async def call(
+        self, tool: Callable[..., Awaitable[ToolResult]], **args: Any
+    ) -> ToolResult | None:
+        """Run a tool and record the call; None if it returned an error."""
+        from langchain_core.messages import AIMessage, ToolMessage
+
+        call_id = f"fast_{uuid.uuid4().hex[:12]}"
+        result = await tool(**args)
+        if not result.records and result.text.startswith("Error"):
+            logger.info(
+                "Fast path %s failed, using the agent: %s", tool.__name__, result.text
+            )
+            return None
+        self.messages.append(
+            AIMessage(
+                content="",
+                tool_calls=[{"name": tool.__name__, "args": args, "id": call_id}],
+            )
+        )
+        self.messages.append(
+            ToolMessage(
+                content=result.text,
+                tool_call_id=call_id,
+                name=tool.__name__,
+                artifact=result.records,
+            )
+        )
+        return result
+
+    def tool_texts(self) -> str:
+        return "\n\n".join(str(m.content) for m in self.messages if m.type == "tool")
+
+    def finish(self, route: Route, answer: str) -> FastPathResult:
+        from langchain_core.messages import AIMessage
+
+        self.messages.append(AIMessage(content=answer))
+        return FastPathResult(route, answer, self.messages)
+
+
+# ---------------------------------------------------------------------------
+# Optional single-call phrasing
+# ---------------------------------------------------------------------------
+
+PHRASING_PROMPT = """\
+You are a clinical assistant. Answer the clinician's question using ONLY \
+the OpenEMR data below. Start by naming the patient with their date of \
+birth. Be concise; list items exactly as they appear in the data. Do not \
+add, infer, or omit clinical values."""
+
+_phrasing_model = None
+
+
+async def _phrase(question: str, data: str) -> str:
+    """One LLM call that turns the fetched data into an answer.
+
+    Like the agent's model calls, it waits for LLM budget (see
+    ratelimit.py) and stops at the turn deadline.
+
+    Raises:
+        TimeoutError: If the turn's deadline passes first.
+    """
+    global _phrasing_model  # noqa: PLW0603
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    if _phrasing_model is None:
+        # Rewording fetched data is a simple lookup: the fast model if set.
+        _phrasing_model = chat_model(ANTHROPIC_FAST_MODEL or ANTHROPIC_MODEL)
+    request = f"Question: {question}\n\nOpenEMR data:\n{data}"
+    left = remaining()
+    async with asyncio.timeout(None if left is None else max(left, 0)):
+        cost = await llm_limiter.acquire(
+            current_session.get(), estimate_tokens(PHRASING_PROMPT + request)
+        )
+        try:
+            response = await _phrasing_model.ainvoke(
+                [SystemMessage(content=PHRASING_PROMPT), HumanMessage(content=request)]
+            )
+        except Exception as exc:
+            llm_limiter.refund(cost)
+            delay = retry_delay(exc)
+            if delay is not None:  # rate limited despite the budget: back off
+                llm_limiter.pause(delay or 1.0)
+            raise
+    llm_limiter.settle(cost, getattr(response, "usage_metadata", None) or {})
+    return str(response.content)
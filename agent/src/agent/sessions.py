@@ -0,0 +1,473 @@
+"""Conversation history storage — per process or shared by all workers.
+
+A follow-up question ("what are his allergies?") only makes sense with
+the previous turns, so every chat turn loads the session's history, runs
+the agent, and stores the new messages.
+
+Two backends:
+- MemorySessionStore: a dict in this process. With several uvicorn
+  workers, a follow-up routed to a different worker finds no history.
+- SQLiteSessionStore: one file shared by every worker on the host, so
+  any worker can continue any session — no sticky sessions needed.
+
+Concept — append-only, incremental writes:
+    Histories only grow, so each message is one row keyed by
+    (session_id, seq). A turn inserts just its new messages instead of
+    rewriting the whole history, and a worker that has seen a session
+    before only reads (and decodes) the rows added since.
+
+Concept — per-session locking:
+    SQLite has no row locks, so an append opens its transaction with
+    BEGIN IMMEDIATE, which takes the write lock *before* reading the
+    session's current length. If two workers finish turns in the same
+    session at the same moment, the second waits, sees the first's
+    messages, and appends after them — neither turn is lost or
+    interleaved. The (session_id, seq) primary key guarantees no two
+    messages can ever share a slot.
+
+    Waiting for that lock (up to 10 seconds) must not stall the event
+    loop, so run_agent calls a blocking store in a worker thread; within
+    the process, a lock keeps those threads to one transaction at a time
+    on the shared connection.
+
+Concept — packing idle sessions:
+    In memory, a history is a list of LangChain message objects, and the
+    same large tool outputs (a patient's medication list, their encounter
+    history) show up again every time a turn re-fetches them. Most
+    sessions go quiet after a few questions but stay in memory. So a
+    MemorySessionStore packs sessions idle for AGENT_SESSION_PACK_AFTER_MINUTES:
+    each long tool output is stored once per content hash (shared by every
+    session and turn that returned it), and the rest of the history is
+    compressed into one zlib blob. The next load() unpacks it. Metrics:
+    session_bytes{form=unpacked|packed} per packed session and
+    sessions{state=live|packed} / session_store_packed_bytes totals.
+
+Messages are stored as compact JSON (no whitespace, no empty/default
+fields). Tool artifacts (typed records) are not stored: everything that
+reads history also understands the tool's text content.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from collections.abc import Sequence
+from dataclasses import dataclass
+from hashlib import sha256
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Protocol
+
+from agent.config import AGENT_SESSION_PACK_AFTER_MINUTES, AGENT_SESSION_PATH
+from agent.metrics import metrics
+
+if TYPE_CHECKING:
+    from langchain_core.messages import BaseMessage
+
+logger = logging.getLogger(__name__)
+
+SESSION_BACKENDS = ("memory", "sqlite")
+
+DEFAULT_SESSION_PATH = Path(tempfile.gettempdir()) / "openemr-agent-sessions.sqlite3"
+
+# Fields that are dropped from stored messages (rebuilt as defaults on load).
+_SKIPPED_FIELDS = frozenset({"type", "artifact"})
+
+
+# Tool outputs at least this long are stored once per content hash when a
+# session is packed; shorter ones are cheaper to keep inline.
+BLOB_MIN_CHARS = 256
+
+
+def _message_data(message: BaseMessage) -> dict[str, Any]:
+    data = {
+        key: value
+        for key, value in message.model_dump().items()
+        if key not in _SKIPPED_FIELDS and value not in (None, "", {}, [])
+    }
+    data["content"] = message.content  # required, even when empty
+    data["type"] = message.type
+    return data
+
+
+def _message_from_data(data: dict[str, Any]) -> BaseMessage:
+    from langchain_core.messages import messages_from_dict
+
+    return messages_from_dict([{"type": data.pop("type"), "data": data}])[0]
+
+
+def _dumps(data: dict[str, Any]) -> bytes:
+    return json.dumps(data, separators=(",", ":"), default=str).encode()
+
+
+def encode_message(message: BaseMessage) -> bytes:
+    """Serialize one message as compact JSON."""
+    return _dumps(_message_data(message))
+
+
+def decode_message(raw: bytes | str) -> BaseMessage:
+    """Rebuild a message serialized by encode_message()."""
+    return _message_from_data(json.loads(raw))
+
+
+# ---------------------------------------------------------------------------
+# Packing idle sessions
+# ---------------------------------------------------------------------------
+
+
+class BlobStore:
+    """Compressed tool outputs, stored once per content hash.
+
+    Reference-counted: a blob is dropped when the last packed session
+    that uses it is unpacked or deleted.
+    """
+
+    def __init__(self) -> None:
+        self._blobs: dict[str, list[Any]] = {}  # hash -> [compressed, refs]
+
+    def put(self, text: str) -> str:
+        raw = text.encode()
+        key = sha256(raw).hexdigest()[:32]
+        entry = self._blobs.get(key)
+        if entry is None:
+            self._blobs[key] = [zlib.compress(raw), 1]
+        else:
+            entry[1] += 1
+        return key
+
+    def get(self, key: str) -> str:
+        return zlib.decompress(self._blobs[key][0]).decode()
+
+    def release(self, key: str) -> None:
+        entry = self._blobs[key]
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self._blobs[key]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(len(compressed) for compressed, _ in self._blobs.values())
+
+    def __len__(self) -> int:
+        return len(self._blobs)
+
+
+@dataclass(frozen=True, slots=True)
+class PackedSession:
+    """One session's history in packed form.
+
+    Attributes:
+        data: zlib-compressed, newline-separated message JSON.
+        blobs: Content hashes of the tool outputs kept in the BlobStore.
+        unpacked_bytes: Size of the history serialized without packing.
+    """
+
+    data: bytes
+    blobs: tuple[str, ...]
+    unpacked_bytes: int
+
+
+def pack_messages(messages: Sequence[BaseMessage], blobs: BlobStore) -> PackedSession:
+    """Pack a history, moving long tool outputs into `blobs`."""
+    lines: list[bytes] = []
+    refs: list[str] = []
+    unpacked = 0
+    for message in messages:
+        data = _message_data(message)
+        unpacked += len(_dumps(data))
+        content = data["content"]
+        if data["type"] == "tool" and isinstance(content, str):
+            if len(content) >= BLOB_MIN_CHARS:
+                refs.append(blobs.put(content))
+                data["content"] = ""
+                data["$blob"] = refs[-1]
+        lines.append(_dumps(data))
+    return PackedSession(zlib.compress(b"\n".join(lines)), tuple(refs), unpacked)
+
+
+def unpack_messages(packed: PackedSession, blobs: BlobStore) -> list[BaseMessage]:
+    """Rebuild a packed history (the caller releases its blobs)."""
+    messages: list[BaseMessage] = []
+    for line in zlib.decompress(packed.data).split(b"\n"):
+        data = json.loads(line)
+        if "$blob" in data:
+            data["content"] = blobs.get(data.pop("$blob"))
+        messages.append(_message_from_data(data))
+    return messages
+
+
+class SessionStore(Protocol):
+    """What run_agent needs from a session backend."""
+
+    name: str
+    # True if calls do disk I/O: run_agent then makes them in a worker thread.
+    blocking: bool
+
+    def load(self, session_id: str) -> list[BaseMessage]:
+        """The session's full history (empty for a new session)."""
+        ...
+
+    def append(self, session_id: str, messages: Sequence[BaseMessage]) -> None:
+        """Add a turn's new messages to the end of the session."""
+        ...
+
+    def delete(self, session_id: str) -> None:
+        """Forget a session."""
+        ...
+
+    def close(self) -> None:
+        """Write out anything pending and release the backend (at shutdown)."""
+        ...
+
+
+class MemorySessionStore:
+    """Sessions in a dict — lost on restart, not shared between workers.
+
+    Sessions idle for `pack_after` seconds are packed (see "packing idle
+    sessions" above) and transparently unpacked on their next access.
+    Idle sessions are looked for on each access, at most once a minute.
+    """
+
+    name = "memory"
+    blocking = False
+
+    def __init__(
+        self, pack_after: float = AGENT_SESSION_PACK_AFTER_MINUTES * 60
+    ) -> None:
+        self.pack_after = pack_after  # seconds; 0 disables packing
+        self._sessions: dict[str, list[BaseMessage]] = {}
+        self._packed: dict[str, PackedSession] = {}
+        self._last_used: dict[str, float] = {}
+        self._blobs = BlobStore()
+        self._next_sweep = 0.0
+
+    def load(self, session_id: str) -> list[BaseMessage]:
+        self._touch(session_id)
+        return list(self._live(session_id))
+
+    def append(self, session_id: str, messages: Sequence[BaseMessage]) -> None:
+        self._touch(session_id)
+        self._sessions[session_id] = [*self._live(session_id), *messages]
+
+    def delete(self, session_id: str) -> None:
+        self._sessions.pop(session_id, None)
+        self._last_used.pop(session_id, None)
+        packed = self._packed.pop(session_id, None)
+        if packed is not None:
+            for key in packed.blobs:
+                self._blobs.release(key)
+        self._update_gauges()
+
+    def __contains__(self, session_id: object) -> bool:
+        return session_id in self._sessions or session_id in self._packed
+
+    def close(self) -> None:
+        """Nothing to write out: memory sessions end with the process."""
+
+    def is_packed(self, session_id: str) -> bool:
+        return session_id in self._packed
+
+    def _live(self, session_id: str) -> list[BaseMessage]:
+        """The session's messages, unpacking it first if needed."""
+        packed = self._packed.pop(session_id, None)
+        if packed is not None:
+            self._sessions[session_id] = unpack_messages(packed, self._blobs)
+            for key in packed.blobs:
+                self._blobs.release(key)
+            metrics.counter("session_unpacks").inc()
+            self._update_gauges()
+        return self._sessions.get(session_id, [])
+
+    def _touch(self, session_id: str) -> None:
+        now = time.monotonic()
+        self._last_used[session_id] = now
+        if self.pack_after > 0 and now >= self._next_sweep:
+            self._next_sweep = now + min(self.pack_after, 60.0)
+            self.pack_idle(now)
+
+    def pack_idle(self, now: float | None = None) -> int:
+        """Pack every live session idle for pack_after seconds.
+
+        Returns:
+            How many sessions were packed.
+        """
+        now = time.monotonic() if now is None else now
+        idle = [
+            session_id
+            for session_id, messages in self._sessions.items()
+            if messages
+            and now - self._last_used.get(session_id, now) >= self.pack_after
+        ]
+        for session_id in idle:
+            packed = pack_messages(self._sessions.pop(session_id), self._blobs)
+            self._packed[session_id] = packed
+            metrics.histogram("session_bytes", form="unpacked").observe(
+                packed.unpacked_bytes
+            )
+            metrics.histogram("session_bytes", form="packed").observe(
+                len(packed.data) + 32 * len(packed.blobs)
+            )
+        if idle:
+            metrics.counter("session_packs").inc(len(idle))
+            self._update_gauges()
+        return len(idle)
+
+    @property
+    def packed_bytes(self) -> int:
+        """Memory held by packed sessions plus their shared tool outputs."""
+        return sum(len(p.data) for p in self._packed.values()) + self._blobs.nbytes
+
+    def _update_gauges(self) -> None:
+        metrics.gauge("sessions", state="live").set(len(self._sessions))
+        metrics.gauge("sessions", state="packed").set(len(self._packed))
+        metrics.gauge("session_store_packed_bytes").set(self.packed_bytes)
+
+
+class SQLiteSessionStore:
+    """Sessions in a WAL-mode SQLite file shared by every worker on the host.
+
+    Keeps the decoded histories of recently used sessions, so loading a
+    session this worker served before only reads the rows added since.
+    """
+
+    name = "sqlite"
+    blocking = True
+
+    # How many decoded histories each worker keeps around.
+    SEEN_LIMIT = 256
+
+    def __init__(self, path: str | Path = "") -> None:
+        self.path = Path(path or DEFAULT_SESSION_PATH).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Histories contain patient data: create the file owner-only.
+        os.close(os.open(self.path, os.O_CREAT | os.O_RDWR, 0o600))
+        self._db = sqlite3.connect(
+            self.path, timeout=10.0, isolation_level=None, check_same_thread=False
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS messages (
+                session_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                body BLOB NOT NULL,
+                PRIMARY KEY (session_id, seq)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                length INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            """
+        )
+        # session_id -> decoded messages this worker has already loaded
+        self._seen: OrderedDict[str, list[BaseMessage]] = OrderedDict()
+        # Guards the connection and _seen across run_agent's worker threads.
+        self._lock = threading.Lock()
+
+    def load(self, session_id: str) -> list[BaseMessage]:
+        with self._lock:
+            seen = self._seen.get(session_id, [])
+            rows = self._db.execute(
+                "SELECT body FROM messages WHERE session_id = ? AND seq >= ? "
+                "ORDER BY seq",
+                (session_id, len(seen)),
+            ).fetchall()
+            history = [*seen, *(decode_message(body) for (body,) in rows)]
+            if history:
+                self._remember(session_id, history)
+            return list(history)
+
+    def _remember(self, session_id: str, history: list[BaseMessage]) -> None:
+        self._seen[session_id] = history
+        self._seen.move_to_end(session_id)
+        while len(self._seen) > self.SEEN_LIMIT:
+            self._seen.popitem(last=False)
+
+    def append(self, session_id: str, messages: Sequence[BaseMessage]) -> None:
+        if not messages:
+            return
+        bodies = [encode_message(m) for m in messages]
+        with self._lock:
+            self._append(session_id, messages, bodies)
+
+    def _append(
+        self, session_id: str, messages: Sequence[BaseMessage], bodies: list[bytes]
+    ) -> None:
+        expected = len(self._seen.get(session_id, []))
+
+        self._db.execute("BEGIN IMMEDIATE")  # take the write lock up front
+        try:
+            row = self._db.execute(
+                "SELECT length FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            start = row[0] if row else 0
+            if start != expected:
+                logger.warning(
+                    "Session %s changed concurrently (%d stored, %d expected); "
+                    "appending after the other turn",
+                    session_id,
+                    start,
+                    expected,
+                )
+            self._db.executemany(
+                "INSERT INTO messages VALUES (?, ?, ?)",
+                [(session_id, start + i, body) for i, body in enumerate(bodies)],
+            )
+            self._db.execute(
+                "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)",
+                (session_id, start + len(bodies), time.time()),
+            )
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+
+        if start == expected:
+            self._remember(session_id, [*self._seen.get(session_id, []), *messages])
+        else:
+            self._seen.pop(session_id, None)  # reload everything next time
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            self._db.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            self._db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._db.execute("COMMIT")
+            self._seen.pop(session_id, None)
+
+    def __contains__(self, session_id: object) -> bool:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return row is not None
+
+    def close(self) -> None:
+        # Fold the WAL into the main file, so the sessions survive on disk
+        # as one self-contained file.
+        with self._lock:
+            self._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._db.close()
+
+
+def open_session_store(backend: str, path: str = AGENT_SESSION_PATH) -> SessionStore:
+    """Create the session store for a backend name ("memory" or "sqlite").
+
+    Raises:
+        ValueError: If the backend name is unknown.
+    """
+    if backend == "memory":
+        return MemorySessionStore()
+    if backend == "sqlite":
+        return SQLiteSessionStore(path)
+    raise ValueError(
+        f"Unknown session backend {backend!r}; use one of {SESSION_BACKENDS}"
+    )
@@ -7,7 +7,9 @@ agent's responses, with full conversation history.
 How it works:
 - Streamlit re-runs this entire script on every user interaction
 - We use st.session_state to persist data (messages, session ID) between reruns
-- Each message is sent to the FastAPI backend (app.py) via HTTP POST
+- Each message is sent to the FastAPI backend (app.py) via HTTP POST,
+  with an idempotency key so a retried or double-submitted question is
+  answered once
 - The backend runs the LangGraph agent and returns a response
 
 Run locally with:
@@ -17,6 +19,7 @@ The FastAPI backend must be running at the URL configured below.
 """
 
 import os
+import uuid
 
 import requests
 import streamlit as st
@@ -57,6 +60,17 @@ for msg in st.session_state.messages:
 user_input = st.chat_input("Ask a question about a patient...")
 
 if user_input:
+    # One idempotency key per question. If the last question got no answer
+    # (timed out) and is asked again, its key is reused: the backend then
+    # returns the answer the first run is still working on, instead of
+    # running the agent a second time.
+    pending = st.session_state.get("pending")
+    if pending and pending["message"] == user_input:
+        idempotency_key = pending["key"]
+    else:
+        idempotency_key = str(uuid.uuid4())
+    st.session_state.pending = {"message": user_input, "key": idempotency_key}
+
     # Show the user's message immediately
     st.chat_message("user").write(user_input)
     st.session_state.messages.append({"role": "user", "content": user_input})
@@ -70,6 +84,7 @@ if user_input:
                     json={
                         "message": user_input,
                         "session_id": st.session_state.session_id,
+                        "idempotency_key": idempotency_key,
                     },
                     timeout=120,
                 )
@@ -77,6 +92,7 @@ if user_input:
                 data = resp.json()
                 answer = data["response"]
                 st.session_state.session_id = data.get("session_id")
+                st.session_state.pending = None
             except requests.exceptions.ConnectionError:
                 answer = (
                     "Could not connect to the backend. "
@@ -85,7 +101,8 @@ if user_input:
             except requests.exceptions.Timeout:
                 answer = (
                     "The request timed out. The agent may be "
-                    "processing a complex query."
+                    "processing a complex query. Ask the same question "
+                    "again to get its answer once it's ready."
                 )
             except Exception as e:
                 answer = f"Error: {e}"
@@ -0,0 +1,167 @@
+"""On-disk cache for OpenEMR OAuth2 credentials.
+
+Without a cache, every process start does a full password grant (and, when
+no client_id is configured, registers a brand-new OAuth2 client). With
+several uvicorn workers and frequent restarts that is slow, and each
+auto-registration leaves another client waiting for admin approval.
+
+The cache file holds the client registration and the latest tokens. A new
+process (or worker) restores them and:
+- uses the access token directly if it hasn't expired,
+- otherwise exchanges the refresh token for a new access token,
+- and only falls back to the password grant if both are rejected.
+
+Concept — protecting the cache:
+    A refresh token is as good as a password for ~3 months, so the file is
+    created with mode 0600 (owner read/write only) and written atomically
+    (temp file + rename, so a crash never leaves half a file). A cache
+    that other users can read is ignored with a warning. Set
+    OPENEMR_TOKEN_CACHE_KEY to also encrypt it with Fernet (AES + HMAC,
+    from the optional `cryptography` package — the "crypto" extra).
+    Generate a key with cryptography.fernet.Fernet.generate_key().
+
+Concept — sharing between workers:
+    OpenEMR rotates refresh tokens: using one revokes it. When one worker
+    refreshes, the others' copies stop working. So before refreshing, the
+    client re-reads the cache — if another worker already refreshed, it
+    adopts that token instead of burning its own.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import json
+import logging
+import os
+import tempfile
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Bump when the file layout changes; older files are then ignored.
+CACHE_VERSION = 1
+
+
+@dataclass(frozen=True, slots=True)
+class CachedCredentials:
+    """Everything needed to resume an OAuth2 session without a password grant.
+
+    Attributes:
+        base_url: OpenEMR server the credentials belong to.
+        site: OpenEMR site name.
+        username: User the tokens were issued to.
+        client_id: OAuth2 client (configured or auto-registered).
+        client_secret: Secret for client_id.
+        access_token: Latest access token ("" if none).
+        refresh_token: Latest refresh token ("" if none).
+        expires_at: Unix time the access token should be treated as expired.
+    """
+
+    base_url: str
+    site: str
+    username: str
+    client_id: str
+    client_secret: str
+    access_token: str = ""
+    refresh_token: str = ""
+    expires_at: float = 0.0
+
+
+class TokenCache:
+    """Reads and writes CachedCredentials to a permission-restricted file.
+
+    All failures (missing file, bad permissions, wrong key, corrupt JSON)
+    are logged and treated as "no cache" — the cache can only ever save
+    work, never break authentication.
+    """
+
+    def __init__(self, path: str | Path, key: str = "") -> None:
+        self.path = Path(path).expanduser()
+        self._fernet = _make_fernet(key) if key else None
+        # A key was configured but can't be used: don't fall back to
+        # writing refresh tokens in plaintext.
+        self.enabled = not key or self._fernet is not None
+
+    def load(self) -> CachedCredentials | None:
+        """Read the cached credentials, or None if unavailable."""
+        if not self.enabled:
+            return None
+        try:
+            mode = self.path.stat().st_mode
+            if os.name == "posix" and mode & 0o077:
+                logger.warning(
+                    "Ignoring token cache %s: readable by other users "
+                    "(run chmod 600 on it)",
+                    self.path,
+                )
+                return None
+            raw = self.path.read_bytes()
+        except FileNotFoundError:
+            return None
+        except OSError as exc:
+            logger.warning("Could not read token cache %s: %s", self.path, exc)
+            return None
+
+        try:
+            if self._fernet is not None:
+                raw = self._fernet.decrypt(raw)
+            data = json.loads(raw)
+            if data.pop("version", None) != CACHE_VERSION:
+                return None
+            return CachedCredentials(**data)
+        except Exception as exc:  # any unreadable cache just means "no cache"
+            logger.warning("Ignoring unreadable token cache %s: %s", self.path, exc)
+            return None
+
+    def save(self, credentials: CachedCredentials) -> None:
+        """Atomically replace the cache file with `credentials` (mode 0600)."""
+        if not self.enabled:
+            return
+        payload = json.dumps({"version": CACHE_VERSION, **asdict(credentials)})
+        raw = payload.encode()
+        if self._fernet is not None:
+            raw = self._fernet.encrypt(raw)
+
+        tmp_name = ""
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # mkstemp creates the file with mode 0600 before anything is
+            # written, so the tokens are never briefly world-readable.
+            fd, tmp_name = tempfile.mkstemp(
+                dir=self.path.parent, prefix=f".{self.path.name}."
+            )
+            with os.fdopen(fd, "wb") as f:
+                f.write(raw)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_name, self.path)
+        except OSError as exc:
+            logger.warning("Could not write token cache %s: %s", self.path, exc)
+            if tmp_name:
+                with contextlib.suppress(OSError):
+                    os.unlink(tmp_name)
+
+    def clear(self) -> None:
+        """Delete the cache file (e.g., after the credentials were rejected)."""
+        with contextlib.suppress(FileNotFoundError):
+            self.path.unlink()
+
+
+def _make_fernet(key: str):  # type: ignore[no-untyped-def]
+    """Build a Fernet cipher from `key`, or None (with a warning) if we can't."""
+    try:
+        from cryptography.fernet import Fernet
+    except ImportError:
+        logger.warning(
+            "OPENEMR_TOKEN_CACHE_KEY is set but the 'cryptography' package "
+            "is not installed — token cache disabled"
+        )
+        return None
+    try:
+        return Fernet(key.encode())
+    except ValueError as exc:
+        logger.warning(
+            "Invalid OPENEMR_TOKEN_CACHE_KEY (%s) — token cache disabled", exc
+        )
+        return None
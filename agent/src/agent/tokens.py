@@ -0,0 +1,21 @@
+"""Token estimation helpers.
+
+Several parts of the agent need to know roughly how many LLM tokens a
+piece of text will cost (tool output budgets, rate limiting, prompt
+metrics). Calling a real tokenizer for every estimate would be slow and
+would need an extra dependency, so we use the common rule of thumb for
+English text and JSON: about four characters per token. It slightly
+overestimates for prose and underestimates for dense IDs, which is close
+enough for budgeting.
+"""
+
+from __future__ import annotations
+
+import math
+
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate how many LLM tokens text will use."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
@@ -0,0 +1,176 @@
+"""Per-turn tool selection — send the model only the tools it may need.
+
+Every LLM step carries the name, description and argument schema of each
+bound tool. With ten tools that's ~2,500 prompt tokens per step, and the
+model spends prefill time on them whether the question is about
+allergies or appointments. The catalog will keep growing.
+
+Concept — keyword scoring:
+    Each tool has a list of words that signal it ("allerg" for
+    get_allergies, "bp", "weight" for get_vitals, ...). The current
+    question is matched against them, and the turn gets:
+    - patient_search (always — nearly every question starts with it),
+    - every tool whose keywords appear in the question,
+    - tools those depend on (get_vitals needs an encounter ID from
+      get_encounters),
+    - tools already called this turn (so paging with a cursor works).
+    No embeddings or model calls: it's a few regex scans per step.
+
+Concept — falling back to the full catalog:
+    If nothing matches (a follow-up like "and the other one?") or the
+    question asks for everything ("summarize his chart"), selection
+    returns None and the step gets all tools. A wrong guess can only
+    narrow the prompt for a question that named its topic.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from collections.abc import Mapping, Sequence
+from typing import TYPE_CHECKING, Any
+
+from pydantic import BaseModel
+
+from agent.metrics import metrics
+from agent.tokens import estimate_tokens
+from agent.verification.claims import message_text
+
+if TYPE_CHECKING:
+    from langchain_core.tools import BaseTool
+
+# Always offered: most questions start by finding the patient.
+ALWAYS = ("patient_search",)
+
+# Words in the question that make a tool relevant. They match at the start
+# of a word ("allerg" matches "allergies"); words of up to three letters
+# must match a whole word ("bp", "dr", "med").
+TOOL_KEYWORDS: Mapping[str, tuple[str, ...]] = {
+    "get_patient_details": (
+        "demographic", "address", "phone", "contact", "email", "detail",
+        "age", "birth", "dob", "sex", "gender", "language", "race",
+        "ethnicity", "lives", "profile",
+    ),
+    "get_allergies": ("allerg", "reaction", "intoleran"),
+    "get_medications": (
+        "med", "meds", "medication", "prescri", "drug", "rx", "taking", "dose",
+        "dosage", "pill", "refill",
+    ),
+    "get_vitals": (
+        "vital", "blood pressure", "bp", "pulse", "heart rate", "temperature",
+        "temp", "weight", "height", "bmi", "oxygen", "spo2", "o2", "respirat",
+    ),
+    "get_medical_problems": (
+        "problem", "diagnos", "condition", "disease", "chronic", "icd",
+        "comorbid", "history",
+    ),
+    "get_encounters": (
+        "encounter", "visit", "seen", "admission", "admitted", "last time",
+    ),
+    "get_appointments": (
+        "appointment", "appt", "schedul", "upcoming", "booked", "follow-up",
+        "follow up",
+    ),
+    "search_practitioners": (
+        "doctor", "provider", "practitioner", "physician", "npi", "specialist",
+        "dr", "clinician", "nurse",
+    ),
+    "get_insurance": (
+        "insurance", "insured", "coverage", "payer", "policy", "copay",
+        "subscriber", "medicare", "medicaid",
+    ),
+}  # fmt: skip
+
+# Tools a selected tool can't be used without.
+DEPENDS_ON: Mapping[str, tuple[str, ...]] = {"get_vitals": ("get_encounters",)}
+
+# Questions that want everything: use the full catalog.
+BROAD = re.compile(
+    r"\b(?:summar\w*|overview|everything|chart|full|complete|all (?:the )?"
+    r"(?:data|info\w*|records))\b",
+    re.IGNORECASE,
+)
+
+_PATTERNS = {
+    name: re.compile(
+        "|".join(
+            rf"\b{re.escape(word)}" + (r"\b" if len(word) <= 3 else "")
+            for word in words
+        ),
+        re.IGNORECASE,
+    )
+    for name, words in TOOL_KEYWORDS.items()
+}
+
+
+def select_tools(
+    messages: Sequence[Any], available: Sequence[str]
+) -> tuple[str, ...] | None:
+    """Names of the tools to offer for the next step, or None for all of them.
+
+    Args:
+        messages: The conversation so far (the latest human message is the
+            question being answered).
+        available: Names of all the agent's tools.
+    """
+    question = ""
+    turn: Sequence[Any] = messages
+    for i in range(len(messages) - 1, -1, -1):
+        if messages[i].type == "human":
+            question, turn = message_text(messages[i]), messages[i + 1 :]
+            break
+
+    if BROAD.search(question):
+        return None
+    matched = [name for name, pattern in _PATTERNS.items() if pattern.search(question)]
+    if not matched:
+        return None
+
+    selected = set(ALWAYS) | set(matched)
+    for name in matched:
+        selected.update(DEPENDS_ON.get(name, ()))
+    for message in turn:
+        for call in getattr(message, "tool_calls", None) or []:
+            selected.add(call["name"])
+    # Keep catalog order so the same subset always gives the same prompt.
+    return tuple(name for name in available if name in selected)
+
+
+# Estimated prompt tokens per tool definition, by tool name.
+_schema_tokens_cache: dict[str, int] = {}
+
+
+def _schema_tokens(tool: BaseTool) -> int:
+    if tool.name not in _schema_tokens_cache:
+        schema = tool.tool_call_schema
+        params: Any = schema
+        if isinstance(schema, type):
+            params = (
+                schema.model_json_schema()
+                if issubclass(schema, BaseModel)
+                else schema.schema()  # a pydantic.v1 model
+            )
+        _schema_tokens_cache[tool.name] = estimate_tokens(
+            tool.name + (tool.description or "") + json.dumps(params)
+        )
+    return _schema_tokens_cache[tool.name]
+
+
+def record_selection(
+    tools: Sequence[BaseTool], selected: tuple[str, ...] | None
+) -> int:
+    """Record prompt tokens spent on tool definitions, and tokens saved.
+
+    Returns:
+        Estimated prompt tokens of the tool definitions sent.
+    """
+    total = sum(_schema_tokens(tool) for tool in tools)
+    if selected is None:
+        metrics.counter("tool_selection", result="full").inc()
+        metrics.histogram("prompt_tool_tokens").observe(total)
+        return total
+    sent = sum(_schema_tokens(tool) for tool in tools if tool.name in selected)
+    metrics.counter("tool_selection", result="subset").inc()
+    metrics.histogram("prompt_tool_tokens").observe(sent)
+    metrics.histogram("prompt_tool_tokens_saved").observe(total - sent)
+    return sent
@@ -10,4 +10,7 @@ Tools are organized by domain:
 - scheduling.py:        Appointments, practitioners
 - billing.py:           Insurance information
 - drug_interactions.py: Check drug interactions (uses external NLM API)
+
+Tools return a ToolResult (see records.py): typed records for downstream
+code plus a lazily rendered text view for the LLM.
 """
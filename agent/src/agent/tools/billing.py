@@ -6,10 +6,32 @@ API endpoints used:
 
 from __future__ import annotations
 
+from collections.abc import Sequence
+
 from agent.openemr_client import OpenEMRAPIError, get_client
+from agent.tools.formatting import TableSpec, formatted
+from agent.tools.records import InsuranceRecord, ToolResult
+
+_INSURANCE_TABLE: TableSpec[InsuranceRecord] = TableSpec(
+    "Insurance",
+    ("type", "provider", "policy", "group"),
+    lambda ins: (ins.type, ins.provider, ins.policy_number, ins.group_number),
+)
+
 
+def _render_insurance(records: Sequence[InsuranceRecord]) -> str:
+    lines = ["Insurance:\n"]
+    for ins in records:
+        entry = f"- {ins.type}: {ins.provider}"
+        if ins.policy_number:
+            entry += f" | Policy: {ins.policy_number}"
+        if ins.group_number:
+            entry += f" | Group: {ins.group_number}"
+        lines.append(entry)
+    return "\n".join(lines)
 
-async def get_insurance(patient_uuid: str) -> str:
+
+async def get_insurance(patient_uuid: str) -> ToolResult:
     """Get insurance information for a patient.
 
     Args:
@@ -23,23 +45,13 @@ async def get_insurance(patient_uuid: str) -> str:
     try:
         data = await client.get(f"/patient/{patient_uuid}/insurance")
     except OpenEMRAPIError as e:
-        return f"Error fetching insurance: {e.detail}"
+        return ToolResult.message(f"Error fetching insurance: {e.detail}")
 
     results = data.get("data", [])
     if not results:
-        return "No insurance information recorded for this patient."
+        return ToolResult.message("No insurance information recorded for this patient.")
 
-    lines = ["Insurance:\n"]
-    for ins in results:
-        ins_type = ins.get("type", "Unknown type")
-        provider = ins.get("provider", "Unknown provider")
-        policy = ins.get("policy_number", "")
-        group = ins.get("group_number", "")
-        entry = f"- {ins_type}: {provider}"
-        if policy:
-            entry += f" | Policy: {policy}"
-        if group:
-            entry += f" | Group: {group}"
-        lines.append(entry)
-
-    return "\n".join(lines)
+    return ToolResult(
+        [InsuranceRecord.from_api(ins) for ins in results],
+        formatted(_render_insurance, _INSURANCE_TABLE),
+    )
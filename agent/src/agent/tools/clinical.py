@@ -9,10 +9,117 @@ API endpoints used:
 
 from __future__ import annotations
 
+from collections.abc import Sequence
+
 from agent.openemr_client import OpenEMRAPIError, get_client
+from agent.tools.formatting import TableSpec, formatted
+from agent.tools.paging import date_sort_key, paged_result
+from agent.tools.records import (
+    AllergyRecord,
+    MedicationRecord,
+    ProblemRecord,
+    ToolResult,
+    VitalsRecord,
+)
+
+_ALLERGY_TABLE: TableSpec[AllergyRecord] = TableSpec(
+    "Allergies",
+    ("substance", "reaction", "severity"),
+    lambda a: (a.title, a.reaction, a.severity),
+)
+_MEDICATION_TABLE: TableSpec[MedicationRecord] = TableSpec(
+    "Medications",
+    ("name", "dose", "route", "frequency", "ingredient_rxcui"),
+    lambda m: (
+        m.title,
+        m.dose,
+        m.route,
+        m.frequency,
+        "; ".join(f"{i.name} {i.rxcui}" for i in m.ingredients),
+    ),
+)
+_VITALS_TABLE: TableSpec[VitalsRecord] = TableSpec(
+    "Vital Signs",
+    (
+        "bp_mmHg",
+        "pulse_bpm",
+        "temp_F",
+        "resp_per_min",
+        "weight_lbs",
+        "height_in",
+        "bmi",
+        "recorded",
+    ),
+    lambda v: (
+        f"{v.bps}/{v.bpd}" if v.bps and v.bpd else "",
+        v.pulse,
+        v.temperature,
+        v.respiration,
+        v.weight,
+        v.height,
+        v.bmi,
+        v.date,
+    ),
+)
+_PROBLEM_TABLE: TableSpec[ProblemRecord] = TableSpec(
+    "Medical Problems",
+    ("problem", "diagnosis", "onset", "status"),
+    lambda p: (p.title, p.diagnosis, p.onset, p.status),
+)
+
+
+def _render_allergies(records: Sequence[AllergyRecord]) -> str:
+    lines = ["Allergies:\n"]
+    for a in records:
+        lines.append(f"- {a.title} | Reaction: {a.reaction} | Severity: {a.severity}")
+    return "\n".join(lines)
+
+
+def _render_medication(m: MedicationRecord) -> str:
+    detail = " | ".join(x for x in [m.dose, m.route, m.frequency] if x)
+    entry = f"- {m.title}" + (f" ({detail})" if detail else "")
+    if m.ingredients:
+        names = ", ".join(f"{i.name} (RxCUI {i.rxcui})" for i in m.ingredients)
+        entry += f" | Ingredient: {names}"
+    return entry
+
+
+def _render_vitals(records: Sequence[VitalsRecord]) -> str:
+    v = records[0]
+    lines = ["Vital Signs:\n"]
+    if v.bps and v.bpd:
+        lines.append(f"  Blood Pressure: {v.bps}/{v.bpd} mmHg")
+    if v.pulse:
+        lines.append(f"  Pulse: {v.pulse} bpm")
+    if v.temperature:
+        lines.append(f"  Temperature: {v.temperature} F")
+    if v.respiration:
+        lines.append(f"  Respiration: {v.respiration} breaths/min")
+    if v.weight:
+        lines.append(f"  Weight: {v.weight} lbs")
+    if v.height:
+        lines.append(f"  Height: {v.height} in")
+    if v.bmi:
+        lines.append(f"  BMI: {v.bmi}")
+    if v.date:
+        lines.append(f"  Recorded: {v.date}")
+    return "\n".join(lines)
+
+
+def _render_problems(records: Sequence[ProblemRecord]) -> str:
+    lines = ["Medical Problems:\n"]
+    for prob in records:
+        entry = f"- {prob.title}"
+        if prob.diagnosis:
+            entry += f" ({prob.diagnosis})"
+        entry += f" | Onset: {prob.onset}"
+        if prob.status:
+            entry += f" | Status: {prob.status}"
+        lines.append(entry)
+    return "\n".join(lines)
 
 
-async def get_allergies(patient_uuid: str) -> str:
+async def get_allergies(patient_uuid: str) -> ToolResult:
     """Get all recorded allergies for a patient.
 
     Args:
@@ -26,57 +133,66 @@ async def get_allergies(patient_uuid: str) -> str:
     try:
         data = await client.get(f"/patient/{patient_uuid}/allergy")
     except OpenEMRAPIError as e:
-        return f"Error fetching allergies: {e.detail}"
+        return ToolResult.message(f"Error fetching allergies: {e.detail}")
 
     results = data.get("data", [])
     if not results:
-        return "No allergies recorded for this patient."
+        return ToolResult.message("No allergies recorded for this patient.")
 
-    lines = ["Allergies:\n"]
-    for a in results:
-        title = a.get("title", "Unknown substance")
-        reaction = a.get("reaction", "No reaction listed")
-        severity = a.get("severity_al", "Unknown severity")
-        lines.append(f"- {title} | Reaction: {reaction} | Severity: {severity}")
-
-    return "\n".join(lines)
+    return ToolResult(
+        [AllergyRecord.from_api(a) for a in results],
+        formatted(_render_allergies, _ALLERGY_TABLE),
+    )
 
 
-async def get_medications(patient_id: str) -> str:
+async def get_medications(
+    patient_id: str,
+    limit: int = 0,
+    sort: str = "desc",
+    cursor: str = "",
+) -> ToolResult:
     """Get current medications for a patient.
 
     Note: This endpoint uses the numeric patient ID (pid), not UUID.
 
+    Each entry is annotated with its normalized ingredient(s) and RxNorm
+    ID (RxCUI) when the medication is in the local lexicon, so brand and
+    generic names for the same drug can be recognized as one. Results are
+    paged: if more medications exist, the output ends with a cursor to pass
+    back for the next page.
+
     Args:
         patient_id: The patient's numeric ID in OpenEMR.
+        limit: Maximum medications to return (0 = default page size).
+        sort: "desc" for most recently started first (default), "asc" for oldest.
+        cursor: Continuation cursor from a previous call, to get the next page.
 
     Returns:
-        List of medications with name, dosage, and frequency.
+        List of medications with name, dosage, frequency, and ingredient.
     """
     client = await get_client()
 
     try:
         data = await client.get(f"/patient/{patient_id}/medication")
     except OpenEMRAPIError as e:
-        return f"Error fetching medications: {e.detail}"
+        return ToolResult.message(f"Error fetching medications: {e.detail}")
 
     results = data.get("data", [])
     if not results:
-        return "No medications recorded for this patient."
+        return ToolResult.message("No medications recorded for this patient.")
 
-    lines = ["Medications:\n"]
-    for m in results:
-        title = m.get("title", "Unknown medication")
-        dose = m.get("dose", "")
-        route = m.get("route", "")
-        freq = m.get("frequency", "")
-        detail = " | ".join(x for x in [dose, route, freq] if x)
-        lines.append(f"- {title}" + (f" ({detail})" if detail else ""))
-
-    return "\n".join(lines)
+    return paged_result(
+        [MedicationRecord.from_api(m) for m in results],
+        render_row=_render_medication,
+        table=_MEDICATION_TABLE,
+        sort_key=lambda m: date_sort_key(m.start_date),
+        limit=limit,
+        sort=sort,
+        cursor=cursor,
+    )
 
 
-async def get_vitals(patient_id: str, encounter_id: str) -> str:
+async def get_vitals(patient_id: str, encounter_id: str) -> ToolResult:
     """Get vital signs from a specific encounter (visit).
 
     Note: This endpoint uses numeric patient ID and encounter ID.
@@ -93,39 +209,19 @@ async def get_vitals(patient_id: str, encounter_id: str) -> str:
     try:
         data = await client.get(f"/patient/{patient_id}/encounter/{encounter_id}/vital")
     except OpenEMRAPIError as e:
-        return f"Error fetching vitals: {e.detail}"
+        return ToolResult.message(f"Error fetching vitals: {e.detail}")
 
     results = data.get("data", [])
     if not results:
-        return "No vitals recorded for this encounter."
+        return ToolResult.message("No vitals recorded for this encounter.")
 
     # Usually one set of vitals per encounter; show the most recent
-    v = results[0]
-    lines = ["Vital Signs:\n"]
+    return ToolResult(
+        [VitalsRecord.from_api(results[0])], formatted(_render_vitals, _VITALS_TABLE)
+    )
 
-    bps = v.get("bps", "")
-    bpd = v.get("bpd", "")
-    if bps and bpd:
-        lines.append(f"  Blood Pressure: {bps}/{bpd} mmHg")
-    if v.get("pulse"):
-        lines.append(f"  Pulse: {v['pulse']} bpm")
-    if v.get("temperature"):
-        lines.append(f"  Temperature: {v['temperature']} F")
-    if v.get("respiration"):
-        lines.append(f"  Respiration: {v['respiration']} breaths/min")
-    if v.get("weight"):
-        lines.append(f"  Weight: {v['weight']} lbs")
-    if v.get("height"):
-        lines.append(f"  Height: {v['height']} in")
-    if v.get("BMI"):
-        lines.append(f"  BMI: {v['BMI']}")
-    if v.get("date"):
-        lines.append(f"  Recorded: {v['date']}")
 
-    return "\n".join(lines)
-
-
-async def get_medical_problems(patient_uuid: str) -> str:
+async def get_medical_problems(patient_uuid: str) -> ToolResult:
     """Get active medical problems (diagnoses) for a patient.
 
     Args:
@@ -139,24 +235,13 @@ async def get_medical_problems(patient_uuid: str) -> str:
     try:
         data = await client.get(f"/patient/{patient_uuid}/medical_problem")
     except OpenEMRAPIError as e:
-        return f"Error fetching medical problems: {e.detail}"
+        return ToolResult.message(f"Error fetching medical problems: {e.detail}")
 
     results = data.get("data", [])
     if not results:
-        return "No medical problems recorded for this patient."
+        return ToolResult.message("No medical problems recorded for this patient.")
 
-    lines = ["Medical Problems:\n"]
-    for prob in results:
-        title = prob.get("title", "Unknown")
-        diagnosis = prob.get("diagnosis", "")
-        onset = prob.get("begdate", "Unknown onset")
-        status = prob.get("status", "")
-        entry = f"- {title}"
-        if diagnosis:
-            entry += f" ({diagnosis})"
-        entry += f" | Onset: {onset}"
-        if status:
-            entry += f" | Status: {status}"
-        lines.append(entry)
-
-    return "\n".join(lines)
+    return ToolResult(
+        [ProblemRecord.from_api(p) for p in results],
+        formatted(_render_problems, _PROBLEM_TABLE),
+    )
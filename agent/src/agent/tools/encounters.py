@@ -7,16 +7,42 @@ API endpoints used:
 from __future__ import annotations
 
 from agent.openemr_client import OpenEMRAPIError, get_client
+from agent.tools.formatting import TableSpec
+from agent.tools.paging import date_sort_key, paged_result
+from agent.tools.records import EncounterRecord, ToolResult
 
+_ENCOUNTER_TABLE: TableSpec[EncounterRecord] = TableSpec(
+    "Encounters",
+    ("date", "encounter_id", "pid", "reason"),
+    lambda enc: (enc.date, enc.eid, enc.pid, enc.reason),
+)
 
-async def get_encounters(patient_uuid: str) -> str:
+
+def _render_encounter(enc: EncounterRecord) -> str:
+    entry = f"- Date: {enc.date} | Encounter ID: {enc.eid} | pid: {enc.pid}"
+    if enc.reason:
+        entry += f" | Reason: {enc.reason}"
+    return entry
+
+
+async def get_encounters(
+    patient_uuid: str,
+    limit: int = 0,
+    sort: str = "desc",
+    cursor: str = "",
+) -> ToolResult:
     """Get encounter (visit) history for a patient.
 
     Encounters represent individual visits to the clinic. Each encounter
     has an ID that can be used with get_vitals() to retrieve vital signs.
+    Results are paged: if more encounters exist, the output ends with a
+    cursor to pass back for the next page.
 
     Args:
         patient_uuid: The patient's UUID from OpenEMR.
+        limit: Maximum encounters to return (0 = default page size).
+        sort: "desc" for most recent first (default), "asc" for oldest first.
+        cursor: Continuation cursor from a previous call, to get the next page.
 
     Returns:
         List of encounters with date, reason, and encounter ID.
@@ -26,21 +52,18 @@ async def get_encounters(patient_uuid: str) -> str:
     try:
         data = await client.get(f"/patient/{patient_uuid}/encounter")
     except OpenEMRAPIError as e:
-        return f"Error fetching encounters: {e.detail}"
+        return ToolResult.message(f"Error fetching encounters: {e.detail}")
 
     results = data.get("data", [])
     if not results:
-        return "No encounters found for this patient."
-
-    lines = ["Encounters:\n"]
-    for enc in results:
-        date = enc.get("date", enc.get("encounterdate", "Unknown date"))
-        reason = enc.get("reason", "")
-        eid = enc.get("eid", enc.get("encounter", enc.get("id", "?")))
-        pid = enc.get("pid", "?")
-        entry = f"- Date: {date} | Encounter ID: {eid} | pid: {pid}"
-        if reason:
-            entry += f" | Reason: {reason}"
-        lines.append(entry)
-
-    return "\n".join(lines)
+        return ToolResult.message("No encounters found for this patient.")
+
+    return paged_result(
+        [EncounterRecord.from_api(enc) for enc in results],
+        render_row=_render_encounter,
+        table=_ENCOUNTER_TABLE,
+        sort_key=lambda enc: date_sort_key(enc.date),
+        limit=limit,
+        sort=sort,
+        cursor=cursor,
+    )
@@ -0,0 +1,109 @@
+"""Output formats for tool results — labeled text or compact tables.
+
+Tool results stay in the session history, so every token in them is paid
+for again on every later LLM call in the conversation. The default "text"
+format repeats field labels on every row:
+
+    - Penicillin | Reaction: Hives | Severity: severe
+    - Sulfa | Reaction: Rash | Severity: mild
+
+The "table" format states the columns once and then lists bare values:
+
+    Allergies [substance|reaction|severity]:
+    Penicillin|Hives|severe
+    Sulfa|Rash|mild
+
+Columns that are empty for every row are left out of the table entirely,
+and empty trailing values are trimmed from each row. For long lists this
+cuts tool output tokens substantially (see benchmarks/tool_output_format.py).
+
+The format is chosen per deployment with TOOL_OUTPUT_FORMAT, and is read
+when the text is rendered, so it can be switched at runtime (e.g., by the
+benchmark) with set_output_format().
+"""
+
+from __future__ import annotations
+
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
+from typing import Generic, TypeVar
+
+from agent.config import TOOL_OUTPUT_FORMAT
+
+T = TypeVar("T")
+
+TEXT = "text"
+TABLE = "table"
+OUTPUT_FORMATS = (TEXT, TABLE)
+
+_output_format = TOOL_OUTPUT_FORMAT if TOOL_OUTPUT_FORMAT in OUTPUT_FORMATS else TEXT
+
+
+def output_format() -> str:
+    """The active output format ("text" or "table")."""
+    return _output_format
+
+
+def set_output_format(fmt: str) -> None:
+    """Switch the output format for all tool results rendered from now on."""
+    global _output_format  # noqa: PLW0603
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format {fmt!r}; use one of {OUTPUT_FORMATS}")
+    _output_format = fmt
+
+
+def _cell(value: str) -> str:
+    # The delimiter can't appear inside a value, and rows must stay one line.
+    return value.replace("|", "/").replace("\n", " ")
+
+
+@dataclass(frozen=True, slots=True)
+class TableSpec(Generic[T]):
+    """How to show one kind of record as a compact table.
+
+    Attributes:
+        title: Table title, e.g. "Allergies".
+        columns: Column names, stated once in the header.
+        row: Extracts one record's values, in column order.
+    """
+
+    title: str
+    columns: tuple[str, ...]
+    row: Callable[[T], tuple[str, ...]]
+
+    def visible_columns(self, records: Sequence[T]) -> list[int]:
+        """Indexes of the columns that have a value in at least one record."""
+        rows = [self.row(r) for r in records]
+        return [i for i in range(len(self.columns)) if any(row[i] for row in rows)]
+
+    def header(self, visible: Sequence[int]) -> str:
+        names = "|".join(self.columns[i] for i in visible)
+        return f"{self.title} [{names}]:"
+
+    def line(self, record: T, visible: Sequence[int]) -> str:
+        values = self.row(record)
+        return "|".join(_cell(values[i]) for i in visible).rstrip("|")
+
+    def render(self, records: Sequence[T]) -> str:
+        visible = self.visible_columns(records)
+        lines = [self.header(visible)]
+        lines.extend(self.line(r, visible) for r in records)
+        return "\n".join(lines)
+
+
+def formatted(
+    text: Callable[[Sequence[T]], str],
+    table: TableSpec[T],
+) -> Callable[[Sequence[T]], str]:
+    """Combine a text renderer and a table spec into one renderer.
+
+    The returned function picks the format when it runs, so it can be
+    passed straight to ToolResult as its lazy renderer.
+    """
+
+    def render(records: Sequence[T]) -> str:
+        if output_format() == TABLE:
+            return table.render(records)
+        return text(records)
+
+    return render
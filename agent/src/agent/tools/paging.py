@@ -0,0 +1,156 @@
+"""Paging for list tools — limits, sort order, token budgets and cursors.
+
+List endpoints like /patient/{puuid}/encounter return every row at once.
+A patient with 400 encounters would put all 400 lines into the tool
+message, and because tool results stay in session history, every later
+LLM call in the session pays for them again.
+
+List tools therefore return one page at a time:
+- limit:  at most this many rows per call
+- sort:   "desc" (newest first, the default) or "asc" (oldest first)
+- budget: stop adding rows once the page reaches TOOL_OUTPUT_TOKEN_BUDGET
+- cursor: when rows remain, the page ends with a continuation cursor that
+          the model can pass back to get the next slice
+
+Concept — opaque cursors:
+    The cursor encodes where the next page starts (offset + sort order)
+    as a short base64 string. The model treats it as an opaque token and
+    just passes it back, so it can't accidentally ask for a page with a
+    different sort order than the one it is paging through.
+"""
+
+from __future__ import annotations
+
+import base64
+import binascii
+import functools
+from collections.abc import Callable, Sequence
+from typing import Any, TypeVar
+
+from agent.config import TOOL_OUTPUT_TOKEN_BUDGET, TOOL_PAGE_SIZE
+from agent.tokens import estimate_tokens
+from agent.tools.formatting import TABLE, TableSpec, output_format
+from agent.tools.records import ToolResult
+
+T = TypeVar("T")
+
+SORT_ORDERS = ("desc", "asc")
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a continuation cursor can't be decoded."""
+
+
+def encode_cursor(offset: int, sort: str) -> str:
+    """Encode a page start position as an opaque cursor string."""
+    raw = f"{offset}:{sort}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[int, str]:
+    """Decode a cursor from encode_cursor() back to (offset, sort).
+
+    Raises:
+        InvalidCursorError: If the cursor is malformed.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        offset_str, sort = base64.urlsafe_b64decode(padded).decode().split(":")
+        offset = int(offset_str)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as exc:
+        raise InvalidCursorError(f"Invalid cursor {cursor!r}") from exc
+    if offset < 0 or sort not in SORT_ORDERS:
+        raise InvalidCursorError(f"Invalid cursor {cursor!r}")
+    return offset, sort
+
+
+def date_sort_key(value: str) -> tuple[bool, str]:
+    """Sort key for OpenEMR date strings.
+
+    Real dates compare as strings (ISO format sorts chronologically);
+    missing or "Unknown date" values sort as older than any real date.
+    """
+    known = bool(value) and value[0].isdigit()
+    return (known, value)
+
+
+def _table_line(table: TableSpec[T], visible: Sequence[int], record: T) -> str:
+    return table.line(record, visible)
+
+
+def paged_result(
+    records: Sequence[T],
+    *,
+    render_row: Callable[[T], str],
+    table: TableSpec[T],
+    sort_key: Callable[[T], Any],
+    limit: int = 0,
+    sort: str = "desc",
+    cursor: str = "",
+    budget: int = 0,
+) -> ToolResult:
+    """Sort, slice and render one page of records within a token budget.
+
+    Args:
+        records: Every row the API returned.
+        render_row: Formats one record as one line (text format).
+        table: Table layout (table format); its title heads the output.
+        sort_key: Key for ordering records ("desc" reverses it).
+        limit: Maximum rows per page (0 means TOOL_PAGE_SIZE).
+        sort: "desc" or "asc"; ignored when a cursor is given.
+        cursor: Continuation cursor from a previous page, or "".
+        budget: Token budget for the output (0 means TOOL_OUTPUT_TOKEN_BUDGET).
+
+    Returns:
+        A ToolResult with the page's records and text. The text ends with a
+        "showing X-Y of N" line and, if rows remain, the next cursor.
+    """
+    limit = limit if limit > 0 else TOOL_PAGE_SIZE
+    budget = budget if budget > 0 else TOOL_OUTPUT_TOKEN_BUDGET
+    offset = 0
+    if cursor:
+        try:
+            offset, sort = decode_cursor(cursor)
+        except InvalidCursorError as e:
+            return ToolResult.message(f"Error: {e}. Omit the cursor to start over.")
+    if sort not in SORT_ORDERS:
+        sort = "desc"
+
+    ordered = sorted(records, key=sort_key, reverse=(sort == "desc"))
+    total = len(ordered)
+
+    if output_format() == TABLE:
+        # Columns are chosen over all records so every page has the same shape.
+        visible = table.visible_columns(ordered)
+        header = table.header(visible)
+        render_row = functools.partial(_table_line, table, visible)
+    else:
+        header = f"{table.title}:\n"
+
+    lines = [header]
+    used = estimate_tokens(header)
+    page: list[T] = []
+    for record in ordered[offset : offset + limit]:
+        line = render_row(record)
+        cost = estimate_tokens(line) + 1  # +1 for the newline
+        # Always include at least one row so paging makes progress.
+        if page and used + cost > budget:
+            break
+        lines.append(line)
+        page.append(record)
+        used += cost
+
+    end = offset + len(page)
+    order = "newest first" if sort == "desc" else "oldest first"
+    if not page:
+        lines.append(f"(No more results — {total} total.)")
+    elif end < total:
+        lines.append(
+            f"(Showing {offset + 1}-{end} of {total}, {order}. For more, call "
+            f'again with cursor="{encode_cursor(end, sort)}".)'
+        )
+    elif offset > 0:
+        lines.append(f"(Showing {offset + 1}-{end} of {total}, {order}.)")
+
+    text = "\n".join(lines)
+    return ToolResult(page, lambda _: text)
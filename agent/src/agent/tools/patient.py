@@ -7,12 +7,88 @@ API endpoints used:
 
 from __future__ import annotations
 
+from collections.abc import Sequence
 from typing import Any
 
 from agent.openemr_client import OpenEMRAPIError, get_client
+from agent.tools.formatting import TableSpec, formatted
+from agent.tools.records import PatientRecord, ToolResult
+
+
+def _search_table(query: str, count: int) -> TableSpec[PatientRecord]:
+    return TableSpec(
+        f"Found {count} patient(s) matching '{query}'",
+        ("name", "dob", "sex", "pid", "uuid"),
+        lambda p: (p.name, p.dob, p.sex, p.pid, p.uuid),
+    )
+
+
+_DETAILS_TABLE: TableSpec[PatientRecord] = TableSpec(
+    "Patient",
+    (
+        "name",
+        "dob",
+        "sex",
+        "pid",
+        "uuid",
+        "address",
+        "home_phone",
+        "cell_phone",
+        "email",
+    ),
+    lambda p: (
+        p.name,
+        p.dob,
+        p.sex,
+        p.pid,
+        p.uuid,
+        ", ".join(x for x in [p.street, p.city, p.state, p.postal_code] if x),
+        p.phone_home,
+        p.phone_cell,
+        p.email,
+    ),
+)
+
+
+def _render_search(query: str, records: Sequence[PatientRecord]) -> str:
+    lines = [f"Found {len(records)} patient(s) matching '{query}':\n"]
+    for p in records:
+        dob = p.dob or "Unknown DOB"
+        sex = p.sex or "Unknown"
+        lines.append(
+            f"- {p.name} | DOB: {dob} | Sex: {sex} | pid: {p.pid} | uuid: {p.uuid}"
+        )
+    return "\n".join(lines)
+
+
+def _render_details(records: Sequence[PatientRecord]) -> str:
+    p = records[0]
+    lines = [
+        f"Patient: {p.name}",
+        f"  DOB: {p.dob or 'Unknown'}",
+        f"  Sex: {p.sex or 'Unknown'}",
+        f"  pid: {p.pid}",
+        f"  uuid: {p.uuid}",
+    ]
+
+    # Address
+    parts = [p.street, p.city, p.state, p.postal_code]
+    if any(parts):
+        lines.append(f"  Address: {', '.join(x for x in parts if x)}")
+
+    # Contact info
+    for value, label in [
+        (p.phone_home, "Home phone"),
+        (p.phone_cell, "Cell phone"),
+        (p.email, "Email"),
+    ]:
+        if value:
+            lines.append(f"  {label}: {value}")
+
+    return "\n".join(lines)
 
 
-async def patient_search(query: str) -> str:
+async def patient_search(query: str) -> ToolResult:
     """Search for patients by name, date of birth, or other demographics.
 
     If the query contains a space, the first word is treated as first name
@@ -37,7 +113,7 @@ async def patient_search(query: str) -> str:
     try:
         data = await client.get("/patient", params=params)
     except OpenEMRAPIError as e:
-        return f"Error searching for patients: {e.detail}"
+        return ToolResult.message(f"Error searching for patients: {e.detail}")
 
     results = data.get("data", [])
 
@@ -50,21 +126,19 @@ async def patient_search(query: str) -> str:
             pass
 
     if not results:
-        return f"No patients found matching '{query}'."
+        return ToolResult.message(f"No patients found matching '{query}'.")
 
-    lines = [f"Found {len(results)} patient(s) matching '{query}':\n"]
-    for p in results:
-        name = f"{p.get('fname', '')} {p.get('lname', '')}".strip()
-        dob = p.get("DOB", "Unknown DOB")
-        pid = p.get("pid", "?")
-        puuid = p.get("uuid", p.get("puuid", "?"))
-        sex = p.get("sex", "Unknown")
-        lines.append(f"- {name} | DOB: {dob} | Sex: {sex} | pid: {pid} | uuid: {puuid}")
-
-    return "\n".join(lines)
+    records = [PatientRecord.from_api(p) for p in results]
+    return ToolResult(
+        records,
+        formatted(
+            lambda rs: _render_search(query, rs),
+            _search_table(query, len(records)),
+        ),
+    )
 
 
-async def get_patient_details(patient_uuid: str) -> str:
+async def get_patient_details(patient_uuid: str) -> ToolResult:
     """Get full demographic details for a specific patient.
 
     Args:
@@ -78,38 +152,12 @@ async def get_patient_details(patient_uuid: str) -> str:
     try:
         data = await client.get(f"/patient/{patient_uuid}")
     except OpenEMRAPIError as e:
-        return f"Error fetching patient details: {e.detail}"
+        return ToolResult.message(f"Error fetching patient details: {e.detail}")
 
     p = data.get("data", {})
     if not p:
-        return f"No patient found with UUID '{patient_uuid}'."
-
-    name = f"{p.get('fname', '')} {p.get('lname', '')}".strip()
-    lines = [
-        f"Patient: {name}",
-        f"  DOB: {p.get('DOB', 'Unknown')}",
-        f"  Sex: {p.get('sex', 'Unknown')}",
-        f"  pid: {p.get('pid', '?')}",
-        f"  uuid: {p.get('uuid', p.get('puuid', '?'))}",
-    ]
+        return ToolResult.message(f"No patient found with UUID '{patient_uuid}'.")
 
-    # Address
-    street = p.get("street", "")
-    city = p.get("city", "")
-    state = p.get("state", "")
-    postal = p.get("postal_code", "")
-    if any([street, city, state, postal]):
-        addr = ", ".join(x for x in [street, city, state, postal] if x)
-        lines.append(f"  Address: {addr}")
-
-    # Contact info
-    for field, label in [
-        ("phone_home", "Home phone"),
-        ("phone_cell", "Cell phone"),
-        ("email", "Email"),
-    ]:
-        val = p.get(field, "")
-        if val:
-            lines.append(f"  {label}: {val}")
-
-    return "\n".join(lines)
+    return ToolResult(
+        [PatientRecord.from_api(p)], formatted(_render_details, _DETAILS_TABLE)
+    )
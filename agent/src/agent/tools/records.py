@@ -0,0 +1,290 @@
+"""Typed records for tool results, with a lazily rendered text view.
+
+Every tool used to return a pre-formatted string. That's what the LLM
+needs, but everything else (verifiers, caches, analytics) then had to
+re-parse the text to get at a pid, DOB or dose. Now each tool returns a
+ToolResult holding:
+
+- records: compact typed records (one per row the API returned)
+- text: the formatted string for the LLM, rendered on first access
+
+so one fetch can feed the model, the verifier and any downstream logic.
+
+Concept — slotted dataclasses:
+    `@dataclass(slots=True)` stores fields in fixed slots instead of a
+    per-instance __dict__, which makes each record smaller and attribute
+    access faster. With `frozen=True` the records are also immutable and
+    hashable, so they are safe to share between the model, caches and
+    verifiers.
+
+ToolResult behaves like its text for the common string operations
+(str(), `in`, ==), so code that treated tool output as a string keeps
+working.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
+from typing import Any
+
+from agent.medication_lexicon import Ingredient, get_lexicon
+
+
+@dataclass(frozen=True, slots=True)
+class PatientRecord:
+    """A patient from /patient (search) or /patient/{puuid} (details)."""
+
+    pid: str
+    uuid: str
+    fname: str
+    lname: str
+    dob: str
+    sex: str
+    street: str = ""
+    city: str = ""
+    state: str = ""
+    postal_code: str = ""
+    phone_home: str = ""
+    phone_cell: str = ""
+    email: str = ""
+
+    @property
+    def name(self) -> str:
+        return f"{self.fname} {self.lname}".strip()
+
+    @classmethod
+    def from_api(cls, p: dict[str, Any]) -> PatientRecord:
+        return cls(
+            pid=str(p.get("pid", "?")),
+            uuid=str(p.get("uuid", p.get("puuid", "?"))),
+            fname=p.get("fname", ""),
+            lname=p.get("lname", ""),
+            dob=p.get("DOB", ""),
+            sex=p.get("sex", ""),
+            street=p.get("street", "") or "",
+            city=p.get("city", "") or "",
+            state=p.get("state", "") or "",
+            postal_code=p.get("postal_code", "") or "",
+            phone_home=p.get("phone_home", "") or "",
+            phone_cell=p.get("phone_cell", "") or "",
+            email=p.get("email", "") or "",
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class AllergyRecord:
+    """One entry from /patient/{puuid}/allergy."""
+
+    title: str
+    reaction: str
+    severity: str
+
+    @classmethod
+    def from_api(cls, a: dict[str, Any]) -> AllergyRecord:
+        return cls(
+            title=a.get("title", "Unknown substance"),
+            reaction=a.get("reaction", "No reaction listed"),
+            severity=a.get("severity_al", "Unknown severity"),
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class MedicationRecord:
+    """One entry from /patient/{pid}/medication, with normalized ingredients."""
+
+    title: str
+    dose: str
+    route: str
+    frequency: str
+    start_date: str
+    ingredients: tuple[Ingredient, ...]
+
+    @classmethod
+    def from_api(cls, m: dict[str, Any]) -> MedicationRecord:
+        title = m.get("title") or ""
+        return cls(
+            title=title or "Unknown medication",
+            dose=m.get("dose", "") or "",
+            route=m.get("route", "") or "",
+            frequency=m.get("frequency", "") or "",
+            start_date=m.get("begdate", "") or "",
+            ingredients=tuple(get_lexicon().normalize(title)) if title else (),
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class VitalsRecord:
+    """One set of vital signs from /patient/{pid}/encounter/{eid}/vital."""
+
+    bps: str
+    bpd: str
+    pulse: str
+    temperature: str
+    respiration: str
+    weight: str
+    height: str
+    bmi: str
+    date: str
+
+    @classmethod
+    def from_api(cls, v: dict[str, Any]) -> VitalsRecord:
+        return cls(
+            bps=str(v.get("bps") or ""),
+            bpd=str(v.get("bpd") or ""),
+            pulse=str(v.get("pulse") or ""),
+            temperature=str(v.get("temperature") or ""),
+            respiration=str(v.get("respiration") or ""),
+            weight=str(v.get("weight") or ""),
+            height=str(v.get("height") or ""),
+            bmi=str(v.get("BMI") or ""),
+            date=str(v.get("date") or ""),
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class ProblemRecord:
+    """One entry from /patient/{puuid}/medical_problem."""
+
+    title: str
+    diagnosis: str
+    onset: str
+    status: str
+
+    @classmethod
+    def from_api(cls, prob: dict[str, Any]) -> ProblemRecord:
+        return cls(
+            title=prob.get("title", "Unknown"),
+            diagnosis=prob.get("diagnosis", "") or "",
+            onset=prob.get("begdate", "Unknown onset") or "Unknown onset",
+            status=prob.get("status", "") or "",
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class EncounterRecord:
+    """One entry from /patient/{puuid}/encounter."""
+
+    eid: str
+    pid: str
+    date: str
+    reason: str
+
+    @classmethod
+    def from_api(cls, enc: dict[str, Any]) -> EncounterRecord:
+        return cls(
+            eid=str(enc.get("eid", enc.get("encounter", enc.get("id", "?")))),
+            pid=str(enc.get("pid", "?")),
+            date=enc.get("date", enc.get("encounterdate", "Unknown date")),
+            reason=enc.get("reason", "") or "",
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class AppointmentRecord:
+    """One entry from /patient/{pid}/appointment."""
+
+    title: str
+    date: str
+    time: str
+    status: str
+
+    @classmethod
+    def from_api(cls, appt: dict[str, Any]) -> AppointmentRecord:
+        return cls(
+            title=appt.get("pc_title", "Untitled"),
+            date=appt.get("pc_eventDate", "Unknown date"),
+            time=appt.get("pc_startTime", "") or "",
+            status=appt.get("pc_apptstatus", "") or "",
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class PractitionerRecord:
+    """One entry from /practitioner."""
+
+    name: str
+    specialty: str
+    npi: str
+    phone: str
+
+    @classmethod
+    def from_api(cls, pr: dict[str, Any]) -> PractitionerRecord:
+        title = pr.get("title", "")
+        return cls(
+            name=f"{title} {pr.get('fname', '')} {pr.get('lname', '')}".strip(),
+            specialty=pr.get("specialty", "") or "",
+            npi=pr.get("npi", "") or "",
+            phone=pr.get("phonew1", pr.get("phone", "")) or "",
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class InsuranceRecord:
+    """One entry from /patient/{puuid}/insurance."""
+
+    type: str
+    provider: str
+    policy_number: str
+    group_number: str
+
+    @classmethod
+    def from_api(cls, ins: dict[str, Any]) -> InsuranceRecord:
+        return cls(
+            type=ins.get("type", "Unknown type"),
+            provider=ins.get("provider", "Unknown provider"),
+            policy_number=ins.get("policy_number", "") or "",
+            group_number=ins.get("group_number", "") or "",
+        )
+
+
+class ToolResult:
+    """Typed records plus a lazily rendered text view for the LLM.
+
+    Attributes:
+        records: The typed records (empty for errors and "not found").
+    """
+
+    __slots__ = ("records", "_render", "_text")
+
+    def __init__(
+        self,
+        records: Sequence[Any],
+        render: Callable[[Sequence[Any]], str],
+    ) -> None:
+        self.records = tuple(records)
+        self._render = render
+        self._text: str | None = None
+
+    @classmethod
+    def message(cls, text: str) -> ToolResult:
+        """A result with no records, only text (errors, empty results)."""
+        result = cls((), lambda _: text)
+        result._text = text
+        return result
+
+    @property
+    def text(self) -> str:
+        """The formatted text for the LLM, rendered once on first access."""
+        if self._text is None:
+            self._text = self._render(self.records)
+        return self._text
+
+    def __str__(self) -> str:
+        return self.text
+
+    def __repr__(self) -> str:
+        return f"ToolResult(records={len(self.records)})"
+
+    def __contains__(self, item: str) -> bool:
+        return item in self.text
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, ToolResult):
+            return self.text == other.text
+        if isinstance(other, str):
+            return self.text == other
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(self.text)
@@ -7,18 +7,69 @@ API endpoints used:
 
 from __future__ import annotations
 
+from collections.abc import Sequence
+from datetime import date
 from typing import Any
 
 from agent.openemr_client import OpenEMRAPIError, get_client
+from agent.tools.formatting import TableSpec, formatted
+from agent.tools.paging import date_sort_key, paged_result
+from agent.tools.records import AppointmentRecord, PractitionerRecord, ToolResult
+
+_APPOINTMENT_TABLE: TableSpec[AppointmentRecord] = TableSpec(
+    "Appointments",
+    ("title", "date", "time", "status"),
+    lambda appt: (appt.title, appt.date, appt.time, appt.status),
+)
+_PRACTITIONER_TABLE: TableSpec[PractitionerRecord] = TableSpec(
+    "Practitioners",
+    ("name", "specialty", "npi", "phone"),
+    lambda pr: (pr.name, pr.specialty, pr.npi, pr.phone),
+)
+
+
+def _render_appointment(appt: AppointmentRecord) -> str:
+    return (
+        f"- {appt.title} | Date: {appt.date}"
+        + (f" {appt.time}" if appt.time else "")
+        + (f" | Status: {appt.status}" if appt.status else "")
+    )
+
+
+def _render_practitioners(records: Sequence[PractitionerRecord]) -> str:
+    lines = [f"Found {len(records)} practitioner(s):\n"]
+    for pr in records:
+        entry = f"- {pr.name}"
+        if pr.specialty:
+            entry += f" | Specialty: {pr.specialty}"
+        if pr.npi:
+            entry += f" | NPI: {pr.npi}"
+        if pr.phone:
+            entry += f" | Phone: {pr.phone}"
+        lines.append(entry)
+    return "\n".join(lines)
 
 
-async def get_appointments(patient_id: str) -> str:
+async def get_appointments(
+    patient_id: str,
+    limit: int = 0,
+    sort: str = "desc",
+    cursor: str = "",
+    upcoming: bool = False,
+) -> ToolResult:
     """Get appointments for a patient.
 
     Note: This endpoint uses the numeric patient ID (pid), not UUID.
+    Results are paged: if more appointments exist, the output ends with a
+    cursor to pass back for the next page. For the next appointment, use
+    upcoming=True with sort="asc".
 
     Args:
         patient_id: The patient's numeric ID in OpenEMR.
+        limit: Maximum appointments to return (0 = default page size).
+        sort: "desc" for latest date first (default), "asc" for earliest first.
+        cursor: Continuation cursor from a previous call, to get the next page.
+        upcoming: Only include appointments from today onward.
 
     Returns:
         List of appointments with date, time, title, and status.
@@ -28,28 +79,31 @@ async def get_appointments(patient_id: str) -> str:
     try:
         data = await client.get(f"/patient/{patient_id}/appointment")
     except OpenEMRAPIError as e:
-        return f"Error fetching appointments: {e.detail}"
+        return ToolResult.message(f"Error fetching appointments: {e.detail}")
 
     results = data.get("data", [])
     if not results:
-        return "No appointments found for this patient."
-
-    lines = ["Appointments:\n"]
-    for appt in results:
-        title = appt.get("pc_title", "Untitled")
-        date = appt.get("pc_eventDate", "Unknown date")
-        time = appt.get("pc_startTime", "")
-        status = appt.get("pc_apptstatus", "")
-        lines.append(
-            f"- {title} | Date: {date}"
-            + (f" {time}" if time else "")
-            + (f" | Status: {status}" if status else "")
-        )
-
-    return "\n".join(lines)
-
-
-async def search_practitioners(query: str) -> str:
+        return ToolResult.message("No appointments found for this patient.")
+
+    records = [AppointmentRecord.from_api(appt) for appt in results]
+    if upcoming:
+        today = date.today().isoformat()
+        records = [appt for appt in records if appt.date >= today]
+        if not records:
+            return ToolResult.message("No upcoming appointments for this patient.")
+
+    return paged_result(
+        records,
+        render_row=_render_appointment,
+        table=_APPOINTMENT_TABLE,
+        sort_key=lambda appt: (date_sort_key(appt.date), appt.time),
+        limit=limit,
+        sort=sort,
+        cursor=cursor,
+    )
+
+
+async def search_practitioners(query: str) -> ToolResult:
     """Search for practitioners (doctors, nurses, etc.) by name.
 
     Args:
@@ -71,26 +125,13 @@ async def search_practitioners(query: str) -> str:
     try:
         data = await client.get("/practitioner", params=params)
     except OpenEMRAPIError as e:
-        return f"Error searching practitioners: {e.detail}"
+        return ToolResult.message(f"Error searching practitioners: {e.detail}")
 
     results = data.get("data", [])
     if not results:
-        return f"No practitioners found matching '{query}'."
-
-    lines = [f"Found {len(results)} practitioner(s):\n"]
-    for pr in results:
-        title = pr.get("title", "")
-        name = f"{title} {pr.get('fname', '')} {pr.get('lname', '')}".strip()
-        specialty = pr.get("specialty", "")
-        npi = pr.get("npi", "")
-        phone = pr.get("phonew1", pr.get("phone", ""))
-        entry = f"- {name}"
-        if specialty:
-            entry += f" | Specialty: {specialty}"
-        if npi:
-            entry += f" | NPI: {npi}"
-        if phone:
-            entry += f" | Phone: {phone}"
-        lines.append(entry)
+        return ToolResult.message(f"No practitioners found matching '{query}'.")
 
-    return "\n".join(lines)
+    return ToolResult(
+        [PractitionerRecord.from_api(pr) for pr in results],
+        formatted(_render_practitioners, _PRACTITIONER_TABLE),
+    )
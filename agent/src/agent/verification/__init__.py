@@ -1,13 +1,21 @@
 """Verification layer for the AI agent.
 
-This package will contain verification nodes that run after the agent
+This package contains verification steps that run after the agent
 generates a response but before it reaches the user. These checks help
 ensure the agent's answers are accurate and safe.
 
+Verifiers:
+- claims.py: Hallucination detection — every date, number, ID and
+  medication in the answer must appear in the data the tools returned
+- rules.py: Domain constraints — the system prompt's rules (confirm name +
+  DOB, list all ambiguous matches, disclaimer), checked structurally and
+  auto-repaired in the answer text
+
 Planned verifiers (Phase 2):
-- Hallucination detection: Compare claims against actual API data
-- Domain constraints: Enforce safety rules (allergy checks, disclaimers)
 - Confidence scoring: Tag responses as high/medium/low confidence
-
-TODO (Step 10): Implement verification nodes.
 """
+
+from agent.verification.claims import ClaimReport, verify_turn
+from agent.verification.rules import DISCLAIMER, RuleReport, check_rules
+
+__all__ = ["DISCLAIMER", "ClaimReport", "RuleReport", "check_rules", "verify_turn"]
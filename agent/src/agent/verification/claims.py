@@ -0,0 +1,214 @@
+"""Claim verification — check the answer's facts against tool outputs.
+
+The agent must never report clinical data that OpenEMR didn't return.
+Asking a second LLM to audit the answer would double latency, so this
+verifier works deterministically instead:
+
+1. Build an index of every factual value the tools returned this session
+   (dates, numbers, IDs, vitals readings, medication ingredients).
+2. Extract the same kinds of values from the final answer.
+3. Flag any answer value that is missing from the index.
+
+Both passes are a single regex scan (plus one Aho-Corasick scan for
+medication names), so verification is linear in the size of the
+conversation and takes milliseconds.
+
+Concept — normalization:
+    The model rarely copies values byte-for-byte. It writes "Jan 15, 2024"
+    where the tool said "2024-01-15", or "98.6" where the tool said "98.60".
+    Every value is normalized to a canonical key before indexing and lookup
+    so that formatting differences don't count as unsupported claims.
+    Medication names are normalized to their RxNorm ingredient, so the
+    answer may say "Zestril" when the chart says "lisinopril 10mg".
+
+Values the user typed themselves (e.g., "pid 12") count as supported,
+since repeating the question back is not a hallucination.
+"""
+
+from __future__ import annotations
+
+import re
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass
+from typing import Any
+
+from agent.medication_lexicon import get_lexicon
+
+_MONTHS = {
+    "jan": 1,
+    "feb": 2,
+    "mar": 3,
+    "apr": 4,
+    "may": 5,
+    "jun": 6,
+    "jul": 7,
+    "aug": 8,
+    "sep": 9,
+    "oct": 10,
+    "nov": 11,
+    "dec": 12,
+}
+
+# One alternation, tried left to right at each position, so more specific
+# shapes (UUIDs, dates, blood pressure) win over plain numbers.
+_FACT_PATTERN = re.compile(
+    r"(?P<uuid>\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b)"
+    r"|(?P<iso>\b\d{4}-\d{2}-\d{2}\b)"
+    r"|(?P<us>\b\d{1,2}/\d{1,2}/\d{4}\b)"
+    r"|(?P<named>\b(?P<month>jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)"
+    r"[a-z]*\.?\s+(?P<day>\d{1,2})(?:st|nd|rd|th)?,?\s+(?P<year>\d{4})\b)"
+    r"|(?P<ratio>\b\d{2,3}/\d{2,3}\b)"
+    r"|(?P<number>(?<![\w.])\d+(?:\.\d+)?)",
+    re.IGNORECASE,
+)
+
+# Single-digit integers are mostly list numbering and counts ("2 allergies"),
+# not chart values, so they are not checked.
+_MIN_NUMBER_LENGTH = 2
+
+
+def _normalize_number(raw: str) -> str:
+    """Canonical form for numbers: "98.60" -> "98.6", "10.0" -> "10"."""
+    if "." in raw:
+        raw = raw.rstrip("0").rstrip(".")
+    return raw.lstrip("0") or "0"
+
+
+def fact_keys(text: str) -> Iterable[tuple[str, str]]:
+    """Yield (original text, normalized key) for each factual value in text."""
+    for match in _FACT_PATTERN.finditer(text):
+        raw = match.group(0)
+        if match.group("uuid"):
+            yield raw, f"id:{raw.lower()}"
+        elif match.group("iso"):
+            yield raw, f"date:{raw}"
+        elif match.group("us"):
+            month, day, year = raw.split("/")
+            yield raw, f"date:{year}-{int(month):02d}-{int(day):02d}"
+        elif match.group("named"):
+            month_num = _MONTHS[match.group("month").lower()]
+            day_num = int(match.group("day"))
+            yield raw, f"date:{match.group('year')}-{month_num:02d}-{day_num:02d}"
+        elif match.group("ratio"):
+            yield raw, f"ratio:{raw}"
+        elif len(raw) >= _MIN_NUMBER_LENGTH:
+            yield raw, f"num:{_normalize_number(raw)}"
+
+
+class FactIndex:
+    """Set of normalized values that the conversation's sources support."""
+
+    def __init__(self) -> None:
+        self._keys: set[str] = set()
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._keys
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, key: str) -> None:
+        """Add a single normalized key."""
+        self._keys.add(key)
+
+    def add_text(self, text: str) -> None:
+        """Index every factual value (and medication ingredient) in text."""
+        for _, key in fact_keys(text):
+            self._keys.add(key)
+            # A full date also supports its parts ("in 2024", "15").
+            if key.startswith("date:"):
+                year, month, day = key[5:].split("-")
+                self._keys.add(f"num:{_normalize_number(year)}")
+                self._keys.add(f"num:{_normalize_number(day)}")
+            elif key.startswith("ratio:"):
+                for part in key[6:].split("/"):
+                    self._keys.add(f"num:{_normalize_number(part)}")
+        for ingredient in get_lexicon().find(text):
+            self._keys.add(f"rx:{ingredient.rxcui}")
+
+
+@dataclass(frozen=True, slots=True)
+class ClaimReport:
+    """Outcome of checking one answer against the fact index.
+
+    Attributes:
+        checked: Number of factual values found in the answer.
+        unsupported: Values (as written in the answer) with no support.
+    """
+
+    checked: int
+    unsupported: tuple[str, ...]
+
+    @property
+    def ok(self) -> bool:
+        """True when every checked value was supported."""
+        return not self.unsupported
+
+
+def verify_claims(answer: str, index: FactIndex) -> ClaimReport:
+    """Check every factual value in answer against index.
+
+    Args:
+        answer: The agent's final response text.
+        index: Values supported by tool outputs and user input.
+
+    Returns:
+        A ClaimReport listing unsupported values in order of appearance.
+    """
+    checked = 0
+    unsupported: dict[str, None] = {}  # dict keeps order and dedupes
+    for raw, key in fact_keys(answer):
+        checked += 1
+        if key not in index:
+            unsupported.setdefault(raw, None)
+    for ingredient in get_lexicon().find(answer):
+        checked += 1
+        if f"rx:{ingredient.rxcui}" not in index:
+            unsupported.setdefault(ingredient.name, None)
+    return ClaimReport(checked=checked, unsupported=tuple(unsupported))
+
+
+def message_text(message: Any) -> str:
+    """Return the plain text of a LangChain message.
+
+    Message content is either a string or a list of content blocks
+    (Anthropic responses mix text and tool_use blocks); only text counts.
+    """
+    content = message.content
+    if isinstance(content, str):
+        return content
+    parts = []
+    for block in content:
+        if isinstance(block, str):
+            parts.append(block)
+        elif isinstance(block, dict) and block.get("type") == "text":
+            parts.append(block.get("text", ""))
+    return "".join(parts)
+
+
+def build_fact_index(messages: Sequence[Any]) -> FactIndex:
+    """Index the values supported by a message trace.
+
+    Tool results and the user's own messages are sources of truth; the
+    AI's earlier answers are not (otherwise one hallucination could be
+    used to "support" the next).
+    """
+    index = FactIndex()
+    for message in messages:
+        if message.type in ("tool", "human"):
+            index.add_text(message_text(message))
+    return index
+
+
+def verify_turn(messages: Sequence[Any]) -> ClaimReport:
+    """Verify the final AI message of a trace against everything before it.
+
+    Args:
+        messages: The full message history returned by the agent; the
+            last message must be the AI's final answer.
+
+    Returns:
+        The ClaimReport for the final answer.
+    """
+    *sources, final = messages
+    return verify_claims(message_text(final), build_fact_index(sources))
@@ -0,0 +1,253 @@
+"""Domain rule checks — enforce the system prompt's rules structurally.
+
+SYSTEM_PROMPT asks the model to follow a few hard rules. Most of the time
+it does, but "most of the time" isn't good enough for clinical safety, and
+re-prompting the model to fix a slip costs a full LLM round trip. Instead,
+this module checks each rule directly against the message trace of the
+current turn (which tools were called, with which IDs, and what they
+returned) and repairs cheap violations by editing the answer text:
+
+- identity: Clinical data must be shared alongside the patient's name and
+  DOB. Repair: prefix the answer with "Patient: <name> (DOB: <dob>)".
+- ambiguity: If patient_search matched several patients, all of them must
+  be listed so the user can choose. Repair: append the list of matches.
+  If the agent went on to fetch data for one of them anyway, a caution
+  line is added asking the user to confirm the patient.
+- disclaimer: Clinical responses must end with the standard disclaimer.
+  Repair: append it.
+
+All checks are simple scans over the turn's messages, so the whole stage
+runs in microseconds.
+"""
+
+from __future__ import annotations
+
+import re
+from collections.abc import Sequence
+from dataclasses import dataclass
+from typing import Any
+
+from agent.verification.claims import fact_keys, message_text
+
+DISCLAIMER = (
+    "This information is for reference only and does not replace clinical judgment."
+)
+
+# Tools whose output is clinical data about a specific patient. Calling any
+# of them in a turn makes the answer a "clinical response".
+CLINICAL_TOOLS = frozenset(
+    {
+        "get_patient_details",
+        "get_allergies",
+        "get_medications",
+        "get_vitals",
+        "get_medical_problems",
+        "get_encounters",
+        "get_appointments",
+        "get_insurance",
+    }
+)
+
+# One patient_search result line, as formatted by tools/patient.py.
+_SEARCH_ROW = re.compile(
+    r"^- (?P<name>.+?) \| DOB: (?P<dob>[^|]+?) \| Sex: [^|]*\| "
+    r"pid: (?P<pid>\S+) \| uuid: (?P<uuid>\S+)$",
+    re.MULTILINE,
+)
+# Header of the same result in the "table" format (see tools/formatting.py):
+# "Found 2 patient(s) matching 'Smith' [name|dob|sex|pid|uuid]:"
+_SEARCH_TABLE = re.compile(
+    r"^Found \d+ patient\(s\) matching .* \[(?P<columns>[^\]\n]*)\]:$",
+    re.MULTILINE,
+)
+_WHITESPACE = re.compile(r"\s+")
+
+
+@dataclass(frozen=True, slots=True)
+class PatientMatch:
+    """A patient as listed in a patient_search result."""
+
+    name: str
+    dob: str
+    pid: str
+    uuid: str
+
+    def label(self) -> str:
+        return f"{self.name} (DOB: {self.dob})"
+
+
+@dataclass(frozen=True, slots=True)
+class RuleViolation:
+    """One broken rule.
+
+    Attributes:
+        rule: Rule name ("identity", "ambiguity" or "disclaimer").
+        detail: Human-readable description for logs.
+        repaired: Whether the answer text was fixed automatically.
+    """
+
+    rule: str
+    detail: str
+    repaired: bool
+
+
+@dataclass(frozen=True, slots=True)
+class RuleReport:
+    """Outcome of the rule stage: the (possibly repaired) answer and findings."""
+
+    text: str
+    violations: tuple[RuleViolation, ...]
+
+    @property
+    def ok(self) -> bool:
+        return not self.violations
+
+
+def _normalized(text: str) -> str:
+    return _WHITESPACE.sub(" ", text).strip().lower()
+
+
+def _current_turn(messages: Sequence[Any]) -> Sequence[Any]:
+    """Messages after the latest human message (the turn being answered)."""
+    for i in range(len(messages) - 1, -1, -1):
+        if messages[i].type == "human":
+            return messages[i + 1 :]
+    return messages
+
+
+def _search_matches(message: Any) -> list[PatientMatch]:
+    """Patients listed in a patient_search ToolMessage.
+
+    Uses the typed records on message.artifact when present. Stored
+    sessions don't keep artifacts (see sessions.py), so otherwise the text
+    is parsed, in either output format.
+    """
+    records = getattr(message, "artifact", None)
+    if records:
+        return [
+            PatientMatch(name=r.name, dob=r.dob, pid=r.pid, uuid=r.uuid)
+            for r in records
+        ]
+    text = message_text(message)
+    return [
+        PatientMatch(
+            name=m.group("name"),
+            dob=m.group("dob"),
+            pid=m.group("pid"),
+            uuid=m.group("uuid"),
+        )
+        for m in _SEARCH_ROW.finditer(text)
+    ] or _table_matches(text)
+
+
+def _table_matches(text: str) -> list[PatientMatch]:
+    """Patients in a patient_search result rendered as a table."""
+    header = _SEARCH_TABLE.search(text)
+    if header is None:
+        return []
+    columns = header.group("columns").split("|")
+    matches = []
+    for line in text[header.end() :].lstrip("\n").splitlines():
+        if not line.strip():
+            break
+        # Columns empty in every row are left out; trailing empties trimmed.
+        row = dict(zip(columns, line.split("|"), strict=False))
+        if row.get("name"):
+            matches.append(
+                PatientMatch(
+                    name=row["name"],
+                    dob=row.get("dob", ""),
+                    pid=row.get("pid", ""),
+                    uuid=row.get("uuid", ""),
+                )
+            )
+    return matches
+
+
+def check_rules(messages: Sequence[Any]) -> RuleReport:
+    """Check the final answer in messages against the domain rules.
+
+    Args:
+        messages: The full message history; the last message must be the
+            AI's final answer to the latest human message.
+
+    Returns:
+        A RuleReport with the repaired answer text and any violations.
+    """
+    *trace, final = messages
+    text = message_text(final)
+    turn_start = len(trace) - len(_current_turn(trace))
+
+    # Walk the trace once, collecting: every patient listed by a search
+    # (so follow-up turns can still be tied to a name + DOB), and for the
+    # current turn the IDs clinical tools were called with and the latest
+    # search's matches.
+    tool_names: dict[str, str] = {}
+    known: dict[str, PatientMatch] = {}
+    clinical_ids: list[str] = []
+    matches: list[PatientMatch] = []
+    clinical_after_search = False
+    for position, message in enumerate(trace):
+        in_turn = position >= turn_start
+        if message.type == "ai":
+            for call in getattr(message, "tool_calls", []) or []:
+                tool_names[call["id"]] = call["name"]
+                if in_turn and call["name"] in CLINICAL_TOOLS:
+                    clinical_ids.extend(str(v) for v in call["args"].values())
+        elif message.type == "tool":
+            name = tool_names.get(message.tool_call_id, message.name or "")
+            if name == "patient_search":
+                found = _search_matches(message)
+                for m in found:
+                    known[m.pid] = known[m.uuid] = m
+                if in_turn:
+                    matches = found
+                    clinical_after_search = False
+            elif in_turn and name in CLINICAL_TOOLS:
+                clinical_after_search = True
+
+    violations: list[RuleViolation] = []
+    is_clinical = bool(clinical_ids)
+    answer = _normalized(text)
+
+    # --- ambiguity ---
+    if len(matches) > 1:
+        missing = [m for m in matches if _normalized(m.name) not in answer]
+        if clinical_after_search:
+            text = (
+                "Caution: several patients matched the search. Please confirm "
+                "this is the patient you meant.\n\n" + text
+            )
+            violations.append(
+                RuleViolation("ambiguity", "fetched data for an ambiguous match", True)
+            )
+        elif missing:
+            listing = "\n".join(f"- {m.label()} | pid: {m.pid}" for m in matches)
+            text += f"\n\nMatching patients:\n{listing}\nWhich patient did you mean?"
+            violations.append(
+                RuleViolation(
+                    "ambiguity",
+                    f"{len(missing)} of {len(matches)} matches not listed",
+                    True,
+                )
+            )
+
+    # --- identity ---
+    if is_clinical:
+        patient = next((known[i] for i in clinical_ids if i in known), None)
+        answer_keys = {key for _, key in fact_keys(text)}
+        if patient is not None and (
+            _normalized(patient.name) not in answer
+            or f"date:{patient.dob}" not in answer_keys
+        ):
+            text = f"Patient: {patient.label()}\n\n{text}"
+            violations.append(
+                RuleViolation("identity", "patient name/DOB not confirmed", True)
+            )
+
+    # --- disclaimer ---
+    if is_clinical and _normalized(DISCLAIMER) not in _normalized(text):
+        text = f"{text.rstrip()}\n\n{DISCLAIMER}"
+        violations.append(RuleViolation("disclaimer", "disclaimer missing", True))
+
+    return RuleReport(text=text, violations=tuple(violations))
@@ -1,12 +1,13 @@
 #!/bin/bash
 # Start both the FastAPI backend and Streamlit frontend.
-# FastAPI runs in the background; Streamlit runs in the foreground
-# (so Docker can track the main process).
+# Both run in the background while this script (the container's main
+# process) waits on them.
 
 # Start the FastAPI server on port 8000 (background)
 uvicorn agent.app:app --host 0.0.0.0 --port 8000 &
+API_PID=$!
 
-# Start the Streamlit frontend on port 8501 (foreground)
+# Start the Streamlit frontend on port 8501 (background)
 # --server.headless=true  disables the "open browser" prompt
 # --server.address=0.0.0.0  listens on all interfaces (needed in Docker)
 # --server.baseUrlPath=/chat  serves Streamlit at /chat/* when behind the ALB
@@ -14,4 +15,15 @@ streamlit run src/agent/streamlit_app.py \
   --server.port 8501 \
   --server.headless true \
   --server.address 0.0.0.0 \
-  --server.baseUrlPath /chat
+  --server.baseUrlPath /chat &
+UI_PID=$!
+
+# Docker/ECS stop the container by sending SIGTERM to this script only.
+# Pass it on, so the agent can drain running turns (AGENT_DRAIN_SECONDS,
+# see drain.py) before the container is killed.
+trap 'kill -TERM "$API_PID" "$UI_PID" 2>/dev/null' TERM INT
+
+# Stop when either service exits (or on SIGTERM), then wait for both.
+wait -n
+kill -TERM "$API_PID" "$UI_PID" 2>/dev/null
+wait
@@ -0,0 +1,147 @@
+"""Tests for the OpenEMR response cache backends and client integration."""
+
+import sqlite3
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+
+from agent.cache import MemoryCache, SQLiteCache, open_cache
+from agent.openemr_client import OpenEMRAPIError, OpenEMRClient
+
+
+class TestMemoryCache:
+    def test_get_returns_value_until_ttl(self) -> None:
+        cache = MemoryCache()
+        cache.set("k", b"v", ttl=60)
+        assert cache.get("k") == b"v"
+
+        cache.set("old", b"v", ttl=-1)  # already expired
+        assert cache.get("old") is None
+        assert len(cache) == 1
+
+    def test_size_cap_evicts_least_recently_used(self) -> None:
+        cache = MemoryCache(max_bytes=10)
+        cache.set("a", b"aaaa", ttl=60)
+        cache.set("b", b"bbbb", ttl=60)
+        cache.get("a")  # "b" is now least recently used
+        cache.set("c", b"cccc", ttl=60)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == b"aaaa"
+        assert cache.get("c") == b"cccc"
+
+
+class TestSQLiteCache:
+    def test_entries_are_shared_between_connections(self, tmp_path: Path) -> None:
+        """Two caches on one file (like two workers) see each other's writes."""
+        worker_1 = SQLiteCache(tmp_path / "cache.sqlite3")
+        worker_2 = SQLiteCache(tmp_path / "cache.sqlite3")
+
+        worker_1.set("k", b"v", ttl=60)
+
+        assert worker_2.get("k") == b"v"
+        assert (tmp_path / "cache.sqlite3").stat().st_mode & 0o777 == 0o600
+        worker_1.close()
+        worker_2.close()
+
+    def test_expired_entries_are_misses(self, tmp_path: Path) -> None:
+        cache = SQLiteCache(tmp_path / "cache.sqlite3")
+        cache.set("k", b"v", ttl=-1)
+        assert cache.get("k") is None
+        cache.close()
+
+    def test_evict_keeps_total_size_under_cap(self, tmp_path: Path) -> None:
+        cache = SQLiteCache(tmp_path / "cache.sqlite3", max_bytes=10)
+        for i in range(5):
+            cache.set(f"k{i}", b"xxxx", ttl=60)
+            time.sleep(0.001)  # distinct stored_at
+        cache.evict()
+
+        assert len(cache) == 2
+        assert cache.get("k4") == b"xxxx"
+        assert cache.get("k0") is None
+        cache.close()
+
+    def test_locked_cache_does_not_wait(self, tmp_path: Path) -> None:
+        """Another worker's write lock makes writes skip, not stall the loop."""
+        cache = SQLiteCache(tmp_path / "cache.db")
+        cache.set("k", b"v", ttl=60)
+        other_worker = sqlite3.connect(tmp_path / "cache.db", isolation_level=None)
+        other_worker.execute("BEGIN IMMEDIATE")
+
+        started = time.perf_counter()
+        cache.set("k2", b"v2", ttl=60)
+        cache.delete("k")
+        cache.clear()
+        assert time.perf_counter() - started < 1.0
+        assert cache.get("k") == b"v"  # WAL readers aren't blocked
+
+        other_worker.execute("COMMIT")
+        other_worker.close()
+        assert cache.get("k2") is None
+
+
+def test_open_cache_backends(tmp_path: Path) -> None:
+    assert open_cache("none") is None
+    assert isinstance(open_cache("memory"), MemoryCache)
+    assert isinstance(open_cache("sqlite", str(tmp_path / "c.db")), SQLiteCache)
+    with pytest.raises(ValueError, match="Unknown cache backend"):
+        open_cache("redis")
+
+
+# --- Client integration ---
+
+
+def _cached_client(calls: list[str]) -> OpenEMRClient:
+    """A client with a memory cache whose API requests are recorded."""
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if "/token" in str(request.url):
+            return httpx.Response(200, json={"access_token": "t", "expires_in": 3600})
+        calls.append(
+            f"{request.method} {request.url.path}?{request.url.query.decode()}"
+        )
+        if request.url.path.endswith("/missing"):
+            return httpx.Response(404, text="Not found")
+        return httpx.Response(200, json={"data": [{"pid": "1"}]})
+
+    client = OpenEMRClient(
+        base_url="https://localhost:9300",
+        client_id="id",
+        client_secret="secret",
+        cache_backend="memory",
+    )
+    client._http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client
+
+
+@pytest.mark.asyncio
+async def test_repeated_get_is_served_from_cache() -> None:
+    calls: list[str] = []
+    client = _cached_client(calls)
+
+    first = await client.get("/patient", params={"lname": "Dixon", "fname": "Phil"})
+    second = await client.get("/patient", params={"fname": "Phil", "lname": "Dixon"})
+
+    assert first == second == {"data": [{"pid": "1"}]}
+    assert len(calls) == 1  # param order doesn't matter
+
+    await client.get("/patient", params={"lname": "Smith"})
+    assert len(calls) == 2  # different params, different entry
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_errors_and_posts_are_not_cached() -> None:
+    calls: list[str] = []
+    client = _cached_client(calls)
+
+    for _ in range(2):
+        with pytest.raises(OpenEMRAPIError):
+            await client.get("/missing")
+        await client.post("/patient", json_data={"fname": "Test"})
+
+    assert len(calls) == 4
+    await client.close()
@@ -0,0 +1,233 @@
+"""Tests for per-turn deadlines, step budgets and cancellation."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any
+from unittest.mock import patch
+
+import httpx
+import pytest
+from fastapi import HTTPException
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+from agent.deadline import remaining, set_deadline, turn_deadline
+from agent.openemr_client import OpenEMRAPIError, OpenEMRClient
+
+SEARCH_RESULT = (
+    "Found 1 patient(s):\n"
+    "- Phil Dixon | DOB: 1980-01-01 | Sex: Male | pid: 1 | uuid: abc-123"
+)
+
+
+def _client(handler: Any) -> OpenEMRClient:
+    client = OpenEMRClient(
+        base_url="https://localhost:9300",
+        site="default",
+        client_id="id",
+        client_secret="secret",
+        username="admin",
+        password="pass",
+        verify_ssl=False,
+        cache_backend="none",
+    )
+    client._http = httpx.AsyncClient(
+        transport=httpx.MockTransport(handler), timeout=httpx.Timeout(30.0)
+    )
+    client._access_token = "test-access-token"
+    client._token_expires_at = time.time() + 3600
+    return client
+
+
+class TestDeadline:
+    def test_remaining(self) -> None:
+        token = turn_deadline.set(None)
+        try:
+            assert remaining() is None
+            set_deadline(10)
+            assert 9 < remaining() <= 10  # type: ignore[operator]
+            set_deadline(0)
+            assert remaining() is None
+        finally:
+            turn_deadline.reset(token)
+
+    @pytest.mark.asyncio
+    async def test_request_timeout_capped_at_time_left(self) -> None:
+        timeouts: list[float] = []
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            timeouts.append(request.extensions["timeout"]["read"])
+            return httpx.Response(200, json={})
+
+        client = _client(handler)
+        token = turn_deadline.set(time.monotonic() + 5)
+        try:
+            await client.get("/patient")
+        finally:
+            turn_deadline.reset(token)
+        await client.get("/patient")  # no deadline: the client's default
+
+        assert 4 < timeouts[0] <= 5
+        assert timeouts[1] == 30.0
+        await client.close()
+
+    @pytest.mark.asyncio
+    async def test_no_request_after_deadline(self) -> None:
+        calls: list[str] = []
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            calls.append(request.url.path)
+            return httpx.Response(200, json={})
+
+        client = _client(handler)
+        token = turn_deadline.set(time.monotonic() - 1)
+        try:
+            with pytest.raises(OpenEMRAPIError, match="deadline"):
+                await client.get("/patient")
+        finally:
+            turn_deadline.reset(token)
+        assert calls == []
+        await client.close()
+
+
+def _call(name: str, **args: Any) -> AIMessage:
+    return AIMessage(
+        content="", tool_calls=[{"name": name, "args": args, "id": f"call_{name}"}]
+    )
+
+
+class LoopingModel:
+    """A chat model that keeps making the same tool calls."""
+
+    def __init__(self, *replies: AIMessage) -> None:
+        self.replies = replies
+        self.calls = 0
+
+    def bind_tools(self, tools: Any) -> RunnableLambda[Any, AIMessage]:
+        async def reply(_prompt: Any) -> AIMessage:
+            self.calls += 1
+            reply = self.replies[min(self.calls, len(self.replies)) - 1]
+            # A fresh message each time: the graph assigns IDs in place.
+            return reply.model_copy(update={"id": None}, deep=True)
+
+        return RunnableLambda(reply)
+
+
+def _agent(model: LoopingModel, monkeypatch: pytest.MonkeyPatch) -> Any:
+    from langgraph.prebuilt import create_react_agent
+
+    from agent.agent import _build_tools
+    from agent.model_routing import ModelRouter
+
+    async def fake_search(query: str) -> tuple[str, tuple[Any, ...]]:
+        return SEARCH_RESULT, ()
+
+    async def hung_allergies(patient_uuid: str) -> tuple[str, tuple[Any, ...]]:
+        await asyncio.sleep(30)
+        return "never", ()
+
+    tools = _build_tools()
+    for tool in tools:
+        if tool.name == "patient_search":
+            monkeypatch.setattr(tool, "coroutine", fake_search)
+        if tool.name == "get_allergies":
+            monkeypatch.setattr(tool, "coroutine", hung_allergies)
+    router = ModelRouter(model, tools=tools)  # type: ignore[arg-type]
+    return create_react_agent(model=router, tools=tools, prompt="test")
+
+
+class TestRunAgentLimits:
+    @pytest.mark.asyncio
+    async def test_deadline_returns_partial_answer(
+        self, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        from agent.agent import _sessions, run_agent
+
+        model = LoopingModel(
+            _call("patient_search", query="Phil Dixon"),
+            _call("get_allergies", patient_uuid="abc-123"),
+        )
+        agent = _agent(model, monkeypatch)
+        with (
+            patch("agent.agent.ANTHROPIC_API_KEY", "test-key"),
+            patch("agent.agent.AGENT_FAST_PATH", False),
+            patch("agent.agent.AGENT_TURN_DEADLINE_SECONDS", 0.3),
+            patch("agent.agent._get_agent", return_value=agent),
+        ):
+            started = time.monotonic()
+            text, session_id = await run_agent("Allergies for Phil Dixon?")
+
+        assert time.monotonic() - started < 5  # the hung tool was cancelled
+        assert "time limit" in text
+        assert "Phil Dixon | DOB: 1980-01-01" in text
+        # Unfinished tool calls are not stored in the session.
+        assert [m.type for m in _sessions.load(session_id)] == ["human", "ai"]
+
+    @pytest.mark.asyncio
+    async def test_step_budget_returns_partial_answer(
+        self, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        from agent.agent import run_agent
+        from agent.metrics import metrics
+
+        metrics.reset()
+        model = LoopingModel(_call("patient_search", query="Phil Dixon"))
+        agent = _agent(model, monkeypatch)
+        with (
+            patch("agent.agent.ANTHROPIC_API_KEY", "test-key"),
+            patch("agent.agent.AGENT_FAST_PATH", False),
+            patch("agent.agent.AGENT_MAX_ITERATIONS", 3),
+            patch("agent.agent._get_agent", return_value=agent),
+        ):
+            text, _ = await run_agent("Find Phil Dixon")
+
+        assert model.calls == 3
+        assert "step limit" in text
+        assert "Phil Dixon | DOB: 1980-01-01" in text
+        counters = metrics.snapshot()["counters"]
+        assert counters["turn_outcome{result=iterations}"] == 1
+
+
+class FakeRequest:
+    def __init__(self, disconnected: bool) -> None:
+        self.disconnected = disconnected
+
+    async def is_disconnected(self) -> bool:
+        return self.disconnected
+
+
+class TestDisconnect:
+    @pytest.mark.asyncio
+    async def test_turn_cancelled_when_client_leaves(self) -> None:
+        from agent.app import _unless_disconnected
+
+        cancelled = asyncio.Event()
+
+        async def long_turn() -> str:
+            try:
+                await asyncio.sleep(30)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+            return "done"
+
+        with patch("agent.app.DISCONNECT_POLL_SECONDS", 0.01):
+            with pytest.raises(HTTPException) as exc_info:
+                await _unless_disconnected(FakeRequest(True), long_turn())  # type: ignore[arg-type]
+
+        assert exc_info.value.status_code == 499
+        assert cancelled.is_set()
+
+    @pytest.mark.asyncio
+    async def test_result_returned_while_connected(self) -> None:
+        from agent.app import _unless_disconnected
+
+        async def quick_turn() -> str:
+            await asyncio.sleep(0.02)
+            return "done"
+
+        with patch("agent.app.DISCONNECT_POLL_SECONDS", 0.01):
+            result = await _unless_disconnected(FakeRequest(False), quick_turn())  # type: ignore[arg-type]
+        assert result == "done"
@@ -0,0 +1,127 @@
+"""Tests for draining running turns on shutdown."""
+
+from __future__ import annotations
+
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from fastapi import HTTPException
+
+from agent.drain import Draining, TurnTracker
+from agent.metrics import metrics
+
+
+async def _turn(seconds: float) -> str:
+    await asyncio.sleep(seconds)
+    return "answer"
+
+
+class TestTurnTracker:
+    @pytest.mark.asyncio
+    async def test_running_turns_finish_within_grace(self) -> None:
+        metrics.reset()
+        tracker = TurnTracker()
+        quick = tracker.start(_turn(0.02))
+        slow = tracker.start(_turn(30))
+
+        report = await tracker.drain(grace=0.1)
+
+        assert (report.drained, report.aborted) == (1, 1)
+        assert quick.result() == "answer"
+        assert slow.cancelled()
+        counters = metrics.snapshot()["counters"]
+        assert counters["drain_turns{result=aborted}"] == 1
+
+    @pytest.mark.asyncio
+    async def test_no_new_turns_while_draining(self) -> None:
+        tracker = TurnTracker()
+        drain = tracker.begin_drain(grace=1)
+        turn = _turn(0)
+        with pytest.raises(Draining):
+            tracker.start(turn)
+        assert turn.cr_frame is None  # closed, never run
+        assert (await drain).drained == 0
+
+    @pytest.mark.asyncio
+    async def test_drain_started_once(self) -> None:
+        tracker = TurnTracker()
+        tracker.start(_turn(0.02))
+        first = tracker.begin_drain(grace=1)
+        assert tracker.begin_drain(grace=0) is first
+        assert (await tracker.drain(grace=0)).drained == 1
+
+    @pytest.mark.asyncio
+    async def test_reset_accepts_again(self) -> None:
+        tracker = TurnTracker()
+        await tracker.drain(grace=0)
+        tracker.reset()
+        assert await tracker.start(_turn(0)) == "answer"
+
+
+class FakeRequest:
+    async def is_disconnected(self) -> bool:
+        return False
+
+
+class TestChatDuringDrain:
+    @pytest.mark.asyncio
+    async def test_new_chat_rejected_with_503(self) -> None:
+        from agent.app import ChatRequest, chat
+
+        tracker = TurnTracker()
+        await tracker.drain(grace=0)
+        with patch("agent.app.turns", tracker):
+            with pytest.raises(HTTPException) as exc_info:
+                await chat(ChatRequest(message="allergies for Phil"), FakeRequest())  # type: ignore[arg-type]
+        assert exc_info.value.status_code == 503
+
+    @pytest.mark.asyncio
+    async def test_running_chat_answered_during_drain(self) -> None:
+        from agent.app import ChatRequest, chat
+
+        tracker = TurnTracker()
+
+        async def fake_run_agent(message: str, session_id: str | None = None):  # type: ignore[no-untyped-def]
+            await asyncio.sleep(0.05)
+            return "Phil has no known allergies.", "session-1"
+
+        with (
+            patch("agent.app.turns", tracker),
+            patch("agent.app.run_agent", fake_run_agent),
+            patch("agent.app.DISCONNECT_POLL_SECONDS", 0.01),
+        ):
+            request = asyncio.ensure_future(
+                chat(ChatRequest(message="allergies for Phil"), FakeRequest())  # type: ignore[arg-type]
+            )
+            await asyncio.sleep(0.01)
+            report = await tracker.drain(grace=1)
+            response = await request
+
+        assert response.response == "Phil has no known allergies."
+        assert (report.drained, report.aborted) == (1, 0)
+
+    @pytest.mark.asyncio
+    async def test_chat_cut_off_by_drain_gets_503(self) -> None:
+        from agent.app import ChatRequest, chat
+
+        tracker = TurnTracker()
+
+        async def hung_run_agent(message: str, session_id: str | None = None):  # type: ignore[no-untyped-def]
+            return await _turn(30), "session-1"
+
+        with (
+            patch("agent.app.turns", tracker),
+            patch("agent.app.run_agent", hung_run_agent),
+            patch("agent.app.DISCONNECT_POLL_SECONDS", 0.01),
+        ):
+            request = asyncio.ensure_future(
+                chat(ChatRequest(message="allergies for Phil"), FakeRequest())  # type: ignore[arg-type]
+            )
+            await asyncio.sleep(0.01)
+            report = await tracker.drain(grace=0.02)
+            with pytest.raises(HTTPException) as exc_info:
+                await request
+
+        assert exc_info.value.status_code == 503
+        assert report.aborted == 1
@@ -0,0 +1,130 @@
+"""Tests for idempotent chat requests."""
+
+from __future__ import annotations
+
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from fastapi import HTTPException
+
+from agent.idempotency import IdempotencyConflict, IdempotencyStore
+from agent.metrics import metrics
+
+
+class Counter:
+    """A stand-in turn that counts how often it really runs."""
+
+    def __init__(self, delay: float = 0.0, fail: bool = False) -> None:
+        self.runs = 0
+        self.delay = delay
+        self.fail = fail
+
+    async def __call__(self) -> str:
+        self.runs += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("turn failed")
+        return f"answer {self.runs}"
+
+
+def _result(result: str) -> float:
+    counters = metrics.snapshot()["counters"]
+    return counters.get(f"chat_idempotency{{result={result}}}", 0)
+
+
+class TestIdempotencyStore:
+    @pytest.mark.asyncio
+    async def test_concurrent_duplicate_attaches(self) -> None:
+        metrics.reset()
+        store, turn = IdempotencyStore(), Counter(delay=0.05)
+        results = await asyncio.gather(
+            store.run("k", "fp", turn), store.run("k", "fp", turn)
+        )
+        assert results == ["answer 1", "answer 1"]
+        assert turn.runs == 1
+        assert (_result("new"), _result("attached")) == (1, 1)
+
+    @pytest.mark.asyncio
+    async def test_finished_duplicate_replayed(self) -> None:
+        metrics.reset()
+        store, turn = IdempotencyStore(), Counter()
+        await store.run("k", "fp", turn)
+        assert await store.run("k", "fp", turn) == "answer 1"
+        assert turn.runs == 1
+        assert _result("replayed") == 1
+
+    @pytest.mark.asyncio
+    async def test_expired_result_runs_again(self) -> None:
+        store, turn = IdempotencyStore(ttl=0.01), Counter()
+        await store.run("k", "fp", turn)
+        await asyncio.sleep(0.02)
+        assert await store.run("k", "fp", turn) == "answer 2"
+
+    @pytest.mark.asyncio
+    async def test_key_reused_for_different_request(self) -> None:
+        store = IdempotencyStore()
+        await store.run("k", "fp", Counter())
+        with pytest.raises(IdempotencyConflict):
+            await store.run("k", "other", Counter())
+
+    @pytest.mark.asyncio
+    async def test_failed_run_forgotten(self) -> None:
+        store = IdempotencyStore()
+        with pytest.raises(RuntimeError):
+            await store.run("k", "fp", Counter(fail=True))
+        assert len(store) == 0
+        assert await store.run("k", "fp", Counter()) == "answer 1"
+
+    @pytest.mark.asyncio
+    async def test_abandoned_waiter_does_not_cancel_run(self) -> None:
+        store, turn = IdempotencyStore(), Counter(delay=0.05)
+        first = asyncio.ensure_future(store.run("k", "fp", turn))
+        await asyncio.sleep(0.01)
+        first.cancel()  # the client went away
+        assert await store.run("k", "fp", turn) == "answer 1"
+        assert turn.runs == 1
+
+    @pytest.mark.asyncio
+    async def test_bounded_oldest_finished_evicted(self) -> None:
+        store = IdempotencyStore(max_entries=2)
+        for key in ("a", "b", "c"):
+            await store.run(key, "fp", Counter())
+        assert len(store) == 2
+        turn = Counter()
+        await store.run("a", "fp", turn)  # evicted, so it runs again
+        assert turn.runs == 1
+
+
+class FakeRequest:
+    async def is_disconnected(self) -> bool:
+        return False
+
+
+class TestChatEndpoint:
+    @pytest.mark.asyncio
+    async def test_retry_with_key_runs_agent_once(self) -> None:
+        from agent.app import ChatRequest, chat, chat_requests
+
+        calls: list[str] = []
+
+        async def fake_run_agent(message: str, session_id: str | None = None):  # type: ignore[no-untyped-def]
+            calls.append(message)
+            await asyncio.sleep(0.02)
+            return "Phil has no known allergies.", "session-1"
+
+        request = ChatRequest(message="allergies for Phil", idempotency_key="q-1")
+        with patch("agent.app.run_agent", fake_run_agent):
+            first, second = await asyncio.gather(
+                chat(request, FakeRequest()),  # type: ignore[arg-type]
+                chat(request, FakeRequest()),  # type: ignore[arg-type]
+            )
+            conflicting = ChatRequest(message="meds for Phil", idempotency_key="q-1")
+            with pytest.raises(HTTPException) as exc_info:
+                await chat(conflicting, FakeRequest())  # type: ignore[arg-type]
+
+        assert calls == ["allergies for Phil"]
+        assert first == second
+        assert first.session_id == "session-1"
+        assert exc_info.value.status_code == 422
+        chat_requests._entries.clear()
@@ -0,0 +1,62 @@
+"""Import-time regression tests.
+
+Every uvicorn worker imports agent.app before it can answer a request, so
+whatever that import pulls in is paid on every deploy, restart and
+autoscale event. LangChain, LangGraph and the Anthropic SDK are imported
+lazily (on first agent use) and must stay that way.
+
+Concept — python -X importtime:
+    With this flag the interpreter writes one line per imported module to
+    stderr: "import time: <self us> | <cumulative us> | <module>". We run
+    the import in a fresh subprocess (this test process has already
+    imported everything) and parse those lines.
+
+For a readable breakdown, run benchmarks/import_time.py.
+"""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+
+# Packages that must not be imported just to start the server.
+HEAVY_PACKAGES = ("langchain_anthropic", "langchain_core", "langgraph", "anthropic")
+
+# Generous ceiling for `import agent.app` in a fresh interpreter. It's
+# ~0.5s on a laptop (mostly FastAPI); the eager imports it replaced took
+# ~3s. Raise with care — the point is to catch regressions, not noise.
+IMPORT_BUDGET_SECONDS = 2.0
+
+
+def _import_times(module: str) -> dict[str, int]:
+    """Cumulative import time (microseconds) of every module `module` pulls in."""
+    env = {**os.environ, "PYTHONPATH": str(SRC)}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+    times: dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_app_import_skips_heavy_packages() -> None:
+    """Importing agent.app should not import LangChain/LangGraph/Anthropic."""
+    times = _import_times("agent.app")
+    heavy = sorted(name for name in times if name.split(".")[0] in HEAVY_PACKAGES)
+    assert heavy == [], f"agent.app eagerly imports: {heavy[:10]}"
+
+
+def test_app_import_within_budget() -> None:
+    """Importing agent.app should stay well under the old eager-import cost."""
+    times = _import_times("agent.app")
+    assert times["agent.app"] / 1e6 < IMPORT_BUDGET_SECONDS
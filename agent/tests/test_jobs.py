@@ -0,0 +1,333 @@
+"""Tests for background batch jobs."""
+
+from __future__ import annotations
+
+import asyncio
+import sqlite3
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from agent.jobs import DONE, FAILED, PENDING, JobRunner, JobStore
+
+
+class RateLimited(Exception):
+    """Looks like the provider SDK's 429 error."""
+
+    status_code = 429
+
+    def __init__(self, retry_after: str | None = None) -> None:
+        super().__init__("rate limited")
+        headers = {"retry-after": retry_after} if retry_after is not None else {}
+        self.response = SimpleNamespace(headers=headers)
+
+
+def _runner(tmp_path: Path, **kwargs: object) -> JobRunner:
+    options: dict[str, object] = {"concurrency": 2, "turns_per_minute": 60_000}
+    options.update(kwargs)
+    return JobRunner(JobStore(tmp_path / "jobs.sqlite3"), **options)  # type: ignore[arg-type]
+
+
+async def _answer(prompt: str, session_id: str) -> tuple[str, str]:
+    return f"answer to {prompt}", session_id
+
+
+class TestJobRunner:
+    @pytest.mark.asyncio
+    async def test_runs_every_prompt(self, tmp_path: Path) -> None:
+        runner = _runner(tmp_path)
+        with patch("agent.jobs.run_agent", side_effect=_answer):
+            job_id = await runner.submit("prompts", ["q1", "q2", "q3"])
+            await runner.join()
+        await runner.stop()
+
+        status = await runner.get(job_id)
+        assert status is not None
+        assert status.status == "done"
+        assert status.counts[DONE] == 3
+        assert [item.response for item in status.items] == [
+            "answer to q1",
+            "answer to q2",
+            "answer to q3",
+        ]
+        assert status.items[0].session_id == f"job-{job_id}-0"
+
+    @pytest.mark.asyncio
+    async def test_concurrency_is_capped(self, tmp_path: Path) -> None:
+        running = peak = 0
+
+        async def slow(prompt: str, session_id: str) -> tuple[str, str]:
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return "ok", session_id
+
+        runner = _runner(tmp_path, concurrency=2)
+        with patch("agent.jobs.run_agent", side_effect=slow):
+            await runner.submit("prompts", [f"q{i}" for i in range(6)])
+            await runner.join()
+        await runner.stop()
+        assert peak == 2
+
+    @pytest.mark.asyncio
+    async def test_rate_limited_item_is_retried(self, tmp_path: Path) -> None:
+        calls = 0
+
+        async def flaky(prompt: str, session_id: str) -> tuple[str, str]:
+            nonlocal calls
+            calls += 1
+            if calls == 1:
+                raise RateLimited(retry_after="0.01")
+            return "ok", session_id
+
+        runner = _runner(tmp_path)
+        with patch("agent.jobs.run_agent", side_effect=flaky):
+            job_id = await runner.submit("prompts", ["q"])
+            await runner.join()
+        await runner.stop()
+
+        status = await runner.get(job_id)
+        assert status is not None
+        assert status.items[0].status == DONE
+        assert status.items[0].attempts == 2
+
+    @pytest.mark.asyncio
+    async def test_gives_up_after_max_attempts(self, tmp_path: Path) -> None:
+        runner = _runner(tmp_path, max_attempts=2)
+        with (
+            patch("agent.jobs.run_agent", side_effect=RateLimited()),
+            patch("agent.jobs.BACKOFF_SECONDS", 0.001),
+        ):
+            job_id = await runner.submit("prompts", ["q"])
+            await runner.join()
+        await runner.stop()
+
+        item = (await runner.get(job_id)).items[0]  # type: ignore[union-attr]
+        assert item.status == FAILED
+        assert item.attempts == 2
+
+    @pytest.mark.asyncio
+    async def test_other_errors_fail_the_item_only(self, tmp_path: Path) -> None:
+        async def picky(prompt: str, session_id: str) -> tuple[str, str]:
+            if prompt == "bad":
+                raise RuntimeError("boom")
+            return "ok", session_id
+
+        runner = _runner(tmp_path)
+        with patch("agent.jobs.run_agent", side_effect=picky):
+            job_id = await runner.submit("prompts", ["bad", "good"])
+            await runner.join()
+        await runner.stop()
+
+        items = (await runner.get(job_id)).items  # type: ignore[union-attr]
+        assert [item.status for item in items] == [FAILED, DONE]
+        assert items[0].error == "RuntimeError: boom"
+        assert items[0].attempts == 1
+
+    @pytest.mark.asyncio
+    async def test_patient_job_asks_for_summary(self, tmp_path: Path) -> None:
+        client = MagicMock()
+        client.get = AsyncMock(
+            return_value={
+                "data": {
+                    "pid": "1",
+                    "uuid": "abc-123",
+                    "fname": "Phil",
+                    "lname": "Dixon",
+                    "DOB": "1980-01-01",
+                }
+            }
+        )
+        run = AsyncMock(return_value=("summary", "s"))
+        runner = _runner(tmp_path)
+        with (
+            patch("agent.jobs.get_client", AsyncMock(return_value=client)),
+            patch("agent.jobs.run_agent", run),
+        ):
+            await runner.submit("patients", ["abc-123"])
+            await runner.join()
+        await runner.stop()
+
+        client.get.assert_awaited_once_with("/patient/abc-123")
+        prompt = run.await_args.args[0]
+        assert "Phil Dixon" in prompt
+        assert "patient ID 1" in prompt
+        assert "abc-123" in prompt
+
+    @pytest.mark.asyncio
+    async def test_drain_leaves_unstarted_items_pending(self, tmp_path: Path) -> None:
+        from agent.drain import TurnTracker
+
+        tracker = TurnTracker()
+        await tracker.drain(grace=0)
+        runner = _runner(tmp_path)
+        with (
+            patch("agent.jobs.turns", tracker),
+            patch("agent.jobs.run_agent", side_effect=_answer) as run_agent,
+        ):
+            job_id = await runner.submit("prompts", ["q1", "q2"])
+            await runner.join()
+        await runner.stop()
+
+        status = await runner.get(job_id)
+        assert status is not None
+        assert status.counts[PENDING] == 2
+        run_agent.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_zero_turns_per_minute_means_no_limit(self, tmp_path: Path) -> None:
+        runner = _runner(tmp_path, turns_per_minute=0)
+        assert runner.bucket is None
+        with patch("agent.jobs.run_agent", side_effect=_answer):
+            job_id = await runner.submit("prompts", ["q1", "q2"])
+            await runner.join()
+        await runner.stop()
+        assert (await runner.get(job_id)).status == "done"  # type: ignore[union-attr]
+
+    @pytest.mark.asyncio
+    async def test_rejects_empty_and_unknown_jobs(self, tmp_path: Path) -> None:
+        runner = _runner(tmp_path)
+        with pytest.raises(ValueError, match="at least one"):
+            await runner.submit("prompts", [])
+        with pytest.raises(ValueError, match="labs"):
+            await runner.submit("labs", ["q"])
+
+
+class TestCheckpoints:
+    @pytest.mark.asyncio
+    async def test_store_lock_wait_does_not_block_the_loop(
+        self, tmp_path: Path
+    ) -> None:
+        runner = _runner(tmp_path)
+        other_worker = sqlite3.connect(tmp_path / "jobs.sqlite3", isolation_level=None)
+        other_worker.execute("BEGIN IMMEDIATE")
+        ticks = 0
+
+        async def chat_turns() -> None:
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(chat_turns())
+        with patch("agent.jobs.run_agent", side_effect=_answer):
+            submit = asyncio.create_task(runner.submit("prompts", ["q"]))
+            await asyncio.sleep(0.2)
+            assert not submit.done()
+            other_worker.execute("COMMIT")
+            job_id = await submit
+            await runner.join()
+        ticker.cancel()
+        await runner.stop()
+
+        assert ticks >= 10
+        assert (await runner.get(job_id)).status == "done"  # type: ignore[union-attr]
+        other_worker.close()
+
+    @pytest.mark.asyncio
+    async def test_resume_runs_only_unfinished_items(self, tmp_path: Path) -> None:
+        store = JobStore(tmp_path / "jobs.sqlite3")
+        job_id = store.create("prompts", ["q0", "q1", "q2"], owner="old-process")
+        store.start_item(job_id, 0, "old-process")
+        store.finish_item(job_id, 0, "earlier answer", "s0")
+        store.start_item(job_id, 1, "old-process")  # was running when the process died
+        store.release("old-process")
+
+        run = AsyncMock(side_effect=_answer)
+        runner = JobRunner(store, turns_per_minute=60_000)
+        with patch("agent.jobs.run_agent", run):
+            assert await runner.resume() == 2
+            await runner.join()
+        await runner.stop()
+
+        assert sorted(c.args[0] for c in run.await_args_list) == ["q1", "q2"]
+        items = store.get(job_id).items  # type: ignore[union-attr]
+        assert items[0].response == "earlier answer"
+        assert [item.status for item in items] == [DONE, DONE, DONE]
+
+    def test_live_owner_keeps_its_job(self, tmp_path: Path) -> None:
+        store = JobStore(tmp_path / "jobs.sqlite3")
+        store.create("prompts", ["q0"], owner="busy-process")
+        assert store.claim_unfinished("new-process") == []
+
+    def test_only_the_owner_starts_items(self, tmp_path: Path) -> None:
+        store = JobStore(tmp_path / "jobs.sqlite3")
+        job_id = store.create("prompts", ["q0"], owner="old-process")
+        store.release("old-process")
+        assert store.claim_unfinished("new-process") == [(job_id, "prompts", 0, "q0")]
+
+        assert store.start_item(job_id, 0, "old-process") is None
+        assert store.start_item(job_id, 0, "new-process") == 1
+
+    @pytest.mark.asyncio
+    async def test_waiting_runner_keeps_its_jobs(self, tmp_path: Path) -> None:
+        """A long turn must not let another process take the job over."""
+        release = asyncio.Event()
+
+        async def long_turn(prompt: str, session_id: str) -> tuple[str, str]:
+            await release.wait()
+            return "ok", session_id
+
+        runner = _runner(tmp_path)
+        with (
+            patch("agent.jobs.HEARTBEAT_INTERVAL", 0.01),
+            patch("agent.jobs.run_agent", side_effect=long_turn),
+        ):
+            job_id = await runner.submit("prompts", ["q"])
+            await asyncio.sleep(0.1)
+            assert runner.store.claim_unfinished("other", stale_after=0.05) == []
+            release.set()
+            await runner.join()
+        await runner.stop()
+        assert (await runner.get(job_id)).status == "done"  # type: ignore[union-attr]
+
+    def test_status_reports_progress(self, tmp_path: Path) -> None:
+        store = JobStore(tmp_path / "jobs.sqlite3")
+        job_id = store.create("prompts", ["q0", "q1"], owner="me")
+        assert store.get(job_id).status == "queued"  # type: ignore[union-attr]
+        store.start_item(job_id, 0, "me")
+        store.finish_item(job_id, 0, "answer", "s0")
+
+        status = store.get(job_id)
+        assert status is not None
+        assert status.status == "running"
+        assert status.counts == {PENDING: 1, "running": 0, DONE: 1, FAILED: 0}
+        assert status.to_dict()["total"] == 2
+        assert store.get("no-such-job") is None
+
+
+class TestJobsAPI:
+    def test_create_job(self) -> None:
+        from agent.app import app
+
+        runner = MagicMock()
+        runner.submit = AsyncMock(return_value="job-1")
+        with patch("agent.app.get_job_runner", return_value=runner):
+            response = TestClient(app).post(
+                "/agent/jobs", json={"patient_uuids": ["a", "b"]}
+            )
+        assert response.status_code == 202
+        assert response.json() == {"job_id": "job-1", "total": 2}
+        runner.submit.assert_awaited_once_with("patients", ["a", "b"])
+
+    def test_needs_exactly_one_kind_of_input(self) -> None:
+        from agent.app import app
+
+        client = TestClient(app)
+        assert client.post("/agent/jobs", json={}).status_code == 422
+        both = {"prompts": ["q"], "patient_uuids": ["a"]}
+        assert client.post("/agent/jobs", json=both).status_code == 422
+
+    def test_unknown_job_is_404(self) -> None:
+        from agent.app import app
+
+        runner = MagicMock()
+        runner.get = AsyncMock(return_value=None)
+        with patch("agent.app.get_job_runner", return_value=runner):
+            response = TestClient(app).get("/agent/jobs/nope")
+        assert response.status_code == 404
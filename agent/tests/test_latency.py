@@ -0,0 +1,256 @@
+"""Tests for per-endpoint latency tracking, adaptive timeouts and hedged GETs."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from agent.latency import (
+    AdaptiveTimeouts,
+    HedgePolicy,
+    LatencyTracker,
+    endpoint_template,
+)
+from agent.metrics import metrics
+from agent.openemr_client import OpenEMRAPIError, OpenEMRClient
+
+
+def _tracker(template: str, seconds: float, samples: int = 20) -> LatencyTracker:
+    tracker = LatencyTracker()
+    for _ in range(samples):
+        tracker.observe(template, seconds)
+    return tracker
+
+
+def _hedges(result: str, endpoint: str = "/x") -> float:
+    counters = metrics.snapshot()["counters"]
+    return counters.get(f"openemr_hedges{{endpoint={endpoint},result={result}}}", 0)
+
+
+class TestEndpointTemplate:
+    @pytest.mark.parametrize(
+        ("endpoint", "template"),
+        [
+            ("/patient", "/patient"),
+            ("/patient/9a1f0c2e-77aa-4b1e-9b6a-1c2d3e4f5a6b", "/patient/{id}"),
+            ("/patient/12/medication", "/patient/{id}/medication"),
+            ("/patient/1/encounter/5/vital", "/patient/{id}/encounter/{id}/vital"),
+            ("/practitioner?name=x1", "/practitioner"),
+        ],
+    )
+    def test_ids_replaced(self, endpoint: str, template: str) -> None:
+        assert endpoint_template(endpoint) == template
+
+
+class TestLatencyTracker:
+    def test_needs_enough_samples(self) -> None:
+        tracker = _tracker("/x", 0.1, samples=19)
+        assert tracker.percentile("/x", 95) is None
+        tracker.observe("/x", 0.5)
+        assert tracker.percentile("/x", 95) == 0.1
+        assert tracker.percentile("/y", 95) is None
+
+
+class TestAdaptiveTimeouts:
+    def test_default_until_enough_history(self) -> None:
+        timeouts = AdaptiveTimeouts(_tracker("/x", 0.1, samples=5), 30, 5, 4)
+        assert timeouts.timeout("/x") == 30
+
+    @pytest.mark.parametrize(
+        ("latency", "timeout"), [(0.1, 5.0), (2.0, 8.0), (20.0, 30.0)]
+    )
+    def test_multiple_of_p99_within_bounds(
+        self, latency: float, timeout: float
+    ) -> None:
+        metrics.reset()
+        timeouts = AdaptiveTimeouts(_tracker("/x", latency), 30, 5, 4)
+        assert timeouts.timeout("/x") == pytest.approx(timeout)
+        gauges = metrics.snapshot()["gauges"]
+        assert gauges["openemr_timeout_seconds{endpoint=/x}"] == pytest.approx(timeout)
+
+
+class TestHedgePolicy:
+    @staticmethod
+    def _sender(*delays: float, fail: tuple[int, ...] = ()):  # type: ignore[no-untyped-def]
+        calls: list[int] = []
+
+        async def send() -> str:
+            n = len(calls)
+            calls.append(n)
+            await asyncio.sleep(delays[n])
+            if n in fail:
+                raise httpx.ConnectError(f"copy {n} failed")
+            return f"copy {n}"
+
+        return send, calls
+
+    @pytest.mark.asyncio
+    async def test_fast_response_not_hedged(self) -> None:
+        policy = HedgePolicy(_tracker("/x", 0.05))
+        send, calls = self._sender(0.0)
+        assert await policy.run("/x", send) == "copy 0"
+        assert len(calls) == 1
+
+    @pytest.mark.asyncio
+    async def test_slow_response_hedged_and_hedge_wins(self) -> None:
+        metrics.reset()
+        policy = HedgePolicy(_tracker("/x", 0.05))
+        send, calls = self._sender(5.0, 0.0)
+        started = time.monotonic()
+        assert await policy.run("/x", send) == "copy 1"
+        assert time.monotonic() - started < 1
+        assert len(calls) == 2
+        assert (_hedges("issued"), _hedges("won")) == (1, 1)
+
+    @pytest.mark.asyncio
+    async def test_no_hedging_without_history(self) -> None:
+        policy = HedgePolicy(LatencyTracker())
+        send, calls = self._sender(0.1)
+        await policy.run("/x", send)
+        assert len(calls) == 1
+
+    @pytest.mark.asyncio
+    async def test_budget_caps_extra_requests(self) -> None:
+        metrics.reset()
+        policy = HedgePolicy(_tracker("/x", 0.05), max_extra=0.0)
+        policy._budget = 0.0
+        send, calls = self._sender(0.1)
+        assert await policy.run("/x", send) == "copy 0"
+        assert len(calls) == 1
+        assert _hedges("skipped") == 1
+
+    @pytest.mark.asyncio
+    async def test_failed_copy_falls_back_to_other(self) -> None:
+        policy = HedgePolicy(_tracker("/x", 0.05))
+        send, _ = self._sender(0.1, 0.2, fail=(0,))
+        assert await policy.run("/x", send) == "copy 1"
+
+    @pytest.mark.asyncio
+    async def test_both_copies_fail(self) -> None:
+        policy = HedgePolicy(_tracker("/x", 0.05))
+        send, _ = self._sender(0.1, 0.1, fail=(0, 1))
+        with pytest.raises(httpx.ConnectError):
+            await policy.run("/x", send)
+
+
+@pytest.mark.asyncio
+async def test_client_hedges_slow_get() -> None:
+    metrics.reset()
+    calls = 0
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal calls
+        calls += 1
+        if calls == 21:  # the first copy of the last request hangs
+            await asyncio.sleep(5)
+        return httpx.Response(200, json={"data": [{"title": "Penicillin"}]})
+
+    client = OpenEMRClient(
+        base_url="https://localhost:9300",
+        verify_ssl=False,
+        cache_backend="none",
+        hedge=True,
+    )
+    client._http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    client._access_token = "test-access-token"
+    client._token_expires_at = time.time() + 3600
+
+    for _ in range(20):  # learn the endpoint's latency
+        await client.get("/patient/abc-123/allergy")
+    started = time.monotonic()
+    data = await client.get("/patient/abc-123/allergy")
+
+    assert data["data"][0]["title"] == "Penicillin"
+    assert time.monotonic() - started < 1
+    assert _hedges("won", "/patient/{id}/allergy") == 1
+    histograms = metrics.snapshot()["histograms"]
+    assert (
+        histograms["openemr_request_ms{endpoint=/patient/{id}/allergy}"]["count"] == 21
+    )
+    await client.close()
+
+
+def _client(handler) -> OpenEMRClient:  # type: ignore[no-untyped-def]
+    client = OpenEMRClient(
+        base_url="https://localhost:9300",
+        verify_ssl=False,
+        cache_backend="none",
+        timeout=30.0,
+        adaptive_timeouts=True,
+    )
+    client._http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    client._access_token = "test-access-token"
+    client._token_expires_at = time.time() + 3600
+    return client
+
+
+@pytest.mark.asyncio
+async def test_client_learns_timeout_per_endpoint() -> None:
+    timeouts: dict[str, list[float]] = {}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        template = endpoint_template(request.url.path.removeprefix("/apis/default/api"))
+        timeouts.setdefault(template, []).append(request.extensions["timeout"]["read"])
+        return httpx.Response(200, json={"data": []})
+
+    client = _client(handler)
+    for _ in range(21):
+        await client.get("/patient/abc-123/allergy")
+    await client.get("/patient/abc-123/encounter")
+
+    allergy = timeouts["/patient/{id}/allergy"]
+    assert allergy[0] == 30.0  # no history yet
+    assert allergy[-1] == client._timeouts.minimum  # fast endpoint: the floor
+    assert timeouts["/patient/{id}/encounter"] == [30.0]  # learned separately
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_client_timeout_counted_and_observed() -> None:
+    metrics.reset()
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    client = _client(handler)
+    with pytest.raises(OpenEMRAPIError, match="timed out after 30.0s"):
+        await client.get("/patient/abc-123/allergy")
+
+    snapshot = metrics.snapshot()
+    assert snapshot["counters"]["openemr_timeouts{endpoint=/patient/{id}/allergy}"] == 1
+    assert (
+        snapshot["histograms"]["openemr_request_ms{endpoint=/patient/{id}/allergy}"][
+            "count"
+        ]
+        == 1
+    )
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_deadline_cutoff_is_not_latency() -> None:
+    """A timeout forced by the turn deadline doesn't teach the endpoint."""
+    from agent.deadline import set_deadline
+
+    metrics.reset()
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    client = _client(handler)
+    set_deadline(2)
+    try:
+        with pytest.raises(OpenEMRAPIError, match="turn deadline"):
+            await client.get("/patient/abc-123/allergy")
+    finally:
+        set_deadline(0)
+
+    snapshot = metrics.snapshot()
+    endpoint = "{endpoint=/patient/{id}/allergy}"
+    assert snapshot["counters"][f"openemr_deadline_cutoffs{endpoint}"] == 1
+    assert f"openemr_timeouts{endpoint}" not in snapshot["counters"]
+    assert f"openemr_request_ms{endpoint}" not in snapshot["histograms"]
+    await client.close()
@@ -0,0 +1,85 @@
+"""Tests for medication name normalization.
+
+The lexicon maps free-text medication titles (as stored in OpenEMR) to
+RxNorm ingredient IDs. These tests cover brand/generic synonyms,
+combination products, whole-word matching, and user-supplied extensions.
+"""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+from agent.medication_lexicon import Ingredient, MedicationLexicon, get_lexicon
+
+
+def test_generic_name_with_dose_text() -> None:
+    """Dose and form text around the name should not affect matching."""
+    result = get_lexicon().normalize("Lisinopril 10mg tab")
+    assert result == [Ingredient(rxcui="29046", name="lisinopril")]
+
+
+def test_brand_name_maps_to_generic() -> None:
+    """Brand names should resolve to the same ingredient as the generic."""
+    lexicon = get_lexicon()
+    assert lexicon.normalize("ZESTRIL") == lexicon.normalize("lisinopril")
+
+
+def test_combination_product_returns_all_ingredients() -> None:
+    """A combination brand should map to every ingredient it contains."""
+    names = [i.name for i in get_lexicon().normalize("Hyzaar 50-12.5 mg")]
+    assert names == ["losartan", "hydrochlorothiazide"]
+
+
+def test_multiword_and_punctuated_terms() -> None:
+    """Punctuation is treated as whitespace when matching."""
+    names = [
+        i.name for i in get_lexicon().normalize("Lisinopril-HCTZ; Insulin Glargine")
+    ]
+    assert names == ["lisinopril", "hydrochlorothiazide", "insulin glargine"]
+
+
+def test_only_whole_words_match() -> None:
+    """Terms embedded inside other words must not match."""
+    lexicon = get_lexicon()
+    assert lexicon.normalize("Casablanca") == []  # contains "asa"
+    assert lexicon.normalize("Metforminex") == []
+
+
+def test_overlapping_terms_found_via_failure_links() -> None:
+    """Terms that share prefixes/suffixes are all found in one pass."""
+    lexicon = MedicationLexicon(
+        {"1": "he", "2": "she", "3": "hers"},
+        {},
+    )
+    assert [i.rxcui for i in lexicon.find("she hers he")] == ["2", "3", "1"]
+
+
+def test_unknown_medication_returns_empty() -> None:
+    assert get_lexicon().normalize("Compounded cream") == []
+
+
+def test_extension_file(tmp_path: Path) -> None:
+    """JSON extension files add ingredients and synonyms to the built-ins."""
+    extra = tmp_path / "lexicon.json"
+    extra.write_text(
+        json.dumps(
+            {
+                "ingredients": {"999": "examplemab"},
+                "synonyms": {"exampla": ["999"]},
+            }
+        )
+    )
+    lexicon = MedicationLexicon.from_sources([extra])
+
+    assert lexicon.normalize("Exampla 5 mg") == [Ingredient("999", "examplemab")]
+    assert lexicon.normalize("Lipitor")[0].name == "atorvastatin"
+
+
+def test_bad_extension_file_falls_back_to_builtins(tmp_path: Path) -> None:
+    """A missing or malformed file doesn't disable medication lookups."""
+    malformed = tmp_path / "lexicon.json"
+    malformed.write_text("{not json")
+    lexicon = MedicationLexicon.from_sources([tmp_path / "missing.json", malformed])
+
+    assert lexicon.normalize("Lipitor")[0].name == "atorvastatin"
@@ -0,0 +1,282 @@
+"""Tests for per-step model routing and fast-step escalation."""
+
+from __future__ import annotations
+
+from typing import Any
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.runnables import RunnableLambda
+
+from agent.agent import _build_tools
+from agent.metrics import metrics
+from agent.model_routing import ModelRouter
+from agent.ratelimit import LLMLimiter
+
+SEARCH_RESULT = (
+    "Found 1 patient(s):\n"
+    "- Phil Dixon | DOB: 1980-01-01 | Sex: Male | pid: 1 | uuid: abc-123"
+)
+
+
+class ScriptedModel:
+    """Stands in for a chat model: returns queued replies, records calls."""
+
+    def __init__(self, *replies: AIMessage | Exception) -> None:
+        self.replies = list(replies)
+        self.calls = 0
+        self.bound: list[list[str]] = []
+
+    def bind_tools(self, tools: Any) -> RunnableLambda[Any, AIMessage]:
+        self.bound.append([tool.name for tool in tools])
+
+        async def reply(_prompt: Any) -> AIMessage:
+            self.calls += 1
+            next_reply = self.replies.pop(0)
+            if isinstance(next_reply, Exception):
+                raise next_reply
+            return next_reply
+
+        return RunnableLambda(reply)
+
+
+def _call(name: str, **args: Any) -> AIMessage:
+    return AIMessage(
+        content="", tool_calls=[{"name": name, "args": args, "id": f"call_{name}"}]
+    )
+
+
+def _router(
+    fast: ScriptedModel | None, strong: ScriptedModel, **kwargs: Any
+) -> ModelRouter:
+    return ModelRouter(
+        strong,  # type: ignore[arg-type]
+        fast,  # type: ignore[arg-type]
+        tools=_build_tools(),
+        strong_name="strong-model",
+        fast_name="fast-model",
+        **kwargs,
+    )
+
+
+def _after_search(question: str) -> list[Any]:
+    return [
+        HumanMessage(content=question),
+        _call("patient_search", query="Phil Dixon"),
+        ToolMessage(content=SEARCH_RESULT, tool_call_id="call_patient_search"),
+    ]
+
+
+class TestChoose:
+    def test_no_fast_model_always_strong(self) -> None:
+        router = _router(None, ScriptedModel())
+        assert router.choose([HumanMessage(content="Find Phil Dixon")]) == "strong"
+
+    def test_planning_step_is_fast(self) -> None:
+        router = _router(ScriptedModel(), ScriptedModel())
+        question = [HumanMessage(content="Summarize Phil Dixon's chart")]
+        assert router.choose(question) == "fast"
+
+    def test_simple_answer_is_fast(self) -> None:
+        router = _router(ScriptedModel(), ScriptedModel())
+        assert router.choose(_after_search("Find Phil Dixon")) == "fast"
+
+    def test_synthesis_answer_is_strong(self) -> None:
+        router = _router(ScriptedModel(), ScriptedModel())
+        messages = _after_search("Summarize Phil Dixon's chart")
+        assert router.choose(messages) == "strong"
+
+    def test_many_tool_results_is_strong(self) -> None:
+        router = _router(ScriptedModel(), ScriptedModel())
+        router.max_fast_tool_results = 0
+        assert router.choose(_after_search("Find Phil Dixon")) == "strong"
+
+    def test_only_current_turn_counts(self) -> None:
+        router = _router(ScriptedModel(), ScriptedModel())
+        messages = [
+            *_after_search("Summarize Phil Dixon's chart"),
+            AIMessage(content="Summary ..."),
+            HumanMessage(content="What are his allergies?"),
+        ]
+        assert router.choose(messages) == "fast"
+
+
+class TestValidate:
+    @pytest.fixture
+    def router(self) -> ModelRouter:
+        return _router(ScriptedModel(), ScriptedModel())
+
+    def test_good_call(self, router: ModelRouter) -> None:
+        step = _call("get_allergies", patient_uuid="abc-123")
+        assert router.validate(step, _after_search("allergies?")) is None
+
+    @pytest.mark.parametrize(
+        ("step", "reason"),
+        [
+            (AIMessage(content=""), "empty"),
+            (_call("get_labs", patient_uuid="abc-123"), "unknown_tool"),
+            (_call("get_allergies"), "bad_args"),
+            (_call("get_allergies", patient_uuid="1"), "wrong_id"),
+            (_call("get_medications", patient_id="abc-123"), "wrong_id"),
+            (_call("get_allergies", patient_uuid="zzz-999"), "unseen_id"),
+        ],
+    )
+    def test_bad_steps(self, router: ModelRouter, step: AIMessage, reason: str) -> None:
+        assert router.validate(step, _after_search("allergies?")) == reason
+
+
+class TestEscalation:
+    @pytest.mark.asyncio
+    async def test_valid_fast_step_is_used(self) -> None:
+        fast = ScriptedModel(_call("patient_search", query="Phil Dixon"))
+        strong = ScriptedModel()
+        router = _router(fast, strong)
+        state = {"messages": [HumanMessage(content="Find Phil Dixon")]}
+
+        response = await router(state, None).ainvoke(state["messages"])
+
+        assert response.tool_calls[0]["name"] == "patient_search"
+        assert (fast.calls, strong.calls) == (1, 0)
+
+    @pytest.mark.asyncio
+    async def test_invalid_fast_step_escalates(self) -> None:
+        metrics.reset()
+        fast = ScriptedModel(_call("get_allergies", patient_uuid="1"))
+        strong = ScriptedModel(_call("get_allergies", patient_uuid="abc-123"))
+        router = _router(fast, strong)
+        state = {"messages": _after_search("Allergies for Phil Dixon")}
+
+        response = await router(state, None).ainvoke(state["messages"])
+
+        assert response.tool_calls[0]["args"] == {"patient_uuid": "abc-123"}
+        assert (fast.calls, strong.calls) == (1, 1)
+        snapshot = metrics.snapshot()
+        assert snapshot["counters"]["model_escalations{reason=wrong_id}"] == 1
+
+    @pytest.mark.asyncio
+    async def test_fast_model_error_escalates(self) -> None:
+        fast = ScriptedModel(RuntimeError("overloaded"))
+        strong = ScriptedModel(AIMessage(content="Phil Dixon (DOB: 1980-01-01)"))
+        router = _router(fast, strong)
+        state = {"messages": _after_search("Find Phil Dixon")}
+
+        response = await router(state, None).ainvoke(state["messages"])
+
+        assert "Phil Dixon" in response.content
+        assert strong.calls == 1
+
+    @pytest.mark.asyncio
+    async def test_per_model_metrics(self) -> None:
+        metrics.reset()
+        reply = AIMessage(
+            content="Done",
+            usage_metadata={
+                "input_tokens": 120,
+                "output_tokens": 8,
+                "total_tokens": 128,
+            },
+        )
+        router = _router(ScriptedModel(reply), ScriptedModel())
+        state = {"messages": _after_search("Find Phil Dixon")}
+
+        await router(state, None).ainvoke(state["messages"])
+
+        snapshot = metrics.snapshot()
+        counters = snapshot["counters"]
+        assert counters["llm_steps{model=fast-model}"] == 1
+        assert counters["llm_tokens{kind=input_tokens,model=fast-model}"] == 120
+        assert "llm_step_ms{model=fast-model,tools=all}" in snapshot["histograms"]
+
+
+class TestToolBinding:
+    @pytest.mark.asyncio
+    async def test_binds_selected_subset(self) -> None:
+        from agent.tool_selection import select_tools
+
+        strong = ScriptedModel(_call("patient_search", query="Phil Dixon"))
+        router = _router(None, strong, select=select_tools)
+        state = {"messages": [HumanMessage(content="Allergies for Phil Dixon")]}
+
+        await router(state, None).ainvoke(state["messages"])
+
+        assert strong.bound == [["patient_search", "get_allergies"]]
+
+    @pytest.mark.asyncio
+    async def test_bound_model_is_reused(self) -> None:
+        strong = ScriptedModel(AIMessage(content="a"), AIMessage(content="b"))
+        router = _router(None, strong)
+        state = {"messages": [HumanMessage(content="hello")]}
+
+        await router(state, None).ainvoke(state["messages"])
+        await router(state, None).ainvoke(state["messages"])
+
+        assert len(strong.bound) == 1 and len(strong.bound[0]) == 10
+
+
+class TestRateLimiting:
+    @pytest.mark.asyncio
+    async def test_budget_reserved_and_settled(self) -> None:
+        limiter = LLMLimiter(input_tokens_per_minute=60_000)
+        bucket = limiter.buckets["input_tokens"]
+        reply = AIMessage(
+            content="Done",
+            usage_metadata={"input_tokens": 5, "output_tokens": 1, "total_tokens": 6},
+        )
+        router = _router(None, ScriptedModel(reply), limiter=limiter)
+        state = {"messages": [HumanMessage(content="hello")]}
+
+        full = bucket.available
+        await router(state, None).ainvoke(state["messages"])
+
+        # The estimate (prompt + tool definitions) was replaced by the real 5.
+        assert full - bucket.available == pytest.approx(5, abs=1)
+
+    @pytest.mark.asyncio
+    async def test_provider_429_pauses_limiter(self) -> None:
+        class RateLimited(Exception):
+            status_code = 429
+
+        limiter = LLMLimiter(requests_per_minute=600)
+        router = _router(None, ScriptedModel(RateLimited()), limiter=limiter)
+        state = {"messages": [HumanMessage(content="hello")]}
+
+        with pytest.raises(RateLimited):
+            await router(state, None).ainvoke(state["messages"])
+        assert metrics.snapshot()["counters"]["llm_limiter_pauses"] >= 1
+
+    @pytest.mark.asyncio
+    async def test_failed_call_refunds_its_tokens(self) -> None:
+        limiter = LLMLimiter(input_tokens_per_minute=60_000)
+        bucket = limiter.buckets["input_tokens"]
+        router = _router(None, ScriptedModel(RuntimeError("529")), limiter=limiter)
+        state = {"messages": [HumanMessage(content="hello")]}
+
+        full = bucket.available
+        with pytest.raises(RuntimeError):
+            await router(state, None).ainvoke(state["messages"])
+        assert bucket.available == pytest.approx(full, abs=1)
+
+
+@pytest.mark.asyncio
+async def test_drives_react_agent(monkeypatch: pytest.MonkeyPatch) -> None:
+    """The router plugs into create_react_agent as a dynamic model."""
+    from langgraph.prebuilt import create_react_agent
+
+    async def fake_search(query: str) -> tuple[str, tuple[Any, ...]]:
+        return SEARCH_RESULT, ()
+
+    tools = _build_tools()
+    search = next(t for t in tools if t.name == "patient_search")
+    monkeypatch.setattr(search, "coroutine", fake_search)
+
+    fast = ScriptedModel(
+        _call("patient_search", query="Phil Dixon"),
+        AIMessage(content="Phil Dixon (DOB: 1980-01-01), pid 1."),
+    )
+    router = ModelRouter(ScriptedModel(), fast, tools=tools)  # type: ignore[arg-type]
+    agent = create_react_agent(model=router, tools=tools, prompt="test")
+
+    result = await agent.ainvoke({"messages": [HumanMessage(content="Find Phil")]})
+
+    assert result["messages"][-1].content.startswith("Phil Dixon")
+    assert fast.calls == 2
@@ -10,16 +10,25 @@ Concept — Mocking HTTP calls:
     refresh logic, and error handling without any external dependencies.
 """
 
+import asyncio
 import time
+from pathlib import Path
+from unittest.mock import patch
 
 import httpx
 import pytest
 
+from agent import openemr_client
+from agent.json_decode import LazyJSON
+from agent.metrics import metrics
 from agent.openemr_client import (
     OpenEMRAPIError,
     OpenEMRAuthError,
     OpenEMRClient,
+    close_client,
+    get_client,
 )
+from agent.token_cache import CachedCredentials, TokenCache
 
 # --- Test helpers ---
 
@@ -308,6 +317,54 @@ class TestAPIRequests:
 
         await client.close()
 
+    @pytest.mark.asyncio
+    async def test_stdlib_decoder_matches_default(self) -> None:
+        """Forcing the stdlib decoder should give the same result."""
+        body = {"validationErrors": [], "data": [{"pid": "1", "fname": "Phil"}]}
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            if "/token" in str(request.url):
+                return httpx.Response(200, json=_token_response())
+            return httpx.Response(200, json=body)
+
+        for name in ("auto", "json"):
+            client = _make_client(json_decoder=name)
+            client._http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            await client.initialize()
+            assert await client.get("/patient") == body
+            await client.close()
+
+    @pytest.mark.asyncio
+    async def test_lazy_json_decodes_on_first_access(self) -> None:
+        """With lazy_json, objects are parsed only when a key is read."""
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            if "/token" in str(request.url):
+                return httpx.Response(200, json=_token_response())
+            if "/api/patient" in str(request.url):
+                return httpx.Response(200, json={"data": [{"id": "1"}]})
+            return httpx.Response(200, json=[1, 2])
+
+        client = _make_client(lazy_json=True)
+        client._http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        await client.initialize()
+
+        result = await client.get("/patient")
+        assert isinstance(result, LazyJSON)
+        assert not result.decoded
+        assert result.get("data", []) == [{"id": "1"}]
+        assert result.decoded
+        assert result == {"data": [{"id": "1"}]}
+
+        # Arrays don't fit the mapping interface, so they decode eagerly
+        assert await client.get("/version") == [1, 2]
+
+        await client.close()
+
+    def test_unknown_decoder_rejected(self) -> None:
+        with pytest.raises(ValueError, match="Unknown JSON decoder"):
+            _make_client(json_decoder="yaml")
+
 
 # --- Initialize flow tests ---
 
@@ -362,3 +419,374 @@ class TestInitialize:
         assert call_log == ["register", "token"]
 
         await client.close()
+
+    @pytest.mark.asyncio
+    async def test_warm_sends_one_request_per_connection(self) -> None:
+        """warm() should authenticate and hit /version once per connection."""
+        version_calls: list[str] = []
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            if "/token" in str(request.url):
+                return httpx.Response(200, json=_token_response())
+            if str(request.url).endswith("/api/version"):
+                version_calls.append(request.headers["authorization"])
+                return httpx.Response(200, json={"data": {"version": "7.0.3"}})
+            return httpx.Response(404)
+
+        client = _make_client()
+        client._http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+        await client.warm(3)
+
+        assert version_calls == ["Bearer test-access-token"] * 3
+
+        await client.close()
+
+
+# --- Shared client tests ---
+
+
+class TestSharedClient:
+    """Tests for the get_client() / close_client() singleton."""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_first_calls_create_one_client(self) -> None:
+        """Racing first calls should share a single initialized client."""
+        inits: list[OpenEMRClient] = []
+
+        async def fake_initialize(self: OpenEMRClient) -> None:
+            inits.append(self)
+            await asyncio.sleep(0.01)  # let the other callers pile up
+
+        with patch.object(OpenEMRClient, "initialize", fake_initialize):
+            clients = await asyncio.gather(*(get_client() for _ in range(5)))
+            assert len(inits) == 1
+            assert all(c is inits[0] for c in clients)
+            await close_client()
+            assert openemr_client._client is None
+
+    @pytest.mark.asyncio
+    async def test_failed_initialize_is_not_cached(self) -> None:
+        """If authentication fails, the next call should try again."""
+
+        async def failing_initialize(self: OpenEMRClient) -> None:
+            raise OpenEMRAuthError("down")
+
+        with patch.object(OpenEMRClient, "initialize", failing_initialize):
+            with pytest.raises(OpenEMRAuthError):
+                await get_client()
+        assert openemr_client._client is None
+
+
+# --- Token cache tests ---
+
+
+class TestPrefetch:
+    """Tests for speculative GETs handed over to the next get()."""
+
+    @staticmethod
+    def _client(handler, **kwargs: object) -> OpenEMRClient:  # type: ignore[no-untyped-def]
+        client = _make_client(**kwargs)
+        client._http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        client._access_token = "test-access-token"
+        client._token_expires_at = time.time() + 3600
+        return client
+
+    @staticmethod
+    def _counter(resource: str, result: str) -> float:
+        counters = metrics.snapshot()["counters"]
+        return counters.get(
+            f"openemr_prefetch{{resource={resource},result={result}}}", 0
+        )
+
+    @pytest.mark.asyncio
+    async def test_get_uses_prefetched_response(self) -> None:
+        metrics.reset()
+        calls: list[str] = []
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            calls.append(request.url.path)
+            return httpx.Response(200, json={"data": [{"title": "Penicillin"}]})
+
+        client = self._client(handler)
+        assert client.prefetch("/patient/abc/allergy", resource="allergies")
+        await asyncio.sleep(0)  # let the prefetch run
+
+        data = await client.get("/patient/abc/allergy")
+
+        assert data == {"data": [{"title": "Penicillin"}]}
+        assert len(calls) == 1
+        assert self._counter("allergies", "used") == 1
+        await client.close()
+
+    @pytest.mark.asyncio
+    async def test_get_joins_prefetch_in_flight(self) -> None:
+        release = asyncio.Event()
+        calls: list[str] = []
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            calls.append(request.url.path)
+            await release.wait()
+            return httpx.Response(200, json={"data": []})
+
+        client = self._client(handler)
+        client.prefetch("/patient/abc/allergy")
+        pending = asyncio.create_task(client.get("/patient/abc/allergy"))
+        await asyncio.sleep(0.01)
+        release.set()
+
+        assert await pending == {"data": []}
+        assert len(calls) == 1
+        await client.close()
+
+    @pytest.mark.asyncio
+    async def test_cancelled_prefetch_is_refetched(self) -> None:
+        metrics.reset()
+        calls: list[str] = []
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            calls.append(request.url.path)
+            await asyncio.sleep(0.01)
+            return httpx.Response(200, json={"data": []})
+
+        client = self._client(handler)
+        key = client.prefetch("/patient/1/medication", resource="medications")
+        assert key is not None
+        client.cancel_prefetches([key])
+
+        await client.get("/patient/1/medication")
+
+        assert self._counter("medications", "cancelled") == 1
+        assert self._counter("medications", "used") == 0
+        assert len(calls) == 1  # get()'s own request; the prefetch never ran
+        await client.close()
+
+    @pytest.mark.asyncio
+    async def test_failed_prefetch_is_refetched(self) -> None:
+        responses = [httpx.Response(500, text="busy"), httpx.Response(200, json={})]
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            return responses.pop(0)
+
+        client = self._client(handler)
+        client.prefetch("/patient/abc/allergy")
+        await asyncio.sleep(0.01)
+
+        assert await client.get("/patient/abc/allergy") == {}
+        await client.close()
+
+    @pytest.mark.asyncio
+    async def test_unclaimed_prefetch_expires(self) -> None:
+        metrics.reset()
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(200, json={})
+
+        client = self._client(handler, cache_ttl=0.0)
+        client.prefetch("/patient/abc/allergy", resource="allergies")
+        await asyncio.sleep(0.01)
+
+        await client.get("/patient/abc/allergy")
+
+        assert self._counter("allergies", "expired") == 1
+        assert self._counter("allergies", "used") == 0
+        await client.close()
+
+    @pytest.mark.asyncio
+    async def test_skips_cached_and_duplicate(self) -> None:
+        async def handler(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(200, json={})
+
+        client = self._client(handler, cache_backend="memory")
+        assert client.prefetch("/patient/abc/allergy") is not None
+        assert client.prefetch("/patient/abc/allergy") is None  # in flight
+        await client.get("/patient/abc/allergy")
+        assert client.prefetch("/patient/abc/allergy") is None  # cached
+        await client.close()
+
+    @pytest.mark.asyncio
+    async def test_prefill_stores_with_its_own_ttl(self) -> None:
+        calls: list[str] = []
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            calls.append(request.url.path)
+            return httpx.Response(200, json={"data": []})
+
+        client = self._client(handler, cache_backend="memory", cache_ttl=30)
+        assert not client.is_cached("/patient/abc/allergy")
+        with patch.object(client._cache, "set", wraps=client._cache.set) as cache_set:
+            await client.prefill("/patient/abc/allergy", ttl=1800)
+
+        assert cache_set.call_args.args[2] == 1800
+        assert client.is_cached("/patient/abc/allergy")
+        await client.get("/patient/abc/allergy")
+        assert len(calls) == 1  # served from the prefilled entry
+        await client.close()
+
+
+def _auth_handler(call_log: list[str]):  # type: ignore[no-untyped-def]
+    """Token/registration endpoint fake that records which grant was used."""
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        url = str(request.url)
+        body = request.content.decode()
+        if "/registration" in url:
+            call_log.append("register")
+            return httpx.Response(200, json=_registration_response())
+        if "client_id=revoked-client" in body:
+            call_log.append("rejected")
+            return httpx.Response(401, json={"error": "invalid_client"})
+        if "grant_type=password" in body:
+            call_log.append("password")
+            return httpx.Response(200, json=_token_response())
+        if "grant_type=refresh_token" in body:
+            call_log.append("refresh")
+            if "refresh_token=revoked" in body:
+                return httpx.Response(400, json={"error": "invalid_grant"})
+            return httpx.Response(
+                200, json=_token_response(access_token="refreshed-token")
+            )
+        return httpx.Response(404)
+
+    return handler
+
+
+class TestTokenCache:
+    """Tests for reusing OAuth2 credentials across restarts."""
+
+    async def _start(self, call_log: list[str], **kwargs: object) -> OpenEMRClient:
+        client = _make_client(**kwargs)
+        client._http = httpx.AsyncClient(
+            transport=httpx.MockTransport(_auth_handler(call_log))
+        )
+        await client.initialize()
+        return client
+
+    @pytest.mark.asyncio
+    async def test_restart_reuses_valid_access_token(self, tmp_path: Path) -> None:
+        """A second process should authenticate without any token request."""
+        cache = str(tmp_path / "tokens.json")
+        call_log: list[str] = []
+
+        first = await self._start(call_log, token_cache_path=cache)
+        await first.close()
+        second = await self._start(call_log, token_cache_path=cache)
+
+        assert call_log == ["password"]
+        assert second._access_token == "test-access-token"
+        assert (tmp_path / "tokens.json").stat().st_mode & 0o777 == 0o600
+
+        await second.close()
+
+    @pytest.mark.asyncio
+    async def test_expired_cache_uses_refresh_grant(self, tmp_path: Path) -> None:
+        """An expired cached access token should be refreshed, not re-granted."""
+        cache = TokenCache(tmp_path / "tokens.json")
+        cache.save(_cached(expires_at=time.time() - 1))
+        call_log: list[str] = []
+
+        client = await self._start(call_log, token_cache_path=str(cache.path))
+
+        assert call_log == ["refresh"]
+        assert client._access_token == "refreshed-token"
+        assert cache.load().access_token == "refreshed-token"  # type: ignore[union-attr]
+
+        await client.close()
+
+    @pytest.mark.asyncio
+    async def test_revoked_refresh_token_falls_back_to_password(
+        self, tmp_path: Path
+    ) -> None:
+        """If the cached refresh token is rejected, do a password grant."""
+        cache = TokenCache(tmp_path / "tokens.json")
+        cache.save(_cached(refresh_token="revoked", expires_at=time.time() - 1))
+        call_log: list[str] = []
+
+        client = await self._start(call_log, token_cache_path=str(cache.path))
+
+        assert call_log == ["refresh", "password"]
+        assert cache.load().refresh_token == "test-refresh-token"  # type: ignore[union-attr]
+
+        await client.close()
+
+    @pytest.mark.asyncio
+    async def test_auto_registration_is_reused(self, tmp_path: Path) -> None:
+        """A cached registration should stop restarts from registering again."""
+        cache = str(tmp_path / "tokens.json")
+        call_log: list[str] = []
+
+        first = await self._start(call_log, client_id="", token_cache_path=cache)
+        await first.close()
+        second = await self._start(call_log, client_id="", token_cache_path=cache)
+
+        assert call_log == ["register", "password"]
+        assert second.client_id == "test-client-id"
+
+        await second.close()
+
+    @pytest.mark.asyncio
+    async def test_rejected_cached_registration_is_replaced(
+        self, tmp_path: Path
+    ) -> None:
+        """A cached client OpenEMR no longer knows is dropped, not reused."""
+        cache = TokenCache(tmp_path / "tokens.json")
+        cache.save(_cached(client_id="revoked-client", expires_at=time.time() - 1))
+        call_log: list[str] = []
+
+        client = await self._start(
+            call_log, client_id="", token_cache_path=str(cache.path)
+        )
+
+        assert call_log == ["rejected", "rejected", "register", "password"]
+        assert client.client_id == "test-client-id"
+        assert cache.load().client_id == "test-client-id"  # type: ignore[union-attr]
+
+        await client.close()
+
+    @pytest.mark.asyncio
+    async def test_cache_for_other_user_is_ignored(self, tmp_path: Path) -> None:
+        cache = TokenCache(tmp_path / "tokens.json")
+        cache.save(_cached(username="someone-else"))
+        call_log: list[str] = []
+
+        client = await self._start(call_log, token_cache_path=str(cache.path))
+
+        assert call_log == ["password"]
+
+        await client.close()
+
+    def test_world_readable_cache_is_ignored(self, tmp_path: Path) -> None:
+        cache = TokenCache(tmp_path / "tokens.json")
+        cache.save(_cached())
+        cache.path.chmod(0o644)
+
+        assert cache.load() is None
+
+    def test_encrypted_cache_round_trip(self, tmp_path: Path) -> None:
+        """With a key, the file is unreadable without it and loads with it."""
+        fernet = pytest.importorskip("cryptography.fernet")
+        key = fernet.Fernet.generate_key().decode()
+        cache = TokenCache(tmp_path / "tokens.json", key=key)
+        credentials = _cached()
+        cache.save(credentials)
+
+        assert b"cached-refresh-token" not in cache.path.read_bytes()
+        assert cache.load() == credentials
+        other_key = fernet.Fernet.generate_key().decode()
+        assert TokenCache(cache.path, key=other_key).load() is None
+
+
+def _cached(**overrides: object) -> CachedCredentials:
+    """Cached credentials matching _make_client()'s defaults."""
+    values: dict[str, object] = {
+        "base_url": "https://localhost:9300",
+        "site": "default",
+        "username": "admin",
+        "client_id": "test-client-id",
+        "client_secret": "test-client-secret",
+        "access_token": "cached-access-token",
+        "refresh_token": "cached-refresh-token",
+        "expires_at": time.time() + 3000,
+    }
+    values.update(overrides)
+    return CachedCredentials(**values)  # type: ignore[arg-type]
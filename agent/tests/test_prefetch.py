@@ -0,0 +1,121 @@
+"""Tests for speculative prefetch after a unique patient match."""
+
+from __future__ import annotations
+
+from typing import Any
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from agent.prefetch import Prefetcher, current_session
+from agent.tools.records import PatientRecord
+
+PHIL = PatientRecord(
+    pid="1", uuid="abc-123", fname="Phil", lname="Dixon", dob="1980-01-01", sex="M"
+)
+JANE = PatientRecord(
+    pid="2", uuid="def-456", fname="Jane", lname="Doe", dob="1990-02-02", sex="F"
+)
+
+
+def _client() -> MagicMock:
+    client = MagicMock()
+    client.prefetch.side_effect = lambda endpoint, resource: f"key:{endpoint}"
+    return client
+
+
+class TestPrefetcher:
+    @pytest.mark.asyncio
+    async def test_prefetches_configured_resources(self) -> None:
+        client = _client()
+        prefetcher = Prefetcher(["allergies", "medications"])
+        with patch("agent.prefetch.get_client", AsyncMock(return_value=client)):
+            await prefetcher.on_patient_match(PHIL)
+
+        endpoints = [c.args[0] for c in client.prefetch.call_args_list]
+        assert endpoints == ["/patient/abc-123/allergy", "/patient/1/medication"]
+
+    @pytest.mark.asyncio
+    async def test_missing_id_is_skipped(self) -> None:
+        """from_api's "?" placeholder must not become /patient/?/..."""
+        client = _client()
+        prefetcher = Prefetcher(["allergies", "medications"])
+        no_pid = PatientRecord.from_api(
+            {"uuid": "abc-123", "fname": "Phil", "lname": "Dixon"}
+        )
+        with patch("agent.prefetch.get_client", AsyncMock(return_value=client)):
+            await prefetcher.on_patient_match(no_pid)
+
+        endpoints = [c.args[0] for c in client.prefetch.call_args_list]
+        assert endpoints == ["/patient/abc-123/allergy"]
+
+    @pytest.mark.asyncio
+    async def test_same_patient_is_prefetched_once(self) -> None:
+        client = _client()
+        prefetcher = Prefetcher(["allergies"])
+        with patch("agent.prefetch.get_client", AsyncMock(return_value=client)):
+            await prefetcher.on_patient_match(PHIL)
+            await prefetcher.on_patient_match(PHIL)
+
+        assert client.prefetch.call_count == 1
+
+    @pytest.mark.asyncio
+    async def test_new_patient_cancels_previous(self) -> None:
+        client = _client()
+        prefetcher = Prefetcher(["allergies"])
+        token = current_session.set("session-1")
+        try:
+            with patch("agent.prefetch.get_client", AsyncMock(return_value=client)):
+                await prefetcher.on_patient_match(PHIL)
+                await prefetcher.on_patient_match(JANE)
+        finally:
+            current_session.reset(token)
+
+        client.cancel_prefetches.assert_called_once_with(
+            ["key:/patient/abc-123/allergy"]
+        )
+
+    @pytest.mark.asyncio
+    async def test_sessions_are_independent(self) -> None:
+        client = _client()
+        prefetcher = Prefetcher(["allergies"])
+        with patch("agent.prefetch.get_client", AsyncMock(return_value=client)):
+            for session, patient in (("a", PHIL), ("b", JANE)):
+                token = current_session.set(session)
+                await prefetcher.on_patient_match(patient)
+                current_session.reset(token)
+
+        client.cancel_prefetches.assert_not_called()
+
+    def test_unknown_resource_rejected(self) -> None:
+        with pytest.raises(ValueError, match="labs"):
+            Prefetcher(["labs"])
+
+
+@pytest.mark.asyncio
+async def test_unique_search_match_triggers_prefetch() -> None:
+    """The agent's patient_search tool starts the prefetch on one match."""
+    from agent.agent import _build_tools
+
+    search = next(t for t in _build_tools() if t.name == "patient_search")
+    response: dict[str, Any] = {
+        "data": [
+            {
+                "fname": "Phil",
+                "lname": "Dixon",
+                "DOB": "1980-01-01",
+                "pid": "1",
+                "uuid": "abc-123",
+            }
+        ]
+    }
+    with (
+        patch("agent.tools.patient.get_client") as gc,
+        patch("agent.agent.prefetcher") as prefetcher,
+    ):
+        gc.return_value.get = AsyncMock(return_value=response)
+        prefetcher.on_patient_match = AsyncMock()
+        await search.ainvoke({"query": "Phil Dixon"})
+
+    prefetcher.on_patient_match.assert_awaited_once()
+    assert prefetcher.on_patient_match.await_args.args[0].uuid == "abc-123"
@@ -0,0 +1,181 @@
+"""Tests for schedule-driven cache pre-warming."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from datetime import datetime
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import pytest
+
+from agent.metrics import metrics
+from agent.openemr_client import OpenEMRClient
+from agent.prewarm import PrewarmJob, ScheduledVisit, due_visits
+
+NOW = datetime(2026, 3, 2, 9, 0)
+
+
+def _appt(pid: str, uuid: str, start: str, status: str = "-") -> dict[str, str]:
+    return {
+        "pid": pid,
+        "puuid": uuid,
+        "pc_eventDate": "2026-03-02",
+        "pc_startTime": start,
+        "pc_apptstatus": status,
+    }
+
+
+def _visit(uuid: str, start: str) -> ScheduledVisit:
+    return ScheduledVisit(
+        pid="1", uuid=uuid, start=datetime.fromisoformat(f"2026-03-02T{start}")
+    )
+
+
+SCHEDULE = {
+    "data": [
+        _appt("1", "abc-123", "09:15:00"),
+        _appt("2", "def-456", "09:20:00", status="x"),  # cancelled
+        _appt("3", "ghi-789", "14:00:00"),  # later today
+    ]
+}
+ENCOUNTERS = {
+    "data": [
+        {"eid": "5", "date": "2025-01-10 10:00:00"},
+        {"eid": "9", "date": "2026-02-01 10:00:00"},
+    ]
+}
+
+
+def _client(calls: list[str]) -> OpenEMRClient:
+    async def handler(request: httpx.Request) -> httpx.Response:
+        path = request.url.path.split("/apis/default/api", 1)[-1]
+        calls.append(path)
+        if path == "/appointment":
+            return httpx.Response(200, json=SCHEDULE)
+        if path.endswith("/encounter"):
+            return httpx.Response(200, json=ENCOUNTERS)
+        return httpx.Response(200, json={"data": []})
+
+    client = OpenEMRClient(
+        base_url="https://localhost:9300",
+        site="default",
+        client_id="id",
+        client_secret="secret",
+        username="admin",
+        password="pass",
+        verify_ssl=False,
+        cache_backend="memory",
+    )
+    client._http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    client._access_token = "test-access-token"
+    client._token_expires_at = time.time() + 3600
+    return client
+
+
+class TestScheduledVisit:
+    def test_parses_appointment(self) -> None:
+        visit = ScheduledVisit.from_api(_appt("1", "abc-123", "09:15:00"))
+        assert visit == ScheduledVisit("1", "abc-123", datetime(2026, 3, 2, 9, 15))
+
+    def test_skips_cancelled_and_no_show(self) -> None:
+        for status in ("x", "%", "?"):
+            assert ScheduledVisit.from_api(_appt("1", "a", "09:00", status)) is None
+
+    def test_skips_missing_ids_and_bad_dates(self) -> None:
+        assert ScheduledVisit.from_api(_appt("", "abc", "09:00")) is None
+        assert ScheduledVisit.from_api({"pid": "1", "puuid": "a"}) is None
+
+
+class TestDueVisits:
+    def test_window_includes_late_and_upcoming(self) -> None:
+        visits = [
+            _visit("early", "08:30:00"),  # 30 min ago: too late
+            _visit("late", "08:50:00"),  # running late: still warmed
+            _visit("soon", "09:20:00"),
+            _visit("later", "10:00:00"),  # beyond the lead window
+        ]
+        due = due_visits(visits, NOW, lead_minutes=30)
+        assert [v.uuid for v in due] == ["late", "soon"]
+
+    def test_one_entry_per_patient_in_start_order(self) -> None:
+        visits = [_visit("b", "09:25:00"), _visit("a", "09:10:00")]
+        visits.append(_visit("a", "09:20:00"))
+        due = due_visits(visits, NOW, lead_minutes=30)
+        assert [(v.uuid, v.start.minute) for v in due] == [("a", 10), ("b", 25)]
+
+
+class TestPrewarmJob:
+    @pytest.mark.asyncio
+    async def test_warms_due_patients_chart(self) -> None:
+        metrics.reset()
+        calls: list[str] = []
+        client = _client(calls)
+        job = PrewarmJob(client, lead_minutes=30, rate=1000, ttl=1800)
+
+        fetched = await job.run_once(now=NOW)
+
+        assert fetched == 6
+        assert calls == [
+            "/appointment",
+            "/patient/abc-123",
+            "/patient/abc-123/allergy",
+            "/patient/1/medication",
+            "/patient/abc-123/medical_problem",
+            "/patient/abc-123/encounter",
+            "/patient/1/encounter/9/vital",  # the latest encounter
+        ]
+        assert metrics.snapshot()["gauges"]["prewarm_due_patients"] == 1
+        await client.close()
+
+    @pytest.mark.asyncio
+    async def test_second_pass_fetches_nothing_new(self) -> None:
+        calls: list[str] = []
+        client = _client(calls)
+        job = PrewarmJob(client, lead_minutes=30, rate=1000, ttl=1800)
+
+        await job.run_once(now=NOW)
+        calls.clear()
+        assert await job.run_once(now=NOW) == 0
+        assert calls == []  # the schedule itself is cached too
+        await client.close()
+
+    @pytest.mark.asyncio
+    async def test_warmed_data_serves_tool_requests(self) -> None:
+        calls: list[str] = []
+        client = _client(calls)
+        await PrewarmJob(client, lead_minutes=30, rate=1000).run_once(now=NOW)
+        calls.clear()
+
+        await client.get("/patient/abc-123/allergy")
+        assert calls == []
+        await client.close()
+
+    @pytest.mark.asyncio
+    async def test_does_nothing_without_cache(self) -> None:
+        calls: list[str] = []
+        client = _client(calls)
+        client._cache = None
+        assert await PrewarmJob(client).run_once(now=NOW) == 0
+        assert calls == []
+        await client.close()
+
+    @pytest.mark.asyncio
+    async def test_unexpected_error_does_not_stop_the_loop(
+        self, caplog: pytest.LogCaptureFixture
+    ) -> None:
+        job = PrewarmJob(_client([]), interval=0)
+        failures = [
+            httpx.ConnectError("connection reset"),
+            KeyError("pc_eventDate"),
+            asyncio.CancelledError(),  # ends the test
+        ]
+        with (
+            patch.object(job, "run_once", AsyncMock(side_effect=failures)) as run,
+            pytest.raises(asyncio.CancelledError),
+        ):
+            await job.run_forever()
+
+        assert run.await_count == 3
+        assert caplog.text.count("Schedule pre-warm pass failed") == 2
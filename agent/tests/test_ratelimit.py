@@ -0,0 +1,153 @@
+"""Tests for the token bucket and the LLM request/token limiter."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from agent.metrics import metrics
+from agent.ratelimit import LLMLimiter, TokenBucket, retry_delay
+
+
+class TestTokenBucket:
+    @pytest.mark.asyncio
+    async def test_burst_goes_through_immediately(self) -> None:
+        bucket = TokenBucket(rate=1, burst=5)
+        started = time.monotonic()
+        for _ in range(5):
+            await bucket.acquire()
+        assert time.monotonic() - started < 0.05
+        assert bucket.available < 1
+
+    @pytest.mark.asyncio
+    async def test_waits_for_refill_when_empty(self) -> None:
+        bucket = TokenBucket(rate=50, burst=1)
+        await bucket.acquire()
+        waited = await bucket.acquire()
+        assert waited >= 0.015  # one token at 50/s takes 20ms
+
+    @pytest.mark.asyncio
+    async def test_oversized_request_capped_at_burst(self) -> None:
+        bucket = TokenBucket(rate=100, burst=2)
+        waited = await asyncio.wait_for(bucket.acquire(10), timeout=1)
+        assert waited < 0.05  # took the full bucket instead of waiting forever
+
+    @pytest.mark.asyncio
+    async def test_waiters_served_in_order(self) -> None:
+        bucket = TokenBucket(rate=100, burst=1)
+        await bucket.acquire()
+        order: list[int] = []
+
+        async def take(n: int) -> None:
+            await bucket.acquire()
+            order.append(n)
+
+        await asyncio.gather(*(take(n) for n in range(3)))
+        assert order == [0, 1, 2]
+
+    def test_rate_must_be_positive(self) -> None:
+        with pytest.raises(ValueError, match="rate"):
+            TokenBucket(rate=0)
+
+    def test_credit_refunds_and_charges(self) -> None:
+        bucket = TokenBucket(rate=0.001, burst=10)
+        bucket.credit(-15)
+        assert bucket.available == pytest.approx(-5, abs=0.01)
+        bucket.credit(100)
+        assert bucket.available == pytest.approx(10)  # never above burst
+
+
+class TestLLMLimiter:
+    @pytest.mark.asyncio
+    async def test_disabled_without_limits(self) -> None:
+        limiter = LLMLimiter()
+        assert not limiter.enabled
+        cost = await limiter.acquire("s", input_tokens=100)
+        assert cost["input_tokens"] == 100
+
+    @pytest.mark.asyncio
+    async def test_waits_for_token_budget(self) -> None:
+        metrics.reset()
+        # 60k tokens/min = 1,000/s with a 10s (10,000 token) bucket.
+        limiter = LLMLimiter(input_tokens_per_minute=60_000)
+        await limiter.acquire("s", input_tokens=10_000)
+        started = time.monotonic()
+        await limiter.acquire("s", input_tokens=20)
+        assert time.monotonic() - started >= 0.015
+        counters = metrics.snapshot()["counters"]
+        assert counters["llm_limiter_throttled{budget=input_tokens}"] == 1
+        assert "llm_limiter_wait_ms" in metrics.snapshot()["histograms"]
+
+    @pytest.mark.asyncio
+    async def test_settle_returns_unused_estimate(self) -> None:
+        limiter = LLMLimiter(output_tokens_per_minute=6_000, output_estimate=500)
+        bucket = limiter.buckets["output_tokens"]
+        cost = await limiter.acquire("s", input_tokens=0)
+        assert bucket.available == pytest.approx(500, abs=1)
+        limiter.settle(cost, {"output_tokens": 100})
+        assert bucket.available == pytest.approx(900, abs=1)
+
+    @pytest.mark.asyncio
+    async def test_refund_returns_the_reservation(self) -> None:
+        limiter = LLMLimiter(
+            requests_per_minute=600,
+            output_tokens_per_minute=6_000,
+            output_estimate=500,
+        )
+        cost = await limiter.acquire("s", input_tokens=0)
+        limiter.refund(cost)
+        assert limiter.buckets["output_tokens"].available == pytest.approx(1000, abs=1)
+        assert limiter.buckets["requests"].available == pytest.approx(99, abs=0.5)
+
+    @pytest.mark.asyncio
+    async def test_sessions_served_round_robin(self) -> None:
+        # One request at a time (1 per 10ms) so the queue order shows.
+        limiter = LLMLimiter(requests_per_minute=6_000)
+        limiter.buckets["requests"] = TokenBucket(rate=100, burst=1)
+        await limiter.acquire("warmup", input_tokens=0)  # empty the bucket
+        order: list[str] = []
+
+        async def call(session: str) -> None:
+            await limiter.acquire(session, input_tokens=0)
+            order.append(session)
+
+        # A busy job session queues three calls before the clinician's one.
+        await asyncio.gather(call("job"), call("job"), call("job"), call("clinician"))
+        assert order.index("clinician") <= 1
+
+    @pytest.mark.asyncio
+    async def test_pause_holds_queued_calls(self) -> None:
+        limiter = LLMLimiter(requests_per_minute=60_000)
+        limiter.pause(0.05)
+        started = time.monotonic()
+        await limiter.acquire("s", input_tokens=0)
+        assert time.monotonic() - started >= 0.04
+
+    @pytest.mark.asyncio
+    async def test_cancelled_caller_is_skipped(self) -> None:
+        limiter = LLMLimiter(requests_per_minute=6_000)
+        limiter.buckets["requests"] = TokenBucket(rate=20, burst=1)
+        await limiter.acquire("a", input_tokens=0)
+        waiting = asyncio.create_task(limiter.acquire("b", input_tokens=0))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        await asyncio.wait_for(limiter.acquire("c", input_tokens=0), timeout=1)
+
+
+def test_retry_delay() -> None:
+    def error(status: int, retry_after: str | None = None) -> Exception:
+        exc = Exception("provider error")
+        headers = {"retry-after": retry_after} if retry_after is not None else {}
+        exc.status_code = status  # type: ignore[attr-defined]
+        exc.response = SimpleNamespace(headers=headers)  # type: ignore[attr-defined]
+        return exc
+
+    assert retry_delay(error(429, "7")) == 7.0
+    assert retry_delay(error(529)) == 0.0
+    assert retry_delay(error(500)) is None
+    assert retry_delay(RuntimeError("boom")) is None
@@ -0,0 +1,265 @@
+"""Tests for the fast-path router (parsing and direct tool calls)."""
+
+from __future__ import annotations
+
+import asyncio
+from datetime import date, timedelta
+from typing import Any
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from agent.router import parse, try_fast_path
+from agent.verification import DISCLAIMER
+
+PHIL = {
+    "fname": "Phil",
+    "lname": "Dixon",
+    "DOB": "1980-01-01",
+    "pid": "1",
+    "uuid": "abc-123",
+    "sex": "Male",
+}
+
+
+def _client(*responses: dict[str, Any]) -> AsyncMock:
+    client = AsyncMock()
+    client.get.side_effect = list(responses)
+    return client
+
+
+class TestParse:
+    @pytest.mark.parametrize(
+        ("question", "topic", "name"),
+        [
+            ("What allergies does Phil Dixon have?", "allergies", "Phil Dixon"),
+            (
+                "What medications is Phil Dixon currently taking?",
+                "medications",
+                "Phil Dixon",
+            ),
+            ("allergies for Phil Dixon", "allergies", "Phil Dixon"),
+            ("Show me the current meds for patient Smith", "medications", "Smith"),
+            ("Phil Dixon's problem list", "problems", "Phil Dixon"),
+            ("When is Smith's next appointment?", "next_appointment", "Smith"),
+            ("insurance info for Jane Doe", "insurance", "Jane Doe"),
+        ],
+    )
+    def test_topic_and_name(self, question: str, topic: str, name: str) -> None:
+        route = parse(question)
+        assert route is not None
+        assert route.topic is not None and route.topic.name == topic
+        assert route.name == name
+
+    def test_patient_lookup_has_no_topic(self) -> None:
+        route = parse("Find patient Phil Dixon")
+        assert route is not None
+        assert route.topic is None and route.name == "Phil Dixon"
+
+    def test_pid(self) -> None:
+        route = parse("meds for pid 12")
+        assert route is not None
+        assert route.pid == "12" and route.name == ""
+
+    @pytest.mark.parametrize(
+        "question",
+        [
+            "What are his allergies?",
+            "allergies for the patient",
+            "What allergies and meds does Phil Dixon have?",
+            "Is Phil Dixon's blood pressure trending up?",
+            "Summarize everything about Phil Dixon",
+            "get appointments for today",
+            "visits for last year",
+            "pull up allergies",
+            "problems for Dixon and Smith",
+        ],
+    )
+    def test_unsure_goes_to_agent(self, question: str) -> None:
+        assert parse(question) is None
+
+
+class TestTryFastPath:
+    @pytest.mark.asyncio
+    async def test_search_then_fetch(self) -> None:
+        allergies = {"data": [{"title": "Penicillin", "reaction": "Hives"}]}
+        with (
+            patch("agent.tools.patient.get_client") as patient_gc,
+            patch("agent.tools.clinical.get_client") as clinical_gc,
+        ):
+            patient_gc.return_value = _client({"data": [PHIL]})
+            clinical_gc.return_value = _client(allergies)
+            routed = await try_fast_path("What allergies does Phil Dixon have?")
+
+        assert routed is not None
+        clinical_gc.return_value.get.assert_awaited_once_with(
+            "/patient/abc-123/allergy"
+        )
+        assert "Phil Dixon (DOB: 1980-01-01" in routed.answer
+        assert "Penicillin" in routed.answer
+        assert routed.answer.endswith(DISCLAIMER)
+        # Human, two (tool call + result) pairs, final answer.
+        assert [m.type for m in routed.messages] == [
+            "human",
+            "ai",
+            "tool",
+            "ai",
+            "tool",
+            "ai",
+        ]
+        assert routed.messages[3].tool_calls[0]["args"] == {"patient_uuid": "abc-123"}
+
+    @pytest.mark.asyncio
+    async def test_ambiguous_name_falls_back(self) -> None:
+        other = {**PHIL, "fname": "Paula", "pid": "2", "uuid": "def-456"}
+        with patch("agent.tools.patient.get_client") as gc:
+            gc.return_value = _client({"data": [PHIL, other]})
+            assert await try_fast_path("allergies for Dixon") is None
+
+    @pytest.mark.asyncio
+    async def test_no_match_falls_back(self) -> None:
+        """A misparsed name must not answer "No patients found"."""
+        with patch("agent.tools.patient.get_client") as gc:
+            gc.return_value = _client({"data": []}, {"data": []})
+            assert await try_fast_path("allergies for Nobody") is None
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("question", ["meds for pid 12", "allergies for pid 12"])
+    async def test_pid_falls_back(self, question: str) -> None:
+        """Without a search there is no name + DOB to head the answer with."""
+        with patch("agent.tools.clinical.get_client") as gc:
+            assert await try_fast_path(question) is None
+        gc.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_phrasing_uses_the_llm_budget(self) -> None:
+        from langchain_core.messages import AIMessage
+
+        model = AsyncMock()
+        model.ainvoke.return_value = AIMessage(
+            content="Phil Dixon (DOB 1980-01-01) is allergic to Penicillin.",
+            usage_metadata={
+                "input_tokens": 90,
+                "output_tokens": 12,
+                "total_tokens": 102,
+            },
+        )
+        with (
+            patch("agent.router.AGENT_FAST_PATH_PHRASING", "llm"),
+            patch("agent.router.ANTHROPIC_API_KEY", "test-key"),
+            patch("agent.router._phrasing_model", model),
+            patch("agent.router.llm_limiter") as limiter,
+            patch("agent.tools.patient.get_client") as patient_gc,
+            patch("agent.tools.clinical.get_client") as clinical_gc,
+        ):
+            limiter.acquire = AsyncMock(return_value={"input_tokens": 100.0})
+            patient_gc.return_value = _client({"data": [PHIL]})
+            clinical_gc.return_value = _client({"data": [{"title": "Penicillin"}]})
+            routed = await try_fast_path("allergies for Phil Dixon")
+
+        assert routed is not None
+        assert routed.answer.startswith("Phil Dixon (DOB 1980-01-01)")
+        limiter.acquire.assert_awaited_once()
+        limiter.settle.assert_called_once_with(
+            {"input_tokens": 100.0}, model.ainvoke.return_value.usage_metadata
+        )
+
+    @pytest.mark.asyncio
+    async def test_phrasing_error_uses_the_template(self) -> None:
+        model = AsyncMock()
+        model.ainvoke.side_effect = RuntimeError("529 overloaded")
+        with (
+            patch("agent.router.AGENT_FAST_PATH_PHRASING", "llm"),
+            patch("agent.router.ANTHROPIC_API_KEY", "test-key"),
+            patch("agent.router._phrasing_model", model),
+            patch("agent.tools.patient.get_client") as patient_gc,
+            patch("agent.tools.clinical.get_client") as clinical_gc,
+        ):
+            patient_gc.return_value = _client({"data": [PHIL]})
+            clinical_gc.return_value = _client({"data": [{"title": "Penicillin"}]})
+            routed = await try_fast_path("allergies for Phil Dixon")
+
+        assert routed is not None
+        assert routed.answer.startswith("Patient: Phil Dixon (DOB: 1980-01-01")
+        assert "Penicillin" in routed.answer
+
+    @pytest.mark.asyncio
+    async def test_phrasing_past_the_deadline_uses_the_template(self) -> None:
+        from agent.deadline import set_deadline
+
+        async def slow_model(*args: Any) -> None:
+            await asyncio.sleep(5)
+
+        model = AsyncMock()
+        model.ainvoke.side_effect = slow_model
+        with (
+            patch("agent.router.AGENT_FAST_PATH_PHRASING", "llm"),
+            patch("agent.router.ANTHROPIC_API_KEY", "test-key"),
+            patch("agent.router._phrasing_model", model),
+            patch("agent.tools.patient.get_client") as patient_gc,
+            patch("agent.tools.clinical.get_client") as clinical_gc,
+        ):
+            patient_gc.return_value = _client({"data": [PHIL]})
+            clinical_gc.return_value = _client({"data": [{"title": "Penicillin"}]})
+            set_deadline(0.1)
+            try:
+                routed = await try_fast_path("allergies for Phil Dixon")
+            finally:
+                set_deadline(0)
+
+        assert routed is not None
+        assert routed.answer.startswith("Patient: Phil Dixon (DOB: 1980-01-01")
+
+    @pytest.mark.asyncio
+    async def test_tool_error_falls_back(self) -> None:
+        from agent.openemr_client import OpenEMRAPIError
+
+        with patch("agent.tools.patient.get_client") as gc:
+            gc.return_value.get.side_effect = OpenEMRAPIError(500, "boom")
+            assert await try_fast_path("Find patient Phil Dixon") is None
+
+    @pytest.mark.asyncio
+    async def test_next_appointment_skips_past_ones(self) -> None:
+        past = (date.today() - timedelta(days=30)).isoformat()
+        soon = (date.today() + timedelta(days=3)).isoformat()
+        appointments = {
+            "data": [
+                {"pc_title": "Old visit", "pc_eventDate": past},
+                {"pc_title": "Follow-up", "pc_eventDate": soon},
+            ]
+        }
+        with (
+            patch("agent.tools.patient.get_client") as patient_gc,
+            patch("agent.tools.scheduling.get_client") as scheduling_gc,
+        ):
+            patient_gc.return_value = _client({"data": [PHIL]})
+            scheduling_gc.return_value = _client(appointments)
+            routed = await try_fast_path("When is Phil Dixon's next appointment?")
+
+        assert routed is not None
+        assert "Follow-up" in routed.answer
+        assert "Old visit" not in routed.answer
+
+
+class TestRunAgent:
+    @pytest.mark.asyncio
+    async def test_routed_turn_skips_the_agent(self) -> None:
+        from agent.agent import _sessions, run_agent
+
+        with (
+            patch("agent.agent.ANTHROPIC_API_KEY", "test-key"),
+            patch("agent.agent._get_agent") as get_agent,
+            patch("agent.tools.patient.get_client") as gc,
+        ):
+            gc.return_value = _client({"data": [PHIL]})
+            text, session_id = await run_agent("Find patient Phil Dixon")
+
+        get_agent.assert_not_called()
+        assert "Phil Dixon" in text
+        # The routed trace is stored like an agent turn.
+        assert [m.type for m in _sessions.load(session_id)] == [
+            "human",
+            "ai",
+            "tool",
+            "ai",
+        ]
@@ -0,0 +1,264 @@
+"""Tests for conversation history storage (memory and shared SQLite)."""
+
+import asyncio
+import sqlite3
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from agent.agent import _in_session_store
+from agent.sessions import (
+    MemorySessionStore,
+    SQLiteSessionStore,
+    decode_message,
+    encode_message,
+    open_session_store,
+)
+from agent.tools.patient import _search_table
+from agent.tools.records import PatientRecord
+from agent.verification.rules import DISCLAIMER, check_rules
+
+
+def _turn(question: str, n: int) -> list:  # type: ignore[type-arg]
+    """One turn: question, tool call, tool result, answer."""
+    call_id = f"call-{n}"
+    return [
+        HumanMessage(content=question, id=f"h{n}"),
+        AIMessage(
+            content="",
+            id=f"a{n}",
+            tool_calls=[
+                {"name": "patient_search", "args": {"query": "Dixon"}, "id": call_id}
+            ],
+        ),
+        ToolMessage(
+            content="Found 1 patient(s):", tool_call_id=call_id, name="patient_search"
+        ),
+        AIMessage(content=f"Answer {n}", id=f"b{n}"),
+    ]
+
+
+def test_encode_round_trips_messages_compactly() -> None:
+    messages = _turn("Tell me about Phil Dixon", 1)
+    messages[2].artifact = ("records",)
+
+    decoded = [decode_message(encode_message(m)) for m in messages]
+
+    assert [type(m) for m in decoded] == [type(m) for m in messages]
+    assert decoded[1].tool_calls == messages[1].tool_calls
+    assert decoded[2].tool_call_id == "call-1"
+    assert decoded[2].artifact is None  # artifacts aren't persisted
+    assert decoded[3].content == "Answer 1"
+    assert b" " not in encode_message(messages[1]).replace(b"Answer", b"")
+    assert b"additional_kwargs" not in encode_message(messages[3])
+
+
+def test_memory_store_appends() -> None:
+    store = MemorySessionStore()
+    store.append("s", _turn("q", 1))
+    store.append("s", _turn("q", 2))
+    assert len(store.load("s")) == 8
+    assert store.load("unknown") == []
+
+
+class TestSQLiteSessionStore:
+    def test_another_worker_continues_the_session(self, tmp_path: Path) -> None:
+        """A session written by one worker is readable by another."""
+        worker_1 = SQLiteSessionStore(tmp_path / "s.db")
+        worker_2 = SQLiteSessionStore(tmp_path / "s.db")
+
+        worker_1.append("s", _turn("Tell me about Phil Dixon", 1))
+        history = worker_2.load("s")
+        worker_2.append("s", _turn("What are his allergies?", 2))
+
+        assert [m.content for m in worker_1.load("s")][::4] == [
+            "Tell me about Phil Dixon",
+            "What are his allergies?",
+        ]
+        assert len(history) == 4
+        assert "s" in worker_1
+        assert (tmp_path / "s.db").stat().st_mode & 0o777 == 0o600
+
+    def test_load_only_reads_new_rows(self, tmp_path: Path) -> None:
+        """A worker that already loaded a session reuses the decoded prefix."""
+        worker_1 = SQLiteSessionStore(tmp_path / "s.db")
+        worker_2 = SQLiteSessionStore(tmp_path / "s.db")
+        worker_1.append("s", _turn("q", 1))
+        first = worker_2.load("s")
+
+        worker_1.load("s")
+        worker_1.append("s", _turn("q", 2))
+        second = worker_2.load("s")
+
+        assert second[0] is first[0]  # not decoded again
+        assert len(second) == 8
+
+    def test_concurrent_turns_are_both_kept(self, tmp_path: Path) -> None:
+        """Two workers finishing a turn on the same history append in order."""
+        worker_1 = SQLiteSessionStore(tmp_path / "s.db")
+        worker_2 = SQLiteSessionStore(tmp_path / "s.db")
+        worker_1.append("s", _turn("q", 1))
+        worker_1.load("s")
+        worker_2.load("s")
+
+        worker_1.append("s", _turn("from worker 1", 2))
+        worker_2.append("s", _turn("from worker 2", 3))  # stale view of "s"
+
+        contents = [m.content for m in SQLiteSessionStore(tmp_path / "s.db").load("s")]
+        assert contents[4] == "from worker 1"
+        assert contents[8] == "from worker 2"
+        assert len(worker_2.load("s")) == 12
+
+    def test_delete(self, tmp_path: Path) -> None:
+        store = SQLiteSessionStore(tmp_path / "s.db")
+        store.append("s", _turn("q", 1))
+        store.delete("s")
+        assert store.load("s") == []
+        assert "s" not in store
+
+    def test_close_writes_sessions_into_the_main_file(self, tmp_path: Path) -> None:
+        """On shutdown the WAL is folded in, leaving one self-contained file."""
+        store = SQLiteSessionStore(tmp_path / "s.db")
+        store.append("s", _turn("q", 1))
+        store.close()
+
+        wal = tmp_path / "s.db-wal"
+        assert not wal.exists() or wal.stat().st_size == 0
+        assert len(SQLiteSessionStore(tmp_path / "s.db").load("s")) == 4
+
+
+def test_open_session_store_rejects_unknown_backend() -> None:
+    assert isinstance(open_session_store("memory"), MemorySessionStore)
+    with pytest.raises(ValueError, match="Unknown session backend"):
+        open_session_store("redis")
+
+
+# --- Packing idle sessions ---
+
+
+def _big_turn(n: int) -> list:  # type: ignore[type-arg]
+    """A turn whose tool output is the same long medication list each time."""
+    messages = _turn(f"question {n}", n)
+    meds = "\n".join(f"- Lisinopril {i}0mg tab (once daily)" for i in range(40))
+    messages[2] = ToolMessage(
+        content=f"Medications:\n{meds}",
+        tool_call_id=f"call-{n}",
+        name="get_medications",
+    )
+    return messages
+
+
+class TestPacking:
+    def test_idle_session_is_packed_and_unpacked_on_access(self) -> None:
+        store = MemorySessionStore(pack_after=60)
+        history = [*_big_turn(1), *_big_turn(2), *_big_turn(3)]
+        store.append("s", history)
+
+        assert store.pack_idle(now=time.monotonic() + 61) == 1
+        assert store.is_packed("s")
+        assert "s" in store
+
+        loaded = store.load("s")
+        assert not store.is_packed("s")
+        assert [m.content for m in loaded] == [m.content for m in history]
+        assert loaded[1].tool_calls == history[1].tool_calls
+        assert store.packed_bytes == 0  # blobs released after unpacking
+
+    def test_repeated_tool_outputs_are_stored_once(self) -> None:
+        store = MemorySessionStore(pack_after=60)
+        store.append("a", [*_big_turn(1), *_big_turn(2)])
+        store.append("b", _big_turn(3))
+
+        store.pack_idle(now=time.monotonic() + 61)
+
+        assert len(store._blobs) == 1  # one medication list, three references
+        unpacked = sum(len(encode_message(m)) for m in _big_turn(1)) * 3
+        assert store.packed_bytes < unpacked / 5
+
+        store.delete("a")
+        assert len(store._blobs) == 1  # still used by "b"
+        store.delete("b")
+        assert len(store._blobs) == 0
+
+    def test_active_session_is_not_packed(self) -> None:
+        store = MemorySessionStore(pack_after=60)
+        store.append("s", _big_turn(1))
+        assert store.pack_idle(now=time.monotonic() + 30) == 0
+        assert not store.is_packed("s")
+
+
+def test_stored_table_search_still_identifies_the_patient(tmp_path: Path) -> None:
+    """Stored sessions drop the records; the table text alone must do."""
+    record = PatientRecord.from_api(
+        {
+            "pid": "12",
+            "uuid": "9a1b2c3d-0000-4000-8000-000000000001",
+            "fname": "Phil",
+            "lname": "Dixon",
+            "DOB": "1980-01-15",
+        }
+    )
+    search = ToolMessage(
+        content=_search_table("Dixon", 1).render([record]),
+        tool_call_id="call-1",
+        name="patient_search",
+        artifact=[record],
+    )
+    turn = _turn("Tell me about Phil Dixon", 1)
+    turn[2] = search
+    store = SQLiteSessionStore(tmp_path / "sessions.db")
+    store.append("s", turn)
+
+    history = SQLiteSessionStore(tmp_path / "sessions.db").load("s")
+    assert history[2].content.startswith("Found 1 patient(s) matching 'Dixon' [")
+    assert getattr(history[2], "artifact", None) is None
+
+    history += [
+        HumanMessage(content="And his meds?"),
+        AIMessage(
+            content="",
+            tool_calls=[
+                {"name": "get_medications", "args": {"patient_id": "12"}, "id": "m"}
+            ],
+        ),
+        ToolMessage(content="Medications:\n\n- Lisinopril", tool_call_id="m"),
+        AIMessage(content=f"He takes lisinopril. {DISCLAIMER}"),
+    ]
+    report = check_rules(history)
+    assert "Phil Dixon (DOB: 1980-01-15)" in report.text
+
+
+@pytest.mark.asyncio
+async def test_waiting_for_the_write_lock_does_not_block_the_loop(
+    tmp_path: Path,
+) -> None:
+    """While another worker holds the lock, other requests keep being served."""
+    store = SQLiteSessionStore(tmp_path / "s.db")
+    other_worker = sqlite3.connect(tmp_path / "s.db", isolation_level=None)
+    other_worker.execute("BEGIN IMMEDIATE")
+
+    ticks = 0
+
+    async def other_requests() -> None:
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    ticker = asyncio.create_task(other_requests())
+    with patch("agent.agent._sessions", store):
+        append = asyncio.create_task(
+            _in_session_store(store.append, "s", _turn("Question", 1))
+        )
+        await asyncio.sleep(0.2)
+        assert not append.done()
+        other_worker.execute("COMMIT")
+        await append
+    ticker.cancel()
+
+    assert ticks >= 10
+    assert len(store.load("s")) == 4
+    other_worker.close()
@@ -9,6 +9,9 @@ They ensure that:
 This is the first thing CI runs, so if these fail, nothing else will work.
 """
 
+from unittest.mock import AsyncMock, patch
+
+import pytest
 from fastapi.testclient import TestClient
 
 
@@ -17,14 +20,35 @@ def test_imports() -> None:
     import agent  # noqa: F401
     import agent.agent  # noqa: F401
     import agent.app  # noqa: F401
+    import agent.cache  # noqa: F401
     import agent.config  # noqa: F401
+    import agent.deadline  # noqa: F401
+    import agent.drain  # noqa: F401
+    import agent.idempotency  # noqa: F401
+    import agent.jobs  # noqa: F401
+    import agent.json_decode  # noqa: F401
+    import agent.latency  # noqa: F401
+    import agent.medication_lexicon  # noqa: F401
+    import agent.metrics  # noqa: F401
+    import agent.model_routing  # noqa: F401
     import agent.openemr_client  # noqa: F401
+    import agent.prefetch  # noqa: F401
+    import agent.prewarm  # noqa: F401
+    import agent.ratelimit  # noqa: F401
+    import agent.router  # noqa: F401
+    import agent.sessions  # noqa: F401
+    import agent.token_cache  # noqa: F401
+    import agent.tokens  # noqa: F401
+    import agent.tool_selection  # noqa: F401
     import agent.tools  # noqa: F401
     import agent.tools.billing  # noqa: F401
     import agent.tools.clinical  # noqa: F401
     import agent.tools.drug_interactions  # noqa: F401
     import agent.tools.encounters  # noqa: F401
+    import agent.tools.formatting  # noqa: F401
+    import agent.tools.paging  # noqa: F401
     import agent.tools.patient  # noqa: F401
+    import agent.tools.records  # noqa: F401
     import agent.tools.scheduling  # noqa: F401
     import agent.verification  # noqa: F401
 
@@ -66,3 +90,72 @@ def test_chat_endpoint_placeholder() -> None:
     data = response.json()
     assert "response" in data
     assert "Hello" in data["response"]
+
+
+def test_metrics_endpoint() -> None:
+    """The /agent/metrics endpoint should return the registry snapshot."""
+    from agent.app import app
+
+    client = TestClient(app)
+    response = client.get("/agent/metrics")
+    assert response.status_code == 200
+    assert set(response.json()) == {"counters", "gauges", "histograms"}
+
+
+def test_lifespan_warms_up_and_closes_client() -> None:
+    """Startup should start warm_up(); shutdown should flush sessions and
+    close the OpenEMR client."""
+    from agent.app import app
+    from agent.drain import turns
+
+    with (
+        patch("agent.app.warm_up", new_callable=AsyncMock) as warm_up,
+        patch("agent.app.close_client", new_callable=AsyncMock) as close_client,
+        patch("agent.app.close_sessions") as close_sessions,
+    ):
+        with TestClient(app) as client:
+            assert client.get("/agent/health").status_code == 200
+        warm_up.assert_awaited_once()
+        close_sessions.assert_called_once()
+        close_client.assert_awaited_once()
+    turns.reset()  # the shutdown drained the shared tracker
+
+
+@pytest.mark.asyncio
+async def test_agent_build_is_shared_and_off_the_event_loop() -> None:
+    """Concurrent first turns await one build; the loop keeps running meanwhile."""
+    import asyncio
+    import time
+
+    import agent.agent as agent_module
+
+    builds = 0
+
+    def slow_build() -> object:
+        nonlocal builds
+        builds += 1
+        time.sleep(0.2)  # importing LangChain
+        return object()
+
+    ticks = 0
+
+    async def ticker() -> None:
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    with (
+        patch.object(agent_module, "_agent", None),
+        patch.object(agent_module, "_agent_build", None),
+        patch.object(agent_module, "_create_agent", slow_build),
+    ):
+        tick_task = asyncio.ensure_future(ticker())
+        first, second = await asyncio.gather(
+            agent_module._get_agent(), agent_module._get_agent()
+        )
+        tick_task.cancel()
+
+    assert first is second
+    assert builds == 1
+    assert ticks > 5  # the loop wasn't blocked during the build
@@ -0,0 +1,91 @@
+"""Tests for per-turn tool selection."""
+
+from __future__ import annotations
+
+from typing import Any
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from agent.agent import _build_tools
+from agent.metrics import metrics
+from agent.tool_selection import TOOL_KEYWORDS, record_selection, select_tools
+
+ALL = (
+    "patient_search",
+    "get_patient_details",
+    "get_allergies",
+    "get_medications",
+    "get_vitals",
+    "get_medical_problems",
+    "get_encounters",
+    "get_appointments",
+    "search_practitioners",
+    "get_insurance",
+)
+
+
+def _select(*messages: Any) -> tuple[str, ...] | None:
+    return select_tools(messages, ALL)
+
+
+class TestSelectTools:
+    def test_keywords_cover_every_tool(self) -> None:
+        assert set(TOOL_KEYWORDS) | {"patient_search"} == set(ALL)
+
+    @pytest.mark.parametrize(
+        ("question", "expected"),
+        [
+            ("What allergies does Phil Dixon have?", ("get_allergies",)),
+            ("meds for pid 12", ("get_medications",)),
+            ("Who is his doctor?", ("search_practitioners",)),
+            ("When is her next appointment?", ("get_appointments",)),
+            ("Latest BP for Smith", ("get_vitals", "get_encounters")),
+        ],
+    )
+    def test_topic_plus_search(self, question: str, expected: tuple[str, ...]) -> None:
+        selected = _select(HumanMessage(content=question))
+        assert selected is not None
+        assert set(selected) == {"patient_search", *expected}
+
+    def test_short_keywords_match_whole_words(self) -> None:
+        selected = _select(HumanMessage(content="List medical problems for Smith"))
+        assert selected == ("patient_search", "get_medical_problems")
+
+    @pytest.mark.parametrize(
+        "question", ["And the other one?", "Summarize Phil Dixon's chart"]
+    )
+    def test_full_catalog_fallback(self, question: str) -> None:
+        assert _select(HumanMessage(content=question)) is None
+
+    def test_keeps_tools_called_this_turn(self) -> None:
+        selected = _select(
+            HumanMessage(content="Allergies for Phil Dixon"),
+            AIMessage(
+                content="",
+                tool_calls=[{"name": "get_encounters", "args": {}, "id": "c1"}],
+            ),
+            ToolMessage(content="...", tool_call_id="c1"),
+        )
+        assert selected == ("patient_search", "get_allergies", "get_encounters")
+
+    def test_uses_latest_question_only(self) -> None:
+        selected = _select(
+            HumanMessage(content="Allergies for Phil Dixon"),
+            AIMessage(content="Penicillin."),
+            HumanMessage(content="What about his insurance?"),
+        )
+        assert selected == ("patient_search", "get_insurance")
+
+
+def test_record_selection_reports_tokens_saved() -> None:
+    metrics.reset()
+    tools = _build_tools()
+    record_selection(tools, ("patient_search", "get_allergies"))
+    record_selection(tools, None)
+
+    snapshot = metrics.snapshot()
+    assert snapshot["counters"]["tool_selection{result=subset}"] == 1
+    assert snapshot["counters"]["tool_selection{result=full}"] == 1
+    saved = snapshot["histograms"]["prompt_tool_tokens_saved"]
+    assert saved["count"] == 1 and saved["max"] > 0
@@ -154,6 +154,20 @@ async def test_get_medications(mock_gc: AsyncMock) -> None:
     result = await get_medications("1")
     assert "Lisinopril" in result
     assert "10mg" in result
+    assert "RxCUI 29046" in result
+
+
+@pytest.mark.asyncio
+@patch("agent.tools.clinical.get_client")
+async def test_get_medications_without_title(mock_gc: AsyncMock) -> None:
+    mock_gc.return_value = _mock_client(
+        {"data": [{"title": None, "dose": "5mg"}, {"title": "Lisinopril"}]}
+    )
+    from agent.tools.clinical import get_medications
+
+    result = await get_medications("1")
+    assert "Unknown medication" in result
+    assert "Lisinopril" in result
 
 
 # --- get_encounters ---
@@ -255,3 +269,174 @@ async def test_search_practitioners(mock_gc: AsyncMock) -> None:
     result = await search_practitioners("Johnson")
     assert "Sarah Johnson" in result
     assert "Family Medicine" in result
+
+
+# --- Structured results ---
+
+
+@pytest.mark.asyncio
+@patch("agent.tools.patient.get_client")
+async def test_patient_search_returns_typed_records(mock_gc: AsyncMock) -> None:
+    """Records carry the parsed fields; text is rendered only when read."""
+    mock_gc.return_value = _mock_client(
+        {"data": [{"fname": "Phil", "lname": "Dixon", "DOB": "1980-01-01", "pid": "1"}]}
+    )
+    from agent.tools.patient import patient_search
+    from agent.tools.records import PatientRecord
+
+    result = await patient_search("Phil Dixon")
+
+    assert result.records == (
+        PatientRecord(
+            pid="1", uuid="?", fname="Phil", lname="Dixon", dob="1980-01-01", sex=""
+        ),
+    )
+    assert result._text is None  # not rendered yet
+    assert "Sex: Unknown" in result.text
+    assert result._text is not None
+
+
+@pytest.mark.asyncio
+@patch("agent.tools.clinical.get_client")
+async def test_langchain_tool_returns_text_and_artifact(mock_gc: AsyncMock) -> None:
+    """The wrapped tool sends text to the LLM and keeps records as artifact."""
+    mock_gc.return_value = _mock_client(
+        {
+            "data": [
+                {"title": "Penicillin", "reaction": "Hives", "severity_al": "severe"}
+            ]
+        }
+    )
+    from agent.agent import _build_tools
+
+    tool = next(t for t in _build_tools() if t.name == "get_allergies")
+    message = await tool.ainvoke(
+        {
+            "name": "get_allergies",
+            "args": {"patient_uuid": "uuid-1"},
+            "id": "call-1",
+            "type": "tool_call",
+        }
+    )
+
+    assert "Penicillin | Reaction: Hives" in message.content
+    assert message.artifact[0].severity == "severe"
+
+
+# --- Paging ---
+
+
+def _encounters(n: int) -> dict[str, Any]:
+    return {
+        "data": [
+            {"date": f"2024-01-{day:02d}", "eid": str(day), "pid": "1"}
+            for day in range(1, n + 1)
+        ]
+    }
+
+
+@pytest.mark.asyncio
+@patch("agent.tools.encounters.get_client")
+async def test_get_encounters_pages_with_cursor(mock_gc: AsyncMock) -> None:
+    """Long lists return one page plus a cursor that fetches the next page."""
+    mock_gc.return_value = _mock_client(_encounters(30))
+    from agent.tools.encounters import get_encounters
+
+    first = await get_encounters("uuid-1", limit=10)
+    assert len(first.records) == 10
+    assert first.records[0].date == "2024-01-30"  # newest first
+    assert "Showing 1-10 of 30" in first
+
+    cursor = first.text.split('cursor="')[1].split('"')[0]
+    second = await get_encounters("uuid-1", limit=10, cursor=cursor)
+    assert second.records[0].date == "2024-01-20"
+
+
+@pytest.mark.asyncio
+@patch("agent.tools.encounters.get_client")
+async def test_get_encounters_sort_ascending(mock_gc: AsyncMock) -> None:
+    mock_gc.return_value = _mock_client(_encounters(3))
+    from agent.tools.encounters import get_encounters
+
+    result = await get_encounters("uuid-1", sort="asc")
+    assert [r.eid for r in result.records] == ["1", "2", "3"]
+    assert "cursor" not in result  # everything fit on one page
+
+
+def test_token_budget_truncates_page() -> None:
+    """The page stops once the estimated token budget is reached."""
+    from agent.tools.formatting import TableSpec
+    from agent.tools.paging import paged_result
+
+    rows = [f"row {i:03d} " + "x" * 40 for i in range(100)]
+    result = paged_result(
+        rows,
+        render_row=lambda r: r,
+        table=TableSpec("Rows", ("row",), lambda r: (r,)),
+        sort_key=lambda r: r,
+        limit=100,
+        sort="asc",
+        budget=100,
+    )
+    assert 0 < len(result.records) < 10
+    assert "of 100" in result
+
+
+def test_invalid_cursor_is_reported() -> None:
+    from agent.tools.formatting import TableSpec
+    from agent.tools.paging import paged_result
+
+    result = paged_result(
+        ["a"],
+        render_row=str,
+        table=TableSpec("Rows", ("row",), lambda r: (r,)),
+        sort_key=str,
+        cursor="not-a-cursor",
+    )
+    assert "Invalid cursor" in result
+
+
+# --- Table output format ---
+
+
+@pytest.mark.asyncio
+@patch("agent.tools.clinical.get_client")
+async def test_table_format_states_columns_once(mock_gc: AsyncMock) -> None:
+    """Table mode lists columns in a header and elides empty fields."""
+    mock_gc.return_value = _mock_client(
+        {
+            "data": [
+                {"title": "Penicillin", "reaction": "Hives", "severity_al": "severe"},
+                {"title": "Sulfa", "reaction": "", "severity_al": ""},
+            ]
+        }
+    )
+    from agent.tools.clinical import get_allergies
+    from agent.tools.formatting import set_output_format
+
+    set_output_format("table")
+    try:
+        result = await get_allergies("uuid-1")
+        assert result.text == (
+            "Allergies [substance|reaction|severity]:\nPenicillin|Hives|severe\nSulfa"
+        )
+    finally:
+        set_output_format("text")
+
+
+@pytest.mark.asyncio
+@patch("agent.tools.encounters.get_client")
+async def test_table_format_with_paging(mock_gc: AsyncMock) -> None:
+    mock_gc.return_value = _mock_client(_encounters(3))
+    from agent.tools.encounters import get_encounters
+    from agent.tools.formatting import set_output_format
+
+    set_output_format("table")
+    try:
+        result = await get_encounters("uuid-1", limit=2)
+        lines = result.text.splitlines()
+        assert lines[0] == "Encounters [date|encounter_id|pid]:"  # no reasons
+        assert lines[1] == "2024-01-03|3|1"
+        assert "Showing 1-2 of 3" in lines[-1]
+    finally:
+        set_output_format("text")
@@ -0,0 +1,162 @@
+"""Tests for the verification layer.
+
+The verifiers are deterministic, so these tests build small message
+traces by hand (no LLM or OpenEMR needed) and check what gets flagged.
+"""
+
+from __future__ import annotations
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from agent.verification.claims import build_fact_index, verify_claims, verify_turn
+from agent.verification.rules import DISCLAIMER, check_rules
+
+_SEARCH_OUTPUT = (
+    "Found 1 patient(s) matching 'Phil Dixon':\n\n"
+    "- Phil Dixon | DOB: 1980-01-15 | Sex: Male | pid: 12 | "
+    "uuid: 9a1b2c3d-0000-4000-8000-000000000001"
+)
+_MEDS_OUTPUT = (
+    "Medications:\n\n- Lisinopril 10mg tab (10mg | oral) | "
+    "Ingredient: lisinopril (RxCUI 29046)"
+)
+_VITALS_OUTPUT = "Vital Signs:\n\n  Blood Pressure: 120/80 mmHg\n  Temperature: 98.60 F"
+
+
+def _trace(answer: str) -> list:
+    return [
+        HumanMessage(content="What meds is Phil Dixon on?"),
+        AIMessage(content="", tool_calls=[]),
+        ToolMessage(content=_SEARCH_OUTPUT, tool_call_id="1"),
+        ToolMessage(content=_MEDS_OUTPUT, tool_call_id="2"),
+        ToolMessage(content=_VITALS_OUTPUT, tool_call_id="3"),
+        AIMessage(content=answer),
+    ]
+
+
+# --- Claim verification ---
+
+
+def test_supported_answer_passes() -> None:
+    """Values that match tool output (after normalization) are supported."""
+    report = verify_turn(
+        _trace(
+            "Phil Dixon (DOB January 15, 1980, pid 12) takes Zestril 10mg. "
+            "BP 120/80, temperature 98.6 F."
+        )
+    )
+    assert report.ok
+    assert report.checked >= 6
+
+
+def test_fabricated_values_are_flagged() -> None:
+    """Doses, dates and drugs that no tool returned are reported."""
+    report = verify_turn(
+        _trace("Phil Dixon (DOB 1980-01-15) takes lisinopril 20mg and metformin.")
+    )
+    assert report.unsupported == ("20", "metformin")
+
+
+def test_us_date_format_normalized() -> None:
+    report = verify_turn(_trace("DOB: 01/15/1980"))
+    assert report.ok
+
+
+def test_previous_ai_answers_are_not_sources() -> None:
+    """An earlier hallucination must not support a later one."""
+    messages = [
+        HumanMessage(content="Tell me about Phil"),
+        AIMessage(content="His weight is 185 lbs."),
+        HumanMessage(content="And his weight again?"),
+        AIMessage(content="His weight is 185 lbs."),
+    ]
+    assert verify_turn(messages).unsupported == ("185",)
+
+
+def test_user_supplied_values_are_supported() -> None:
+    index = build_fact_index([HumanMessage(content="Show meds for pid 42")])
+    assert verify_claims("Patient pid 42 has no medications.", index).ok
+
+
+# --- Domain rules ---
+
+
+def _call(name: str, call_id: str, **args: str) -> dict:
+    return {"name": name, "args": args, "id": call_id, "type": "tool_call"}
+
+
+_TWO_SMITHS = (
+    "Found 2 patient(s) matching 'Smith':\n\n"
+    "- John Smith | DOB: 1970-05-15 | Sex: Male | pid: 1 | uuid: aaa\n"
+    "- Jane Smith | DOB: 1985-08-20 | Sex: Female | pid: 2 | uuid: bbb"
+)
+
+
+def _allergy_turn(answer: str) -> list:
+    return [
+        HumanMessage(content="Allergies for Phil Dixon?"),
+        AIMessage(content="", tool_calls=[_call("patient_search", "1", query="x")]),
+        ToolMessage(content=_SEARCH_OUTPUT, tool_call_id="1", name="patient_search"),
+        AIMessage(
+            content="",
+            tool_calls=[
+                _call(
+                    "get_allergies",
+                    "2",
+                    patient_uuid="9a1b2c3d-0000-4000-8000-000000000001",
+                )
+            ],
+        ),
+        ToolMessage(content="Allergies:\n\n- Penicillin", tool_call_id="2"),
+        AIMessage(content=answer),
+    ]
+
+
+def test_compliant_answer_is_untouched() -> None:
+    answer = f"Phil Dixon (DOB 1980-01-15) is allergic to Penicillin.\n\n{DISCLAIMER}"
+    report = check_rules(_allergy_turn(answer))
+    assert report.ok
+    assert report.text == answer
+
+
+def test_missing_disclaimer_and_identity_are_repaired() -> None:
+    report = check_rules(_allergy_turn("He is allergic to Penicillin."))
+
+    assert {v.rule for v in report.violations} == {"identity", "disclaimer"}
+    assert report.text.startswith("Patient: Phil Dixon (DOB: 1980-01-15)")
+    assert report.text.endswith(DISCLAIMER)
+
+
+def test_identity_resolved_from_earlier_turn() -> None:
+    """A follow-up turn can be tied to a patient found in a previous turn."""
+    messages = _allergy_turn(f"Phil Dixon, DOB 1980-01-15. {DISCLAIMER}")
+    messages += [
+        HumanMessage(content="And his meds?"),
+        AIMessage(
+            content="", tool_calls=[_call("get_medications", "3", patient_id="12")]
+        ),
+        ToolMessage(content=_MEDS_OUTPUT, tool_call_id="3"),
+        AIMessage(content=f"He takes lisinopril. {DISCLAIMER}"),
+    ]
+    report = check_rules(messages)
+    assert [v.rule for v in report.violations] == ["identity"]
+    assert "Phil Dixon (DOB: 1980-01-15)" in report.text
+
+
+def test_ambiguous_matches_are_listed() -> None:
+    messages = [
+        HumanMessage(content="Find Smith"),
+        AIMessage(content="", tool_calls=[_call("patient_search", "1", query="Smith")]),
+        ToolMessage(content=_TWO_SMITHS, tool_call_id="1"),
+        AIMessage(content="I found John Smith."),
+    ]
+    report = check_rules(messages)
+
+    assert [v.rule for v in report.violations] == ["ambiguity"]
+    assert "Jane Smith (DOB: 1985-08-20)" in report.text
+    assert "Which patient did you mean?" in report.text
+
+
+def test_non_clinical_answer_needs_no_disclaimer() -> None:
+    messages = [HumanMessage(content="Hi"), AIMessage(content="Hello! How can I help?")]
+    assert check_rules(messages).ok